@@ -0,0 +1,270 @@
+"""
+Cached API key authentication.
+
+validate_api_key (Supabase RPC) counted this month's conversions and wrote
+api_keys.last_used_at on every authenticated request. Lookups are now cached
+by key hash in two layers:
+
+1. In-process: AUTH_CACHE_LOCAL_TTL seconds, dropped immediately when a
+   revocation is published on the auth:revocations channel
+2. Redis: auth:key:{key_hash} for AUTH_CACHE_TTL seconds, shared by all API
+   processes (unknown keys are cached too, so guessing keys does not reach
+   the database)
+
+The database is only queried on a miss, with the side-effect-free
+lookup_api_key RPC. last_used_at is recorded in the auth:last_used Redis hash
+and flushed to Supabase in one batch every AUTH_LAST_USED_FLUSH_SECONDS.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+
+from .config import (
+    AUTH_CACHE_TTL,
+    AUTH_CACHE_LOCAL_TTL,
+    AUTH_CACHE_LOCAL_SIZE,
+    AUTH_LAST_USED_FLUSH_SECONDS,
+)
+from .redis_client import get_redis, get_async_redis
+from .supabase_client import lookup_api_key, lookup_api_key_async, touch_api_keys
+
+REVOCATION_CHANNEL = "auth:revocations"
+_LAST_USED_KEY = "auth:last_used"
+
+# Only record last use once per key per interval from each process
+_LAST_USED_RECORD_INTERVAL = 30
+
+_local_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_local_lock = threading.Lock()
+_last_recorded: dict = {}
+_background_started = False
+
+
+def _cache_key(key_hash: str) -> str:
+    return f"auth:key:{key_hash}"
+
+
+def _id_key(api_key_id: str) -> str:
+    return f"auth:keyid:{api_key_id}"
+
+
+def _local_get(key_hash: str) -> Optional[dict]:
+    with _local_lock:
+        entry = _local_cache.get(key_hash)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at < time.monotonic():
+            del _local_cache[key_hash]
+            return None
+        _local_cache.move_to_end(key_hash)
+        return info
+
+
+def _local_set(key_hash: str, info: dict) -> None:
+    with _local_lock:
+        _local_cache[key_hash] = (time.monotonic() + AUTH_CACHE_LOCAL_TTL, info)
+        _local_cache.move_to_end(key_hash)
+        while len(_local_cache) > AUTH_CACHE_LOCAL_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _local_drop(key_hash: str) -> None:
+    with _local_lock:
+        _local_cache.pop(key_hash, None)
+
+
+def _should_record_last_used(api_key_id: str) -> Optional[int]:
+    """Returns the timestamp to record, or None if this key was recorded recently."""
+    now = time.time()
+    if now - _last_recorded.get(api_key_id, 0) < _LAST_USED_RECORD_INTERVAL:
+        return None
+    _last_recorded[api_key_id] = now
+    return int(now)
+
+
+def _record_last_used(api_key_id: str) -> None:
+    """Marks a key as used; written to Supabase by flush_last_used()."""
+    now = _should_record_last_used(api_key_id)
+    if now is None:
+        return
+    try:
+        get_redis().hset(_LAST_USED_KEY, api_key_id, now)
+    except redis.RedisError as e:
+        print(f"WARNING: Could not record API key usage ({e}).")
+
+
+async def _record_last_used_async(api_key_id: str) -> None:
+    """Async variant of _record_last_used."""
+    now = _should_record_last_used(api_key_id)
+    if now is None:
+        return
+    try:
+        await get_async_redis().hset(_LAST_USED_KEY, api_key_id, now)
+    except redis.RedisError as e:
+        print(f"WARNING: Could not record API key usage ({e}).")
+
+
+def validate_api_key(key_hash: str) -> Optional[dict]:
+    """
+    Cached drop-in for supabase_client.validate_api_key.
+
+    Args:
+        key_hash: SHA-256 hash of the API key (see hash_api_key)
+
+    Returns:
+        Dict with api_key_id, user_id, plan, monthly_limit and is_valid if the
+        key is valid, None otherwise
+    """
+    info = _local_get(key_hash)
+
+    if info is None:
+        try:
+            cached = get_redis().get(_cache_key(key_hash))
+        except redis.RedisError as e:
+            print(f"WARNING: Auth cache unavailable ({e}). Validating API key against the database.")
+            cached = None
+        if cached is not None:
+            info = json.loads(cached)
+        else:
+            info = lookup_api_key(key_hash)
+            if info is None:
+                return None  # Database error: do not cache
+            try:
+                pipe = get_redis().pipeline()
+                pipe.setex(_cache_key(key_hash), AUTH_CACHE_TTL, json.dumps(info))
+                if info.get("api_key_id"):
+                    pipe.setex(_id_key(info["api_key_id"]), AUTH_CACHE_TTL, key_hash)
+                pipe.execute()
+            except redis.RedisError:
+                pass
+        _local_set(key_hash, info)
+
+    if not info.get("is_valid"):
+        return None
+
+    _record_last_used(str(info["api_key_id"]))
+    return info
+
+
+async def validate_api_key_async(key_hash: str) -> Optional[dict]:
+    """Async variant of validate_api_key for the API's request handlers."""
+    info = _local_get(key_hash)
+
+    if info is None:
+        client = get_async_redis()
+        try:
+            cached = await client.get(_cache_key(key_hash))
+        except redis.RedisError as e:
+            print(f"WARNING: Auth cache unavailable ({e}). Validating API key against the database.")
+            cached = None
+        if cached is not None:
+            info = json.loads(cached)
+        else:
+            info = await lookup_api_key_async(key_hash)
+            if info is None:
+                return None  # Database error: do not cache
+            try:
+                pipe = client.pipeline()
+                pipe.setex(_cache_key(key_hash), AUTH_CACHE_TTL, json.dumps(info))
+                if info.get("api_key_id"):
+                    pipe.setex(_id_key(info["api_key_id"]), AUTH_CACHE_TTL, key_hash)
+                await pipe.execute()
+            except redis.RedisError:
+                pass
+        _local_set(key_hash, info)
+
+    if not info.get("is_valid"):
+        return None
+
+    await _record_last_used_async(str(info["api_key_id"]))
+    return info
+
+
+def invalidate_api_key(api_key_id: Optional[str] = None, key_hash: Optional[str] = None) -> None:
+    """
+    Drops a key from every cache layer (after a revocation or plan change).
+
+    Args:
+        api_key_id: ID of the key (resolved to its hash through the cache)
+        key_hash: Hash of the key, when known
+    """
+    client = get_redis()
+    if key_hash is None and api_key_id:
+        cached_hash = client.get(_id_key(api_key_id))
+        key_hash = cached_hash.decode() if cached_hash else None
+    if key_hash is None:
+        return  # Not cached anywhere (local entries never outlive the Redis entry)
+
+    keys = [_cache_key(key_hash)]
+    if api_key_id:
+        keys.append(_id_key(api_key_id))
+    client.delete(*keys)
+    _local_drop(key_hash)
+    client.publish(REVOCATION_CHANNEL, key_hash)
+
+
+def _handle_revocation(message: dict) -> None:
+    data = message.get("data")
+    if isinstance(data, bytes):
+        _local_drop(data.decode())
+
+
+def flush_last_used() -> int:
+    """
+    Writes the accumulated last_used_at timestamps to Supabase in one batch.
+
+    The hash is renamed before reading, so concurrent flushers never write
+    the same entries twice and new uses go to a fresh hash.
+
+    Returns:
+        Number of keys updated
+    """
+    client = get_redis()
+    flushing_key = f"{_LAST_USED_KEY}:flushing:{uuid.uuid4().hex}"
+    try:
+        client.rename(_LAST_USED_KEY, flushing_key)
+    except redis.ResponseError:
+        return 0  # Nothing recorded since the last flush
+
+    usage = {
+        api_key_id.decode(): float(used_at)
+        for api_key_id, used_at in client.hgetall(flushing_key).items()
+    }
+    client.delete(flushing_key)
+    if usage and not touch_api_keys(usage):
+        print(f"WARNING: Dropped last_used_at updates for {len(usage)} API keys.")
+        return 0
+    return len(usage)
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(AUTH_LAST_USED_FLUSH_SECONDS)
+        try:
+            flush_last_used()
+        except redis.RedisError as e:
+            print(f"WARNING: Could not flush API key usage ({e}).")
+
+
+def start_background_tasks() -> None:
+    """Subscribes to revocations and starts the last_used_at flusher (once per process)."""
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+
+    try:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{REVOCATION_CHANNEL: _handle_revocation})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+    except redis.RedisError as e:
+        print(f"WARNING: Auth revocation listener unavailable ({e}). Relying on AUTH_CACHE_LOCAL_TTL.")
+
+    threading.Thread(target=_flush_loop, name="auth-last-used-flush", daemon=True).start()
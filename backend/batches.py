@@ -0,0 +1,159 @@
+"""
+Batch conversions: many documents submitted in one request.
+
+POST /api/v1/batches creates one job per document, with authentication,
+quota, status writes, conversion tracking and enqueueing each done once for
+the whole batch. The batch itself is a few Redis keys:
+
+- batch:{batch_id}: hash with user_id, total, completed, failed, created_at
+  (and finished_at once every job is done)
+- batch:{batch_id}:jobs: list of the batch's job IDs, in submission order
+- batch-job:{job_id}: the batch a job belongs to
+
+complete_job and fail_job report every job through record_batch_result; the
+report that finishes the batch sends a single batch.completed webhook.
+"""
+
+import logging
+import time
+from typing import Optional
+
+import redis
+
+from .redis_client import get_redis, get_async_redis
+from .webhook_service import send_webhook_sync
+
+logger = logging.getLogger(__name__)
+
+# Counts a job's result (ARGV[1]: 'completed' or 'failed') in its batch, once.
+# Returns 0 if the job is not in a batch, {batch_id, user_id, total,
+# completed, failed} if this result finished the batch, 1 otherwise.
+_RESULT_SCRIPT = """
+local batch_id = redis.call('GET', KEYS[1])
+if not batch_id then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+local key = 'batch:' .. batch_id
+if redis.call('EXISTS', key) == 0 then
+    return 1
+end
+redis.call('HINCRBY', key, ARGV[1], 1)
+local state = redis.call('HMGET', key, 'user_id', 'total', 'completed', 'failed')
+if tonumber(state[3]) + tonumber(state[4]) < tonumber(state[2]) then
+    return 1
+end
+redis.call('HSET', key, 'finished_at', ARGV[2])
+return {batch_id, state[1], state[2], state[3], state[4]}
+"""
+
+
+def _batch_key(batch_id: str) -> str:
+    return f"batch:{batch_id}"
+
+
+def _membership_key(job_id: str) -> str:
+    return f"batch-job:{job_id}"
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def create_batch_async(batch_id: str, user_id: str, job_ids: list, ttl: int) -> None:
+    """
+    Records a batch and its jobs in one round trip.
+
+    Args:
+        batch_id: Unique identifier for the batch
+        user_id: Owner of the batch (receives the batch.completed webhook)
+        job_ids: The batch's jobs, in submission order
+        ttl: How long the batch record is kept
+    """
+    key = _batch_key(batch_id)
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.hset(key, mapping={
+        "user_id": user_id,
+        "total": len(job_ids),
+        "completed": 0,
+        "failed": 0,
+        "created_at": int(time.time()),
+    })
+    pipe.expire(key, ttl)
+    pipe.rpush(f"{key}:jobs", *job_ids)
+    pipe.expire(f"{key}:jobs", ttl)
+    for job_id in job_ids:
+        pipe.set(_membership_key(job_id), batch_id, ex=ttl)
+    await pipe.execute()
+
+
+async def get_batch_async(batch_id: str) -> Optional[dict]:
+    """
+    Retrieve a batch's aggregate status.
+
+    Returns:
+        Dict with status ("processing" or "completed"), total, completed,
+        failed, pending, created_at, finished_at and job_ids, or None if the
+        batch does not exist
+    """
+    key = _batch_key(batch_id)
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.hgetall(key)
+    pipe.lrange(f"{key}:jobs", 0, -1)
+    fields, job_ids = await pipe.execute()
+    if not fields:
+        return None
+
+    fields = {_decode(name): _decode(value) for name, value in fields.items()}
+    total, completed, failed = (int(fields[name]) for name in ("total", "completed", "failed"))
+    finished_at = fields.get("finished_at")
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if finished_at else "processing",
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "pending": total - completed - failed,
+        "created_at": int(fields["created_at"]),
+        "finished_at": int(finished_at) if finished_at else None,
+        "job_ids": [_decode(job_id) for job_id in job_ids],
+    }
+
+
+def record_batch_result(job_id: str, status: str) -> bool:
+    """
+    Counts a finished job in its batch, if it belongs to one, and sends the
+    batch.completed webhook when it was the batch's last job.
+
+    Args:
+        job_id: The finished job
+        status: "completed" or "failed"
+
+    Returns:
+        True if the job belongs to a batch (its own job.* webhook is not sent)
+    """
+    try:
+        result = get_redis().eval(_RESULT_SCRIPT, 1, _membership_key(job_id), status, int(time.time()))
+    except redis.RedisError as e:
+        logger.warning(f"Could not record batch result for job {job_id}: {e}")
+        return False
+    if not isinstance(result, list):
+        return result == 1
+
+    batch_id, user_id, total, completed, failed = (_decode(value) for value in result)
+    try:
+        send_webhook_sync(
+            user_id=user_id,
+            job_id=batch_id,
+            event_type="batch.completed",
+            data={
+                "batch_id": batch_id,
+                "status": "completed",
+                "total": int(total),
+                "completed": int(completed),
+                "failed": int(failed),
+            }
+        )
+    except Exception as webhook_error:
+        logger.warning(f"Webhook notification failed for batch {batch_id}: {webhook_error}")
+    return True
@@ -1,7 +1,108 @@
 import os
+import tempfile
 
 # Redis Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 # PDF Storage Configuration
 PDF_TTL_SECONDS = int(os.getenv("PDF_TTL_SECONDS", 7200))  # 2 hours default
+
+# Tiered PDF Storage (Redis hot tier + filesystem/S3 cold tier)
+PDF_STORAGE_BACKEND = os.getenv("PDF_STORAGE_BACKEND", "filesystem")  # "filesystem", "s3" or "none"
+PDF_STORAGE_DIR = os.getenv("PDF_STORAGE_DIR", os.path.join(tempfile.gettempdir(), "pdfleaf-pdfs"))
+PDF_HOT_MAX_BYTES = int(os.getenv("PDF_HOT_MAX_BYTES", 512 * 1024))  # larger PDFs go straight to the cold tier
+PDF_HOT_TTL_SECONDS = int(os.getenv("PDF_HOT_TTL_SECONDS", 900))
+PDF_COLD_TTL_SECONDS = int(os.getenv("PDF_COLD_TTL_SECONDS", 0))  # 0 = never expires
+JOB_RECORD_TTL_SECONDS = int(os.getenv("JOB_RECORD_TTL_SECONDS", 90 * 86400))  # completed jobs, with a cold tier
+JOB_INDEX_TTL_SECONDS = int(os.getenv("JOB_INDEX_TTL_SECONDS", max(PDF_TTL_SECONDS, JOB_RECORD_TTL_SECONDS)))  # per-user job index window
+PDF_S3_BUCKET = os.getenv("PDF_S3_BUCKET", "pdfleaf")
+PDF_S3_ENDPOINT_URL = os.getenv("PDF_S3_ENDPOINT_URL")  # e.g. http://minio:9000
+PDF_S3_ACCESS_KEY = os.getenv("PDF_S3_ACCESS_KEY")
+PDF_S3_SECRET_KEY = os.getenv("PDF_S3_SECRET_KEY")
+PDF_S3_REGION = os.getenv("PDF_S3_REGION", "us-east-1")
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 256 * 1024))  # bytes held in memory per download
+
+# Signed Direct-Download URLs (served by nginx from PDF_STORAGE_DIR, or S3 presigned URLs)
+DOWNLOAD_URL_SECRET = os.getenv("DOWNLOAD_URL_SECRET")  # unset = no signed URLs
+DOWNLOAD_URL_TTL_SECONDS = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", 900))
+DOWNLOAD_URL_BASE = os.getenv("DOWNLOAD_URL_BASE", "")  # e.g. https://htmltopdf.buscarid.com (empty = relative URLs)
+DOWNLOAD_FILES_PREFIX = os.getenv("DOWNLOAD_FILES_PREFIX", "/files")  # nginx location serving PDF_STORAGE_DIR
+
+# Task Payload Store (claim-check: HTML is stored once, tasks carry a reference)
+PAYLOAD_STORE = os.getenv("PAYLOAD_STORE", "redis")  # "redis" or "disk"
+PAYLOAD_STORE_DIR = os.getenv("PAYLOAD_STORE_DIR", os.path.join(tempfile.gettempdir(), "pdfleaf-payloads"))
+PAYLOAD_TTL_SECONDS = int(os.getenv("PAYLOAD_TTL_SECONDS", 86400))  # covers queue backlogs
+PAYLOAD_REDIS_MAX_BYTES = int(os.getenv("PAYLOAD_REDIS_MAX_BYTES", 1024 * 1024))  # larger rendered chunks go to the PDF cold tier
+
+# API Key Authentication Cache (Redis + in-process, revocations via pub/sub)
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 60))  # seconds a validated key is trusted in Redis
+AUTH_CACHE_LOCAL_TTL = int(os.getenv("AUTH_CACHE_LOCAL_TTL", 10))  # seconds in each API process
+AUTH_CACHE_LOCAL_SIZE = int(os.getenv("AUTH_CACHE_LOCAL_SIZE", 4096))  # keys per API process
+AUTH_LAST_USED_FLUSH_SECONDS = int(os.getenv("AUTH_LAST_USED_FLUSH_SECONDS", 60))  # last_used_at batch interval
+
+# Monthly Quota Ledger (Redis, reserve/commit/release per job)
+QUOTA_RESERVATION_TTL = int(os.getenv("QUOTA_RESERVATION_TTL", 3600))  # unconfirmed reservations expire
+QUOTA_SETTLE_TTL = int(os.getenv("QUOTA_SETTLE_TTL", max(QUOTA_RESERVATION_TTL, PAYLOAD_TTL_SECONDS)))  # jobs completing this late are still counted
+QUOTA_RECONCILE_SECONDS = int(os.getenv("QUOTA_RECONCILE_SECONDS", 300))  # ledger vs conversions table
+
+# Conversion Tracking (write-behind through a Redis Stream, bulk upserts into conversions)
+CONVERSION_FLUSH_BATCH = int(os.getenv("CONVERSION_FLUSH_BATCH", 500))  # events per database write
+CONVERSION_FLUSH_INTERVAL_MS = int(os.getenv("CONVERSION_FLUSH_INTERVAL_MS", 2000))  # max delay before a partial batch is written
+CONVERSION_CLAIM_IDLE_MS = int(os.getenv("CONVERSION_CLAIM_IDLE_MS", 60000))  # unacknowledged events retried after
+CONVERSION_STREAM_MAXLEN = int(os.getenv("CONVERSION_STREAM_MAXLEN", 1000000))  # approximate cap on buffered events
+
+# Per-IP Rate Limiting (slowapi), shared by all API processes through Redis
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", REDIS_URL)  # "memory://" = per process
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "moving-window")  # or "fixed-window"
+
+# API Key Rate Limiting (GCRA over minute and hour windows)
+RATE_LIMIT_LOCAL_BATCH = int(os.getenv("RATE_LIMIT_LOCAL_BATCH", 1))  # tokens pre-allocated per Redis call (1 = off)
+RATE_LIMIT_LOCAL_TTL_MS = int(os.getenv("RATE_LIMIT_LOCAL_TTL_MS", 1000))  # lifetime of pre-allocated tokens
+
+# Job Status Push (pub/sub behind SSE and long-poll on job status)
+JOB_WAIT_MAX_SECONDS = int(os.getenv("JOB_WAIT_MAX_SECONDS", 60))  # cap on GET /jobs/{id}?wait=
+JOB_EVENTS_MAX_SECONDS = int(os.getenv("JOB_EVENTS_MAX_SECONDS", 300))  # SSE stream lifetime; clients reconnect
+JOB_EVENTS_KEEPALIVE_SECONDS = int(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", 15))  # SSE comment lines through idle proxies
+JOB_STATUS_BATCH_MAX = int(os.getenv("JOB_STATUS_BATCH_MAX", 1000))  # job IDs per POST /jobs/status
+JOB_LIST_PAGE_MAX = int(os.getenv("JOB_LIST_PAGE_MAX", 100))  # jobs per page of GET /jobs
+
+# Batch Conversions (POST /api/v1/batches)
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", 1000))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", 20 * 1024 * 1024))  # HTML of all documents together
+
+# Rendered PDF Cache (content-addressed, shared by identical jobs of the same user)
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "true").lower() == "true"
+RENDER_CACHE_TTL = int(os.getenv("RENDER_CACHE_TTL", PDF_TTL_SECONDS))
+RENDER_QUEUE_TTL = int(os.getenv("RENDER_QUEUE_TTL", PAYLOAD_TTL_SECONDS))  # leader's claim while its task is queued
+RENDER_LOCK_TTL = int(os.getenv("RENDER_LOCK_TTL", 180))  # claim once rendering starts; longer than task_time_limit
+RENDER_WATCHDOG_SECONDS = int(os.getenv("RENDER_WATCHDOG_SECONDS", 60))  # followers check that their leader is alive
+
+# PDF Rendering Configuration
+PAGE_CSS_CACHE_SIZE = int(os.getenv("PAGE_CSS_CACHE_SIZE", 64))  # parsed @page stylesheets per worker
+TAILWIND_CSS_CACHE_SIZE = int(os.getenv("TAILWIND_CSS_CACHE_SIZE", 256))  # parsed Tailwind stylesheets per worker
+SPLIT_MAX_PARTS = int(os.getenv("SPLIT_MAX_PARTS", 1000))  # per-record PDFs from one split_on render
+CHUNKED_RENDER_MAX_CHUNKS = int(os.getenv("CHUNKED_RENDER_MAX_CHUNKS", 8))  # parallel chunk tasks per chunked job (match worker processes)
+CHUNKED_RENDER_MIN_CHUNK_BYTES = int(os.getenv("CHUNKED_RENDER_MIN_CHUNK_BYTES", 64 * 1024))  # smaller documents render in one piece
+
+# PDF Templates (template + JSON data rendering)
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", 64))  # compiled templates per worker
+TEMPLATE_RECORD_TTL = int(os.getenv("TEMPLATE_RECORD_TTL", 3600))  # template records cached in Redis
+TEMPLATE_DATA_MAX_BYTES = int(os.getenv("TEMPLATE_DATA_MAX_BYTES", 1024 * 1024))  # JSON data per job
+
+# Inline Rendering (mode=sync: small documents rendered in a process pool inside the API)
+INLINE_RENDER_WORKERS = int(os.getenv("INLINE_RENDER_WORKERS", 2))  # pre-warmed render processes per API process (0 = off)
+INLINE_RENDER_MAX_QUEUE = int(os.getenv("INLINE_RENDER_MAX_QUEUE", 4))  # renders waiting for a process before falling back to Celery
+INLINE_RENDER_MAX_BYTES = int(os.getenv("INLINE_RENDER_MAX_BYTES", 64 * 1024))  # HTML (incl. header/footer) eligible for inline rendering
+INLINE_RENDER_MAX_ELEMENTS = int(os.getenv("INLINE_RENDER_MAX_ELEMENTS", 1500))  # tags eligible for inline rendering
+INLINE_RENDER_MAX_RESOURCES = int(os.getenv("INLINE_RENDER_MAX_RESOURCES", 4))  # external images/stylesheets/fonts
+INLINE_RENDER_TIMEOUT_MS = int(os.getenv("INLINE_RENDER_TIMEOUT_MS", 3000))  # then the response is a pending job
+
+# External Resource Fetching (images, stylesheets, fonts)
+RESOURCE_CACHE_DIR = os.getenv("RESOURCE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pdfleaf-resources"))
+RESOURCE_CACHE_MEMORY_BYTES = int(os.getenv("RESOURCE_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))  # per worker process
+RESOURCE_CACHE_DISK_BYTES = int(os.getenv("RESOURCE_CACHE_DISK_BYTES", 512 * 1024 * 1024))  # shared by workers on a node
+RESOURCE_CACHE_DEFAULT_TTL = int(os.getenv("RESOURCE_CACHE_DEFAULT_TTL", 300))  # when responses carry no cache headers
+RESOURCE_FETCH_TIMEOUT = float(os.getenv("RESOURCE_FETCH_TIMEOUT", 10))  # seconds per resource
+RESOURCE_FETCH_BUDGET = float(os.getenv("RESOURCE_FETCH_BUDGET", 30))  # seconds of fetching per document
+RESOURCE_MAX_BYTES = int(os.getenv("RESOURCE_MAX_BYTES", 20 * 1024 * 1024))  # per resource
+RESOURCE_PREFETCH_CONCURRENCY = int(os.getenv("RESOURCE_PREFETCH_CONCURRENCY", 8))  # parallel fetches per document
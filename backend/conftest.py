@@ -41,7 +41,7 @@ def _mock_validate_api_key_invalid(key_hash):
     return {"is_valid": False}
 
 
-def _mock_check_user_quota_ok(user_id):
+def _mock_reserve_quota_ok(user_id, job_id):
     """Mock quota check that allows conversion."""
     return {
         "can_convert": True,
@@ -51,7 +51,7 @@ def _mock_check_user_quota_ok(user_id):
     }
 
 
-def _mock_check_user_quota_exceeded(user_id):
+def _mock_reserve_quota_exceeded(user_id, job_id):
     """Mock quota check that denies conversion."""
     return {
         "can_convert": False,
@@ -88,7 +88,7 @@ def _mock_rate_limit_exceeded(api_key_id, plan):
     }
 
 
-def _mock_set_job_status(job_id, status, ttl=None):
+def _mock_set_job_status(job_id, status, ttl=None, user_id=None):
     _job_storage[job_id] = status
 
 
@@ -100,8 +100,13 @@ def _mock_store_pdf(job_id, pdf_bytes, ttl=None):
     _pdf_storage[job_id] = pdf_bytes
 
 
-def _mock_get_pdf(job_id):
-    return _pdf_storage.get(job_id)
+def _mock_open_pdf(job_id):
+    pdf_bytes = _pdf_storage.get(job_id)
+    if pdf_bytes is None:
+        return None
+    blob = MagicMock(size=len(pdf_bytes))
+    blob.iter_range.side_effect = lambda start, end, *args: iter([pdf_bytes[start:end + 1]])
+    return blob
 
 
 @pytest.fixture(autouse=True)
@@ -113,6 +118,33 @@ def reset_storage():
     yield
 
 
+@pytest.fixture(autouse=True)
+def payload_store(tmp_path):
+    """Keep task payloads on local disk instead of Redis."""
+    from backend.payload_store import DiskPayloadStore
+    with patch('backend.payload_store._store', DiskPayloadStore(str(tmp_path / "payloads"))):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def render_cache_miss():
+    """Treat every job as a render cache miss (no Redis in tests)."""
+    with patch('backend.main.claim_render', return_value=("leader", None)), \
+         patch('backend.main.start_render', return_value=True), \
+         patch('backend.tasks.start_render', return_value=True):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def quota_ledger():
+    """Keep quota commits/releases away from Redis (reservations are mocked per client)."""
+    with patch('backend.main.release_quota'), \
+         patch('backend.main.release_quotas'), \
+         patch('backend.tasks.commit_quota'), \
+         patch('backend.tasks.release_quota'):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def disable_slowapi_limiter():
     """Disable slowapi IP-based rate limiter during tests."""
@@ -135,10 +167,13 @@ def client():
     Always returns a valid API key to bypass authentication checks.
     """
     from backend.pdf_service import generate_pdf_from_html
+    from backend.payload_store import load_payload
 
-    def sync_task_delay(job_id, html, options, user_id=None):
+    def sync_task_delay(job_id, payload_ref, user_id=None, render_key=None):
         """Execute PDF generation synchronously for testing."""
         try:
+            payload = load_payload(payload_ref)
+            html, options = payload["html"], payload["options"]
             _mock_set_job_status(job_id, {"status": "processing"})
             pdf_bytes = generate_pdf_from_html(html=html, **options)
             _mock_store_pdf(job_id, pdf_bytes)
@@ -150,14 +185,14 @@ def client():
     mock_task.delay = MagicMock(side_effect=lambda **kwargs: sync_task_delay(**kwargs))
     mock_rate_limiter = _create_mock_rate_limiter(_mock_rate_limit_ok)
 
-    with patch('backend.main.set_job_status', side_effect=_mock_set_job_status), \
-         patch('backend.main.get_job_status', side_effect=_mock_get_job_status), \
-         patch('backend.main.get_pdf', side_effect=_mock_get_pdf), \
+    with patch('backend.main.set_job_status_async', side_effect=_mock_set_job_status), \
+         patch('backend.main.get_job_status_async', side_effect=_mock_get_job_status), \
+         patch('backend.main.open_pdf', side_effect=_mock_open_pdf), \
          patch('backend.main.generate_pdf_task', mock_task), \
          patch('backend.main.get_api_key_from_request', return_value=TEST_API_KEY), \
-         patch('backend.main.validate_api_key', side_effect=_mock_validate_api_key_success), \
-         patch('backend.main.check_user_quota', side_effect=_mock_check_user_quota_ok), \
-         patch('backend.main.track_conversion', side_effect=_mock_track_conversion), \
+         patch('backend.main.validate_api_key_async', side_effect=_mock_validate_api_key_success), \
+         patch('backend.main.reserve_quota_async', side_effect=_mock_reserve_quota_ok), \
+         patch('backend.main.record_conversion_async', side_effect=_mock_track_conversion), \
          patch('backend.main.get_rate_limiter', return_value=mock_rate_limiter):
 
         from backend.main import app
@@ -171,9 +206,12 @@ def client_no_auth():
     Returns None for API key extraction, so requests fail with 401.
     """
     from backend.pdf_service import generate_pdf_from_html
+    from backend.payload_store import load_payload
 
-    def sync_task_delay(job_id, html, options, user_id=None):
+    def sync_task_delay(job_id, payload_ref, user_id=None, render_key=None):
         try:
+            payload = load_payload(payload_ref)
+            html, options = payload["html"], payload["options"]
             _mock_set_job_status(job_id, {"status": "processing"})
             pdf_bytes = generate_pdf_from_html(html=html, **options)
             _mock_store_pdf(job_id, pdf_bytes)
@@ -185,14 +223,14 @@ def client_no_auth():
     mock_task.delay = MagicMock(side_effect=lambda **kwargs: sync_task_delay(**kwargs))
     mock_rate_limiter = _create_mock_rate_limiter(_mock_rate_limit_ok)
 
-    with patch('backend.main.set_job_status', side_effect=_mock_set_job_status), \
-         patch('backend.main.get_job_status', side_effect=_mock_get_job_status), \
-         patch('backend.main.get_pdf', side_effect=_mock_get_pdf), \
+    with patch('backend.main.set_job_status_async', side_effect=_mock_set_job_status), \
+         patch('backend.main.get_job_status_async', side_effect=_mock_get_job_status), \
+         patch('backend.main.open_pdf', side_effect=_mock_open_pdf), \
          patch('backend.main.generate_pdf_task', mock_task), \
          patch('backend.main.get_api_key_from_request', return_value=None), \
-         patch('backend.main.validate_api_key', side_effect=_mock_validate_api_key_invalid), \
-         patch('backend.main.check_user_quota', side_effect=_mock_check_user_quota_ok), \
-         patch('backend.main.track_conversion', side_effect=_mock_track_conversion), \
+         patch('backend.main.validate_api_key_async', side_effect=_mock_validate_api_key_invalid), \
+         patch('backend.main.reserve_quota_async', side_effect=_mock_reserve_quota_ok), \
+         patch('backend.main.record_conversion_async', side_effect=_mock_track_conversion), \
          patch('backend.main.get_rate_limiter', return_value=mock_rate_limiter):
 
         from backend.main import app
@@ -206,9 +244,12 @@ def client_quota_exceeded():
     Auth is valid, but quota check fails.
     """
     from backend.pdf_service import generate_pdf_from_html
+    from backend.payload_store import load_payload
 
-    def sync_task_delay(job_id, html, options, user_id=None):
+    def sync_task_delay(job_id, payload_ref, user_id=None, render_key=None):
         try:
+            payload = load_payload(payload_ref)
+            html, options = payload["html"], payload["options"]
             _mock_set_job_status(job_id, {"status": "processing"})
             pdf_bytes = generate_pdf_from_html(html=html, **options)
             _mock_store_pdf(job_id, pdf_bytes)
@@ -220,14 +261,14 @@ def client_quota_exceeded():
     mock_task.delay = MagicMock(side_effect=lambda **kwargs: sync_task_delay(**kwargs))
     mock_rate_limiter = _create_mock_rate_limiter(_mock_rate_limit_ok)
 
-    with patch('backend.main.set_job_status', side_effect=_mock_set_job_status), \
-         patch('backend.main.get_job_status', side_effect=_mock_get_job_status), \
-         patch('backend.main.get_pdf', side_effect=_mock_get_pdf), \
+    with patch('backend.main.set_job_status_async', side_effect=_mock_set_job_status), \
+         patch('backend.main.get_job_status_async', side_effect=_mock_get_job_status), \
+         patch('backend.main.open_pdf', side_effect=_mock_open_pdf), \
          patch('backend.main.generate_pdf_task', mock_task), \
          patch('backend.main.get_api_key_from_request', return_value=TEST_API_KEY), \
-         patch('backend.main.validate_api_key', side_effect=_mock_validate_api_key_success), \
-         patch('backend.main.check_user_quota', side_effect=_mock_check_user_quota_exceeded), \
-         patch('backend.main.track_conversion', side_effect=_mock_track_conversion), \
+         patch('backend.main.validate_api_key_async', side_effect=_mock_validate_api_key_success), \
+         patch('backend.main.reserve_quota_async', side_effect=_mock_reserve_quota_exceeded), \
+         patch('backend.main.record_conversion_async', side_effect=_mock_track_conversion), \
          patch('backend.main.get_rate_limiter', return_value=mock_rate_limiter):
 
         from backend.main import app
@@ -241,9 +282,12 @@ def client_rate_limited():
     Auth is valid, but rate limit check fails.
     """
     from backend.pdf_service import generate_pdf_from_html
+    from backend.payload_store import load_payload
 
-    def sync_task_delay(job_id, html, options, user_id=None):
+    def sync_task_delay(job_id, payload_ref, user_id=None, render_key=None):
         try:
+            payload = load_payload(payload_ref)
+            html, options = payload["html"], payload["options"]
             _mock_set_job_status(job_id, {"status": "processing"})
             pdf_bytes = generate_pdf_from_html(html=html, **options)
             _mock_store_pdf(job_id, pdf_bytes)
@@ -255,14 +299,14 @@ def client_rate_limited():
     mock_task.delay = MagicMock(side_effect=lambda **kwargs: sync_task_delay(**kwargs))
     mock_rate_limiter = _create_mock_rate_limiter(_mock_rate_limit_exceeded)
 
-    with patch('backend.main.set_job_status', side_effect=_mock_set_job_status), \
-         patch('backend.main.get_job_status', side_effect=_mock_get_job_status), \
-         patch('backend.main.get_pdf', side_effect=_mock_get_pdf), \
+    with patch('backend.main.set_job_status_async', side_effect=_mock_set_job_status), \
+         patch('backend.main.get_job_status_async', side_effect=_mock_get_job_status), \
+         patch('backend.main.open_pdf', side_effect=_mock_open_pdf), \
          patch('backend.main.generate_pdf_task', mock_task), \
          patch('backend.main.get_api_key_from_request', return_value=TEST_API_KEY), \
-         patch('backend.main.validate_api_key', side_effect=_mock_validate_api_key_success), \
-         patch('backend.main.check_user_quota', side_effect=_mock_check_user_quota_ok), \
-         patch('backend.main.track_conversion', side_effect=_mock_track_conversion), \
+         patch('backend.main.validate_api_key_async', side_effect=_mock_validate_api_key_success), \
+         patch('backend.main.reserve_quota_async', side_effect=_mock_reserve_quota_ok), \
+         patch('backend.main.record_conversion_async', side_effect=_mock_track_conversion), \
          patch('backend.main.get_rate_limiter', return_value=mock_rate_limiter):
 
         from backend.main import app
@@ -276,9 +320,12 @@ def client_invalid_api_key():
     API key is provided but validation fails.
     """
     from backend.pdf_service import generate_pdf_from_html
+    from backend.payload_store import load_payload
 
-    def sync_task_delay(job_id, html, options, user_id=None):
+    def sync_task_delay(job_id, payload_ref, user_id=None, render_key=None):
         try:
+            payload = load_payload(payload_ref)
+            html, options = payload["html"], payload["options"]
             _mock_set_job_status(job_id, {"status": "processing"})
             pdf_bytes = generate_pdf_from_html(html=html, **options)
             _mock_store_pdf(job_id, pdf_bytes)
@@ -290,14 +337,14 @@ def client_invalid_api_key():
     mock_task.delay = MagicMock(side_effect=lambda **kwargs: sync_task_delay(**kwargs))
     mock_rate_limiter = _create_mock_rate_limiter(_mock_rate_limit_ok)
 
-    with patch('backend.main.set_job_status', side_effect=_mock_set_job_status), \
-         patch('backend.main.get_job_status', side_effect=_mock_get_job_status), \
-         patch('backend.main.get_pdf', side_effect=_mock_get_pdf), \
+    with patch('backend.main.set_job_status_async', side_effect=_mock_set_job_status), \
+         patch('backend.main.get_job_status_async', side_effect=_mock_get_job_status), \
+         patch('backend.main.open_pdf', side_effect=_mock_open_pdf), \
          patch('backend.main.generate_pdf_task', mock_task), \
          patch('backend.main.get_api_key_from_request', return_value="pk_invalid_key"), \
-         patch('backend.main.validate_api_key', side_effect=_mock_validate_api_key_invalid), \
-         patch('backend.main.check_user_quota', side_effect=_mock_check_user_quota_ok), \
-         patch('backend.main.track_conversion', side_effect=_mock_track_conversion), \
+         patch('backend.main.validate_api_key_async', side_effect=_mock_validate_api_key_invalid), \
+         patch('backend.main.reserve_quota_async', side_effect=_mock_reserve_quota_ok), \
+         patch('backend.main.record_conversion_async', side_effect=_mock_track_conversion), \
          patch('backend.main.get_rate_limiter', return_value=mock_rate_limiter):
 
         from backend.main import app
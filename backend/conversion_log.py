@@ -0,0 +1,304 @@
+"""
+Write-behind conversion tracking through a Redis Stream.
+
+track_conversion (INSERT from the API) and update_conversion_status (UPDATE
+from the worker) cost two database round trips per job, one of them on the
+request path. Both are now events appended to the conversions:events stream:
+
+- record_conversion_async: job submitted (pending)
+- record_conversions_async: batch of jobs submitted (pending)
+- record_conversion_status: job completed or failed
+
+A writer thread in each API process reads the stream through the
+conversion-writers consumer group and bulk-upserts merged rows by job_id in
+batches of CONVERSION_FLUSH_BATCH events or every CONVERSION_FLUSH_INTERVAL_MS,
+whichever comes first. Events are acknowledged only after the database write
+succeeds; unacknowledged events (failed writes, crashed writers) are claimed
+again after CONVERSION_CLAIM_IDLE_MS, so delivery is at-least-once and the
+upserts are idempotent. If Redis is unavailable, events are written to the
+database directly.
+
+user_id, api_key_id and ip_address are validated before an event is appended.
+When the database rejects a batch anyway (e.g. a user_id with no profile), the
+batch is bisected down to the rows it rejects; their events move to the
+conversions:dead stream so they cannot hold back the events behind them.
+"""
+
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+import redis
+
+from .config import (
+    CONVERSION_FLUSH_BATCH,
+    CONVERSION_FLUSH_INTERVAL_MS,
+    CONVERSION_CLAIM_IDLE_MS,
+    CONVERSION_STREAM_MAXLEN,
+)
+from .redis_client import get_redis, get_async_redis
+from .supabase_client import (
+    track_conversion_async,
+    update_conversion_status,
+    upsert_conversions,
+)
+
+STREAM_KEY = "conversions:events"
+DEAD_LETTER_KEY = "conversions:dead"
+GROUP = "conversion-writers"
+
+# Status only moves forward when events are merged or replayed
+_STATUS_RANK = {"pending": 0, "processing": 1, "completed": 2, "failed": 2}
+
+_writer_started = False
+
+
+def _valid_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def _valid_ip(value) -> bool:
+    try:
+        ipaddress.ip_address(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+# Fields the conversions table types strictly; invalid values are dropped
+# from the event instead of failing the whole batch's upsert
+_VALIDATORS = {"user_id": _valid_uuid, "api_key_id": _valid_uuid, "ip_address": _valid_ip}
+
+
+def _event(job_id: str, status: str, **fields) -> dict:
+    for field, valid in _VALIDATORS.items():
+        if fields.get(field) is not None and not valid(fields[field]):
+            print(f"WARNING: Dropping invalid {field} {fields[field]!r} from conversion {job_id}.")
+            fields[field] = None
+    event = {"job_id": job_id, "status": status, "at": datetime.now(timezone.utc).isoformat()}
+    event.update((field, value) for field, value in fields.items() if value is not None)
+    return event
+
+
+def _xadd_kwargs(event: dict) -> dict:
+    return {
+        "name": STREAM_KEY,
+        "fields": {"event": json.dumps(event)},
+        "maxlen": CONVERSION_STREAM_MAXLEN,
+        "approximate": True,
+    }
+
+
+async def record_conversion_async(
+    job_id: str,
+    user_id: Optional[str] = None,
+    api_key_id: Optional[str] = None,
+    action: str = "download",
+    html_size: Optional[int] = None,
+    status: str = "pending",
+    source: str = "web",
+    ip_address: Optional[str] = None
+) -> None:
+    """Records a submitted conversion (same arguments as track_conversion), without waiting for the database."""
+    event = _event(
+        job_id, status, user_id=user_id, api_key_id=api_key_id, action=action,
+        html_size=html_size, source=source, ip_address=ip_address,
+    )
+    try:
+        await get_async_redis().xadd(**_xadd_kwargs(event))
+    except redis.RedisError as e:
+        print(f"WARNING: Conversion stream unavailable ({e}). Writing conversion to the database.")
+        await track_conversion_async(
+            job_id, user_id, api_key_id, action, html_size, status, source, ip_address
+        )
+
+
+async def record_conversions_async(conversions: list) -> None:
+    """Records many submitted conversions (record_conversion_async arguments, one dict each) in one round trip."""
+    pipe = get_async_redis().pipeline(transaction=False)
+    for conversion in conversions:
+        conversion = dict(conversion)
+        job_id = conversion.pop("job_id")
+        status = conversion.pop("status", "pending")
+        pipe.xadd(**_xadd_kwargs(_event(job_id, status, **conversion)))
+    try:
+        await pipe.execute()
+    except redis.RedisError as e:
+        print(f"WARNING: Conversion stream unavailable ({e}). Writing conversions to the database.")
+        for conversion in conversions:
+            await track_conversion_async(**conversion)
+
+
+def record_conversion_status(
+    job_id: str,
+    status: str,
+    page_count: Optional[int] = None,
+    file_size_bytes: Optional[int] = None,
+    processing_time_ms: Optional[int] = None
+) -> None:
+    """Records a conversion's new status (same arguments as update_conversion_status)."""
+    event = _event(
+        job_id, status, page_count=page_count, file_size_bytes=file_size_bytes,
+        processing_time_ms=processing_time_ms,
+    )
+    try:
+        get_redis().xadd(**_xadd_kwargs(event))
+    except redis.RedisError as e:
+        print(f"WARNING: Conversion stream unavailable ({e}). Writing conversion status to the database.")
+        update_conversion_status(job_id, status, page_count, file_size_bytes, processing_time_ms)
+
+
+def merge_events(events: list) -> list:
+    """
+    Folds a batch of events into one row per job_id.
+
+    Args:
+        events: Decoded events in stream order
+
+    Returns:
+        Rows for upsert_conversions; created_at is the job's earliest event
+    """
+    rows = {}
+    for event in events:
+        event = dict(event)
+        job_id = event.pop("job_id")
+        at = event.pop("at")
+        row = rows.setdefault(job_id, {"job_id": job_id, "created_at": at})
+        row["created_at"] = min(row["created_at"], at)
+        status = event.pop("status", None)
+        if status and _STATUS_RANK.get(status, 0) >= _STATUS_RANK.get(row.get("status"), -1):
+            row["status"] = status
+        row.update(event)
+    return list(rows.values())
+
+
+def _ensure_group(client) -> None:
+    try:
+        client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _read_batch(client, consumer: str) -> list:
+    """Collects up to CONVERSION_FLUSH_BATCH entries within CONVERSION_FLUSH_INTERVAL_MS."""
+    # Entries another writer read but never acknowledged come first
+    _, entries, *_ = client.xautoclaim(
+        STREAM_KEY, GROUP, consumer, min_idle_time=CONVERSION_CLAIM_IDLE_MS, count=CONVERSION_FLUSH_BATCH
+    )
+    entries = [entry for entry in entries if entry[1]]
+
+    deadline = time.monotonic() + CONVERSION_FLUSH_INTERVAL_MS / 1000
+    while len(entries) < CONVERSION_FLUSH_BATCH:
+        block_ms = int((deadline - time.monotonic()) * 1000)
+        if block_ms <= 0:
+            break
+        response = client.xreadgroup(
+            GROUP, consumer, {STREAM_KEY: ">"}, count=CONVERSION_FLUSH_BATCH - len(entries), block=block_ms
+        )
+        if not response:
+            break
+        entries.extend(response[0][1])
+    return entries
+
+
+def _rejected_rows(rows: list) -> list:
+    """
+    Bisects a batch the database rejected down to the rows it rejects.
+
+    Args:
+        rows: Rows whose upsert failed
+
+    Returns:
+        Rows that fail on their own; all the others are written
+    """
+    if len(rows) == 1:
+        return rows
+    middle = len(rows) // 2
+    rejected = []
+    for half in (rows[:middle], rows[middle:]):
+        if not upsert_conversions(half):
+            rejected.extend(_rejected_rows(half))
+    return rejected
+
+
+def flush_conversion_events(consumer: str) -> Optional[int]:
+    """
+    Writes one batch of stream events to the conversions table.
+
+    Args:
+        consumer: Name of this writer in the consumer group
+
+    Returns:
+        Number of events written, or None if the database is unavailable
+        (the events stay pending and are retried)
+    """
+    client = get_redis()
+    entries = _read_batch(client, consumer)
+    if not entries:
+        return 0
+
+    events = {}
+    for entry_id, fields in entries:
+        try:
+            events[entry_id] = json.loads(fields[b"event"])
+        except (KeyError, ValueError):
+            print(f"WARNING: Dropping malformed conversion event {fields!r}.")
+
+    rows = merge_events(list(events.values()))
+    rejected = set()
+    if rows and not upsert_conversions(rows):
+        # An empty upsert tells an unavailable database from rejected rows
+        if not upsert_conversions([]):
+            return None
+        rejected = {row["job_id"] for row in _rejected_rows(rows)}
+
+    ids = [entry_id for entry_id, _ in entries]
+    dead = [entry_id for entry_id, event in events.items() if event["job_id"] in rejected]
+    pipe = client.pipeline()
+    for entry_id in dead:
+        pipe.xadd(
+            DEAD_LETTER_KEY, {"event": json.dumps(events[entry_id])},
+            maxlen=CONVERSION_STREAM_MAXLEN, approximate=True,
+        )
+    pipe.xack(STREAM_KEY, GROUP, *ids)
+    pipe.xdel(STREAM_KEY, *ids)
+    pipe.execute()
+    if dead:
+        print(f"WARNING: Moved {len(dead)} rejected conversion events to {DEAD_LETTER_KEY}.")
+    return len(events) - len(dead)
+
+
+def _writer_loop(consumer: str) -> None:
+    group_ready = False
+    while True:
+        try:
+            if not group_ready:
+                _ensure_group(get_redis())
+                group_ready = True
+            if flush_conversion_events(consumer) is None:
+                time.sleep(CONVERSION_FLUSH_INTERVAL_MS / 1000)
+        except redis.RedisError as e:
+            group_ready = False
+            print(f"WARNING: Could not flush conversion events ({e}).")
+            time.sleep(CONVERSION_FLUSH_INTERVAL_MS / 1000)
+
+
+def start_conversion_writer() -> None:
+    """Starts the conversion stream writer (once per process)."""
+    global _writer_started
+    if _writer_started:
+        return
+    _writer_started = True
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    threading.Thread(target=_writer_loop, args=(consumer,), name="conversion-writer", daemon=True).start()
@@ -0,0 +1,102 @@
+"""
+Short-lived signed URLs for downloading PDFs directly from the storage tier.
+
+Job status responses and job.completed webhooks carry a download_url so that
+clients fetch the bytes without going through the API workers:
+
+- Filesystem cold tier: {DOWNLOAD_URL_BASE}/files/pdf/{job_id}.pdf?expires=...&disposition=...&sig=...
+  nginx serves the file straight from PDF_STORAGE_DIR after checking the
+  signature with a bodiless auth_request to /api/v1/files/verify
+  (see frontend/nginx.conf)
+- S3 cold tier: a presigned URL from the object store
+- Redis only: /api/v1/files/... on the API, which streams the blob itself
+
+Signatures are HMAC-SHA256 over the object path, expiry and disposition,
+keyed with DOWNLOAD_URL_SECRET. Without a secret, no URLs are issued.
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+from .config import (
+    DOWNLOAD_URL_SECRET,
+    DOWNLOAD_URL_TTL_SECONDS,
+    DOWNLOAD_URL_BASE,
+    DOWNLOAD_FILES_PREFIX,
+)
+from .pdf_storage import FilesystemColdStore, S3ColdStore, get_cold_store, object_name
+
+# API route that verifies signatures and streams blobs without a file tier
+API_FILES_PREFIX = "/api/v1/files"
+
+DISPOSITIONS = ("attachment", "inline")
+
+
+def content_disposition(disposition: str) -> str:
+    """Content-Disposition header sent with a signed download."""
+    return f'{disposition}; filename="pdfLeaf.pdf"'
+
+
+def sign(object_path: str, expires: int, disposition: str) -> str:
+    """
+    Computes the signature of a download URL.
+
+    Args:
+        object_path: Storage path of the PDF ("pdf/{job_id}.pdf")
+        expires: Unix timestamp after which the URL is rejected
+        disposition: "attachment" or "inline"
+
+    Returns:
+        Hex HMAC-SHA256 digest
+    """
+    message = f"{object_path}\n{expires}\n{disposition}".encode("utf-8")
+    return hmac.new(DOWNLOAD_URL_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def verify(object_path: str, expires: str, disposition: str, signature: str) -> bool:
+    """Checks a download URL's signature and expiry (constant-time comparison)."""
+    if not DOWNLOAD_URL_SECRET or disposition not in DISPOSITIONS:
+        return False
+    try:
+        expires_at = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires_at < time.time():
+        return False
+    return hmac.compare_digest(sign(object_path, expires_at, disposition), signature or "")
+
+
+def build_download_url(job_id: str, storage: Optional[dict], disposition: str = "attachment") -> Optional[str]:
+    """
+    Issues a signed download URL for a completed job.
+
+    Args:
+        job_id: The job
+        storage: Storage metadata from the job record (blob name, tier, ...)
+        disposition: "attachment" or "inline"
+
+    Returns:
+        URL valid for DOWNLOAD_URL_TTL_SECONDS, or None when signed URLs are
+        not configured
+    """
+    if not DOWNLOAD_URL_SECRET:
+        return None
+
+    name = (storage or {}).get("name") or f"pdf:{job_id}"
+    cold_store = get_cold_store()
+
+    if isinstance(cold_store, S3ColdStore):
+        return cold_store.presigned_url(name, DOWNLOAD_URL_TTL_SECONDS, content_disposition(disposition))
+
+    prefix = DOWNLOAD_FILES_PREFIX if isinstance(cold_store, FilesystemColdStore) else API_FILES_PREFIX
+    object_path = object_name(name)
+    expires = int(time.time()) + DOWNLOAD_URL_TTL_SECONDS
+    query = urlencode({
+        "expires": expires,
+        "disposition": disposition,
+        "sig": sign(object_path, expires, disposition),
+    })
+    return f"{DOWNLOAD_URL_BASE}{prefix}/{object_path}?{query}"
@@ -0,0 +1,181 @@
+"""
+Inline rendering of small documents inside the API service (mode="sync").
+
+A one-page invoice renders in well under a second, but through Celery it also
+pays the queue hop and the client's polling interval. With mode="sync", a
+document under the INLINE_RENDER_MAX_* thresholds is rendered in a pool of
+INLINE_RENDER_WORKERS processes owned by the API process, started at API
+startup with WeasyPrint and fonts already loaded, and the PDF is returned in
+the response.
+
+Documents over the thresholds, or arriving while INLINE_RENDER_MAX_QUEUE
+renders are already waiting, go through generate_pdf_task as usual. A render
+that takes longer than INLINE_RENDER_TIMEOUT_MS keeps running; the response
+is a pending job and the job is completed in the background, exactly as if a
+worker had rendered it.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import (
+    INLINE_RENDER_WORKERS,
+    INLINE_RENDER_MAX_QUEUE,
+    INLINE_RENDER_MAX_BYTES,
+    INLINE_RENDER_MAX_ELEMENTS,
+    INLINE_RENDER_MAX_RESOURCES,
+)
+from .resource_prefetch import collect_resource_urls
+from .tasks import finish_rendered_job, fail_rendered_job
+
+_WARMUP_HTML = "<html><body><p>pdfLeaf</p></body></html>"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_in_flight = 0
+
+# Background completions of inline renders (kept referenced until done)
+_completions: set = set()
+
+
+def _warm_process() -> None:
+    """Pool initializer: loads WeasyPrint and the fonts before the first request."""
+    try:
+        from .pdf_service import generate_pdf_from_html
+        generate_pdf_from_html(_WARMUP_HTML)
+    except Exception as e:
+        print(f"WARNING: Inline render process warm-up failed ({e}).")
+
+
+def _render(html: str, options: dict) -> bytes:
+    from .pdf_service import generate_pdf_from_html
+    return generate_pdf_from_html(html=html, **options)
+
+
+def _noop() -> None:
+    pass
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Get or create the inline render pool (None when INLINE_RENDER_WORKERS is 0)."""
+    global _pool
+    if INLINE_RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Fresh interpreters: the API process runs threads that must not be forked
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=INLINE_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_warm_process,
+            )
+        return _pool
+
+
+def warm_render_pool() -> None:
+    """Starts every render process now instead of on the first sync requests."""
+    pool = get_render_pool()
+    if pool is not None:
+        for _ in range(INLINE_RENDER_WORKERS):
+            pool.submit(_noop)
+
+
+def shutdown_render_pool() -> None:
+    """Stops the render processes (renders still running are abandoned)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def is_inline_eligible(html: str, options: dict) -> bool:
+    """
+    Checks a sanitized document against the inline rendering thresholds.
+
+    Args:
+        html: Sanitized HTML content
+        options: PDF generation options (header_html/footer_html count too)
+
+    Returns:
+        True if the document is small enough to render inside the API
+    """
+    parts = [html, options.get("header_html") or "", options.get("footer_html") or ""]
+    if sum(len(part.encode("utf-8")) for part in parts) > INLINE_RENDER_MAX_BYTES:
+        return False
+    if sum(part.count("<") for part in parts) > INLINE_RENDER_MAX_ELEMENTS:
+        return False
+    return len(collect_resource_urls(html)) <= INLINE_RENDER_MAX_RESOURCES
+
+
+def _release_slot(_future: Future) -> None:
+    global _in_flight
+    with _pool_lock:
+        _in_flight -= 1
+
+
+def submit_inline_render(html: str, options: dict) -> Optional[Future]:
+    """
+    Queues a render in the pool if the document is eligible and the pool has room.
+
+    Args:
+        html: Sanitized HTML content
+        options: PDF generation options
+
+    Returns:
+        Future of the PDF bytes, or None to use generate_pdf_task instead
+    """
+    global _in_flight
+    if not is_inline_eligible(html, options):
+        return None
+    pool = get_render_pool()
+    if pool is None:
+        return None
+    with _pool_lock:
+        if _in_flight >= INLINE_RENDER_WORKERS + INLINE_RENDER_MAX_QUEUE:
+            return None
+        _in_flight += 1
+    try:
+        future = pool.submit(_render, html, options)
+    except RuntimeError:  # pool shut down or broken
+        _release_slot(None)
+        return None
+    future.add_done_callback(_release_slot)
+    return future
+
+
+async def _complete(render: asyncio.Future, job_id: str, user_id: Optional[str], render_key: Optional[str], start_time: float) -> None:
+    try:
+        pdf_bytes = await render
+    except Exception as e:
+        await run_in_threadpool(fail_rendered_job, job_id, str(e), user_id, render_key)
+        return
+    await run_in_threadpool(finish_rendered_job, job_id, pdf_bytes, start_time, user_id, render_key)
+
+
+def start_inline_job(future: Future, job_id: str, user_id: Optional[str] = None, render_key: Optional[str] = None) -> asyncio.Future:
+    """
+    Completes a job from an inline render in the background (storage,
+    status, webhooks), whether or not the request waits for it.
+
+    Args:
+        future: Future returned by submit_inline_render
+        job_id: Unique identifier for the job
+        user_id: Optional user ID for webhook notifications
+        render_key: Optional render cache key
+
+    Returns:
+        Awaitable of the PDF bytes for the response
+    """
+    render = asyncio.wrap_future(future)
+    completion = asyncio.ensure_future(_complete(render, job_id, user_id, render_key, time.time()))
+    _completions.add(completion)
+    completion.add_done_callback(_completions.discard)
+    return render
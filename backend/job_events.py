@@ -0,0 +1,199 @@
+"""
+Job status push: pub/sub behind SSE and long-poll on job status.
+
+set_job_status publishes every transition on job-events:{job_id}. Each API
+process keeps one pub/sub connection, subscribed to the channels of the jobs
+its clients are currently waiting on, and fans messages out to in-process
+queues. If pub/sub is unavailable, waiters fall back to polling Redis.
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import redis
+
+from .redis_client import get_async_redis, get_job_status_async, job_events_channel
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Poll interval once pub/sub is unavailable
+_POLL_INTERVAL = 0.5
+
+_CHANNEL_PREFIX = job_events_channel("")
+
+
+class _Hub:
+    """One pub/sub connection per event loop, shared by every waiting request (open only while someone waits)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.pubsub = None
+        self.reader: Optional[asyncio.Task] = None
+        self.queues: dict = {}
+
+    async def add(self, job_id: str, queue: asyncio.Queue) -> None:
+        waiters = self.queues.setdefault(job_id, set())
+        waiters.add(queue)
+        if len(waiters) > 1:
+            return
+        try:
+            if self.pubsub is None:
+                self.pubsub = get_async_redis().pubsub()
+            await self.pubsub.subscribe(job_events_channel(job_id))
+        except redis.RedisError:
+            del self.queues[job_id]
+            raise
+        if self.reader is None:
+            self.reader = asyncio.ensure_future(self._read())
+
+    async def remove(self, job_id: str, queue: asyncio.Queue) -> None:
+        waiters = self.queues.get(job_id)
+        if waiters is None:
+            return
+        waiters.discard(queue)
+        if waiters:
+            return
+        del self.queues[job_id]
+        if self.pubsub is None:
+            return
+        try:
+            if self.queues:
+                await self.pubsub.unsubscribe(job_events_channel(job_id))
+            else:
+                await self.close()  # Nobody waiting: release the connection
+        except redis.RedisError:
+            pass
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                status = json.loads(message["data"])
+                for queue in self.queues.get(channel[len(_CHANNEL_PREFIX):], ()):
+                    queue.put_nowait(status)
+        except (redis.RedisError, OSError) as e:
+            print(f"WARNING: Job events subscription lost ({e}). Waiting requests fall back to polling.")
+            self._fail_waiters()
+
+    def _fail_waiters(self) -> None:
+        for waiters in self.queues.values():
+            for queue in waiters:
+                queue.put_nowait(None)
+        self.queues.clear()
+        self.pubsub = None
+        self.reader = None
+
+    async def close(self) -> None:
+        if self.reader is not None:
+            self.reader.cancel()
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+        self.pubsub = None
+        self.reader = None
+
+
+_hub: Optional[_Hub] = None
+
+
+def _get_hub() -> _Hub:
+    global _hub
+    loop = asyncio.get_running_loop()
+    if _hub is None or _hub.loop is not loop:
+        _hub = _Hub(loop)
+    return _hub
+
+
+async def close_job_events() -> None:
+    """Closes this process's pub/sub connection."""
+    global _hub
+    if _hub is not None:
+        await _hub.close()
+        _hub = None
+
+
+@asynccontextmanager
+async def subscribe(job_id: str) -> AsyncIterator[asyncio.Queue]:
+    """
+    Subscribes to a job's status transitions.
+
+    Yields:
+        Queue receiving each new status dict, or None once pub/sub is
+        unavailable (the caller should poll from then on)
+    """
+    hub = _get_hub()
+    queue: asyncio.Queue = asyncio.Queue()
+    try:
+        await hub.add(job_id, queue)
+    except redis.RedisError as e:
+        print(f"WARNING: Job events unavailable ({e}). Polling job {job_id}.")
+        queue.put_nowait(None)
+    try:
+        yield queue
+    finally:
+        await hub.remove(job_id, queue)
+
+
+async def watch_job(job_id: str, timeout: float, tick: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+    """
+    Follows a job's status.
+
+    Subscribes before reading the current status, so no transition is missed.
+
+    Args:
+        job_id: The job
+        timeout: Seconds to follow the job for
+        tick: If set, None is yielded after this many seconds without a change
+
+    Yields:
+        The current status, then each status that differs from the last one
+        yielded, until the job reaches a terminal status or the timeout
+        expires. Nothing if the job does not exist.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    async with subscribe(job_id) as queue:
+        status = await get_job_status_async(job_id)
+        if status is None:
+            return
+        yield status
+        last_yield = loop.time()
+
+        polling = False
+        while status.get("status") not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            wait = min(remaining, tick) if tick else remaining
+
+            if polling:
+                await asyncio.sleep(min(wait, _POLL_INTERVAL))
+                event = await get_job_status_async(job_id)
+                if tick and loop.time() - last_yield >= tick and (event or status).get("status") == status.get("status"):
+                    last_yield = loop.time()
+                    yield None
+            else:
+                try:
+                    event = await asyncio.wait_for(queue.get(), wait)
+                except asyncio.TimeoutError:
+                    if tick:
+                        last_yield = loop.time()
+                        yield None
+                    continue
+                if event is None:
+                    polling = True
+                    event = await get_job_status_async(job_id)
+
+            if event is None:
+                continue
+            if event.get("status") != status.get("status"):
+                status = event
+                last_yield = loop.time()
+                yield status
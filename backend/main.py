@@ -1,21 +1,70 @@
-from fastapi import FastAPI, HTTPException, Response, Request
+from fastapi import FastAPI, HTTPException, Response, Request, Query
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, field_validator
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+import asyncio
 import bleach
+import json
 import uuid
 from datetime import datetime
-from typing import Optional
+from urllib.parse import urlsplit, parse_qsl
+from typing import Optional, Tuple
 from .pdf_service import generate_pdf_from_html
-from .redis_client import set_job_status, get_job_status, get_pdf
-from .tasks import generate_pdf_task
+from .redis_client import (
+    set_job_status_async,
+    get_job_status_async,
+    get_job_statuses_async,
+    set_job_statuses_async,
+    list_user_jobs_async,
+    JOB_STATUSES,
+    open_pdf,
+    store_pdf_ref,
+    close_async_redis,
+)
+from .tasks import generate_pdf_task, watch_render_follower, complete_job, enqueue_pdf_tasks, part_info
+from .render_cache import compute_render_key, claim_render, start_render, render_blob_key
+from .payload_store import store_payload, store_payloads
+from .pdf_storage import retention_seconds, open_blob, blob_name, iter_zip
+from .download_urls import build_download_url, content_disposition, verify as verify_download
+from .config import (
+    RENDER_CACHE_ENABLED,
+    RENDER_WATCHDOG_SECONDS,
+    DOWNLOAD_FILES_PREFIX,
+    RATE_LIMIT_STORAGE_URI,
+    RATE_LIMIT_STRATEGY,
+    INLINE_RENDER_TIMEOUT_MS,
+    JOB_WAIT_MAX_SECONDS,
+    JOB_EVENTS_MAX_SECONDS,
+    JOB_EVENTS_KEEPALIVE_SECONDS,
+    JOB_STATUS_BATCH_MAX,
+    JOB_LIST_PAGE_MAX,
+    BATCH_MAX_DOCUMENTS,
+    BATCH_MAX_BYTES,
+    TEMPLATE_DATA_MAX_BYTES,
+)
 from .supabase_client import (
-    track_conversion,
     hash_api_key,
-    validate_api_key,
-    check_user_quota
+    close_async_http
+)
+from .conversion_log import record_conversion_async, record_conversions_async, start_conversion_writer
+from .inline_render import submit_inline_render, start_inline_job, warm_render_pool, shutdown_render_pool
+from .job_events import TERMINAL_STATUSES, watch_job, close_job_events
+from .auth_cache import validate_api_key_async, invalidate_api_key, start_background_tasks
+from .quota_ledger import reserve_quota_async, reserve_quota_batch_async, release_quota, release_quotas, start_reconciler
+from .batches import create_batch_async, get_batch_async
+from .templates import (
+    TemplateError,
+    create_template,
+    get_template,
+    list_templates,
+    delete_template,
+    template_payload,
+    template_render_source,
 )
 from .redis_client import get_redis
 from .rate_limiter import APIKeyRateLimiter, get_rate_limit_headers
@@ -63,8 +112,16 @@ ALLOWED_ATTRIBUTES = {
     'blockquote': ['cite']
 }
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Rate limiter por IP: contadores no Redis compartilhados entre workers e réplicas
+# (uma chamada Lua por verificação); se o Redis cair, usa memória local até ele voltar
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+    key_prefix="slowapi",
+    in_memory_fallback_enabled=True,
+    swallow_errors=True,
+)
 
 
 def get_api_key_from_request(request: Request) -> Optional[str]:
@@ -92,6 +149,17 @@ def sanitize_html(html: str) -> str:
     )
 
 
+def sanitize_template_html(html: str) -> str:
+    """Sanitiza o HTML de um template, mantendo comentários (marcadores das tags Jinja)."""
+    return bleach.clean(
+        html,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        strip=True,
+        strip_comments=False
+    )
+
+
 def validate_html(html: str) -> tuple[bool, str]:
     """Valida o conteúdo HTML básico."""
     if not html:
@@ -167,8 +235,11 @@ A resposta da API inclui informações de quota:
 | **Margens** | Customizáveis em cm, mm ou polegadas |
 | **Numeração** | Números de página automáticos no rodapé |
 | **Header/Footer** | HTML personalizado para cabeçalho e rodapé |
-| **TailwindCSS** | Suporte nativo (injetado automaticamente) |
+| **TailwindCSS** | Suporte nativo (compilado no servidor, sem CDN) |
 | **Webhooks** | Notificações assíncronas para conclusão de jobs |
+| **Templates** | Layout registrado uma vez, PDFs gerados a partir de dados JSON |
+| **Split por registro** | `split_on`: um documento renderizado uma vez, um PDF por registro (ou um ZIP) |
+| **Renderização em partes** | `chunked`: documentos muito grandes renderizados em paralelo por vários workers |
 
 ### 🔔 Webhooks
 
@@ -182,6 +253,7 @@ Configure webhooks para receber notificações quando jobs são concluídos:
 **Eventos disponíveis:**
 - `job.completed` - Job concluído com sucesso
 - `job.failed` - Job falhou
+- `batch.completed` - Todos os jobs de um lote terminaram (`data` traz `total`, `completed` e `failed`)
 
 **Payload do webhook:**
 ```json
@@ -414,6 +486,24 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def start_background_workers():
+    """Assina revogações de API keys, inicia o envio em lote de last_used_at, a reconciliação de cotas e a gravação das conversões."""
+    start_background_tasks()
+    start_reconciler()
+    start_conversion_writer()
+    warm_render_pool()
+
+
+@app.on_event("shutdown")
+async def close_async_clients():
+    """Fecha os pools de conexão assíncronos (Redis, pub/sub de jobs e PostgREST) e os processos de renderização inline."""
+    await close_job_events()
+    await close_async_redis()
+    await close_async_http()
+    shutdown_render_pool()
+
+
 # Security Headers Middleware
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
@@ -464,9 +554,9 @@ class PDFRequest(BaseModel):
     Apenas o campo `html_content` é obrigatório.
     """
 
-    html_content: str = Field(
-        ...,
-        description="Conteúdo HTML a ser convertido em PDF. Pode ser um documento HTML completo ou apenas um fragmento. O TailwindCSS é injetado automaticamente. Máximo: 2MB.",
+    html_content: str | None = Field(
+        default=None,
+        description="Conteúdo HTML a ser convertido em PDF. Pode ser um documento HTML completo ou apenas um fragmento. As classes TailwindCSS usadas são compiladas automaticamente. Máximo: 2MB. Obrigatório, exceto quando `template_id` é informado.",
         min_length=10,
         json_schema_extra={
             "example": """<!DOCTYPE html>
@@ -503,6 +593,14 @@ class PDFRequest(BaseModel):
             "enum": ["preview", "download"]
         }
     )
+    mode: str = Field(
+        default="async",
+        description="'async' enfileira o job e retorna o job_id para polling. 'sync' renderiza documentos pequenos no próprio serviço e retorna o PDF na resposta; documentos grandes, fila cheia ou renderização acima do orçamento de tempo retornam um job pendente, como no modo 'async'.",
+        json_schema_extra={
+            "example": "sync",
+            "enum": ["async", "sync"]
+        }
+    )
     page_size: str = Field(
         default="A4",
         description="Tamanho da página. Valores aceitos: A3, A4, A5, Letter, Legal, B4, B5, ou dimensões customizadas (ex: '210mm 297mm').",
@@ -596,6 +694,42 @@ class PDFRequest(BaseModel):
             "example": "1"
         }
     )
+    header_footer_mode: str = Field(
+        default="running",
+        description="Como o cabeçalho/rodapé é aplicado. 'running' diagrama o cabeçalho/rodapé em cada página; 'overlay' renderiza uma única vez e carimba em todas as páginas (recomendado para documentos longos).",
+        json_schema_extra={
+            "example": "running",
+            "enum": ["running", "overlay"]
+        }
+    )
+    split_on: str | None = Field(
+        default=None,
+        description="Classe CSS que marca o início de cada registro (ex: extratos em lote). O documento é renderizado uma vez e dividido em um PDF por registro, baixados individualmente (`?part=N`) ou juntos em um ZIP. Cada registro deve começar em uma nova página; o `id` do elemento marcador identifica o registro.",
+        json_schema_extra={
+            "example": "statement"
+        }
+    )
+    chunked: bool = Field(
+        default=False,
+        description="Renderização em partes paralelas, para documentos muito grandes (ex: relatórios com milhares de linhas). O documento é dividido nos elementos `.page-break`/`.page-break-before` de primeiro nível, as partes são renderizadas em paralelo por vários workers e concatenadas; cabeçalho, rodapé e numeração de páginas são aplicados ao documento inteiro. Documentos sem quebras de página de primeiro nível, ou servidores sem armazenamento em disco para as partes (PAYLOAD_STORE=disk ou PDF_STORAGE_BACKEND), são renderizados normalmente.",
+        json_schema_extra={
+            "example": False
+        }
+    )
+    template_id: str | None = Field(
+        default=None,
+        description="ID de um template registrado em /api/v1/templates. O PDF é gerado a partir do template e de `data`, sem enviar o HTML.",
+        json_schema_extra={
+            "example": "8d0f5a8e-2b7c-4b8e-9a57-3f1f6f4d2c10"
+        }
+    )
+    data: dict | None = Field(
+        default=None,
+        description="Dados JSON para preencher o template (variáveis Jinja, ex: {{ cliente.nome }}). Valores são escapados automaticamente.",
+        json_schema_extra={
+            "example": {"cliente": {"nome": "Maria"}, "itens": [{"descricao": "Produto A", "valor": "100,00"}]}
+        }
+    )
     user_id: str | None = Field(
         default=None,
         description="ID do usuário autenticado (para conversões via frontend). Alternativa ao uso de API key no header.",
@@ -628,12 +762,53 @@ class PDFRequest(BaseModel):
 
     @field_validator('html_content')
     @classmethod
-    def validate_html_size(cls, v: str) -> str:
+    def validate_html_size(cls, v: str | None) -> str | None:
         """Valida o tamanho do HTML (máximo 2MB)."""
-        if len(v.encode('utf-8')) > MAX_HTML_SIZE:
+        if v is not None and len(v.encode('utf-8')) > MAX_HTML_SIZE:
             raise ValueError(f'HTML excede o limite de 2MB')
         return v
 
+    @field_validator('data')
+    @classmethod
+    def validate_data_size(cls, v: dict | None) -> dict | None:
+        """Valida o tamanho dos dados do template."""
+        if v is not None and len(json.dumps(v).encode('utf-8')) > TEMPLATE_DATA_MAX_BYTES:
+            raise ValueError(f'Dados do template excedem o limite de {TEMPLATE_DATA_MAX_BYTES // 1024}KB')
+        return v
+
+    @model_validator(mode='after')
+    def validate_source(self):
+        """Exige html_content ou template_id (não ambos)."""
+        if (self.html_content is None) == (self.template_id is None):
+            raise ValueError("Informe html_content ou template_id (apenas um deles)")
+        if self.data is not None and self.template_id is None:
+            raise ValueError("data só pode ser usado com template_id")
+        if self.split_on and self.include_page_numbers:
+            raise ValueError("include_page_numbers não é suportado com split_on (a numeração seria do documento inteiro)")
+        if self.chunked and (self.split_on or self.template_id):
+            raise ValueError("chunked não pode ser usado com split_on ou template_id")
+        return self
+
+    @field_validator('split_on')
+    @classmethod
+    def validate_split_on(cls, v: str | None) -> str | None:
+        """Valida o nome da classe marcadora de registros."""
+        import re
+        if v is None:
+            return None
+        v = v.strip().lstrip('.')
+        if not re.match(r'^[A-Za-z_][\w-]*$', v):
+            raise ValueError("split_on deve ser um nome de classe CSS. Exemplo: 'statement'")
+        return v
+
+    @field_validator('mode')
+    @classmethod
+    def validate_mode(cls, v: str) -> str:
+        """Valida o modo de conversão."""
+        if v.lower() not in ['async', 'sync']:
+            raise ValueError("Modo deve ser 'async' ou 'sync'")
+        return v.lower()
+
     @field_validator('orientation')
     @classmethod
     def validate_orientation(cls, v: str) -> str:
@@ -664,6 +839,14 @@ class PDFRequest(BaseModel):
             raise ValueError("Altura deve ser um número seguido de cm, mm ou in. Exemplos: '2cm', '20mm', '0.5in'")
         return v
 
+    @field_validator('header_footer_mode')
+    @classmethod
+    def validate_header_footer_mode(cls, v: str) -> str:
+        """Valida o modo de aplicação do cabeçalho/rodapé."""
+        if v.lower() not in ['running', 'overlay']:
+            raise ValueError("Modo de cabeçalho/rodapé deve ser 'running' ou 'overlay'")
+        return v.lower()
+
     @field_validator('exclude_header_pages', 'exclude_footer_pages')
     @classmethod
     def validate_page_exclusion(cls, v: str | None) -> str | None:
@@ -691,9 +874,13 @@ Submete conteúdo HTML para conversão assíncrona em PDF.
 2. GET /api/v1/jobs/{job_id} → Polling para verificar status
 3. GET /api/v1/jobs/{job_id}/download → Baixar o PDF quando pronto
 
+**Modo síncrono (`"mode": "sync"`):**
+- Documentos pequenos são renderizados no próprio serviço e o PDF vem no corpo da resposta (`application/pdf`, job em `X-Job-Id`)
+- Documentos grandes, fila de renderização cheia ou renderização acima do orçamento de tempo retornam o JSON com `status: pending`, como no fluxo acima
+
 **Comportamento:**
 - Se o HTML não contiver tags `<html>` ou `<body>`, será automaticamente encapsulado em um documento HTML válido
-- O TailwindCSS CDN é injetado automaticamente para permitir uso de classes utilitárias
+- As classes utilitárias do TailwindCSS usadas no documento são compiladas no servidor (sem CDN); gradientes, sombras, rings, filtros, transforms, valores arbitrários e modificadores de opacidade não são suportados
 - O PDF é gerado usando WeasyPrint com suporte completo a CSS
 - O HTML é sanitizado para remover scripts e elementos perigosos
 - PDFs ficam disponíveis por 2 horas após geração
@@ -718,9 +905,13 @@ Submete conteúdo HTML para conversão assíncrona em PDF.
 2. GET /api/jobs/{job_id} → Polling para verificar status
 3. GET /api/jobs/{job_id}/download → Baixar o PDF quando pronto
 
+**Modo síncrono (`"mode": "sync"`):**
+- Documentos pequenos são renderizados no próprio serviço e o PDF vem no corpo da resposta (`application/pdf`, job em `X-Job-Id`)
+- Documentos grandes, fila de renderização cheia ou renderização acima do orçamento de tempo retornam o JSON com `status: pending`, como no fluxo acima
+
 **Comportamento:**
 - Se o HTML não contiver tags `<html>` ou `<body>`, será automaticamente encapsulado em um documento HTML válido
-- O TailwindCSS CDN é injetado automaticamente para permitir uso de classes utilitárias
+- As classes utilitárias do TailwindCSS usadas no documento são compiladas no servidor (sem CDN); gradientes, sombras, rings, filtros, transforms, valores arbitrários e modificadores de opacidade não são suportados
 - O PDF é gerado usando WeasyPrint com suporte completo a CSS
 - O HTML é sanitizado para remover scripts e elementos perigosos
 - PDFs ficam disponíveis por 2 horas após geração
@@ -958,15 +1149,15 @@ Submete conteúdo HTML para conversão assíncrona em PDF.
                         },
                         "tailwind": {
                             "summary": "Com TailwindCSS",
-                            "description": "Usando classes TailwindCSS (injetado automaticamente)",
+                            "description": "Usando classes TailwindCSS (compiladas automaticamente). Gradientes, sombras, rings, filtros, transforms, valores arbitrários (`w-[13px]`) e modificadores de opacidade (`bg-black/50`) não são suportados e são ignorados.",
                             "value": {
                                 "html_content": """<div class="p-8 max-w-2xl mx-auto">
-    <div class="bg-gradient-to-r from-blue-500 to-purple-600 text-white p-6 rounded-lg shadow-lg mb-6">
+    <div class="bg-blue-600 text-white p-6 rounded-lg mb-6">
         <h1 class="text-3xl font-bold">PDF Gravity</h1>
         <p class="text-blue-100 mt-2">Converta HTML para PDF com estilo!</p>
     </div>
 
-    <div class="bg-white border border-gray-200 rounded-lg p-6 shadow">
+    <div class="bg-white border border-gray-200 rounded-lg p-6">
         <h2 class="text-xl font-semibold text-gray-800 mb-4">✨ Funcionalidades</h2>
         <ul class="space-y-2">
             <li class="flex items-center text-gray-600">
@@ -1007,7 +1198,7 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
     if api_key:
         # Validação via API key (chamadas de API externa)
         key_hash = hash_api_key(api_key)
-        key_info = validate_api_key(key_hash)
+        key_info = await validate_api_key_async(key_hash)
 
         if not key_info or not key_info.get("is_valid"):
             raise HTTPException(
@@ -1025,7 +1216,7 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
 
         # Check rate limit for API key
         rate_limiter = get_rate_limiter()
-        rate_result = rate_limiter.check_rate_limit(str(api_key_id), plan)
+        rate_result = await run_in_threadpool(rate_limiter.check_rate_limit, str(api_key_id), plan)
 
         if not rate_result["allowed"]:
             raise HTTPException(
@@ -1057,8 +1248,9 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
             }
         )
 
-    # 2. Verificar cota ANTES de processar
-    quota = check_user_quota(user_id)
+    # 2. Reservar uma unidade da cota ANTES de processar (ledger atômico no Redis)
+    job_id = str(uuid.uuid4())
+    quota = await reserve_quota_async(user_id, job_id)
 
     if not quota.get("can_convert", False):
         raise HTTPException(
@@ -1074,65 +1266,113 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
             }
         )
 
-    # 3. Validar HTML
-    is_valid, error_msg = validate_html(pdf_request.html_content)
-    if not is_valid:
-        raise HTTPException(status_code=400, detail=error_msg)
-
-    # 4. Sanitizar HTML
-    clean_html = sanitize_html(pdf_request.html_content)
-
-    # 5. Sanitizar header/footer HTML (se fornecido)
-    clean_header = sanitize_html(pdf_request.header_html) if pdf_request.header_html else None
-    clean_footer = sanitize_html(pdf_request.footer_html) if pdf_request.footer_html else None
-
-    # 6. Criar job
-    job_id = str(uuid.uuid4())
-    set_job_status(job_id, {"status": "pending"})
-
-    # 7. Track conversion com user_id e api_key_id
+    # 3-9. Qualquer falha antes de o job existir devolve a unidade reservada da cota
     try:
-        ip_address = get_remote_address(request)
-        html_size = len(clean_html.encode('utf-8'))
-        track_conversion(
-            job_id=job_id,
-            user_id=user_id,
-            api_key_id=api_key_id,
-            action=pdf_request.action,
-            html_size=html_size,
-            status="pending",
-            source=source,
-            ip_address=ip_address
-        )
+        template = None
+        clean_html = None
+        if pdf_request.template_id:
+            # 3a. Template registrado: já sanitizado no upload, o job leva só os dados
+            template = await run_in_threadpool(get_template, pdf_request.template_id)
+            if template is None or template["user_id"] != user_id:
+                raise HTTPException(status_code=404, detail="Template not found")
+        else:
+            # 3. Validar HTML (regex e bleach são CPU-bound: executados fora do event loop)
+            is_valid, error_msg = await run_in_threadpool(validate_html, pdf_request.html_content)
+            if not is_valid:
+                raise HTTPException(status_code=400, detail=error_msg)
+
+            # 4. Sanitizar HTML
+            clean_html = await run_in_threadpool(sanitize_html, pdf_request.html_content)
+
+        # 5. Sanitizar header/footer HTML (se fornecido)
+        clean_header = await run_in_threadpool(sanitize_html, pdf_request.header_html) if pdf_request.header_html else None
+        clean_footer = await run_in_threadpool(sanitize_html, pdf_request.footer_html) if pdf_request.footer_html else None
+
+        # 6. Criar job
+        await set_job_status_async(job_id, {"status": "pending"}, user_id=user_id)
+
+        # 7. Registrar conversão com user_id e api_key_id (gravada no Supabase em lote)
+        try:
+            ip_address = get_remote_address(request)
+            html_size = len((clean_html if template is None else json.dumps(pdf_request.data or {})).encode('utf-8'))
+            await record_conversion_async(
+                job_id=job_id,
+                user_id=user_id,
+                api_key_id=api_key_id,
+                action=pdf_request.action,
+                html_size=html_size,
+                status="pending",
+                source=source,
+                ip_address=ip_address
+            )
+        except Exception:
+            pass  # Don't fail the request if tracking fails
+
+        options = _render_options(pdf_request, clean_header, clean_footer)
+
+        # 8. Reutilizar PDF idêntico do mesmo usuário já renderizado ou em renderização (cache de render)
+        # Jobs com split_on geram vários PDFs e não passam pelo cache
+        render_key = None
+        render_outcome = "leader"
+        if RENDER_CACHE_ENABLED and not pdf_request.split_on:
+            render_source = clean_html if template is None else template_render_source(template, pdf_request.data)
+            render_key = await run_in_threadpool(compute_render_key, render_source, options, user_id)
+            render_outcome, cached_storage = await run_in_threadpool(claim_render, render_key, job_id, user_id)
+
+        if render_outcome == "hit":
+            # PDF idêntico em cache: job concluído imediatamente, sem nova renderização
+            await run_in_threadpool(store_pdf_ref, job_id, render_blob_key(render_key), retention_seconds())
+            await run_in_threadpool(complete_job, job_id, cached_storage, 0, user_id)
+        elif render_outcome == "leader":
+            inline_future = None
+            if pdf_request.mode == "sync" and template is None and not (pdf_request.split_on or pdf_request.chunked):
+                inline_future = submit_inline_render(clean_html, options)
+
+            if inline_future is not None:
+                # 9a. Documento pequeno: renderizar no pool de processos do próprio serviço.
+                # O job é concluído em segundo plano mesmo se a resposta não esperar pela renderização.
+                if render_key:
+                    # Sem espera na fila: a reserva do render só precisa durar a renderização
+                    await run_in_threadpool(start_render, render_key, job_id)
+                render = start_inline_job(inline_future, job_id, user_id, render_key)
+                try:
+                    pdf_bytes = await asyncio.wait_for(asyncio.shield(render), INLINE_RENDER_TIMEOUT_MS / 1000)
+                except asyncio.TimeoutError:
+                    pdf_bytes = None  # Acima do orçamento: cliente faz polling do job
+                except Exception:
+                    pdf_bytes = None  # Falha registrada no job (status "failed")
+                if pdf_bytes is not None:
+                    return _inline_pdf_response(pdf_bytes, job_id, pdf_request.action, quota, rate_result)
+            else:
+                # 9b. Enviar para fila Celery
+                # Documento gravado uma vez no payload store; a fila leva só a referência
+                payload = {"html": clean_html} if template is None else template_payload(template, pdf_request.data)
+                payload_ref = await run_in_threadpool(store_payload, {**payload, "options": options})
+                await run_in_threadpool(
+                    generate_pdf_task.delay,
+                    job_id=job_id,
+                    payload_ref=payload_ref,
+                    user_id=user_id,  # For webhook notifications
+                    render_key=render_key
+                )
+        else:
+            # "follower": job idêntico já na fila; será concluído pela mesma renderização.
+            # Guarda o próprio documento para assumir a renderização se o líder morrer.
+            payload = {"html": clean_html} if template is None else template_payload(template, pdf_request.data)
+            payload_ref = await run_in_threadpool(store_payload, {**payload, "options": options})
+            await run_in_threadpool(
+                watch_render_follower.apply_async,
+                kwargs={"job_id": job_id, "render_key": render_key, "payload_ref": payload_ref, "user_id": user_id},
+                countdown=RENDER_WATCHDOG_SECONDS
+            )
     except Exception:
-        pass  # Don't fail the request if tracking fails
-
-    # 8. Enviar para fila Celery
-    generate_pdf_task.delay(
-        job_id=job_id,
-        html=clean_html,
-        options={
-            "page_size": pdf_request.page_size,
-            "orientation": pdf_request.orientation,
-            "margin_top": pdf_request.margin_top,
-            "margin_bottom": pdf_request.margin_bottom,
-            "margin_left": pdf_request.margin_left,
-            "margin_right": pdf_request.margin_right,
-            "include_page_numbers": pdf_request.include_page_numbers,
-            "header_html": clean_header,
-            "footer_html": clean_footer,
-            "header_height": pdf_request.header_height,
-            "footer_height": pdf_request.footer_height,
-            "exclude_header_pages": pdf_request.exclude_header_pages,
-            "exclude_footer_pages": pdf_request.exclude_footer_pages,
-        },
-        user_id=user_id  # For webhook notifications
-    )
+        await run_in_threadpool(release_quota, job_id)
+        raise
 
-    # 9. Retornar resposta com info de cota e rate limit
+    # 10. Retornar resposta com info de cota e rate limit
     response_data = {
         "job_id": job_id,
-        "status": "pending",
+        "status": "completed" if render_outcome == "hit" else "pending",
         "quota": {
             "used": quota["used_this_month"] + 1,
             "limit": quota["monthly_limit"],
@@ -1147,15 +1387,382 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
             "remaining": rate_result["remaining"],
             "reset": rate_result["reset"]
         }
+        if "windows" in rate_result:
+            response_data["rate_limit"]["windows"] = rate_result["windows"]
 
     return response_data
 
 
+def _render_options(pdf_request: PDFRequest, clean_header: Optional[str], clean_footer: Optional[str]) -> dict:
+    """Opções de geração do PDF (com header/footer já sanitizados)."""
+    options = {
+        "page_size": pdf_request.page_size,
+        "orientation": pdf_request.orientation,
+        "margin_top": pdf_request.margin_top,
+        "margin_bottom": pdf_request.margin_bottom,
+        "margin_left": pdf_request.margin_left,
+        "margin_right": pdf_request.margin_right,
+        "include_page_numbers": pdf_request.include_page_numbers,
+        "header_html": clean_header,
+        "footer_html": clean_footer,
+        "header_height": pdf_request.header_height,
+        "footer_height": pdf_request.footer_height,
+        "exclude_header_pages": pdf_request.exclude_header_pages,
+        "exclude_footer_pages": pdf_request.exclude_footer_pages,
+        "header_footer_mode": pdf_request.header_footer_mode,
+    }
+    if pdf_request.split_on:
+        options["split_on"] = pdf_request.split_on
+    if pdf_request.chunked:
+        options["chunked"] = True
+    return options
+
+
+def _inline_pdf_response(pdf_bytes: bytes, job_id: str, action: str, quota: dict, rate_result: Optional[dict]) -> Response:
+    """Resposta do modo 'sync': o PDF no corpo, job e cota nos headers."""
+    disposition = "inline" if action == "preview" else "attachment"
+    headers = {
+        "Content-Disposition": content_disposition(disposition),
+        "X-Job-Id": job_id,
+        "X-Quota-Used": str(quota["used_this_month"] + 1),
+        "X-Quota-Limit": str(quota["monthly_limit"]),
+        "X-Quota-Remaining": str(max(0, quota["remaining"] - 1)),
+    }
+    if rate_result:
+        headers.update(get_rate_limit_headers(rate_result))
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+class BatchDocument(BaseModel):
+    """Documento de um lote de conversão."""
+    html_content: str | None = Field(
+        default=None,
+        min_length=10,
+        description="Conteúdo HTML do documento. Máximo: 2MB. Obrigatório, exceto quando o lote usa `template_id`."
+    )
+    data: dict | None = Field(
+        default=None,
+        description="Dados do template deste documento (com `template_id` em `defaults` ou em `options`).",
+        json_schema_extra={"example": {"numero": "NF-2026-0001", "total": "150,00"}}
+    )
+    reference: str | None = Field(
+        default=None,
+        max_length=200,
+        description="Identificador do documento no seu sistema (ex: número da fatura), devolvido junto com o job_id.",
+        json_schema_extra={"example": "NF-2026-0001"}
+    )
+    options: dict = Field(
+        default_factory=dict,
+        description="Opções deste documento, sobrepondo as opções padrão do lote."
+    )
+
+
+class BatchRequest(BaseModel):
+    """Modelo de requisição para conversão em lote."""
+    documents: list[BatchDocument] = Field(
+        ...,
+        min_length=1,
+        max_length=BATCH_MAX_DOCUMENTS,
+        description=f"Documentos a converter (máximo {BATCH_MAX_DOCUMENTS}). Cada documento vira um job."
+    )
+    defaults: dict = Field(
+        default_factory=dict,
+        description="Opções padrão de todos os documentos: os mesmos campos de /api/v1/convert (page_size, margins, header_html, template_id, ...), exceto html_content.",
+        json_schema_extra={"example": {"page_size": "A4", "footer_html": "<div>Minha Empresa</div>"}}
+    )
+
+
+def _batch_pdf_requests(batch_request: BatchRequest) -> list:
+    """Valida cada documento do lote com as regras de PDFRequest (opções padrão + opções do documento)."""
+    pdf_requests = []
+    errors = []
+    for index, document in enumerate(batch_request.documents):
+        fields = {**batch_request.defaults, **document.options}
+        if document.html_content is not None:
+            fields["html_content"] = document.html_content
+        if document.data is not None:
+            fields["data"] = document.data
+        fields.pop("mode", None)
+        fields.pop("user_id", None)
+        try:
+            pdf_requests.append(PDFRequest(**fields))
+        except ValidationError as e:
+            errors.extend(
+                {**error, "loc": ("body", "documents", index, *error["loc"])}
+                for error in e.errors(include_url=False)
+            )
+    if errors:
+        raise RequestValidationError(errors)
+    return pdf_requests
+
+
+def _document_size(pdf_request: PDFRequest) -> int:
+    """Tamanho do documento: HTML ou, para templates, os dados JSON."""
+    if pdf_request.template_id:
+        return len(json.dumps(pdf_request.data or {}).encode('utf-8'))
+    return len(pdf_request.html_content.encode('utf-8'))
+
+
+def _prepare_batch_documents(pdf_requests: list, templates: dict) -> list:
+    """
+    Valida e sanitiza os documentos de um lote em uma única passagem.
+
+    Header/footer repetidos entre documentos são sanitizados uma só vez.
+    Documentos de template não são sanitizados (o template já foi no upload).
+
+    Args:
+        pdf_requests: Documentos validados por _batch_pdf_requests
+        templates: Templates usados pelo lote, por ID
+
+    Returns:
+        Payloads dos jobs (html ou template + dados, e opções de geração), na ordem dos documentos
+
+    Raises:
+        ValueError: se algum documento for inválido
+    """
+    sanitized_fragments = {}
+
+    def clean_fragment(fragment: Optional[str]) -> Optional[str]:
+        if not fragment:
+            return None
+        if fragment not in sanitized_fragments:
+            sanitized_fragments[fragment] = sanitize_html(fragment)
+        return sanitized_fragments[fragment]
+
+    prepared = []
+    for index, pdf_request in enumerate(pdf_requests):
+        if pdf_request.template_id:
+            payload = template_payload(templates[pdf_request.template_id], pdf_request.data)
+        else:
+            is_valid, error_msg = validate_html(pdf_request.html_content)
+            if not is_valid:
+                raise ValueError(f"Documento {index}: {error_msg}")
+            payload = {"html": sanitize_html(pdf_request.html_content)}
+        payload["options"] = _render_options(
+            pdf_request,
+            clean_fragment(pdf_request.header_html),
+            clean_fragment(pdf_request.footer_html)
+        )
+        prepared.append(payload)
+    return prepared
+
+
+@app.post(
+    "/api/v1/batches",
+    summary="Converter documentos em lote",
+    description=f"""
+Converte até {BATCH_MAX_DOCUMENTS} documentos HTML em uma única requisição. Cada documento vira um job, processado em paralelo pelos workers.
+
+- Autenticação, rate limit e cota são verificados uma vez para o lote inteiro; a cota precisa comportar todos os documentos
+- `defaults` define as opções comuns; `options` de cada documento as sobrepõe
+- Com `template_id` em `defaults`, cada documento envia só `data` (o template é carregado uma vez para o lote)
+- Acompanhe o lote em `GET /api/v1/batches/{{batch_id}}` e cada job em `GET /api/v1/jobs/{{job_id}}` ou `POST /api/v1/jobs/status`
+- Ao final do lote é enviado um único webhook `batch.completed` (os jobs do lote não enviam `job.completed`/`job.failed`)
+    """,
+    responses={
+        200: {
+            "description": "Lote criado",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "batch_id": "b1a2c3d4-0000-0000-0000-000000000000",
+                        "status": "processing",
+                        "total": 2,
+                        "jobs": [
+                            {"job_id": "xxx", "reference": "NF-2026-0001"},
+                            {"job_id": "yyy", "reference": "NF-2026-0002"}
+                        ],
+                        "quota": {"used": 12, "limit": 100, "remaining": 88}
+                    }
+                }
+            }
+        },
+        400: {"description": "Documento inválido"},
+        401: {"description": "API key ausente ou inválida"},
+        404: {"description": "Template não encontrado"},
+        413: {"description": "Lote acima do tamanho máximo"},
+        429: {"description": "Rate limit ou cota mensal excedidos"}
+    },
+    tags=["API v1"]
+)
+@limiter.limit("10/minute")
+async def create_batch(request: Request, batch_request: BatchRequest):
+    """Convert many documents with one authentication, quota reservation and enqueue."""
+    # 1. Autenticação via API key (uma vez para o lote)
+    api_key = get_api_key_from_request(request)
+    if not api_key:
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "error": "authentication_required",
+                "message": "Authentication required. Provide an API key in the Authorization header (Bearer <key>) or X-API-Key header."
+            }
+        )
+
+    key_hash = hash_api_key(api_key)
+    key_info = await validate_api_key_async(key_hash)
+    if not key_info or not key_info.get("is_valid"):
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "error": "invalid_api_key",
+                "message": "Invalid or expired API key."
+            }
+        )
+
+    user_id = key_info["user_id"]
+    api_key_id = key_info.get("api_key_id")
+    plan = key_info.get("plan", "free")
+
+    rate_result = await run_in_threadpool(get_rate_limiter().check_rate_limit, str(api_key_id), plan)
+    if not rate_result["allowed"]:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "rate_limit_exceeded",
+                "message": f"Rate limit exceeded. Try again in {rate_result['reset']} seconds.",
+                "rate_limit": {
+                    "limit": rate_result["limit"],
+                    "remaining": 0,
+                    "reset": rate_result["reset"]
+                }
+            },
+            headers=get_rate_limit_headers(rate_result)
+        )
+
+    # 2. Validar e sanitizar todos os documentos (uma passagem fora do event loop)
+    pdf_requests = _batch_pdf_requests(batch_request)
+    html_sizes = [_document_size(pdf_request) for pdf_request in pdf_requests]
+    if sum(html_sizes) > BATCH_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch HTML exceeds {BATCH_MAX_BYTES // (1024 * 1024)}MB. Split it into smaller batches."
+        )
+    templates = {}
+    for template_id in dict.fromkeys(r.template_id for r in pdf_requests if r.template_id):
+        template = await run_in_threadpool(get_template, template_id)
+        if template is None or template["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail=f"Template {template_id} not found")
+        templates[template_id] = template
+    try:
+        prepared = await run_in_threadpool(_prepare_batch_documents, pdf_requests, templates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 3. Reservar a cota do lote inteiro (tudo ou nada)
+    batch_id = str(uuid.uuid4())
+    job_ids = [str(uuid.uuid4()) for _ in prepared]
+    quota = await reserve_quota_batch_async(user_id, job_ids)
+    if not quota.get("can_convert", False):
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "quota_exceeded",
+                "message": f"Monthly quota exceeded. Batch needs {len(job_ids)} conversions, {quota['remaining']} remaining.",
+                "quota": {
+                    "used": quota["used_this_month"],
+                    "limit": quota["monthly_limit"],
+                    "remaining": quota["remaining"]
+                }
+            }
+        )
+
+    # 4-5. Qualquer falha antes de enfileirar devolve as unidades reservadas da cota
+    try:
+        # 4. Criar lote e jobs (cada etapa em um único round trip ao Redis)
+        await create_batch_async(batch_id, user_id, job_ids, retention_seconds())
+        await set_job_statuses_async(job_ids, {"status": "pending"}, user_id=user_id)
+
+        try:
+            ip_address = get_remote_address(request)
+            await record_conversions_async([
+                {
+                    "job_id": job_id,
+                    "user_id": user_id,
+                    "api_key_id": api_key_id,
+                    "action": pdf_request.action,
+                    "html_size": html_size,
+                    "status": "pending",
+                    "source": "api",
+                    "ip_address": ip_address
+                }
+                for job_id, pdf_request, html_size in zip(job_ids, pdf_requests, html_sizes)
+            ])
+        except Exception:
+            pass  # Don't fail the request if tracking fails
+
+        # 5. Gravar documentos no payload store e enfileirar todos os jobs como um grupo Celery
+        payload_refs = await run_in_threadpool(store_payloads, prepared)
+        await run_in_threadpool(enqueue_pdf_tasks, [
+            {"job_id": job_id, "payload_ref": payload_ref, "user_id": user_id}
+            for job_id, payload_ref in zip(job_ids, payload_refs)
+        ])
+    except Exception:
+        await run_in_threadpool(release_quotas, job_ids)
+        raise
+
+    count = len(job_ids)
+    return {
+        "batch_id": batch_id,
+        "status": "processing",
+        "total": count,
+        "jobs": [
+            {"job_id": job_id, "reference": document.reference}
+            for job_id, document in zip(job_ids, batch_request.documents)
+        ],
+        "quota": {
+            "used": quota["used_this_month"] + count,
+            "limit": quota["monthly_limit"],
+            "remaining": max(0, quota["remaining"] - count)
+        },
+        "rate_limit": {
+            "limit": rate_result["limit"],
+            "remaining": rate_result["remaining"],
+            "reset": rate_result["reset"]
+        }
+    }
+
+
+@app.get(
+    "/api/v1/batches/{batch_id}",
+    summary="Verificar status do lote",
+    description="Retorna o progresso agregado de um lote: total de documentos, concluídos, com falha e pendentes, e os IDs dos jobs na ordem de envio.",
+    responses={
+        200: {
+            "description": "Status do lote",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "batch_id": "b1a2c3d4-0000-0000-0000-000000000000",
+                        "status": "processing",
+                        "total": 2,
+                        "completed": 1,
+                        "failed": 0,
+                        "pending": 1,
+                        "created_at": 1700000000,
+                        "finished_at": None,
+                        "job_ids": ["xxx", "yyy"]
+                    }
+                }
+            }
+        },
+        404: {"description": "Lote não encontrado"}
+    },
+    tags=["API v1"]
+)
+async def get_batch(batch_id: str):
+    """Get a batch's aggregate status."""
+    batch = await get_batch_async(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
 # Versioned job status endpoint (v1)
 @app.get(
     "/api/v1/jobs/{job_id}",
     summary="Verificar status do job",
-    description="Retorna o status atual de um job de conversão de PDF.",
+    description="Retorna o status atual de um job de conversão de PDF. Com `?wait=N`, aguarda até N segundos pela próxima mudança de status (long-poll) em vez de exigir polling frequente.",
     responses={
         200: {
             "description": "Status do job",
@@ -1164,7 +1771,7 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
                     "examples": {
                         "pending": {"value": {"job_id": "xxx", "status": "pending"}},
                         "processing": {"value": {"job_id": "xxx", "status": "processing"}},
-                        "completed": {"value": {"job_id": "xxx", "status": "completed", "size": 12345}},
+                        "completed": {"value": {"job_id": "xxx", "status": "completed", "size": 12345, "download_url": "https://htmltopdf.buscarid.com/files/pdf/xxx.pdf?expires=1700000000&disposition=attachment&sig=..."}},
                         "failed": {"value": {"job_id": "xxx", "status": "failed", "error": "Error message"}}
                     }
                 }
@@ -1177,7 +1784,7 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
 @app.get(
     "/api/jobs/{job_id}",
     summary="Verificar status do job",
-    description="Retorna o status atual de um job de conversão de PDF.",
+    description="Retorna o status atual de um job de conversão de PDF. Com `?wait=N`, aguarda até N segundos pela próxima mudança de status (long-poll) em vez de exigir polling frequente.",
     responses={
         200: {
             "description": "Status do job",
@@ -1197,26 +1804,329 @@ async def convert_html_to_pdf(request: Request, pdf_request: PDFRequest):
     tags=["Jobs"],
     include_in_schema=False
 )
-async def get_job(job_id: str):
-    """Get job status by ID."""
-    status = get_job_status(job_id)
+async def get_job(
+    job_id: str,
+    wait: int = Query(
+        default=0,
+        ge=0,
+        description="Long-poll: segundos para aguardar uma mudança de status antes de responder (máximo 60). Retorna imediatamente se o job já terminou."
+    )
+):
+    """Get job status by ID, optionally waiting for the next status change."""
+    if wait <= 0:
+        status = await get_job_status_async(job_id)
+    else:
+        status = None
+        watcher = watch_job(job_id, min(wait, JOB_WAIT_MAX_SECONDS))
+        try:
+            async for event in watcher:
+                first = status is None
+                status = event
+                if not first or event.get("status") in TERMINAL_STATUSES:
+                    break
+        finally:
+            await watcher.aclose()
+
     if not status:
         raise HTTPException(status_code=404, detail="Job not found")
-    return {"job_id": job_id, **status}
+    return _job_response(job_id, status)
+
+
+def _job_response(job_id: str, status: dict) -> dict:
+    """Corpo de resposta do status de um job (com download_url quando concluído)."""
+    response = {"job_id": job_id, **status}
+    if status.get("parts") is not None:
+        # split_on: um PDF (e um download_url) por registro
+        response["parts"] = [part_info(part, build_download_url(job_id, part)) for part in status["parts"]]
+    elif status.get("status") == "completed":
+        download_url = build_download_url(job_id, status.get("storage"))
+        if download_url:
+            response["download_url"] = download_url
+    return response
+
+
+@app.get(
+    "/api/v1/jobs/{job_id}/events",
+    summary="Acompanhar status do job (SSE)",
+    description="""
+Stream Server-Sent Events com as mudanças de status do job.
+
+- O primeiro evento traz o status atual; cada mudança gera um novo evento `status`
+- O stream termina quando o job é concluído (`completed`) ou falha (`failed`)
+- Comentários `: keepalive` são enviados periodicamente; após 5 minutos o stream é encerrado e o cliente pode reconectar
+    """,
+    responses={
+        200: {"description": "Stream de eventos (text/event-stream)"},
+        404: {"description": "Job não encontrado"}
+    },
+    tags=["API v1"]
+)
+@app.get("/api/jobs/{job_id}/events", tags=["Jobs"], include_in_schema=False)
+async def stream_job_events(job_id: str):
+    """Stream a job's status changes as Server-Sent Events."""
+    watcher = watch_job(job_id, JOB_EVENTS_MAX_SECONDS, tick=JOB_EVENTS_KEEPALIVE_SECONDS)
+    try:
+        first = await watcher.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        try:
+            yield _sse_status(job_id, first)
+            async for status in watcher:
+                yield ": keepalive\n\n" if status is None else _sse_status(job_id, status)
+        finally:
+            await watcher.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse_status(job_id: str, status: dict) -> str:
+    return f"event: status\ndata: {json.dumps(_job_response(job_id, status))}\n\n"
+
+
+class JobStatusBatchRequest(BaseModel):
+    """Request model for the bulk job status lookup."""
+    job_ids: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=JOB_STATUS_BATCH_MAX,
+        description=f"IDs dos jobs a consultar (máximo {JOB_STATUS_BATCH_MAX})"
+    )
+    since: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="Cursor retornado por uma consulta anterior: retorna apenas os jobs cujo status mudou desde então"
+    )
+
+
+@app.post(
+    "/api/v1/jobs/status",
+    summary="Verificar status de vários jobs",
+    description=f"""
+Retorna o status de até {JOB_STATUS_BATCH_MAX} jobs em uma única requisição.
+
+- `jobs`: status de cada job encontrado, na ordem de `job_ids`
+- `missing`: IDs de jobs inexistentes ou expirados
+- `cursor`: envie como `since` na próxima consulta para receber apenas os jobs cujo status mudou desde esta
+    """,
+    responses={
+        200: {
+            "description": "Status dos jobs",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "jobs": [
+                            {"job_id": "xxx", "status": "processing", "updated_at": 1700000000000},
+                            {"job_id": "yyy", "status": "completed", "size": 12345, "updated_at": 1700000000500, "download_url": "https://htmltopdf.buscarid.com/files/pdf/yyy.pdf?expires=1700000000&disposition=attachment&sig=..."}
+                        ],
+                        "missing": ["zzz"],
+                        "cursor": 1700000001000
+                    }
+                }
+            }
+        },
+        422: {"description": "Lista de IDs vazia ou acima do limite"}
+    },
+    tags=["API v1"]
+)
+@app.post("/api/jobs/status", tags=["Jobs"], include_in_schema=False)
+async def get_jobs_status(body: JobStatusBatchRequest):
+    """Get the status of many jobs with a single Redis round trip."""
+    job_ids = list(dict.fromkeys(body.job_ids))
+    statuses, cursor = await get_job_statuses_async(job_ids)
+
+    jobs = []
+    missing = []
+    for job_id, status in zip(job_ids, statuses):
+        if status is None:
+            missing.append(job_id)
+        elif body.since is None or status.get("updated_at", 0) >= body.since:
+            jobs.append(_job_response(job_id, status))
+    return {"jobs": jobs, "missing": missing, "cursor": cursor}
+
+
+@app.get(
+    "/api/v1/jobs",
+    summary="Listar jobs",
+    description=f"""
+Lista os jobs da conta da API key, do mais recente para o mais antigo, sem consultar o banco de dados.
+
+- `status`: filtra por status atual (`pending`, `processing`, `completed`, `failed`)
+- `limit`: jobs por página (máximo {JOB_LIST_PAGE_MAX})
+- `cursor`: envie o `next_cursor` da página anterior para obter a próxima; `null` indica a última página
+    """,
+    responses={
+        200: {
+            "description": "Página de jobs",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "jobs": [
+                            {"job_id": "xxx", "status": "completed", "size": 12345, "updated_at": 1700000000500, "download_url": "https://htmltopdf.buscarid.com/files/pdf/xxx.pdf?expires=1700000000&disposition=attachment&sig=..."},
+                            {"job_id": "yyy", "status": "failed", "error": "Error message", "updated_at": 1700000000000}
+                        ],
+                        "next_cursor": "1699999990000:yyy"
+                    }
+                }
+            }
+        },
+        400: {"description": "Status ou cursor inválido"},
+        401: {"description": "Authentication required"}
+    },
+    tags=["API v1"]
+)
+async def list_jobs(
+    request: Request,
+    status: Optional[str] = Query(default=None, description="Filtrar por status"),
+    limit: int = Query(default=20, ge=1, le=JOB_LIST_PAGE_MAX, description="Jobs por página"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor da página anterior")
+):
+    """List the user's jobs from the per-user Redis index."""
+    api_key = get_api_key_from_request(request)
+    if not api_key:
+        raise HTTPException(status_code=401, detail="API key required")
+
+    key_hash = hash_api_key(api_key)
+    key_info = await validate_api_key_async(key_hash)
+    if not key_info or not key_info.get("is_valid"):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Valid statuses: {', '.join(JOB_STATUSES)}")
+
+    try:
+        jobs, next_cursor = await list_user_jobs_async(key_info["user_id"], status, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "jobs": [_job_response(job_id, job_status) for job_id, job_status in jobs],
+        "next_cursor": next_cursor
+    }
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range "Range: bytes=..." header.
+
+    Args:
+        range_header: Value of the Range header (or None)
+        size: Size of the PDF in bytes
+
+    Returns:
+        (start, end) byte offsets, inclusive, or None to send the whole PDF
+        (no header, multiple ranges or a malformed header are ignored)
+
+    Raises:
+        ValueError: if the range cannot be satisfied (416)
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, sep, last = range_header[len("bytes="):].strip().partition("-")
+    if not sep:
+        return None
+    if not (first or last).isdigit() or (last and not last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("range starts past the end of the PDF")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header against a stored ETag (weak comparison)."""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == f'"{etag}"':
+            return True
+    return False
+
+
+def _stream_pdf(blob, request: Request, headers: dict, etag: Optional[str] = None) -> Response:
+    """
+    Streams a stored PDF, honouring Range, If-Range and If-None-Match.
+
+    Args:
+        blob: Blob from open_pdf/open_blob (size and iter_range())
+        request: Incoming request (for the conditional headers)
+        headers: Response headers (Content-Disposition, ...)
+        etag: Content hash of the PDF, when known
+
+    Returns:
+        200/206 StreamingResponse, or a 304 Response
+    """
+    if etag:
+        headers["ETag"] = f'"{etag}"'
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+    # If-Range: only resume when the client's copy is still the same PDF
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or (etag and if_range.strip() == f'"{etag}"'):
+        try:
+            byte_range = _parse_range(request.headers.get("range"), blob.size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Range not satisfiable",
+                headers={"Content-Range": f"bytes */{blob.size}"}
+            )
+
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{blob.size}"
+    else:
+        start, end = 0, blob.size - 1
+        status_code = 200
+    headers["Content-Length"] = str(end - start + 1)
+
+    # Sync iterators run in the threadpool; only one chunk is held at a time
+    return StreamingResponse(
+        blob.iter_range(start, end),
+        status_code=status_code,
+        media_type="application/pdf",
+        headers=headers
+    )
+
 
 
 # Versioned download endpoint (v1)
 @app.get(
     "/api/v1/jobs/{job_id}/download",
     summary="Baixar PDF do job",
-    description="Baixa o PDF gerado de um job completado.",
+    description=(
+        "Baixa o PDF gerado de um job completado. O PDF é transmitido em partes; "
+        "suporta `Range` (206, downloads retomáveis) e `If-None-Match` (304). "
+        "Jobs com `split_on` baixam um registro com `?part=N` (a partir de 1) ou todos em um ZIP."
+    ),
     responses={
         200: {
-            "content": {"application/pdf": {}},
-            "description": "PDF gerado"
+            "content": {"application/pdf": {}, "application/zip": {}},
+            "description": "PDF gerado (ZIP com um PDF por registro para jobs com split_on)"
         },
+        206: {"description": "Parte do PDF (requisição com Range)"},
+        304: {"description": "PDF não modificado (ETag confere)"},
         400: {"description": "PDF ainda não está pronto"},
-        404: {"description": "Job não encontrado ou PDF expirado"}
+        404: {"description": "Job não encontrado ou PDF expirado"},
+        416: {"description": "Range fora do tamanho do PDF"}
     },
     tags=["API v1"]
 )
@@ -1235,30 +2145,118 @@ async def get_job(job_id: str):
     tags=["Jobs"],
     include_in_schema=False
 )
-async def download_job_pdf(job_id: str, action: str = "download"):
-    """Download PDF from completed job."""
-    status = get_job_status(job_id)
+async def download_job_pdf(job_id: str, request: Request, action: str = "download", part: Optional[int] = None):
+    """Stream the PDF of a completed job, with Range and ETag support."""
+    status = await get_job_status_async(job_id)
     if not status:
         raise HTTPException(status_code=404, detail="Job not found")
 
     if status.get("status") != "completed":
         raise HTTPException(status_code=400, detail="PDF not ready")
 
-    pdf_bytes = get_pdf(job_id)
-    if not pdf_bytes:
-        raise HTTPException(status_code=404, detail="PDF expired")
-
+    parts = status.get("parts")
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"pdfLeaf_{timestamp}.pdf"
     disposition = "attachment" if action == "download" else "inline"
 
-    return Response(
-        content=pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'{disposition}; filename="{filename}"'}
+    if parts is not None and part is None:
+        # split_on sem ?part: todos os registros em um ZIP transmitido
+        return await _stream_parts_zip(parts, f"pdfLeaf_{timestamp}")
+
+    if part is not None:
+        if parts is None or not 1 <= part <= len(parts):
+            raise HTTPException(status_code=404, detail="Part not found")
+        storage = parts[part - 1]
+        blob = await run_in_threadpool(open_blob, storage["name"])
+        filename = f"pdfLeaf_{timestamp}_{part}.pdf"
+    else:
+        storage = status.get("storage") or {}
+        blob = await run_in_threadpool(open_pdf, job_id)
+        filename = f"pdfLeaf_{timestamp}.pdf"
+    if blob is None:
+        raise HTTPException(status_code=404, detail="PDF expired")
+
+    headers = {
+        "Content-Disposition": f'{disposition}; filename="{filename}"',
+        "Accept-Ranges": "bytes",
+    }
+    return _stream_pdf(blob, request, headers, storage.get("etag"))
+
+
+async def _stream_parts_zip(parts: list, basename: str) -> StreamingResponse:
+    """Transmite os PDFs de um job com split_on em um ZIP (um arquivo por registro)."""
+    import re
+
+    def open_parts():
+        entries = []
+        for number, part in enumerate(parts, start=1):
+            blob = open_blob(part["name"])
+            if blob is None:
+                return None
+            record = re.sub(r"[^\w-]", "_", part.get("record") or "")
+            entries.append((f"{number:04d}{'_' + record if record else ''}.pdf", blob))
+        return entries
+
+    entries = await run_in_threadpool(open_parts)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="PDF expired")
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{basename}.zip"'}
     )
 
 
+@app.get("/api/v1/files/verify", include_in_schema=False)
+async def verify_signed_download(request: Request):
+    """
+    Checks a signed download URL for nginx's auth_request.
+
+    nginx passes the original URI in X-Original-URI and serves the file from
+    PDF_STORAGE_DIR itself when this returns 200.
+    """
+    original = urlsplit(request.headers.get("x-original-uri", ""))
+    prefix = DOWNLOAD_FILES_PREFIX.rstrip("/") + "/"
+    if not original.path.startswith(prefix):
+        raise HTTPException(status_code=403, detail="Invalid download URL")
+
+    object_path = original.path[len(prefix):]
+    query = dict(parse_qsl(original.query))
+    disposition = query.get("disposition", "")
+    if blob_name(object_path) is None or not verify_download(
+        object_path, query.get("expires"), disposition, query.get("sig")
+    ):
+        raise HTTPException(status_code=403, detail="Invalid or expired download URL")
+
+    return Response(status_code=200, headers={"X-PDF-Disposition": content_disposition(disposition)})
+
+
+@app.get("/api/v1/files/{object_path:path}", include_in_schema=False)
+async def download_signed_pdf(
+    object_path: str,
+    request: Request,
+    expires: str = "",
+    disposition: str = "attachment",
+    sig: str = ""
+):
+    """
+    Serves a signed download URL when there is no file tier for nginx to serve
+    (Redis-only storage). No job lookup is needed: the signature is the grant.
+    """
+    name = blob_name(object_path)
+    if name is None or not verify_download(object_path, expires, disposition, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired download URL")
+
+    blob = await run_in_threadpool(open_blob, name)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="PDF expired")
+
+    headers = {
+        "Content-Disposition": content_disposition(disposition),
+        "Accept-Ranges": "bytes",
+    }
+    return _stream_pdf(blob, request, headers)
+
+
 # ============================================================================
 # Webhook Management Endpoints (API v1)
 # ============================================================================
@@ -1268,7 +2266,7 @@ class WebhookCreateRequest(BaseModel):
     url: str = Field(..., description="URL to receive webhook notifications")
     events: list[str] = Field(
         default=["job.completed", "job.failed"],
-        description="Events to subscribe to. Available: job.completed, job.failed"
+        description="Events to subscribe to. Available: job.completed, job.failed, batch.completed"
     )
 
     @field_validator('url')
@@ -1281,7 +2279,7 @@ class WebhookCreateRequest(BaseModel):
     @field_validator('events')
     @classmethod
     def validate_events(cls, v):
-        valid_events = {'job.completed', 'job.failed'}
+        valid_events = {'job.completed', 'job.failed', 'batch.completed'}
         for event in v:
             if event not in valid_events:
                 raise ValueError(f"Invalid event: {event}. Valid events: {valid_events}")
@@ -1341,7 +2339,7 @@ async def create_webhook(request: Request, webhook_request: WebhookCreateRequest
         raise HTTPException(status_code=401, detail="API key required")
 
     key_hash = hash_api_key(api_key)
-    key_info = validate_api_key(key_hash)
+    key_info = await validate_api_key_async(key_hash)
     if not key_info or not key_info.get("is_valid"):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
@@ -1412,7 +2410,7 @@ async def list_webhooks(request: Request):
         raise HTTPException(status_code=401, detail="API key required")
 
     key_hash = hash_api_key(api_key)
-    key_info = validate_api_key(key_hash)
+    key_info = await validate_api_key_async(key_hash)
     if not key_info or not key_info.get("is_valid"):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
@@ -1449,7 +2447,7 @@ async def delete_webhook(request: Request, webhook_id: str):
         raise HTTPException(status_code=401, detail="API key required")
 
     key_hash = hash_api_key(api_key)
-    key_info = validate_api_key(key_hash)
+    key_info = await validate_api_key_async(key_hash)
     if not key_info or not key_info.get("is_valid"):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
@@ -1474,6 +2472,124 @@ async def delete_webhook(request: Request, webhook_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================================================
+# Template Management Endpoints (API v1)
+# ============================================================================
+
+class TemplateCreateRequest(BaseModel):
+    """Request model for registering a PDF template."""
+    name: str = Field(..., min_length=1, max_length=200, description="Template name")
+    html_content: str = Field(
+        ...,
+        min_length=10,
+        max_length=MAX_HTML_SIZE,
+        description="Template HTML with Jinja tags ({{ value }}, {% for %}, {% if %}). Values are autoescaped; extends/include/import are not allowed."
+    )
+
+
+async def _template_user(request: Request) -> str:
+    """Authenticates a template request by API key and returns the user ID."""
+    api_key = get_api_key_from_request(request)
+    if not api_key:
+        raise HTTPException(status_code=401, detail="API key required")
+
+    key_info = await validate_api_key_async(hash_api_key(api_key))
+    if not key_info or not key_info.get("is_valid"):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return key_info["user_id"]
+
+
+@app.post(
+    "/api/v1/templates",
+    summary="Register PDF template",
+    description="""
+Register an HTML layout once and generate PDFs from JSON data.
+
+The template is sanitized at registration. Conversions then send only
+`template_id` and `data` to `POST /api/v1/convert` (or in a batch's `defaults`),
+skipping per-job sanitization and style parsing:
+
+```json
+{"template_id": "8d0f5a8e-...", "data": {"customer": {"name": "Maria"}}}
+```
+
+Templates are immutable: register a new template to change the layout.
+    """,
+    responses={
+        200: {
+            "description": "Template registered",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "id": "8d0f5a8e-2b7c-4b8e-9a57-3f1f6f4d2c10",
+                        "name": "Invoice",
+                        "version": "3f1f6f4d2c10a9b8",
+                        "created_at": "2026-01-13T12:00:00Z"
+                    }
+                }
+            }
+        },
+        400: {"description": "Invalid template"},
+        401: {"description": "Authentication required"}
+    },
+    tags=["API v1 - Templates"]
+)
+async def create_pdf_template(request: Request, template_request: TemplateCreateRequest):
+    """Register a PDF template."""
+    user_id = await _template_user(request)
+
+    try:
+        record = await run_in_threadpool(
+            create_template, user_id, template_request.name, template_request.html_content, sanitize_template_html
+        )
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "id": record["id"],
+        "name": record["name"],
+        "version": record["version"],
+        "created_at": record.get("created_at")
+    }
+
+
+@app.get(
+    "/api/v1/templates",
+    summary="List PDF templates",
+    description="List the authenticated user's templates, newest first.",
+    responses={
+        200: {"description": "List of templates"},
+        401: {"description": "Authentication required"}
+    },
+    tags=["API v1 - Templates"]
+)
+async def list_pdf_templates(request: Request):
+    """List the user's templates."""
+    user_id = await _template_user(request)
+    return {"templates": await run_in_threadpool(list_templates, user_id)}
+
+
+@app.delete(
+    "/api/v1/templates/{template_id}",
+    summary="Delete PDF template",
+    description="Delete a template. New conversions can no longer use it.",
+    responses={
+        200: {"description": "Template deleted"},
+        401: {"description": "Authentication required"},
+        404: {"description": "Template not found"}
+    },
+    tags=["API v1 - Templates"]
+)
+async def delete_pdf_template(request: Request, template_id: str):
+    """Delete a template."""
+    user_id = await _template_user(request)
+    if not await run_in_threadpool(delete_template, template_id, user_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"message": "Template deleted successfully"}
+
+
 @app.get(
     "/health",
     summary="Health Check",
@@ -1497,6 +2613,32 @@ async def health_check():
     return {"status": "ok"}
 
 
+# ============================================
+# API KEY ENDPOINTS
+# ============================================
+
+@app.post(
+    "/api/v1/api-keys/{api_key_id}/invalidate",
+    summary="Invalidar cache de API key",
+    description=(
+        "Remove a API key dos caches de autenticação de todas as instâncias. "
+        "Chamado pelo dashboard após revogar uma key; a próxima requisição "
+        "com a key é validada novamente no banco."
+    ),
+    tags=["API v1"],
+    include_in_schema=False
+)
+@limiter.limit("30/minute")
+async def invalidate_api_key_cache(request: Request, api_key_id: str):
+    """Drop a revoked API key from the auth caches (only forces a re-check, grants nothing)."""
+    try:
+        await run_in_threadpool(invalidate_api_key, api_key_id)
+    except Exception as e:
+        print(f"WARNING: Could not invalidate API key {api_key_id} ({e}).")
+        raise HTTPException(status_code=503, detail="Auth cache unavailable")
+    return {"invalidated": True}
+
+
 # ============================================
 # STRIPE ENDPOINTS
 # ============================================
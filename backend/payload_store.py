@@ -0,0 +1,259 @@
+"""
+Claim-check store for conversion payloads.
+
+Sanitized HTML (up to 2MB) plus header/footer used to travel as Celery task
+arguments, so the broker held a full copy of every queued document. The API
+now writes the payload once, zlib-compressed, to a payload store and enqueues
+only its reference; the worker streams it back and deletes it when done.
+
+Backends (PAYLOAD_STORE):
+- "redis": payload:{id} keys with a TTL, read back in GETRANGE chunks
+- "disk": files in PAYLOAD_STORE_DIR (a shared volume or object-store mount)
+
+Chunked renders also pass their rendered chunks (raw PDF bytes) through the
+store, from the chunk tasks to the task that concatenates them. Redis runs
+with a small maxmemory and volatile-ttl eviction, so with the Redis backend
+chunks over PAYLOAD_REDIS_MAX_BYTES are written to the PDF cold tier instead
+(chunked renders are refused when there is none, see large_bytes_supported).
+"""
+
+import json
+import os
+import time
+import uuid
+import zlib
+from typing import Iterator, Optional
+
+from .config import PAYLOAD_STORE, PAYLOAD_STORE_DIR, PAYLOAD_TTL_SECONDS, PAYLOAD_REDIS_MAX_BYTES
+from .pdf_storage import get_cold_store
+from .redis_client import get_redis
+
+# Size of the chunks read back from the store
+PAYLOAD_CHUNK_SIZE = 256 * 1024
+
+# Purge expired disk payloads after this many writes from a process
+_DISK_PURGE_INTERVAL = 64
+
+# Prefix of the references of bytes kept in the PDF cold tier ("chunk:{id}" blobs)
+_COLD_REF_PREFIX = "cold:"
+
+
+class PayloadNotFoundError(Exception):
+    """Raised when a payload reference has expired or does not exist."""
+
+
+def _compress(payload: dict) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _decompress(chunks: Iterator[bytes]) -> dict:
+    decompressor = zlib.decompressobj()
+    parts = [decompressor.decompress(chunk) for chunk in chunks]
+    parts.append(decompressor.flush())
+    return json.loads(b"".join(parts).decode("utf-8"))
+
+
+class RedisPayloadStore:
+    """Payloads stored as compressed blobs in Redis."""
+
+    def __init__(self, ttl: int = PAYLOAD_TTL_SECONDS):
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(ref: str) -> str:
+        return f"payload:{ref}"
+
+    def put(self, ref: str, data: bytes) -> None:
+        get_redis().setex(self._key(ref), self.ttl, data)
+
+    def put_many(self, items: list) -> None:
+        pipe = get_redis().pipeline(transaction=False)
+        for ref, data in items:
+            pipe.setex(self._key(ref), self.ttl, data)
+        pipe.execute()
+
+    def iter_chunks(self, ref: str) -> Iterator[bytes]:
+        client = get_redis()
+        key = self._key(ref)
+        if not client.exists(key):
+            raise PayloadNotFoundError(f"Payload {ref} not found or expired")
+        offset = 0
+        while True:
+            chunk = client.getrange(key, offset, offset + PAYLOAD_CHUNK_SIZE - 1)
+            if chunk:
+                yield chunk
+            if len(chunk) < PAYLOAD_CHUNK_SIZE:
+                return
+            offset += PAYLOAD_CHUNK_SIZE
+
+    def delete(self, ref: str) -> None:
+        get_redis().delete(self._key(ref))
+
+
+class DiskPayloadStore:
+    """Payloads stored as compressed files in a directory shared by API and workers."""
+
+    def __init__(self, directory: str = PAYLOAD_STORE_DIR, ttl: int = PAYLOAD_TTL_SECONDS):
+        self.directory = directory
+        self.ttl = ttl
+        self._writes_since_purge = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self.directory, f"{ref}.json.z")
+
+    def put(self, ref: str, data: bytes) -> None:
+        path = self._path(ref)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._writes_since_purge += 1
+        if self._writes_since_purge >= _DISK_PURGE_INTERVAL:
+            self._writes_since_purge = 0
+            self.purge_expired()
+
+    def put_many(self, items: list) -> None:
+        for ref, data in items:
+            self.put(ref, data)
+
+    def iter_chunks(self, ref: str) -> Iterator[bytes]:
+        try:
+            f = open(self._path(ref), "rb")
+        except FileNotFoundError:
+            raise PayloadNotFoundError(f"Payload {ref} not found or expired")
+        with f:
+            while True:
+                chunk = f.read(PAYLOAD_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def delete(self, ref: str) -> None:
+        try:
+            os.remove(self._path(ref))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self) -> int:
+        """Removes payloads older than the TTL (jobs that were never picked up)."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+_store = None
+
+
+def get_payload_store():
+    """Get or create the configured payload store singleton."""
+    global _store
+    if _store is None:
+        if PAYLOAD_STORE == "disk":
+            _store = DiskPayloadStore()
+        else:
+            _store = RedisPayloadStore()
+    return _store
+
+
+def store_payload(payload: dict) -> str:
+    """
+    Writes a task payload to the payload store.
+
+    Args:
+        payload: JSON-serializable payload (html, options, ...)
+
+    Returns:
+        Reference to pass to the task instead of the payload
+    """
+    ref = uuid.uuid4().hex
+    get_payload_store().put(ref, _compress(payload))
+    return ref
+
+
+def store_payloads(payloads: list) -> list:
+    """
+    Writes many task payloads to the payload store (one round trip with Redis).
+
+    Args:
+        payloads: JSON-serializable payloads
+
+    Returns:
+        References, in the order of payloads
+    """
+    items = [(uuid.uuid4().hex, _compress(payload)) for payload in payloads]
+    get_payload_store().put_many(items)
+    return [ref for ref, _ in items]
+
+
+def load_payload(ref: str) -> dict:
+    """
+    Streams a payload back from the payload store.
+
+    Raises:
+        PayloadNotFoundError: if the payload expired or was deleted
+    """
+    return _decompress(get_payload_store().iter_chunks(ref))
+
+
+def large_bytes_supported() -> bool:
+    """Whether store_bytes can keep large blobs out of Redis (disk store or a PDF cold tier)."""
+    return not isinstance(get_payload_store(), RedisPayloadStore) or get_cold_store() is not None
+
+
+def store_bytes(data: bytes) -> str:
+    """
+    Writes raw bytes (e.g. a rendered chunk of a chunked PDF) to the payload store.
+
+    With the Redis backend, bytes over PAYLOAD_REDIS_MAX_BYTES go to the PDF
+    cold tier when there is one.
+
+    Returns:
+        Reference to read them back with load_bytes
+    """
+    ref = uuid.uuid4().hex
+    store = get_payload_store()
+    if isinstance(store, RedisPayloadStore) and len(data) > PAYLOAD_REDIS_MAX_BYTES:
+        cold_store = get_cold_store()
+        if cold_store is not None:
+            cold_store.put(f"chunk:{ref}", data)
+            return f"{_COLD_REF_PREFIX}{ref}"
+    store.put(ref, data)
+    return ref
+
+
+def load_bytes(ref: str) -> bytes:
+    """
+    Reads raw bytes written with store_bytes.
+
+    Raises:
+        PayloadNotFoundError: if they expired or were deleted
+    """
+    if ref.startswith(_COLD_REF_PREFIX):
+        cold_store = get_cold_store()
+        data = cold_store.get(f"chunk:{ref[len(_COLD_REF_PREFIX):]}") if cold_store is not None else None
+        if data is None:
+            raise PayloadNotFoundError(f"Payload {ref} not found or expired")
+        return data
+    return b"".join(get_payload_store().iter_chunks(ref))
+
+
+def delete_payload(ref: Optional[str]) -> None:
+    """Deletes a payload once its task is done."""
+    if not ref:
+        return
+    if ref.startswith(_COLD_REF_PREFIX):
+        cold_store = get_cold_store()
+        if cold_store is not None:
+            cold_store.delete(f"chunk:{ref[len(_COLD_REF_PREFIX):]}")
+        return
+    get_payload_store().delete(ref)
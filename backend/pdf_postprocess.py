@@ -1,16 +1,20 @@
 """
-PDF Post-processing module for page-specific header/footer exclusions.
+PDF Post-processing module for header/footer overlays.
 
-WeasyPrint's CSS @page rules don't support arbitrary page number targeting.
-This module uses pikepdf to merge pages from two PDFs:
-1. A PDF with headers/footers on all pages
-2. A PDF without headers/footers
+With running elements, WeasyPrint lays out the header/footer again on every
+page. In overlay mode the margin content is rendered once into a small PDF,
+converted to a Form XObject and stamped onto each page of the body PDF with
+pikepdf. The XObject is shared by all pages, so the output stays small.
 
-Pages are selected based on user-specified exclusion lists.
+Page numbers inside the footer ({{page}}) are drawn per page as a tiny text
+overlay at the position reserved for them in the rendered footer.
+
+Chunked renders are concatenated here too, before their header/footer is
+stamped, so page numbers run across the whole document.
 """
 
 import io
-from typing import Set
+from typing import Iterable, Set, Tuple
 
 try:
     import pikepdf
@@ -19,69 +23,161 @@ except ImportError:
     PIKEPDF_AVAILABLE = False
 
 
-def apply_page_exclusions(
-    pdf_with_headers: bytes,
-    pdf_without_headers: bytes,
-    exclude_header_pages: Set[int],
-    exclude_footer_pages: Set[int]
-) -> bytes:
+class PageNumberSlot:
+    """
+    Position reserved for the current page number inside a margin overlay.
+
+    Coordinates are in points, relative to the overlay's bottom-left corner,
+    with y at the text baseline.
     """
-    Merges two PDFs based on page exclusion rules.
 
-    Strategy:
-    - For pages in exclusion sets, use corresponding page from pdf_without_headers
-    - For all other pages, use page from pdf_with_headers
+    def __init__(
+        self,
+        x: float,
+        y: float,
+        font_size: float,
+        color: Tuple[float, float, float] = (0, 0, 0)
+    ):
+        self.x = x
+        self.y = y
+        self.font_size = font_size
+        self.color = color
 
-    Note: This is a simplified approach. For independent header/footer exclusion,
-    we'd need to generate 4 variants. Current implementation excludes both
-    header AND footer for any page in either exclusion set.
+
+class MarginOverlay:
+    """
+    Rendered header or footer to stamp onto the body pages.
 
     Args:
-        pdf_with_headers: PDF bytes with headers/footers on all pages
-        pdf_without_headers: PDF bytes without headers/footers
-        exclude_header_pages: Set of 1-based page numbers to exclude header
-        exclude_footer_pages: Set of 1-based page numbers to exclude footer
+        pdf_bytes: Single-page PDF with the rendered margin content
+        anchor: "top" (header) or "bottom" (footer) edge of the page
+        x: Distance from the left page edge, in points
+        offset: Distance from the anchored page edge, in points
+        width: Overlay width in points
+        height: Overlay height in points
+        exclude_pages: 1-based page numbers that must not get the overlay
+        page_number_slots: Positions where the page number is drawn per page
+    """
+
+    def __init__(
+        self,
+        pdf_bytes: bytes,
+        anchor: str,
+        x: float,
+        offset: float,
+        width: float,
+        height: float,
+        exclude_pages: Set[int] = frozenset(),
+        page_number_slots: Iterable[PageNumberSlot] = ()
+    ):
+        self.pdf_bytes = pdf_bytes
+        self.anchor = anchor
+        self.x = x
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.exclude_pages = exclude_pages
+        self.page_number_slots = list(page_number_slots)
+
+    def rect(self, page_height: float) -> Tuple[float, float, float, float]:
+        """Returns the overlay rectangle (llx, lly, urx, ury) on a page of the given height."""
+        if self.anchor == "top":
+            lly = page_height - self.offset - self.height
+        else:
+            lly = self.offset
+        return (self.x, lly, self.x + self.width, lly + self.height)
+
+
+def _page_number_stream(font_name: str, page_num: int, slots, origin_x: float, origin_y: float) -> bytes:
+    """Builds the content stream drawing the page number at each slot."""
+    ops = []
+    for slot in slots:
+        r, g, b = slot.color
+        ops.append(
+            f"q BT {font_name} {slot.font_size:.2f} Tf {r:.3f} {g:.3f} {b:.3f} rg "
+            f"{origin_x + slot.x:.2f} {origin_y + slot.y:.2f} Td ({page_num}) Tj ET Q"
+        )
+    return "\n".join(ops).encode("ascii")
+
+
+def stamp_overlays(pdf_bytes: bytes, overlays: Iterable[MarginOverlay]) -> bytes:
+    """
+    Stamps rendered headers/footers onto every page of a PDF.
+
+    Args:
+        pdf_bytes: Body PDF, laid out with margins reserved for the overlays
+        overlays: Margin overlays to stamp
 
     Returns:
-        Merged PDF bytes
+        PDF bytes with the overlays applied
     """
     if not PIKEPDF_AVAILABLE:
-        raise ImportError("pikepdf is required for page exclusions")
+        raise ImportError("pikepdf is required for header/footer overlays")
+
+    pdf = pikepdf.open(io.BytesIO(pdf_bytes))
+    sources = []
+    font = None
 
-    # Combine exclusion sets (simplified: exclude both h/f for any excluded page)
-    exclude_pages = exclude_header_pages | exclude_footer_pages
+    for overlay in overlays:
+        source = pikepdf.open(io.BytesIO(overlay.pdf_bytes))
+        sources.append(source)
+        xobject = pdf.copy_foreign(source.pages[0].as_form_xobject())
 
-    if not exclude_pages:
-        return pdf_with_headers
+        if overlay.page_number_slots and font is None:
+            font = pdf.make_indirect(pikepdf.Dictionary(
+                Type=pikepdf.Name.Font,
+                Subtype=pikepdf.Name.Type1,
+                BaseFont=pikepdf.Name.Helvetica,
+                Encoding=pikepdf.Name.WinAnsiEncoding,
+            ))
 
-    # Open both PDFs
-    with_hf = pikepdf.open(io.BytesIO(pdf_with_headers))
-    without_hf = pikepdf.open(io.BytesIO(pdf_without_headers))
+        for page_num, page in enumerate(pdf.pages, start=1):
+            if page_num in overlay.exclude_pages:
+                continue
 
-    # Create output PDF
-    output = pikepdf.new()
+            llx, lly, urx, ury = overlay.rect(float(page.mediabox[3]) - float(page.mediabox[1]))
+            page.add_overlay(xobject, pikepdf.Rectangle(llx, lly, urx, ury))
 
-    # Get page counts
-    num_pages_with = len(with_hf.pages)
-    num_pages_without = len(without_hf.pages)
+            if overlay.page_number_slots:
+                font_name = page.add_resource(font, pikepdf.Name.Font, prefix="PN")
+                stream = _page_number_stream(str(font_name), page_num, overlay.page_number_slots, llx, lly)
+                page.contents_add(pikepdf.Stream(pdf, stream), prepend=False)
 
-    # Use the minimum to avoid index errors if page counts differ slightly
-    num_pages = min(num_pages_with, num_pages_without)
+    output_buffer = io.BytesIO()
+    # Derive /ID from the content so identical input yields identical bytes
+    pdf.save(output_buffer, deterministic_id=True)
+    for source in sources:
+        source.close()
+    pdf.close()
 
-    # Merge pages based on exclusions
-    for page_num in range(1, num_pages + 1):
-        page_index = page_num - 1  # Convert to 0-based index
+    return output_buffer.getvalue()
 
-        if page_num in exclude_pages:
-            # Use page from PDF without headers/footers
-            output.pages.append(without_hf.pages[page_index])
-        else:
-            # Use page from PDF with headers/footers
-            output.pages.append(with_hf.pages[page_index])
 
-    # Write to bytes
+def concatenate_pdfs(pdfs: Iterable[bytes]) -> tuple:
+    """
+    Concatenates PDFs (the chunks of a chunked render) in order.
+
+    Args:
+        pdfs: PDF bytes of each chunk
+
+    Returns:
+        Tuple of (pdf_bytes, page count)
+    """
+    if not PIKEPDF_AVAILABLE:
+        raise ImportError("pikepdf is required for chunked rendering")
+
+    pdf = pikepdf.new()
+    sources = []
+    for pdf_bytes in pdfs:
+        source = pikepdf.open(io.BytesIO(pdf_bytes))
+        sources.append(source)
+        pdf.pages.extend(source.pages)
+    page_count = len(pdf.pages)
+
     output_buffer = io.BytesIO()
-    output.save(output_buffer)
-    output_buffer.seek(0)
+    pdf.save(output_buffer, deterministic_id=True)
+    for source in sources:
+        source.close()
+    pdf.close()
 
-    return output_buffer.read()
+    return output_buffer.getvalue(), page_count
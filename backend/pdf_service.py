@@ -1,3 +1,12 @@
+import re
+import threading
+from collections import OrderedDict
+
+from .config import PAGE_CSS_CACHE_SIZE, TAILWIND_CSS_CACHE_SIZE, SPLIT_MAX_PARTS
+from .tailwind_compiler import scan_class_names, class_set_hash, compile_tailwind_css, page_width_px
+from .resource_cache import ResourceFetcher, CachingURLFetcher
+from .resource_prefetch import collect_resource_urls, prefetch_resources
+
 try:
     from weasyprint import HTML, CSS
 except OSError:
@@ -108,6 +117,595 @@ def _build_page_css(
     return page_css
 
 
+class _StylesheetCache:
+    """
+    Process-local LRU cache of parsed WeasyPrint CSS objects.
+
+    Parsing is the expensive part of applying a stylesheet, and the same
+    stylesheets are applied to many jobs, so each worker parses a given
+    stylesheet only once.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, key, build_css):
+        """
+        Returns the cached CSS object for key, parsing build_css() on a miss.
+
+        Args:
+            key: Hashable cache key
+            build_css: Callable returning the CSS source string
+        """
+        with self._lock:
+            stylesheet = self._entries.get(key)
+            if stylesheet is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return stylesheet
+            self.misses += 1
+
+        stylesheet = CSS(string=build_css())
+
+        with self._lock:
+            self._entries[key] = stylesheet
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return stylesheet
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def clear(self) -> None:
+        """Empties the cache and resets its counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_page_css_cache = _StylesheetCache(PAGE_CSS_CACHE_SIZE)
+_tailwind_css_cache = _StylesheetCache(TAILWIND_CSS_CACHE_SIZE)
+
+
+def _page_css_cache_key(
+    page_size: str,
+    orientation: str,
+    margin_top: str,
+    margin_bottom: str,
+    margin_left: str,
+    margin_right: str,
+    include_page_numbers: bool,
+    header_html: str | None,
+    footer_html: str | None,
+    header_height: str,
+    footer_height: str
+) -> tuple:
+    """
+    Normalizes the @page options into a hashable cache key.
+
+    Only the presence of header/footer HTML affects the @page rules, and
+    standalone page numbers are only emitted when there is no custom footer.
+    """
+    has_header = bool(header_html)
+    has_footer = bool(footer_html)
+    return (
+        page_size.strip(),
+        orientation.strip().lower(),
+        margin_top.strip(),
+        margin_bottom.strip(),
+        margin_left.strip(),
+        margin_right.strip(),
+        bool(include_page_numbers) and not has_footer,
+        has_header,
+        has_footer,
+        header_height.strip() if has_header else None,
+        footer_height.strip() if has_footer else None,
+    )
+
+
+# @page options that are plain CSS values (stripped before keying and building)
+_PAGE_CSS_VALUE_OPTIONS = (
+    "page_size", "orientation", "margin_top", "margin_bottom",
+    "margin_left", "margin_right", "header_height", "footer_height",
+)
+
+
+def _normalize_page_options(page_options: dict) -> dict:
+    """Strips the @page CSS values and lowercases orientation."""
+    normalized = dict(page_options)
+    for name in _PAGE_CSS_VALUE_OPTIONS:
+        if isinstance(normalized.get(name), str):
+            normalized[name] = normalized[name].strip()
+    normalized["orientation"] = normalized["orientation"].lower()
+    return normalized
+
+
+def _get_page_stylesheet(**page_options):
+    """
+    Returns the parsed WeasyPrint CSS object for the given @page options.
+
+    Accepts the same keyword arguments as _build_page_css. Parsed stylesheets
+    are kept in a bounded LRU cache (PAGE_CSS_CACHE_SIZE entries).
+    """
+    # Normalized once so the cache key and the built CSS always agree
+    page_options = _normalize_page_options(page_options)
+    return _page_css_cache.get_or_parse(
+        _page_css_cache_key(**page_options),
+        lambda: _build_page_css(**page_options)
+    )
+
+
+def _get_tailwind_stylesheet(
+    html: str,
+    header_html: str | None,
+    footer_html: str | None,
+    page_size: str,
+    orientation: str
+):
+    """
+    Compiles the Tailwind utilities used by the document into a parsed stylesheet.
+
+    Returns None when the document uses no Tailwind classes. Parsed stylesheets
+    are cached by class-set hash (TAILWIND_CSS_CACHE_SIZE entries).
+    """
+    class_names = scan_class_names(html, header_html, footer_html)
+    viewport_width = page_width_px(page_size, orientation)
+    class_hash = class_set_hash(class_names, viewport_width)
+    if class_hash is None:
+        return None
+    # Compiled only on a miss; this is the only memo layer for Tailwind CSS
+    return _tailwind_css_cache.get_or_parse(
+        class_hash,
+        lambda: compile_tailwind_css(class_names, viewport_width)[1]
+    )
+
+
+def get_page_css_cache_stats() -> dict:
+    """Returns hit/miss counters and current size of the @page stylesheet cache."""
+    return _page_css_cache.stats()
+
+
+def get_tailwind_css_cache_stats() -> dict:
+    """Returns hit/miss counters and current size of the Tailwind stylesheet cache."""
+    return _tailwind_css_cache.stats()
+
+
+def clear_page_css_cache() -> None:
+    """Empties the @page stylesheet cache and resets its counters."""
+    _page_css_cache.clear()
+
+
+def clear_tailwind_css_cache() -> None:
+    """Empties the Tailwind stylesheet cache and resets its counters."""
+    _tailwind_css_cache.clear()
+
+
+def _parse_page_numbers(pages: str | None) -> frozenset:
+    """Parses a comma-separated page list ("1, 3, 5") into a set of 1-based page numbers."""
+    if not pages:
+        return frozenset()
+    return frozenset(int(p.strip()) for p in pages.split(',') if p.strip())
+
+
+def _build_exclusion_css(exclude_header_pages: frozenset, exclude_footer_pages: frozenset) -> str:
+    """
+    Builds @page rules that blank the header/footer margin boxes on given pages.
+
+    Uses the :nth() page selector so exclusions are applied during the single
+    layout pass. The page margins are kept, so the body content flows exactly
+    as on pages that show the header/footer.
+    """
+    page_css = ""
+    for page_num in sorted(exclude_header_pages):
+        page_css += f"""
+        @page :nth({page_num}) {{
+            @top-center {{
+                content: none;
+            }}
+        }}
+        """
+    for page_num in sorted(exclude_footer_pages):
+        page_css += f"""
+        @page :nth({page_num}) {{
+            @bottom-center {{
+                content: none;
+            }}
+        }}
+        """
+    return page_css
+
+
+def _get_exclusion_stylesheet(exclude_header_pages: frozenset, exclude_footer_pages: frozenset):
+    """
+    Returns the parsed exclusion stylesheet, cached alongside the @page stylesheets.
+    """
+    key = ("exclusions", tuple(sorted(exclude_header_pages)), tuple(sorted(exclude_footer_pages)))
+    return _page_css_cache.get_or_parse(
+        key,
+        lambda: _build_exclusion_css(exclude_header_pages, exclude_footer_pages)
+    )
+
+
+# CSS absolute length units in points
+_PT_PER_UNIT = {"pt": 1.0, "px": 0.75, "in": 72.0, "cm": 72.0 / 2.54, "mm": 72.0 / 25.4}
+
+# Named page sizes in points (portrait)
+_PAGE_SIZES_PT = {
+    "a3": (841.89, 1190.55),
+    "a4": (595.28, 841.89),
+    "a5": (419.53, 595.28),
+    "b4": (708.66, 1000.63),
+    "b5": (498.90, 708.66),
+    "letter": (612.0, 792.0),
+    "legal": (612.0, 1008.0),
+}
+
+_PAGE_SLOT_CLASS = "pdf-page-slot"
+
+
+def _length_to_pt(value: str) -> float:
+    """
+    Converts a CSS absolute length ("2cm", "20mm", "0.5in", "0") to points.
+
+    Raises:
+        ValueError: for relative or unknown units
+    """
+    match = re.match(r'^\s*([\d.]+)\s*([a-z]*)\s*$', value.lower())
+    if not match:
+        raise ValueError(f"Invalid length: {value}")
+    number, unit = float(match.group(1)), match.group(2)
+    if not unit and number == 0:
+        return 0.0
+    if unit not in _PT_PER_UNIT:
+        raise ValueError(f"Unsupported length unit: {value}")
+    return number * _PT_PER_UNIT[unit]
+
+
+def _page_width_pt(page_size: str, orientation: str) -> float:
+    """Returns the page width in points for a named or custom ("210mm 297mm") page size."""
+    named = _PAGE_SIZES_PT.get(page_size.strip().lower())
+    if named:
+        width, height = named
+    else:
+        parts = page_size.split()
+        width = _length_to_pt(parts[0])
+        height = _length_to_pt(parts[1]) if len(parts) > 1 else width
+    return max(width, height) if orientation == "landscape" else min(width, height)
+
+
+def _extract_head_styles(html: str) -> str:
+    """Returns the <style> and stylesheet <link> tags of the document head."""
+    head_match = re.search(r'<head[^>]*>(.*?)</head>', html, re.IGNORECASE | re.DOTALL)
+    if not head_match:
+        return ""
+    tags = re.findall(
+        r'<style[^>]*>.*?</style>|<link[^>]*rel=["\']?stylesheet[^>]*>',
+        head_match.group(1),
+        re.IGNORECASE | re.DOTALL
+    )
+    return "\n".join(tags)
+
+
+def _page_boxes(page):
+    """
+    Returns the laid out boxes of a rendered page, in tree order.
+
+    WeasyPrint has no public API for the box tree; Page._page_box is an
+    internal that is stable across the 70.x releases pinned in
+    requirements.txt (see TestWeasyPrintInternals).
+
+    Raises:
+        RuntimeError: if the installed WeasyPrint does not expose it
+    """
+    page_box = getattr(page, "_page_box", None)
+    if page_box is None or not hasattr(page_box, "descendants"):
+        raise RuntimeError("Unsupported WeasyPrint version: Page._page_box not found (see the pin in requirements.txt)")
+    return page_box.descendants()
+
+
+_box_tree_probe = None
+
+
+def _box_tree_available() -> bool:
+    """
+    Whether the installed WeasyPrint exposes the box tree read by
+    _find_page_number_slots (probed once per process with a tiny render).
+    """
+    global _box_tree_probe
+    if _box_tree_probe is None:
+        try:
+            page = HTML(string="<p>1</p>").render().pages[0]
+            _box_tree_probe = any(getattr(box, "element", None) is not None for box in _page_boxes(page))
+        except (AttributeError, IndexError, TypeError, RuntimeError):
+            _box_tree_probe = False
+        if not _box_tree_probe:
+            print("WARNING: WeasyPrint box tree unavailable. Header/footer page numbers use running elements.")
+    return _box_tree_probe
+
+
+def _find_page_number_slots(document, height_pt: float) -> list:
+    """
+    Locates the page number placeholders in a rendered margin overlay.
+
+    Walks the laid out box tree of the first page and returns one
+    PageNumberSlot per placeholder, positioned at the text baseline.
+    """
+    from .pdf_postprocess import PageNumberSlot
+
+    slots = []
+    try:
+        for box in _page_boxes(document.pages[0]):
+            element = getattr(box, "element", None)
+            if element is None or _PAGE_SLOT_CLASS not in (element.get("class") or "").split():
+                continue
+            if getattr(box, "baseline", None) is None:
+                continue
+            color = box.style["color"]
+            slots.append(PageNumberSlot(
+                x=box.content_box_x() * _PT_PER_UNIT["px"],
+                y=height_pt - (box.position_y + box.baseline) * _PT_PER_UNIT["px"],
+                font_size=box.style["font_size"] * _PT_PER_UNIT["px"],
+                color=(color.red, color.green, color.blue),
+            ))
+    except (AttributeError, IndexError, KeyError, RuntimeError) as e:
+        print(f"WARNING: Could not locate page number placeholders in overlay ({e}).")
+    return slots
+
+
+def _render_margin_overlay(
+    fragment_html: str,
+    head_styles: str,
+    width_pt: float,
+    height_pt: float,
+    total_pages: int,
+    include_page_numbers: bool,
+    stylesheets: list,
+    url_fetcher
+):
+    """
+    Renders header/footer HTML once into a single-page PDF of the margin box size.
+
+    With include_page_numbers, {{pages}} is substituted with the final page
+    count and {{page}} is replaced by an invisible placeholder as wide as the
+    largest page number, whose position is returned so the number can be
+    drawn per page.
+
+    Returns:
+        Tuple of (pdf_bytes, list of PageNumberSlot)
+    """
+    has_slots = include_page_numbers and "{{page}}" in fragment_html
+    if include_page_numbers:
+        digits = "0" * len(str(total_pages))
+        fragment_html = fragment_html.replace("{{pages}}", str(total_pages))
+        fragment_html = fragment_html.replace(
+            "{{page}}",
+            f'<span class="{_PAGE_SLOT_CLASS}"><span style="color: transparent;">{digits}</span></span>'
+        )
+
+    overlay_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        {head_styles}
+        <style>
+            @page {{ size: {width_pt:.2f}pt {height_pt:.2f}pt; margin: 0; }}
+            html, body {{ margin: 0; padding: 0; }}
+        </style>
+    </head>
+    <body>
+        <div style="height: {height_pt:.2f}pt; width: 100%; display: flex; flex-direction: column; justify-content: center;">
+            {fragment_html}
+        </div>
+    </body>
+    </html>
+    """
+
+    document = HTML(string=overlay_html, url_fetcher=url_fetcher).render(stylesheets=stylesheets)
+    slots = _find_page_number_slots(document, height_pt) if has_slots else []
+    return document.write_pdf(), slots
+
+
+class SplitPart:
+    """
+    One record's PDF, cut from a document rendered once (see split_on).
+
+    Args:
+        pdf_bytes: The record's pages as a PDF
+        record: id attribute of the record's marker element, if any
+        first_page: 1-based first page of the record in the full document
+        last_page: 1-based last page of the record in the full document
+    """
+
+    def __init__(self, pdf_bytes: bytes, record: str | None, first_page: int, last_page: int):
+        self.pdf_bytes = pdf_bytes
+        self.record = record
+        self.first_page = first_page
+        self.last_page = last_page
+
+
+def _mark_records(root, split_on: str) -> list:
+    """
+    Gives each split_on element an id, so the page where it starts can be
+    read from the rendered pages' anchors (Page.anchors).
+
+    Elements that already have an id keep it; it names the record.
+
+    Args:
+        root: Parsed document (HTML.etree_element), changed in place
+        split_on: Class marking the first element of each record
+
+    Returns:
+        List of (anchor, record id attribute or None), in document order
+
+    Raises:
+        ValueError: if a record's id is not unique in the document
+    """
+    id_counts = {}
+    for element in root.iter():
+        if element.get("id"):
+            id_counts[element.get("id")] = id_counts.get(element.get("id"), 0) + 1
+
+    markers = []
+    for element in root.iter():
+        if split_on not in (element.get("class") or "").split():
+            continue
+        record = element.get("id")
+        if record is None:
+            anchor = f"split-on-record-{len(markers) + 1}"
+            while anchor in id_counts:
+                anchor += "-"
+            element.set("id", anchor)
+        elif id_counts[record] > 1:
+            raise ValueError(f"id \"{record}\" is used more than once; .{split_on} elements need unique ids")
+        else:
+            anchor = record
+        markers.append((anchor, record))
+    return markers
+
+
+def _find_record_starts(document, markers: list) -> list:
+    """
+    Finds the page where each record starts.
+
+    A record starts on the first page holding its marker's anchor (elements
+    split over several pages have an anchor on each of them). Markers that
+    were not rendered (e.g. display: none) are skipped.
+
+    Args:
+        document: Rendered document
+        markers: (anchor, record) pairs from _mark_records
+
+    Returns:
+        List of (page index, marker id attribute), in document order
+
+    Raises:
+        ValueError: if two records start on the same page
+    """
+    first_pages = {}
+    for page_index, page in enumerate(document.pages):
+        for anchor in page.anchors:
+            first_pages.setdefault(anchor, page_index)
+
+    starts = []
+    for anchor, record in markers:
+        page_index = first_pages.get(anchor)
+        if page_index is None:
+            continue
+        if starts and page_index <= starts[-1][0]:
+            raise ValueError(
+                f"Records {len(starts)} and {len(starts) + 1} start on page {page_index + 1}; "
+                f"start each record on a new page (e.g. with .page-break-before)"
+            )
+        starts.append((page_index, record))
+    return starts
+
+
+def _split_document(document, split_on: str, markers: list) -> list:
+    """
+    Writes one PDF per record of a rendered document.
+
+    Pages before the first record belong to the first record.
+
+    Args:
+        document: Rendered document
+        split_on: Class marking the first element of each record
+        markers: (anchor, record) pairs from _mark_records
+
+    Returns:
+        List of SplitPart, in document order
+
+    Raises:
+        ValueError: if the document has no split_on element or more than
+            SPLIT_MAX_PARTS records
+    """
+    starts = _find_record_starts(document, markers)
+    if not starts:
+        raise ValueError(f"No element with class \"{split_on}\" found to split the document on")
+    if len(starts) > SPLIT_MAX_PARTS:
+        raise ValueError(f"Document has {len(starts)} records; split_on is limited to {SPLIT_MAX_PARTS}")
+
+    page_count = len(document.pages)
+    parts = []
+    for index, (first_page, record) in enumerate(starts):
+        if index == 0:
+            first_page = 0
+        end = starts[index + 1][0] if index + 1 < len(starts) else page_count
+        pdf_bytes = document.copy(document.pages[first_page:end]).write_pdf(pdf_identifier=True)
+        parts.append(SplitPart(pdf_bytes, record, first_page + 1, end))
+    return parts
+
+
+def _stamp_margin_overlays(
+    pdf_bytes: bytes,
+    total_pages: int,
+    head_styles: str,
+    overlay_stylesheets: list,
+    url_fetcher,
+    page_size: str,
+    orientation: str,
+    margin_left: str,
+    margin_right: str,
+    include_page_numbers: bool,
+    header_html: str | None,
+    footer_html: str | None,
+    header_height: str,
+    footer_height: str,
+    header_exclude_set: frozenset,
+    footer_exclude_set: frozenset
+) -> bytes:
+    """
+    Renders the header/footer once and stamps them onto every page of a PDF.
+
+    Returns:
+        PDF bytes with the header/footer applied
+    """
+    from .pdf_postprocess import MarginOverlay, stamp_overlays
+
+    content_width_pt = (
+        _page_width_pt(page_size, orientation)
+        - _length_to_pt(margin_left)
+        - _length_to_pt(margin_right)
+    )
+    margin_left_pt = _length_to_pt(margin_left)
+    overlays = []
+    if header_html:
+        header_height_pt = _length_to_pt(header_height)
+        header_pdf, _ = _render_margin_overlay(
+            header_html, head_styles, content_width_pt, header_height_pt,
+            total_pages, False, overlay_stylesheets, url_fetcher
+        )
+        overlays.append(MarginOverlay(
+            header_pdf, "top", margin_left_pt, 0, content_width_pt, header_height_pt,
+            exclude_pages=header_exclude_set
+        ))
+    if footer_html:
+        footer_height_pt = _length_to_pt(footer_height)
+        footer_pdf, slots = _render_margin_overlay(
+            footer_html, head_styles, content_width_pt, footer_height_pt,
+            total_pages, include_page_numbers, overlay_stylesheets, url_fetcher
+        )
+        overlays.append(MarginOverlay(
+            footer_pdf, "bottom", margin_left_pt, 0, content_width_pt, footer_height_pt,
+            exclude_pages=footer_exclude_set, page_number_slots=slots
+        ))
+    return stamp_overlays(pdf_bytes, overlays)
+
+
 def _inject_running_elements(
     html: str,
     header_html: str | None,
@@ -187,17 +785,23 @@ def generate_pdf_from_html(
     header_height: str = "2cm",
     footer_height: str = "2cm",
     exclude_header_pages: str | None = None,
-    exclude_footer_pages: str | None = None
-) -> bytes:
+    exclude_footer_pages: str | None = None,
+    header_footer_mode: str = "running",
+    render_stats: dict | None = None,
+    extra_stylesheets: list | None = None,
+    split_on: str | None = None
+) -> bytes | list:
     """
     Generates a PDF from an HTML string.
 
     Features:
-    - Injects TailwindCSS and ensures basic HTML structure if missing
+    - Compiles used TailwindCSS utilities offline and ensures basic HTML structure if missing
     - Page configuration via WeasyPrint stylesheets for priority
-    - Custom header/footer support via running elements
+    - Custom header/footer support via running elements, or rendered once
+      and stamped onto each page (header_footer_mode="overlay")
     - Page number integration (standalone or in footer)
-    - Page exclusion for headers/footers via post-processing
+    - Independent header/footer exclusion per page (single layout pass)
+    - External resources served through the shared resource cache
 
     Args:
         html: HTML content to convert
@@ -211,10 +815,22 @@ def generate_pdf_from_html(
         footer_height: Height of footer area
         exclude_header_pages: Comma-separated page numbers to exclude header
         exclude_footer_pages: Comma-separated page numbers to exclude footer
+        header_footer_mode: "running" (laid out on every page by WeasyPrint) or
+            "overlay" (rendered once and stamped with pikepdf, for long documents)
+        render_stats: Optional dict filled with per-job statistics
+            ("resources": fetch time, cache hits, bytes fetched/saved,
+            and "prefetch": concurrent prefetch wall time vs summed fetch times)
+        extra_stylesheets: Already-parsed CSS objects applied before the
+            generated stylesheets (e.g. a template's static styles)
+        split_on: Class marking the first element of each record. The
+            document is laid out once and cut into one PDF per record
+            (header/footer always use running elements)
 
     Returns:
-        PDF file as bytes
+        PDF file as bytes, or with split_on a list of SplitPart
     """
+    orientation = orientation.strip().lower()
+
     # Basic check for HTML structure
     if "<html" not in html.lower():
         html = f"""
@@ -231,87 +847,373 @@ def generate_pdf_from_html(
         </html>
         """
 
-    # Inject TailwindCSS if not present
-    if "cdn.tailwindcss.com" not in html:
-        if "</head>" in html:
-            html = html.replace("</head>", '<script src="https://cdn.tailwindcss.com"></script></head>')
-        else:
-            html = '<script src="https://cdn.tailwindcss.com"></script>' + html
+    # Overlay mode renders header/footer separately, so the body has no running elements
+    use_overlay = header_footer_mode == "overlay" and bool(header_html or footer_html) and not split_on
+    if use_overlay:
+        try:
+            from .pdf_postprocess import PIKEPDF_AVAILABLE
+            if not PIKEPDF_AVAILABLE:
+                raise ImportError("pikepdf not installed")
+            # Validate the overlay geometry up front
+            _page_width_pt(page_size, orientation)
+            for length in (margin_left, margin_right, header_height, footer_height):
+                _length_to_pt(length)
+            # {{page}} placeholders are located in the overlay's box tree
+            has_slots = include_page_numbers and any("{{page}}" in (f or "") for f in (header_html, footer_html))
+            if has_slots and HTML is not None and not _box_tree_available():
+                raise RuntimeError("page number placeholders need the WeasyPrint box tree")
+        except (ImportError, ValueError, IndexError, RuntimeError) as e:
+            print(f"WARNING: Header/footer overlay unavailable ({e}). Using running elements.")
+            use_overlay = False
 
     # Inject running elements for header/footer
-    if header_html or footer_html:
+    if (header_html or footer_html) and not use_overlay:
         html = _inject_running_elements(html, header_html, footer_html, include_page_numbers)
 
-    # Build page CSS
-    page_css = _build_page_css(
-        page_size=page_size,
-        orientation=orientation,
-        margin_top=margin_top,
-        margin_bottom=margin_bottom,
-        margin_left=margin_left,
-        margin_right=margin_right,
-        include_page_numbers=include_page_numbers,
-        header_html=header_html,
-        footer_html=footer_html,
-        header_height=header_height,
-        footer_height=footer_height
-    )
-
     # Generate PDF
     if HTML is None:
         raise RuntimeError("WeasyPrint dependencies (GTK3) not found. Please run via Docker or install GTK3 on Windows.")
 
-    # Apply page CSS as separate stylesheet to ensure it overrides user styles
-    pdf_bytes = HTML(string=html).write_pdf(stylesheets=[CSS(string=page_css)])
+    # Parsed page CSS (cached per worker process)
+    if use_overlay:
+        # Reserve the header/footer areas without margin boxes; standalone page
+        # numbers stay a cheap margin-box counter
+        page_stylesheet = _get_page_stylesheet(
+            page_size=page_size,
+            orientation=orientation,
+            margin_top=header_height if header_html else margin_top,
+            margin_bottom=footer_height if footer_html else margin_bottom,
+            margin_left=margin_left,
+            margin_right=margin_right,
+            include_page_numbers=include_page_numbers and not footer_html,
+            header_html=None,
+            footer_html=None,
+            header_height=header_height,
+            footer_height=footer_height
+        )
+    else:
+        page_stylesheet = _get_page_stylesheet(
+            page_size=page_size,
+            orientation=orientation,
+            margin_top=margin_top,
+            margin_bottom=margin_bottom,
+            margin_left=margin_left,
+            margin_right=margin_right,
+            include_page_numbers=include_page_numbers,
+            header_html=header_html,
+            footer_html=footer_html,
+            header_height=header_height,
+            footer_height=footer_height
+        )
 
-    # Post-process for page exclusions if needed
-    if (exclude_header_pages or exclude_footer_pages) and (header_html or footer_html):
-        try:
-            from .pdf_postprocess import apply_page_exclusions
-
-            # Parse exclusion lists
-            header_exclude_set = set()
-            footer_exclude_set = set()
-
-            if exclude_header_pages:
-                header_exclude_set = {int(p.strip()) for p in exclude_header_pages.split(',')}
-            if exclude_footer_pages:
-                footer_exclude_set = {int(p.strip()) for p in exclude_footer_pages.split(',')}
-
-            # Generate PDF without headers/footers for excluded pages
-            page_css_no_hf = _build_page_css(
-                page_size=page_size,
-                orientation=orientation,
-                margin_top=margin_top,
-                margin_bottom=margin_bottom,
-                margin_left=margin_left,
-                margin_right=margin_right,
-                include_page_numbers=False,
-                header_html=None,
-                footer_html=None,
-                header_height=header_height,
-                footer_height=footer_height
-            )
+    # Tailwind utilities used by the document, compiled offline
+    stylesheets = list(extra_stylesheets or [])
+    tailwind_stylesheet = _get_tailwind_stylesheet(
+        html, header_html, footer_html, page_size, orientation
+    )
+    if tailwind_stylesheet is not None:
+        stylesheets.append(tailwind_stylesheet)
 
-            # Generate without running elements
-            html_no_hf = html
-            # Remove running element divs
-            import re
-            html_no_hf = re.sub(r'<div class="pdf-running-header"[^>]*>.*?</div>', '', html_no_hf, flags=re.DOTALL)
-            html_no_hf = re.sub(r'<div class="pdf-running-footer"[^>]*>.*?</div>', '', html_no_hf, flags=re.DOTALL)
-            html_no_hf = re.sub(r'<style>\s*\.page-num::before.*?</style>', '', html_no_hf, flags=re.DOTALL)
-
-            pdf_bytes_no_hf = HTML(string=html_no_hf).write_pdf(stylesheets=[CSS(string=page_css_no_hf)])
-
-            # Merge PDFs based on exclusions
-            pdf_bytes = apply_page_exclusions(
-                pdf_with_headers=pdf_bytes,
-                pdf_without_headers=pdf_bytes_no_hf,
-                exclude_header_pages=header_exclude_set,
-                exclude_footer_pages=footer_exclude_set
-            )
-        except ImportError:
-            # pikepdf not available, skip exclusions
-            print("WARNING: pikepdf not installed. Page exclusions for headers/footers are not available.")
+    # Apply page CSS as separate stylesheet (last) to ensure it overrides user styles
+    stylesheets.append(page_stylesheet)
+
+    # Header/footer exclusions are page-selector rules applied in the same layout pass
+    header_exclude_set = _parse_page_numbers(exclude_header_pages) if header_html else frozenset()
+    footer_exclude_set = _parse_page_numbers(exclude_footer_pages) if footer_html else frozenset()
+    if (header_exclude_set or footer_exclude_set) and not use_overlay:
+        stylesheets.append(_get_exclusion_stylesheet(header_exclude_set, footer_exclude_set))
+
+    # External resources go through the shared cache with a per-document budget
+    if CachingURLFetcher is None and HTML is not None:
+        raise RuntimeError("WeasyPrint >= 70.0 is required (weasyprint.urls.URLFetcher not found)")
+    resource_fetcher = ResourceFetcher()
+    url_fetcher = CachingURLFetcher(resource_fetcher)
+
+    # Fetch remote resources concurrently so layout does not pay one round-trip per resource
+    prefetch_stats = None
+    resource_urls = collect_resource_urls(html)
+    if use_overlay:
+        for fragment in (header_html, footer_html):
+            if fragment:
+                resource_urls += [url for url in collect_resource_urls(fragment) if url not in resource_urls]
+    if resource_urls:
+        prefetch_stats = prefetch_resources(resource_fetcher, resource_urls)
+
+    if split_on:
+        # One layout pass (fonts, styles, resources shared), then one PDF per record
+        source = HTML(string=html, url_fetcher=url_fetcher)
+        markers = _mark_records(source.etree_element, split_on)
+        document = source.render(stylesheets=stylesheets)
+        pdf_bytes = _split_document(document, split_on, markers)
+    elif not use_overlay:
+        # Content-derived file identifier keeps output byte-identical for identical input
+        pdf_bytes = HTML(string=html, url_fetcher=url_fetcher).write_pdf(
+            stylesheets=stylesheets, pdf_identifier=True
+        )
+    else:
+        document = HTML(string=html, url_fetcher=url_fetcher).render(stylesheets=stylesheets)
+        total_pages = len(document.pages)
+        pdf_bytes = document.write_pdf(pdf_identifier=True)
+
+        overlay_stylesheets = list(extra_stylesheets or [])
+        if tailwind_stylesheet is not None:
+            overlay_stylesheets.append(tailwind_stylesheet)
+        pdf_bytes = _stamp_margin_overlays(
+            pdf_bytes, total_pages, _extract_head_styles(html), overlay_stylesheets, url_fetcher,
+            page_size, orientation, margin_left, margin_right, include_page_numbers,
+            header_html, footer_html, header_height, footer_height,
+            header_exclude_set, footer_exclude_set
+        )
+
+    if render_stats is not None:
+        render_stats["resources"] = resource_fetcher.stats()
+        if prefetch_stats is not None:
+            render_stats["prefetch"] = prefetch_stats
 
     return pdf_bytes
+
+
+# ============================================================================
+# Chunked rendering
+# ============================================================================
+#
+# WeasyPrint lays a document out on one core. A chunked render cuts the body
+# at top-level .page-break / .page-break-before elements (where the layout
+# breaks the page anyway), renders the chunks in parallel and concatenates
+# them. Page numbers depend on the pages of every earlier chunk, so chunks are
+# rendered without header/footer and those are stamped once on the
+# concatenated PDF (as in header_footer_mode="overlay"), numbered across the
+# whole document.
+
+_TAG_PATTERN = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][a-zA-Z0-9-]*)((?:"[^"]*"|\'[^\']*\'|[^>"\'])*)>', re.DOTALL)
+_CLASS_ATTR_PATTERN = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"
+})
+_RAW_TEXT_TAGS = frozenset({"script", "style"})
+
+# Standalone page numbers of a chunked render, stamped like a footer
+_PAGE_NUMBER_FOOTER_HTML = (
+    '<div style="text-align: center; font-size: 10pt; color: #666;">Página {{page}} de {{pages}}</div>'
+)
+
+
+class ChunkPlan:
+    """
+    How a document is rendered in chunks.
+
+    Args:
+        chunks: Complete HTML document of each chunk, in order
+        chunk_options: generate_pdf_from_html options of every chunk
+            (no header/footer, their margins reserved)
+        assembly_options: Options for assemble_chunked_pdf
+        head_styles: <style>/<link> tags of the document head, for the
+            header/footer rendered at assembly
+    """
+
+    def __init__(self, chunks: list, chunk_options: dict, assembly_options: dict, head_styles: str):
+        self.chunks = chunks
+        self.chunk_options = chunk_options
+        self.assembly_options = assembly_options
+        self.head_styles = head_styles
+
+
+def _class_names(attributes: str) -> list:
+    match = _CLASS_ATTR_PATTERN.search(attributes)
+    if not match:
+        return []
+    return (match.group(1) or match.group(2) or match.group(3) or "").split()
+
+
+def _split_at_page_breaks(body: str) -> list:
+    """
+    Splits body content before top-level .page-break-before elements and
+    after top-level .page-break elements.
+
+    Returns:
+        The segments in order, or [body] if the markup is not balanced
+    """
+    segments = []
+    start = 0
+    depth = 0
+    break_after = False
+    position = 0
+    while True:
+        match = _TAG_PATTERN.search(body, position)
+        if match is None:
+            break
+        position = match.end()
+        if match.group(2) is None:
+            continue  # comment
+        name = match.group(2).lower()
+
+        if match.group(1):
+            depth -= 1
+            if depth < 0:
+                return [body]
+            if depth == 0 and break_after:
+                segments.append(body[start:position])
+                start = position
+                break_after = False
+            continue
+
+        classes = _class_names(match.group(3)) if depth == 0 else []
+        if "page-break-before" in classes and body[start:match.start()].strip():
+            segments.append(body[start:match.start()])
+            start = match.start()
+
+        if name in _VOID_TAGS or match.group(3).rstrip().endswith("/"):
+            if "page-break" in classes:
+                segments.append(body[start:position])
+                start = position
+            continue
+
+        if name in _RAW_TEXT_TAGS:
+            # Skip to the closing tag: contents are not markup
+            end = body.lower().find(f"</{name}", position)
+            if end < 0:
+                return [body]
+            position = end
+
+        if depth == 0:
+            break_after = "page-break" in classes
+        depth += 1
+
+    if depth != 0:
+        return [body]
+    segments.append(body[start:])
+    return [segment for segment in segments if segment.strip()]
+
+
+def _group_segments(segments: list, max_chunks: int, min_chunk_bytes: int) -> list:
+    """Joins consecutive segments into at most max_chunks chunks of similar size."""
+    sizes = [len(segment.encode("utf-8")) for segment in segments]
+    total = sum(sizes)
+    count = min(max_chunks, len(segments), total // max(min_chunk_bytes, 1))
+    if count < 2:
+        return ["".join(segments)]
+
+    target = total / count
+    chunks = []
+    current = []
+    current_size = 0
+    for segment, size in zip(segments, sizes):
+        current.append(segment)
+        current_size += size
+        if current_size >= target and len(chunks) < count - 1:
+            chunks.append("".join(current))
+            current = []
+            current_size = 0
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def plan_chunked_render(html: str, options: dict, max_chunks: int, min_chunk_bytes: int) -> ChunkPlan | None:
+    """
+    Splits a document for a chunked render.
+
+    Args:
+        html: Sanitized HTML of the document
+        options: generate_pdf_from_html options of the job
+        max_chunks: Maximum number of chunks
+        min_chunk_bytes: Minimum HTML size of a chunk
+
+    Returns:
+        ChunkPlan, or None if the document does not split into at least two
+        chunks or pikepdf is unavailable (render it in one piece)
+    """
+    from .pdf_postprocess import PIKEPDF_AVAILABLE
+    if not PIKEPDF_AVAILABLE:
+        print("WARNING: Chunked rendering unavailable (pikepdf not installed). Rendering in one piece.")
+        return None
+
+    body_open = re.search(r'<body[^>]*>', html, re.IGNORECASE)
+    body_close = html.lower().rfind("</body>")
+    if body_open and body_close > body_open.end():
+        prefix, body, suffix = html[:body_open.end()], html[body_open.end():body_close], html[body_close:]
+    else:
+        prefix, body, suffix = "", html, ""
+
+    chunks = _group_segments(_split_at_page_breaks(body), max_chunks, min_chunk_bytes)
+    if len(chunks) < 2:
+        return None
+
+    header_html = options.get("header_html")
+    header_height = options.get("header_height", "2cm")
+    footer_html = options.get("footer_html")
+    footer_height = options.get("footer_height", "2cm")
+    if options.get("include_page_numbers") and not footer_html:
+        # Standalone page numbers become a stamped footer in the bottom margin
+        footer_html = _PAGE_NUMBER_FOOTER_HTML
+        footer_height = options.get("margin_bottom", "2cm")
+
+    assembly_options = {**options, "footer_html": footer_html, "footer_height": footer_height}
+    assembly_options.pop("chunked", None)
+    chunk_options = {
+        **assembly_options,
+        "margin_top": header_height if header_html else options.get("margin_top", "2cm"),
+        "margin_bottom": footer_height if footer_html else options.get("margin_bottom", "2cm"),
+        "include_page_numbers": False,
+        "header_html": None,
+        "footer_html": None,
+        "exclude_header_pages": None,
+        "exclude_footer_pages": None,
+        "header_footer_mode": "running",
+    }
+    return ChunkPlan(
+        [prefix + chunk + suffix for chunk in chunks],
+        chunk_options,
+        assembly_options,
+        _extract_head_styles(html),
+    )
+
+
+def assemble_chunked_pdf(
+    chunk_pdfs: list,
+    head_styles: str,
+    page_size: str = "A4",
+    orientation: str = "portrait",
+    margin_left: str = "2cm",
+    margin_right: str = "2cm",
+    include_page_numbers: bool = False,
+    header_html: str | None = None,
+    footer_html: str | None = None,
+    header_height: str = "2cm",
+    footer_height: str = "2cm",
+    exclude_header_pages: str | None = None,
+    exclude_footer_pages: str | None = None,
+    **layout_options
+) -> bytes:
+    """
+    Concatenates the chunks of a chunked render and stamps the header/footer
+    (and page numbers) across the whole document.
+
+    Args:
+        chunk_pdfs: PDF bytes of each chunk, in order
+        head_styles: ChunkPlan.head_styles
+        **: ChunkPlan.assembly_options
+
+    Returns:
+        PDF file as bytes
+    """
+    from .pdf_postprocess import concatenate_pdfs
+
+    pdf_bytes, total_pages = concatenate_pdfs(chunk_pdfs)
+    if not (header_html or footer_html):
+        return pdf_bytes
+
+    if HTML is None:
+        raise RuntimeError("WeasyPrint dependencies (GTK3) not found. Please run via Docker or install GTK3 on Windows.")
+
+    overlay_stylesheets = []
+    tailwind_stylesheet = _get_tailwind_stylesheet("", header_html, footer_html, page_size, orientation)
+    if tailwind_stylesheet is not None:
+        overlay_stylesheets.append(tailwind_stylesheet)
+    return _stamp_margin_overlays(
+        pdf_bytes, total_pages, head_styles, overlay_stylesheets, CachingURLFetcher(ResourceFetcher()),
+        page_size, orientation, margin_left, margin_right, include_page_numbers,
+        header_html, footer_html, header_height, footer_height,
+        _parse_page_numbers(exclude_header_pages) if header_html else frozenset(),
+        _parse_page_numbers(exclude_footer_pages) if footer_html else frozenset()
+    )
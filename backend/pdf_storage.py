@@ -0,0 +1,403 @@
+"""
+Tiered storage for generated PDFs.
+
+Redis runs with a small maxmemory and volatile-ttl eviction, so keeping every
+PDF there made large documents evict each other long before PDF_TTL_SECONDS.
+PDFs are now stored in two tiers:
+
+1. Hot tier: Redis, for PDFs up to PDF_HOT_MAX_BYTES, kept for
+   PDF_HOT_TTL_SECONDS (recent downloads are served from memory)
+2. Cold tier: local filesystem (PDF_STORAGE_DIR) or an S3-compatible bucket
+   (MinIO works locally); every PDF is written here and kept for
+   PDF_COLD_TTL_SECONDS (0 = never expires)
+
+Reads try the hot tier first and fall back to the cold tier transparently.
+With PDF_STORAGE_BACKEND=none, Redis is the only tier (previous behaviour).
+
+Blobs are addressed by name ("pdf:{job_id}", "render:{key}"); the hot tier
+uses the name as the Redis key. Downloads open a blob with open_blob() and
+stream byte ranges of it, DOWNLOAD_CHUNK_SIZE bytes at a time. Jobs split
+into one PDF per record (split_on) store each part as "pdf:{job_id}-{n}";
+iter_zip() streams several blobs as one ZIP archive.
+"""
+
+import hashlib
+import os
+import re
+import time
+import zipfile
+from typing import Iterable, Iterator, Optional
+
+from .config import (
+    PDF_TTL_SECONDS,
+    PDF_STORAGE_BACKEND,
+    PDF_STORAGE_DIR,
+    PDF_HOT_MAX_BYTES,
+    PDF_HOT_TTL_SECONDS,
+    PDF_COLD_TTL_SECONDS,
+    JOB_RECORD_TTL_SECONDS,
+    PDF_S3_BUCKET,
+    PDF_S3_ENDPOINT_URL,
+    PDF_S3_ACCESS_KEY,
+    PDF_S3_SECRET_KEY,
+    PDF_S3_REGION,
+    DOWNLOAD_CHUNK_SIZE,
+)
+from .redis_client import get_redis
+
+try:
+    import boto3
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+# Purge expired cold files after this many writes from a process
+_COLD_PURGE_INTERVAL = 128
+
+_OBJECT_PATH_RE = re.compile(r"^(pdf|render)/([A-Za-z0-9_-]+)\.pdf$")
+
+
+def object_name(name: str) -> str:
+    """Maps a blob name ("pdf:{job_id}") to an object path ("pdf/{job_id}.pdf")."""
+    prefix, _, ident = name.partition(":")
+    return f"{prefix}/{ident}.pdf"
+
+
+def blob_name(object_path: str) -> Optional[str]:
+    """Maps an object path back to its blob name (None if it is not a stored PDF path)."""
+    match = _OBJECT_PATH_RE.match(object_path)
+    if not match:
+        return None
+    return f"{match.group(1)}:{match.group(2)}"
+
+
+class RedisBlob:
+    """Hot-tier blob, read back with GETRANGE one chunk at a time."""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+    def iter_range(self, start: int, end: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields bytes start..end (inclusive) in chunks of at most chunk_size."""
+        client = get_redis()
+        offset = start
+        while offset <= end:
+            chunk = client.getrange(self.name, offset, min(offset + chunk_size, end + 1) - 1)
+            if not chunk:
+                # The hot copy expired mid-download; continue from the cold tier
+                cold_store = get_cold_store()
+                blob = cold_store.open(self.name) if cold_store is not None else None
+                if blob is None:
+                    print(f"WARNING: {self.name} expired during download")
+                    return
+                yield from blob.iter_range(offset, end, chunk_size)
+                return
+            yield chunk
+            offset += len(chunk)
+
+
+class FileBlob:
+    """Cold-tier blob stored as a local file."""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+    def iter_range(self, start: int, end: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields bytes start..end (inclusive) in chunks of at most chunk_size."""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+
+class S3Blob:
+    """Cold-tier blob in an S3-compatible bucket, read with ranged GETs."""
+
+    def __init__(self, client, bucket: str, key: str, size: int):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+
+    def iter_range(self, start: int, end: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields bytes start..end (inclusive) in chunks of at most chunk_size."""
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+
+class FilesystemColdStore:
+    """Cold tier on a local (or network-mounted) filesystem."""
+
+    def __init__(self, directory: str = PDF_STORAGE_DIR, ttl: int = PDF_COLD_TTL_SECONDS):
+        self.directory = directory
+        self.ttl = ttl
+        self._writes_since_purge = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, object_name(name))
+
+    def put(self, name: str, data: bytes) -> None:
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._writes_since_purge += 1
+        if self.ttl and self._writes_since_purge >= _COLD_PURGE_INTERVAL:
+            self._writes_since_purge = 0
+            self.purge_expired()
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self.path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def open(self, name: str) -> Optional[FileBlob]:
+        path = self.path(name)
+        try:
+            return FileBlob(path, os.path.getsize(path))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self) -> int:
+        """Removes PDFs older than the cold TTL."""
+        if not self.ttl:
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+
+class S3ColdStore:
+    """
+    Cold tier on an S3-compatible object store (AWS S3, MinIO, R2).
+
+    Expiration is left to the bucket's lifecycle rules.
+    """
+
+    def __init__(
+        self,
+        bucket: str = PDF_S3_BUCKET,
+        endpoint_url: Optional[str] = PDF_S3_ENDPOINT_URL,
+        client=None
+    ):
+        if client is None:
+            if not BOTO3_AVAILABLE:
+                raise ImportError("boto3 is required for PDF_STORAGE_BACKEND=s3")
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                aws_access_key_id=PDF_S3_ACCESS_KEY,
+                aws_secret_access_key=PDF_S3_SECRET_KEY,
+                region_name=PDF_S3_REGION,
+            )
+        self.bucket = bucket
+        self.client = client
+
+    def put(self, name: str, data: bytes) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=object_name(name),
+            Body=data,
+            ContentType="application/pdf",
+        )
+
+    def presigned_url(self, name: str, expires_in: int, disposition: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": object_name(name),
+                "ResponseContentType": "application/pdf",
+                "ResponseContentDisposition": disposition,
+            },
+            ExpiresIn=expires_in,
+        )
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=object_name(name))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def open(self, name: str) -> Optional[S3Blob]:
+        key = object_name(name)
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return S3Blob(self.client, self.bucket, key, head["ContentLength"])
+
+    def delete(self, name: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=object_name(name))
+
+
+_cold_store = None
+_cold_store_initialized = False
+
+
+def get_cold_store():
+    """Get or create the configured cold tier singleton (None when disabled)."""
+    global _cold_store, _cold_store_initialized
+    if not _cold_store_initialized:
+        _cold_store_initialized = True
+        try:
+            if PDF_STORAGE_BACKEND == "filesystem":
+                _cold_store = FilesystemColdStore()
+            elif PDF_STORAGE_BACKEND == "s3":
+                _cold_store = S3ColdStore()
+        except (ImportError, OSError) as e:
+            print(f"WARNING: PDF cold storage unavailable ({e}). Storing PDFs in Redis only.")
+            _cold_store = None
+    return _cold_store
+
+
+def retention_seconds() -> int:
+    """How long a completed job (and its PDF) remains downloadable."""
+    return JOB_RECORD_TTL_SECONDS if get_cold_store() is not None else PDF_TTL_SECONDS
+
+
+def put_blob(name: str, data: bytes, ttl: int = PDF_TTL_SECONDS) -> dict:
+    """
+    Stores a PDF in the storage tiers.
+
+    Args:
+        name: Blob name ("pdf:{job_id}" or "render:{key}")
+        data: PDF bytes
+        ttl: Retention when Redis is the only tier
+
+    Returns:
+        Storage metadata for the job record: blob name, tier ("hot" when a
+        copy is in Redis, else "cold"), size and etag (content hash)
+    """
+    meta = {
+        "name": name,
+        "size": len(data),
+        "etag": hashlib.sha256(data).hexdigest()[:32],
+    }
+
+    cold_store = get_cold_store()
+    if cold_store is None:
+        get_redis().setex(name, ttl, data)
+        meta["tier"] = "hot"
+        return meta
+
+    cold_store.put(name, data)
+    if len(data) <= PDF_HOT_MAX_BYTES:
+        get_redis().setex(name, PDF_HOT_TTL_SECONDS, data)
+        meta["tier"] = "hot"
+    else:
+        meta["tier"] = "cold"
+    return meta
+
+
+def get_blob(name: str) -> Optional[bytes]:
+    """Retrieves a PDF from the hot tier, falling back to the cold tier."""
+    data = get_redis().get(name)
+    if data is not None:
+        return data
+
+    cold_store = get_cold_store()
+    if cold_store is None:
+        return None
+    return cold_store.get(name)
+
+
+def open_blob(name: str):
+    """
+    Opens a PDF for streaming without loading it into memory.
+
+    Returns:
+        RedisBlob, FileBlob or S3Blob (each with a size and iter_range()),
+        or None if the PDF is in neither tier
+    """
+    size = get_redis().strlen(name)
+    if size:
+        return RedisBlob(name, size)
+
+    cold_store = get_cold_store()
+    if cold_store is None:
+        return None
+    return cold_store.open(name)
+
+
+class _ZipSink:
+    """Write-only file object collecting the bytes zipfile writes (not seekable, so entries are streamed)."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> list:
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def iter_zip(entries: Iterable) -> Iterator[bytes]:
+    """
+    Streams blobs as a ZIP archive without holding them in memory.
+
+    PDFs are already compressed, so entries are stored uncompressed.
+
+    Args:
+        entries: (filename, blob) pairs; blobs from open_blob()
+
+    Yields:
+        ZIP archive bytes, one blob chunk at a time
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for filename, blob in entries:
+            info = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+            info.file_size = blob.size
+            with archive.open(info, "w") as member:
+                for chunk in blob.iter_range(0, blob.size - 1):
+                    member.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
@@ -0,0 +1,345 @@
+"""
+Monthly conversion quota ledger in Redis.
+
+check_user_quota counted this month's completed conversions on every submit,
+and concurrent submits could all pass the check before any of them completed.
+Each user now has a ledger per month, updated atomically by Lua scripts:
+
+- quota:ledger:{user_id}:{YYYYMM}: hash with "used" (completed conversions)
+  and "limit" (plan's monthly limit)
+- quota:ledger:{user_id}:{YYYYMM}:reservations: sorted set of in-flight job
+  IDs, scored by when the reservation expires
+- quota:res:{job_id}: the ledger a job's reservation belongs to, kept for
+  QUOTA_SETTLE_TTL so a job that completes late is still counted
+
+A submit reserves one unit (reserve_quota), the job's completion commits it
+(commit_quota) and a failure releases it (release_quota). Reservations of
+jobs that never finish stop holding quota after QUOTA_RESERVATION_TTL.
+Ledgers are seeded from the database on first use each month and reconciled
+against the conversions table every QUOTA_RECONCILE_SECONDS. Conversions
+reach the table behind a stream (conversion_log), so reconciliation only
+ever raises "used": jobs committed but not yet written are never forgotten.
+"""
+
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from .config import QUOTA_RESERVATION_TTL, QUOTA_SETTLE_TTL, QUOTA_RECONCILE_SECONDS
+from .redis_client import get_redis, get_async_redis
+from .supabase_client import (
+    check_user_quota,
+    check_user_quota_async,
+    fetch_usage_quota,
+    fetch_usage_quota_async,
+)
+
+# Ledgers outlive their month so late commits and reconciliation still find them
+_LEDGER_TTL = 40 * 86400
+
+# Reserves one unit unless the ledger is missing (needs seeding) or full.
+# Returns {'uninitialized'} | {'exceeded'|'ok', used, reserved, limit}
+_RESERVE_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'used') == 0 then
+    return {'uninitialized'}
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+local used = tonumber(redis.call('HGET', KEYS[1], 'used'))
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit'))
+local reserved = redis.call('ZCARD', KEYS[2])
+if used + reserved >= limit then
+    return {'exceeded', used, reserved, limit}
+end
+redis.call('ZADD', KEYS[2], tonumber(ARGV[2]) + tonumber(ARGV[3]), ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('SET', KEYS[3], KEYS[1], 'EX', ARGV[5])
+return {'ok', used, reserved, limit}
+"""
+
+# Reserves one unit for each job in ARGV[5..], all or none.
+# Returns {'uninitialized'} | {'exceeded'|'ok', used, reserved, limit}
+_RESERVE_MANY_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'used') == 0 then
+    return {'uninitialized'}
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+local used = tonumber(redis.call('HGET', KEYS[1], 'used'))
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit'))
+local reserved = redis.call('ZCARD', KEYS[2])
+if used + reserved + #ARGV - 4 > limit then
+    return {'exceeded', used, reserved, limit}
+end
+local expires = tonumber(ARGV[1]) + tonumber(ARGV[2])
+for i = 5, #ARGV do
+    redis.call('ZADD', KEYS[2], expires, ARGV[i])
+    redis.call('SET', 'quota:res:' .. ARGV[i], KEYS[1], 'EX', ARGV[4])
+end
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return {'ok', used, reserved, limit}
+"""
+
+# Settles job ARGV[1]'s reservation: counts it as used when ARGV[2] == '1'.
+# The reservation may already have been pruned from the sorted set; the job
+# still counts. Idempotent: a job is settled at most once.
+_SETTLE_SCRIPT = """
+local ledger = redis.call('GET', KEYS[1])
+if not ledger then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', ledger .. ':reservations', ARGV[1])
+if ARGV[2] == '1' then
+    redis.call('HINCRBY', ledger, 'used', 1)
+end
+return 1
+"""
+
+# Raises "used" to the database's count ARGV[1] (never lowers it: commits
+# may not have reached the conversions table yet) and sets "limit" to ARGV[2].
+# Returns the reconciled "used".
+_RECONCILE_SCRIPT = """
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or '0')
+local counted = tonumber(ARGV[1])
+if counted > used then
+    used = counted
+end
+redis.call('HSET', KEYS[1], 'used', used, 'limit', ARGV[2])
+return used
+"""
+
+_RECONCILE_LOCK_KEY = "quota:reconcile:lock"
+
+_reconciler_started = False
+
+
+def _month() -> str:
+    return time.strftime("%Y%m", time.gmtime())
+
+
+def _ledger_key(user_id: str, month: str) -> str:
+    return f"quota:ledger:{user_id}:{month}"
+
+
+def _reservation_key(job_id: str) -> str:
+    return f"quota:res:{job_id}"
+
+
+def _seed_ledger(ledger_key: str, user_id: str) -> bool:
+    """Initializes a ledger from the database (no-op if another process got there first)."""
+    quota = fetch_usage_quota(user_id)
+    if quota is None:
+        return False
+    pipe = get_redis().pipeline()
+    pipe.hsetnx(ledger_key, "used", int(quota["used_this_month"]))
+    pipe.hsetnx(ledger_key, "limit", int(quota["monthly_limit"]))
+    pipe.expire(ledger_key, _LEDGER_TTL)
+    pipe.execute()
+    return True
+
+
+async def _seed_ledger_async(ledger_key: str, user_id: str) -> bool:
+    """Async variant of _seed_ledger."""
+    quota = await fetch_usage_quota_async(user_id)
+    if quota is None:
+        return False
+    pipe = get_async_redis().pipeline()
+    pipe.hsetnx(ledger_key, "used", int(quota["used_this_month"]))
+    pipe.hsetnx(ledger_key, "limit", int(quota["monthly_limit"]))
+    pipe.expire(ledger_key, _LEDGER_TTL)
+    await pipe.execute()
+    return True
+
+
+def _reservation_result(result: list) -> dict:
+    used, reserved, limit = (int(value) for value in result[1:4])
+    return {
+        "monthly_limit": limit,
+        "used_this_month": used + reserved,
+        "remaining": max(0, limit - used - reserved),
+        "can_convert": _outcome(result) == "ok",
+    }
+
+
+def _outcome(result: list) -> str:
+    return result[0].decode() if isinstance(result[0], bytes) else result[0]
+
+
+def reserve_quota(user_id: str, job_id: str) -> dict:
+    """
+    Reserves one conversion of the user's monthly quota for a job.
+
+    Args:
+        user_id: Owner of the job
+        job_id: The job the unit is reserved for
+
+    Returns:
+        Dict with monthly_limit, used_this_month (completed plus in-flight
+        jobs, excluding this one), remaining and can_convert, like
+        check_user_quota. Falls back to check_user_quota if Redis is down.
+    """
+    month = _month()
+    ledger_key = _ledger_key(user_id, month)
+    keys = [ledger_key, f"{ledger_key}:reservations", _reservation_key(job_id)]
+
+    try:
+        client = get_redis()
+        for _ in range(2):
+            result = client.eval(
+                _RESERVE_SCRIPT, 3, *keys, job_id, int(time.time()), QUOTA_RESERVATION_TTL, _LEDGER_TTL,
+                QUOTA_SETTLE_TTL
+            )
+            if _outcome(result) != "uninitialized":
+                break
+            if not _seed_ledger(ledger_key, user_id):
+                return check_user_quota(user_id)
+        else:
+            return check_user_quota(user_id)
+    except redis.RedisError as e:
+        print(f"WARNING: Quota ledger unavailable ({e}). Checking quota against the database.")
+        return check_user_quota(user_id)
+
+    return _reservation_result(result)
+
+
+async def reserve_quota_async(user_id: str, job_id: str) -> dict:
+    """Async variant of reserve_quota for the API's request handlers."""
+    month = _month()
+    ledger_key = _ledger_key(user_id, month)
+    keys = [ledger_key, f"{ledger_key}:reservations", _reservation_key(job_id)]
+
+    try:
+        client = get_async_redis()
+        for _ in range(2):
+            result = await client.eval(
+                _RESERVE_SCRIPT, 3, *keys, job_id, int(time.time()), QUOTA_RESERVATION_TTL, _LEDGER_TTL,
+                QUOTA_SETTLE_TTL
+            )
+            if _outcome(result) != "uninitialized":
+                break
+            if not await _seed_ledger_async(ledger_key, user_id):
+                return await check_user_quota_async(user_id)
+        else:
+            return await check_user_quota_async(user_id)
+    except redis.RedisError as e:
+        print(f"WARNING: Quota ledger unavailable ({e}). Checking quota against the database.")
+        return await check_user_quota_async(user_id)
+
+    return _reservation_result(result)
+
+
+async def reserve_quota_batch_async(user_id: str, job_ids: list) -> dict:
+    """
+    Reserves one conversion for each job of a batch, all or none.
+
+    Args:
+        user_id: Owner of the jobs
+        job_ids: The jobs the units are reserved for
+
+    Returns:
+        Dict like reserve_quota (used_this_month and remaining exclude the
+        batch); can_convert is True only if the whole batch fits
+    """
+    month = _month()
+    ledger_key = _ledger_key(user_id, month)
+    keys = [ledger_key, f"{ledger_key}:reservations"]
+
+    try:
+        client = get_async_redis()
+        for _ in range(2):
+            result = await client.eval(
+                _RESERVE_MANY_SCRIPT, 2, *keys, int(time.time()), QUOTA_RESERVATION_TTL, _LEDGER_TTL,
+                QUOTA_SETTLE_TTL, *job_ids
+            )
+            if _outcome(result) != "uninitialized":
+                break
+            if not await _seed_ledger_async(ledger_key, user_id):
+                return await _check_batch_quota_async(user_id, len(job_ids))
+        else:
+            return await _check_batch_quota_async(user_id, len(job_ids))
+    except redis.RedisError as e:
+        print(f"WARNING: Quota ledger unavailable ({e}). Checking quota against the database.")
+        return await _check_batch_quota_async(user_id, len(job_ids))
+
+    return _reservation_result(result)
+
+
+async def _check_batch_quota_async(user_id: str, count: int) -> dict:
+    quota = dict(await check_user_quota_async(user_id))
+    quota["can_convert"] = quota.get("remaining", 0) >= count
+    return quota
+
+
+def _settle(job_id: str, committed: bool) -> None:
+    try:
+        get_redis().eval(_SETTLE_SCRIPT, 1, _reservation_key(job_id), job_id, "1" if committed else "0")
+    except redis.RedisError as e:
+        print(f"WARNING: Quota ledger unavailable ({e}). Job {job_id} will be reconciled later.")
+
+
+def commit_quota(job_id: str) -> None:
+    """Counts a completed job's reservation as used."""
+    _settle(job_id, committed=True)
+
+
+def release_quota(job_id: Optional[str]) -> None:
+    """Returns a failed or rejected job's reservation to the quota."""
+    if job_id:
+        _settle(job_id, committed=False)
+
+
+def release_quotas(job_ids: list) -> None:
+    """Returns the reservations of jobs that were never created (e.g. a failed batch submit)."""
+    for job_id in job_ids:
+        release_quota(job_id)
+
+
+def reconcile_ledgers() -> int:
+    """
+    Brings this month's ledgers up to the database's counts and plan limits.
+
+    Each ledger is updated by one script, so commits landing while the
+    database is read are kept; "used" only goes down when the month changes.
+
+    Runs in at most one process per QUOTA_RECONCILE_SECONDS.
+
+    Returns:
+        Number of ledgers reconciled
+    """
+    client = get_redis()
+    if not client.set(_RECONCILE_LOCK_KEY, "1", nx=True, ex=max(1, QUOTA_RECONCILE_SECONDS - 1)):
+        return 0
+
+    month = _month()
+    prefix = "quota:ledger:"
+    reconciled = 0
+    for key in client.scan_iter(match=f"{prefix}*:{month}", count=500):
+        ledger_key = key.decode() if isinstance(key, bytes) else key
+        user_id = ledger_key[len(prefix):-(len(month) + 1)]
+        quota = fetch_usage_quota(user_id)
+        if quota is None:
+            continue
+        client.eval(
+            _RECONCILE_SCRIPT, 1, ledger_key, int(quota["used_this_month"]), int(quota["monthly_limit"])
+        )
+        reconciled += 1
+    return reconciled
+
+
+def _reconcile_loop() -> None:
+    while True:
+        time.sleep(QUOTA_RECONCILE_SECONDS)
+        try:
+            reconcile_ledgers()
+        except redis.RedisError as e:
+            print(f"WARNING: Could not reconcile quota ledgers ({e}).")
+
+
+def start_reconciler() -> None:
+    """Starts the periodic ledger reconciliation (once per process)."""
+    global _reconciler_started
+    if _reconciler_started:
+        return
+    _reconciler_started = True
+    threading.Thread(target=_reconcile_loop, name="quota-reconcile", daemon=True).start()
@@ -2,14 +2,17 @@
 Rate Limiter for API Keys
 
 Implements per-API-key rate limiting using Redis.
-Different limits are applied based on the user's plan.
+Different limits are applied based on the user's plan, per minute and per hour.
 Rate limits are fetched from the database (plans table) with caching.
 """
 
-from datetime import datetime
+import math
+import threading
+import time
 from typing import Dict, Optional
 import redis
 
+from .config import RATE_LIMIT_LOCAL_BATCH, RATE_LIMIT_LOCAL_TTL_MS
 from .supabase_client import get_plan_rate_limits
 
 # Fallback rate limits (used when database is unavailable or for tests)
@@ -22,21 +25,142 @@ PLAN_RATE_LIMITS = {
 }
 
 
+# Checks both windows with GCRA (generic cell rate algorithm) and, when both
+# admit it, consumes ARGV[3] tokens (falling back to 1) in one atomic step.
+# Each key holds the window's theoretical arrival time (ms, Redis server clock)
+# and expires as soon as the window is fully replenished.
+# Returns {granted, minute_remaining, minute_reset_ms, hour_remaining, hour_reset_ms}
+_GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local periods = {60000, 3600000}
+local limits = {tonumber(ARGV[1]), tonumber(ARGV[2])}
+local tats = {}
+for i = 1, 2 do
+    local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+    if tat < now then
+        tat = now
+    end
+    tats[i] = tat
+end
+
+local function fits(cost)
+    for i = 1, 2 do
+        if tats[i] + cost * periods[i] / limits[i] - now > periods[i] then
+            return false
+        end
+    end
+    return true
+end
+
+local granted = 0
+local batch = tonumber(ARGV[3])
+if batch > 1 and fits(batch) then
+    granted = batch
+elseif fits(1) then
+    granted = 1
+end
+
+local result = {granted}
+for i = 1, 2 do
+    local interval = periods[i] / limits[i]
+    local tat = tats[i] + granted * interval
+    if granted > 0 then
+        redis.call('SET', KEYS[i], tostring(tat), 'PX', math.ceil(tat - now))
+    end
+    local remaining = math.max(0, math.floor((periods[i] - (tat - now)) / interval))
+    local reset
+    if granted > 0 then
+        reset = tat - now
+    else
+        reset = math.max(0, tat + interval - periods[i] - now)
+    end
+    table.insert(result, remaining)
+    table.insert(result, math.ceil(reset))
+end
+return result
+"""
+
+_WINDOWS = ("minute", "hour")
+
+
 class APIKeyRateLimiter:
     """
     Rate limiter that tracks API usage per API key using Redis.
 
-    Uses a sliding window approach with minute-based keys that auto-expire.
+    Enforces the plan's per-minute and per-hour limits with GCRA in a single
+    EVALSHA round trip. With RATE_LIMIT_LOCAL_BATCH > 1, each process takes
+    tokens from Redis in batches and hands them out locally for up to
+    RATE_LIMIT_LOCAL_TTL_MS, so bursts do not hit Redis on every call (at the
+    cost of up to one batch of unused tokens per process per key).
     """
 
-    def __init__(self, redis_client: redis.Redis):
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        local_batch: int = RATE_LIMIT_LOCAL_BATCH,
+        local_ttl_ms: int = RATE_LIMIT_LOCAL_TTL_MS
+    ):
         """
         Initialize the rate limiter with a Redis client.
 
         Args:
-            redis_client: Redis client instance for storing rate limit counters
+            redis_client: Redis client instance for storing rate limit state
+            local_batch: Tokens taken from Redis per round trip (1 = no local pre-allocation)
+            local_ttl_ms: How long locally held tokens stay usable
         """
         self.redis = redis_client
+        self.local_batch = max(1, local_batch)
+        self.local_ttl_ms = local_ttl_ms
+        self._script = redis_client.register_script(_GCRA_SCRIPT)
+        self._local_tokens: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(api_key_id: str) -> list:
+        return [f"ratelimit:{api_key_id}:{window}" for window in _WINDOWS]
+
+    def _take_local(self, api_key_id: str) -> Optional[Dict]:
+        """Hands out a pre-allocated token, if this process holds one."""
+        with self._lock:
+            entry = self._local_tokens.get(api_key_id)
+            if entry is None:
+                return None
+            tokens, expires_at, result = entry
+            if tokens <= 0 or time.monotonic() > expires_at:
+                del self._local_tokens[api_key_id]
+                return None
+            entry[0] -= 1
+            return result
+
+    @staticmethod
+    def _build_result(granted: int, values: list, limits: Dict[str, int]) -> Dict:
+        windows = {}
+        for i, window in enumerate(_WINDOWS):
+            windows[window] = {
+                "limit": limits[f"per_{window}"],
+                "remaining": int(values[2 * i]),
+                "reset": max(1, math.ceil(int(values[2 * i + 1]) / 1000)),
+            }
+
+        if granted:
+            # Report the window closest to its limit
+            binding = min(windows.values(), key=lambda w: w["remaining"] / w["limit"])
+        else:
+            # Report the window that blocks the longest
+            binding = max(
+                (w for w in windows.values() if w["remaining"] == 0),
+                key=lambda w: w["reset"],
+                default=windows["minute"]
+            )
+
+        return {
+            "allowed": granted > 0,
+            "limit": binding["limit"],
+            "remaining": binding["remaining"],
+            "reset": binding["reset"],
+            "windows": windows,
+        }
 
     def check_rate_limit(self, api_key_id: str, plan: str) -> Dict:
         """
@@ -49,26 +173,25 @@ class APIKeyRateLimiter:
         Returns:
             Dict with:
                 - allowed: bool - whether the request should be allowed
-                - limit: int - the rate limit for this plan
-                - remaining: int - remaining requests in current window
-                - reset: int - seconds until the rate limit resets
+                - limit: int - the limit of the binding window
+                - remaining: int - remaining requests in the binding window
+                - reset: int - seconds until the binding window frees up
+                - windows: dict - limit/remaining/reset for "minute" and "hour"
         """
+        local = self._take_local(api_key_id)
+        if local is not None:
+            return local
+
         # Get limits for the plan from database (with cache)
         limits = get_plan_rate_limits(plan)
 
-        # Create a minute-based key that will auto-expire
-        current_minute = datetime.utcnow().strftime('%Y%m%d%H%M')
-        minute_key = f"ratelimit:{api_key_id}:minute:{current_minute}"
-
-        # Increment the counter
         try:
-            current = self.redis.incr(minute_key)
-
-            # Set expiration on first request (60 seconds)
-            if current == 1:
-                self.redis.expire(minute_key, 60)
+            values = self._script(
+                keys=self._keys(api_key_id),
+                args=[limits["per_minute"], limits["per_hour"], self.local_batch]
+            )
         except redis.RedisError:
-            # If Redis fails, allow the request but log the error
+            # If Redis fails, allow the request
             return {
                 "allowed": True,
                 "limit": limits["per_minute"],
@@ -76,16 +199,18 @@ class APIKeyRateLimiter:
                 "reset": 60
             }
 
-        limit = limits["per_minute"]
-        remaining = max(0, limit - current)
-        reset = 60 - datetime.utcnow().second
+        granted = int(values[0])
+        result = self._build_result(granted, values[1:], limits)
 
-        return {
-            "allowed": current <= limit,
-            "limit": limit,
-            "remaining": remaining,
-            "reset": reset
-        }
+        if granted > 1:
+            with self._lock:
+                self._local_tokens[api_key_id] = [
+                    granted - 1,
+                    time.monotonic() + self.local_ttl_ms / 1000,
+                    result
+                ]
+
+        return result
 
     def get_usage_stats(self, api_key_id: str, plan: str) -> Dict:
         """
@@ -100,17 +225,22 @@ class APIKeyRateLimiter:
         """
         # Get limits for the plan from database (with cache)
         limits = get_plan_rate_limits(plan)
-        current_minute = datetime.utcnow().strftime('%Y%m%d%H%M')
-        minute_key = f"ratelimit:{api_key_id}:minute:{current_minute}"
 
         try:
-            current = self.redis.get(minute_key)
-            current = int(current) if current else 0
+            tats = self.redis.mget(self._keys(api_key_id))
         except redis.RedisError:
-            current = 0
+            tats = [None, None]
+
+        now_ms = time.time() * 1000
+        usage = {}
+        for window, tat, period_ms in zip(_WINDOWS, tats, (60_000, 3_600_000)):
+            limit = limits[f"per_{window}"]
+            backlog_ms = max(0.0, float(tat) - now_ms) if tat else 0.0
+            usage[window] = min(limit, math.ceil(backlog_ms / (period_ms / limit)))
 
         return {
-            "current_minute_usage": current,
+            "current_minute_usage": usage["minute"],
+            "current_hour_usage": usage["hour"],
             "limit_per_minute": limits["per_minute"],
             "limit_per_hour": limits["per_hour"],
             "plan": plan
@@ -127,8 +257,14 @@ def get_rate_limit_headers(rate_result: Dict) -> Dict[str, str]:
     Returns:
         Dict of header name -> value pairs
     """
-    return {
+    headers = {
         "X-RateLimit-Limit": str(rate_result["limit"]),
         "X-RateLimit-Remaining": str(rate_result["remaining"]),
         "X-RateLimit-Reset": str(rate_result["reset"])
     }
+    hour = rate_result.get("windows", {}).get("hour")
+    if hour:
+        headers["X-RateLimit-Limit-Hour"] = str(hour["limit"])
+        headers["X-RateLimit-Remaining-Hour"] = str(hour["remaining"])
+        headers["X-RateLimit-Reset-Hour"] = str(hour["reset"])
+    return headers
@@ -1,8 +1,17 @@
 import redis
+import redis.asyncio
 import json
-from .config import REDIS_URL, PDF_TTL_SECONDS
+from .config import REDIS_URL, PDF_TTL_SECONDS, JOB_INDEX_TTL_SECONDS
 
 _client = None
+_async_client = None
+
+# pdf:{job_id} may hold a reference to a shared blob instead of PDF bytes.
+# PDFs always start with "%PDF", so the prefix cannot collide.
+_PDF_REF_PREFIX = b"@ref:"
+
+# Longest reference value ("@ref:render:" + SHA-256 hex digest, with headroom)
+_PDF_REF_MAX_LENGTH = 256
 
 
 def get_redis():
@@ -13,19 +22,153 @@ def get_redis():
     return _client
 
 
-def store_pdf(job_id: str, pdf_bytes: bytes, ttl: int = PDF_TTL_SECONDS) -> None:
-    """Store PDF bytes in Redis with TTL."""
-    get_redis().setex(f"pdf:{job_id}", ttl, pdf_bytes)
+def get_async_redis():
+    """Get or create the asyncio Redis client singleton (for the API's event loop)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.from_url(REDIS_URL, decode_responses=False)
+    return _async_client
+
+
+async def close_async_redis() -> None:
+    """Close the asyncio Redis client's connection pool."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def store_pdf(job_id: str, pdf_bytes: bytes, ttl: int = PDF_TTL_SECONDS) -> dict:
+    """
+    Store PDF bytes in the PDF storage tiers (see pdf_storage).
+
+    Returns:
+        Storage metadata (tier, size, etag) for the job record
+    """
+    from .pdf_storage import put_blob
+    return put_blob(f"pdf:{job_id}", pdf_bytes, ttl)
+
+
+def store_pdf_ref(job_id: str, blob_key: str, ttl: int = PDF_TTL_SECONDS) -> None:
+    """
+    Point pdf:{job_id} at a shared PDF blob (e.g. a cached render) without copying it.
+
+    Without a cold tier, the Redis copy of the blob is kept at least as long
+    as the reference.
+    """
+    from .pdf_storage import get_cold_store
+
+    pipe = get_redis().pipeline()
+    pipe.setex(f"pdf:{job_id}", ttl, _PDF_REF_PREFIX + blob_key.encode())
+    if get_cold_store() is None:
+        pipe.expire(blob_key, ttl, gt=True)
+    pipe.execute()
 
 
 def get_pdf(job_id: str) -> bytes | None:
-    """Retrieve PDF bytes from Redis."""
-    return get_redis().get(f"pdf:{job_id}")
+    """Retrieve PDF bytes (hot tier first, then cold tier), following blob references."""
+    from .pdf_storage import get_blob, get_cold_store
+
+    data = get_redis().get(f"pdf:{job_id}")
+    if data is None:
+        cold_store = get_cold_store()
+        return cold_store.get(f"pdf:{job_id}") if cold_store is not None else None
+    if data.startswith(_PDF_REF_PREFIX):
+        return get_blob(data[len(_PDF_REF_PREFIX):].decode())
+    return data
+
+
+def open_pdf(job_id: str):
+    """
+    Open a job's PDF for streaming, following blob references.
+
+    Only the first bytes of pdf:{job_id} are read to detect a reference, so
+    the PDF itself is never loaded into memory here.
+
+    Returns:
+        A blob with a size and iter_range() (see pdf_storage.open_blob), or None
+    """
+    from .pdf_storage import open_blob
+
+    name = f"pdf:{job_id}"
+    head = get_redis().getrange(name, 0, _PDF_REF_MAX_LENGTH - 1)
+    if head.startswith(_PDF_REF_PREFIX):
+        name = head[len(_PDF_REF_PREFIX):].decode()
+    return open_blob(name)
+
+
+def job_events_channel(job_id: str) -> str:
+    """Pub/sub channel on which a job's status transitions are published."""
+    return f"job-events:{job_id}"
+
+
+# Job statuses kept in the per-user index (user-jobs:{user_id}:{status})
+JOB_STATUSES = ("pending", "processing", "completed", "failed")
+
+
+def user_jobs_key(user_id: str, status: str | None = None) -> str:
+    """Sorted set of a user's job IDs (all jobs, or one status), scored by creation time in ms."""
+    return f"user-jobs:{user_id}:{status}" if status else f"user-jobs:{user_id}"
+
+
+# Stamps the status JSON (ARGV[1], always a JSON object) with updated_at in
+# milliseconds from the Redis clock, stores it and publishes the transition.
+# A single clock keeps "changed since" cursors exact across API and workers.
+#
+# With a user index (KEYS[2]), the job is also added to user-jobs:{user_id}
+# at its creation time and moved to the sorted set of its new status; entries
+# older than ARGV[5] seconds are trimmed from every set of the index.
+_SET_STATUS_SCRIPT = """
+local t = redis.call('TIME')
+local updated_at = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local data
+if ARGV[1] == '{}' then
+    data = '{"updated_at": ' .. updated_at .. '}'
+else
+    data = string.sub(ARGV[1], 1, -2) .. ', "updated_at": ' .. updated_at .. '}'
+end
+redis.call('SET', KEYS[1], data, 'EX', ARGV[2])
+redis.call('PUBLISH', ARGV[3], data)
+
+if #KEYS > 1 then
+    local job_id, status, window = ARGV[4], ARGV[6], tonumber(ARGV[5])
+    local created = redis.call('ZSCORE', KEYS[2], job_id)
+    if not created then
+        created = updated_at
+        redis.call('ZADD', KEYS[2], created, job_id)
+    end
+    local horizon = '(' .. (updated_at - window * 1000)
+    local index = {KEYS[2]}
+    for i = 7, #ARGV do
+        local key = KEYS[2] .. ':' .. ARGV[i]
+        if ARGV[i] == status then
+            redis.call('ZADD', key, created, job_id)
+        else
+            redis.call('ZREM', key, job_id)
+        end
+        table.insert(index, key)
+    end
+    for _, key in ipairs(index) do
+        redis.call('ZREMRANGEBYSCORE', key, '-inf', horizon)
+        redis.call('EXPIRE', key, window)
+    end
+end
+return data
+"""
 
 
-def set_job_status(job_id: str, status: dict, ttl: int = PDF_TTL_SECONDS) -> None:
-    """Store job status in Redis with TTL."""
-    get_redis().setex(f"job:{job_id}", ttl, json.dumps(status))
+def _status_args(job_id: str, status: dict, ttl: int, user_id: str | None = None) -> tuple:
+    status = {key: value for key, value in status.items() if key != "updated_at"}
+    args = [json.dumps(status), ttl, job_events_channel(job_id)]
+    if not user_id:
+        return (_SET_STATUS_SCRIPT, 1, f"job:{job_id}", *args)
+    args += [job_id, JOB_INDEX_TTL_SECONDS, status.get("status", ""), *JOB_STATUSES]
+    return (_SET_STATUS_SCRIPT, 2, f"job:{job_id}", user_jobs_key(user_id), *args)
+
+
+def set_job_status(job_id: str, status: dict, ttl: int = PDF_TTL_SECONDS, user_id: str | None = None) -> None:
+    """Store job status in Redis with TTL, publish the transition and index the job under its user."""
+    get_redis().eval(*_status_args(job_id, status, ttl, user_id))
 
 
 def get_job_status(job_id: str) -> dict | None:
@@ -34,3 +177,117 @@ def get_job_status(job_id: str) -> dict | None:
     if data is None:
         return None
     return json.loads(data)
+
+
+async def set_job_status_async(job_id: str, status: dict, ttl: int = PDF_TTL_SECONDS, user_id: str | None = None) -> None:
+    """Store job status in Redis with TTL, publish the transition and index the job (without blocking the event loop)."""
+    await get_async_redis().eval(*_status_args(job_id, status, ttl, user_id))
+
+
+async def set_job_statuses_async(job_ids: list, status: dict, ttl: int = PDF_TTL_SECONDS, user_id: str | None = None) -> None:
+    """Store the same status for many jobs in one round trip (see set_job_status)."""
+    client = get_async_redis()
+    script = client.register_script(_SET_STATUS_SCRIPT)
+    pipe = client.pipeline(transaction=False)
+    for job_id in job_ids:
+        _, numkeys, *params = _status_args(job_id, status, ttl, user_id)
+        script(keys=params[:numkeys], args=params[numkeys:], client=pipe)
+    await pipe.execute()
+
+
+async def get_job_status_async(job_id: str) -> dict | None:
+    """Retrieve job status from Redis (without blocking the event loop)."""
+    data = await get_async_redis().get(f"job:{job_id}")
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+async def get_job_statuses_async(job_ids: list) -> tuple:
+    """
+    Retrieve many job statuses in one round trip.
+
+    Args:
+        job_ids: Job IDs to look up
+
+    Returns:
+        (statuses, cursor): statuses in the order of job_ids, None for
+        unknown jobs; cursor is the Redis time in milliseconds at which
+        they were read (every later change has updated_at >= cursor)
+    """
+    pipe = get_async_redis().pipeline(transaction=True)
+    pipe.time()
+    pipe.mget([f"job:{job_id}" for job_id in job_ids])
+    (seconds, microseconds), values = await pipe.execute()
+    cursor = int(seconds) * 1000 + int(microseconds) // 1000
+    return [json.loads(value) if value is not None else None for value in values], cursor
+
+
+def _parse_job_cursor(cursor: str) -> tuple:
+    created, sep, job_id = cursor.partition(":")
+    if not sep or not created.isdigit() or not job_id:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return int(created), job_id
+
+
+async def list_user_jobs_async(
+    user_id: str,
+    status: str | None = None,
+    limit: int = 20,
+    cursor: str | None = None
+) -> tuple:
+    """
+    List a user's jobs, newest first, from the per-user index.
+
+    Args:
+        user_id: Owner of the jobs
+        status: Only jobs currently in this status
+        limit: Page size
+        cursor: next_cursor of the previous page
+
+    Returns:
+        (jobs, next_cursor): (job_id, status dict) pairs and the cursor of
+        the next page (None on the last page)
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    key = user_jobs_key(user_id, status)
+    client = get_async_redis()
+
+    pipe = client.pipeline(transaction=False)
+    if cursor:
+        created, last_id = _parse_job_cursor(cursor)
+        # Jobs created in the same millisecond as the cursor's job, then older ones
+        pipe.zrevrangebyscore(key, created, created, withscores=True)
+        pipe.zrevrangebyscore(key, f"({created}", "-inf", start=0, num=limit + 1, withscores=True)
+        same_ms, older = await pipe.execute()
+        members = [entry for entry in same_ms if entry[0].decode() < last_id] + older
+    else:
+        pipe.zrevrange(key, 0, limit, withscores=True)
+        (members,) = await pipe.execute()
+
+    page = [(member.decode(), int(score)) for member, score in members[:limit]]
+    if not page:
+        return [], None
+    values = await client.mget([f"job:{job_id}" for job_id, _ in page])
+
+    jobs = []
+    expired = []
+    for (job_id, _), value in zip(page, values):
+        if value is None:
+            expired.append(job_id)
+        else:
+            jobs.append((job_id, json.loads(value)))
+    if expired:
+        # Jobs whose status expired before the index window: drop them from the index
+        pipe = client.pipeline(transaction=False)
+        for index_key in [user_jobs_key(user_id)] + [user_jobs_key(user_id, s) for s in JOB_STATUSES]:
+            pipe.zrem(index_key, *expired)
+        await pipe.execute()
+
+    next_cursor = None
+    if len(members) > limit:
+        last_id, last_created = page[-1]
+        next_cursor = f"{last_created}:{last_id}"
+    return jobs, next_cursor
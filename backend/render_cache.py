@@ -0,0 +1,263 @@
+"""
+Content-addressed cache of rendered PDFs with in-flight deduplication.
+
+Integrations often resubmit identical documents (retries, "preview" followed
+by "download", scheduled reports). Each render is keyed by a hash of the
+user, the sanitized HTML, header/footer and normalized options. Keys are
+scoped per user so a cache hit never reveals that another tenant rendered
+the same content:
+
+- If the PDF is already cached, the job completes at submit time and
+  pdf:{job_id} becomes a reference to the cached blob (see redis_client.get_pdf).
+  The blob itself lives in the PDF storage tiers (see pdf_storage).
+- If an identical render is queued or in progress, the job is registered as a
+  follower and completed by the leader's task when it finishes (singleflight)
+- Otherwise the job becomes the leader and is queued as usual
+
+The leader's claim lasts RENDER_QUEUE_TTL while its task waits in the queue
+and is cut to RENDER_LOCK_TTL once it starts rendering (start_render). Each
+follower keeps its own payload and a watchdog task (see
+tasks.watch_render_follower) that takes over the render if the claim
+disappears without a result, e.g. when the leader was killed.
+
+Renders are deterministic (no timestamps, content-derived PDF identifiers),
+so identical inputs produce identical bytes and stable ETags.
+"""
+
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+import redis
+
+from .config import RENDER_CACHE_TTL, RENDER_LOCK_TTL, RENDER_QUEUE_TTL
+from .redis_client import get_redis
+from .tailwind_compiler import TAILWIND_INDEX_VERSION
+
+# Bump when a renderer change alters the output for the same input
+RENDER_CACHE_VERSION = "1"
+
+# Claims the render for job ARGV[1] unless it is cached or in flight.
+# Returns {'hit', storage metadata} | {'leader'} | {'follower'}
+_CLAIM_SCRIPT = """
+local meta = redis.call('GET', KEYS[1])
+if meta then
+    return {'hit', meta}
+end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'EX', ARGV[3]) then
+    return {'leader'}
+end
+redis.call('RPUSH', KEYS[3], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return {'follower'}
+"""
+
+# Refreshes leader ARGV[1]'s claim when its render starts.
+# Returns 0 if the claim expired or was taken over.
+_START_SCRIPT = """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return 1
+"""
+
+# Checks on a waiting follower: takes over the claim for job ARGV[1] if it
+# disappeared without a result.
+# Returns {'hit', storage metadata} | {'waiting'} | {'leader'}
+_WATCH_SCRIPT = """
+local meta = redis.call('GET', KEYS[1])
+if meta then
+    return {'hit', meta}
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return {'waiting'}
+end
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+return {'leader'}
+"""
+
+# Publishes the storage metadata of the cached PDF (when given), releases
+# leader ARGV[3]'s lock and returns the followers. A failed leader whose claim
+# was taken over leaves the followers to the new leader.
+_FINISH_SCRIPT = """
+local owner = redis.call('GET', KEYS[2])
+local owned = (not owner) or owner == ARGV[3]
+if ARGV[1] == '' and not owned then
+    return {}
+end
+if ARGV[1] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+local followers = redis.call('LRANGE', KEYS[3], 0, -1)
+redis.call('DEL', KEYS[3])
+if owned then
+    redis.call('DEL', KEYS[2])
+end
+return followers
+"""
+
+
+def _normalize_pages(pages: Optional[str]) -> List[int]:
+    if not pages:
+        return []
+    return sorted({int(p.strip()) for p in pages.split(',') if p.strip()})
+
+
+def _normalize_options(options: dict) -> dict:
+    """Normalizes render options so equivalent requests share a cache key."""
+    normalized = {}
+    for name, value in options.items():
+        if name in ("exclude_header_pages", "exclude_footer_pages"):
+            value = _normalize_pages(value)
+        elif isinstance(value, str):
+            value = value.strip()
+            if name in ("orientation", "header_footer_mode", "page_size"):
+                value = value.lower()
+        normalized[name] = value
+    return normalized
+
+
+def compute_render_key(html: str, options: dict, user_id: Optional[str] = None) -> str:
+    """
+    Computes the content address of a render.
+
+    Args:
+        html: Sanitized HTML content
+        options: Render options (including sanitized header_html/footer_html)
+        user_id: Owner of the job; renders are only shared within one user
+
+    Returns:
+        Hex SHA-256 digest identifying the rendered PDF
+    """
+    payload = json.dumps(
+        {
+            "version": RENDER_CACHE_VERSION,
+            "tailwind": TAILWIND_INDEX_VERSION,
+            "user_id": user_id,
+            "html": html,
+            "options": _normalize_options(options),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_blob_key(render_key: str) -> str:
+    """Storage blob name of the cached PDF for a render key (see pdf_storage)."""
+    return f"render:{render_key}"
+
+
+def _keys(render_key: str) -> List[str]:
+    return [
+        f"render:meta:{render_key}",
+        f"render:lock:{render_key}",
+        f"render:followers:{render_key}",
+    ]
+
+
+def claim_render(render_key: str, job_id: str, user_id: Optional[str] = None) -> Tuple[str, Optional[dict]]:
+    """
+    Decides how a new job is served.
+
+    Args:
+        render_key: Key from compute_render_key
+        job_id: The new job
+        user_id: Owner of the job (for webhook notifications when coalesced)
+
+    Returns:
+        Tuple of (outcome, storage) where outcome is "hit" (storage is the
+        cached PDF's storage metadata), "follower" (an identical render is in
+        flight) or "leader" (the job must be rendered). Redis errors fall back
+        to "leader".
+    """
+    follower = json.dumps({"job_id": job_id, "user_id": user_id})
+    try:
+        result = get_redis().eval(
+            _CLAIM_SCRIPT, 3, *_keys(render_key), job_id, follower, RENDER_QUEUE_TTL
+        )
+    except redis.RedisError as e:
+        print(f"WARNING: Render cache unavailable ({e}). Rendering without deduplication.")
+        return "leader", None
+
+    return _claim_result(result)
+
+
+def _claim_result(result: list) -> Tuple[str, Optional[dict]]:
+    outcome = result[0].decode() if isinstance(result[0], bytes) else result[0]
+    storage = json.loads(result[1]) if len(result) > 1 else None
+    return outcome, storage
+
+
+def start_render(render_key: str, job_id: str, ttl: int = RENDER_LOCK_TTL) -> bool:
+    """
+    Refreshes the leader's claim when its render starts.
+
+    The claim taken at submit time covers the queue wait (RENDER_QUEUE_TTL);
+    from here it only needs to outlive the render itself.
+
+    Args:
+        render_key: Key from compute_render_key
+        job_id: The leader job
+        ttl: Seconds the claim is held from now
+
+    Returns:
+        False if the claim expired or was taken over by a follower (the
+        render still runs; its result completes whoever is waiting)
+    """
+    try:
+        return bool(get_redis().eval(_START_SCRIPT, 3, *_keys(render_key), job_id, ttl, RENDER_QUEUE_TTL))
+    except redis.RedisError as e:
+        print(f"WARNING: Render cache unavailable ({e}). Could not refresh the claim on {render_key}.")
+        return False
+
+
+def watch_render(render_key: str, job_id: str) -> Tuple[str, Optional[dict]]:
+    """
+    Checks on the render a follower job is waiting for.
+
+    Args:
+        render_key: Key from compute_render_key
+        job_id: The waiting follower job
+
+    Returns:
+        Tuple of (outcome, storage) where outcome is "hit" (the PDF is
+        cached), "waiting" (the leader still holds its claim) or "leader"
+        (the claim disappeared without a result and the follower took it
+        over). Redis errors return "waiting".
+    """
+    try:
+        result = get_redis().eval(_WATCH_SCRIPT, 3, *_keys(render_key), job_id, RENDER_QUEUE_TTL)
+    except redis.RedisError as e:
+        print(f"WARNING: Render cache unavailable ({e}). Job {job_id} keeps waiting.")
+        return "waiting", None
+    return _claim_result(result)
+
+
+def finish_render(render_key: str, storage: Optional[dict], leader: Optional[str] = None) -> Optional[List[dict]]:
+    """
+    Publishes the leader's result and returns the jobs that coalesced onto it.
+
+    Args:
+        render_key: Key from compute_render_key
+        storage: Storage metadata of the PDF stored under render_blob_key(),
+            or None if the render failed
+        leader: The leader job; its lock is only released while it still
+            holds the claim
+
+    Returns:
+        List of {"job_id", "user_id"} dicts for the follower jobs, or None if
+        Redis is unavailable
+    """
+    try:
+        followers = get_redis().eval(
+            _FINISH_SCRIPT, 3, *_keys(render_key),
+            json.dumps(storage) if storage else "", RENDER_CACHE_TTL, leader or ""
+        )
+    except redis.RedisError as e:
+        print(f"WARNING: Render cache unavailable ({e}). Followers of {render_key} were not completed.")
+        return None
+    return [json.loads(follower) for follower in followers]
@@ -0,0 +1,619 @@
+"""
+Shared cache for external resources fetched during PDF rendering.
+
+WeasyPrint fetches every <img>, <link> stylesheet and @font-face URL from
+scratch on each render. Customers reuse the same logos and fonts across
+thousands of jobs, so fetched resources are cached in two tiers:
+
+1. An in-process LRU bounded by total bytes (RESOURCE_CACHE_MEMORY_BYTES)
+2. An on-disk content store shared by all Celery workers on a node
+   (RESOURCE_CACHE_DIR, bounded by RESOURCE_CACHE_DISK_BYTES)
+
+Freshness follows the HTTP cache headers (Cache-Control, Expires, Age) and
+stale entries are revalidated with ETag/Last-Modified when available.
+
+Each document gets its own ResourceFetcher, which enforces a per-resource
+timeout and a per-document fetch budget so a slow asset host cannot pin a
+worker for the whole task_time_limit, and records per-job fetch statistics.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+from .config import (
+    RESOURCE_CACHE_DIR,
+    RESOURCE_CACHE_MEMORY_BYTES,
+    RESOURCE_CACHE_DISK_BYTES,
+    RESOURCE_CACHE_DEFAULT_TTL,
+    RESOURCE_FETCH_TIMEOUT,
+    RESOURCE_FETCH_BUDGET,
+    RESOURCE_MAX_BYTES,
+)
+
+try:
+    from weasyprint.urls import URLFetcher, URLFetcherResponse
+except OSError:
+    URLFetcher = None
+    URLFetcherResponse = None
+except ImportError:
+    # Older WeasyPrint releases lack the URLFetcher classes (see the pin in requirements.txt)
+    URLFetcher = None
+    URLFetcherResponse = None
+    print("WARNING: WeasyPrint >= 70.0 is required for the resource cache. PDF generation will fail until it is upgraded.")
+
+# Heuristic freshness (10% of the time since Last-Modified) is capped at one day
+HEURISTIC_TTL_CAP = 86400
+
+# Run disk eviction after this many writes from a process
+_DISK_EVICTION_INTERVAL = 32
+
+# Headers sent with every resource fetch (sync and prefetch clients)
+RESOURCE_FETCH_HEADERS = {"User-Agent": "PDFLeaf-Renderer/1.0"}
+
+
+class ResourceFetchError(Exception):
+    """Raised when a resource cannot be fetched (error, timeout or budget exhausted)."""
+
+
+class CachedResource:
+    """A fetched resource with the metadata needed to decide its freshness."""
+
+    def __init__(
+        self,
+        url: str,
+        body: bytes,
+        content_type: Optional[str] = None,
+        expires_at: float = 0,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ):
+        self.url = url
+        self.body = body
+        self.content_type = content_type
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+    def can_revalidate(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def to_meta(self) -> dict:
+        return {
+            "url": self.url,
+            "content_type": self.content_type,
+            "expires_at": self.expires_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_meta(cls, meta: dict, body: bytes) -> "CachedResource":
+        return cls(
+            url=meta["url"],
+            body=body,
+            content_type=meta.get("content_type"),
+            expires_at=meta.get("expires_at", 0),
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+        )
+
+
+def _parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parses a Cache-Control header into {directive: value}."""
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers, now: Optional[float] = None) -> Optional[float]:
+    """
+    Computes how long a response may be served from cache.
+
+    Args:
+        headers: Response headers (case-insensitive mapping)
+        now: Current time (defaults to time.time())
+
+    Returns:
+        Seconds of freshness remaining, or None if the response must not be stored
+    """
+    now = now or time.time()
+    directives = _parse_cache_control(headers.get("cache-control"))
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+
+    try:
+        age = max(0.0, float(headers.get("age", 0)))
+    except ValueError:
+        age = 0.0
+
+    for directive in ("s-maxage", "max-age"):
+        if directives.get(directive) is not None:
+            try:
+                return max(0.0, float(directives[directive]) - age)
+            except ValueError:
+                return 0
+
+    date = _parse_http_date(headers.get("date")) or now
+    expires = _parse_http_date(headers.get("expires"))
+    if headers.get("expires") is not None:
+        # An invalid Expires value means "already expired"
+        return max(0.0, expires - date) if expires else 0
+
+    last_modified = _parse_http_date(headers.get("last-modified"))
+    if last_modified and last_modified < date:
+        return min(HEURISTIC_TTL_CAP, (date - last_modified) * 0.1)
+
+    return RESOURCE_CACHE_DEFAULT_TTL
+
+
+class ResourceCache:
+    """
+    Two-tier resource cache: in-process LRU plus a shared on-disk store.
+
+    Disk entries are content files named by the SHA-256 of the URL, with a JSON
+    metadata sidecar. Writes are atomic (temp file + rename) so concurrent
+    workers never observe partial entries. Eviction removes the least recently
+    used files (by mtime) once the store exceeds its size limit.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = RESOURCE_CACHE_DIR,
+        memory_bytes: int = RESOURCE_CACHE_MEMORY_BYTES,
+        disk_bytes: int = RESOURCE_CACHE_DISK_BYTES
+    ):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, CachedResource]" = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                print(f"WARNING: Resource cache directory unavailable ({e}). Using memory tier only.")
+                self.directory = None
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return (
+            os.path.join(self.directory, f"{key}.body"),
+            os.path.join(self.directory, f"{key}.json"),
+        )
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[CachedResource]:
+        with self._lock:
+            resource = self._memory.get(key)
+            if resource is not None:
+                self._memory.move_to_end(key)
+            return resource
+
+    def _memory_put(self, key: str, resource: CachedResource) -> None:
+        # Very large resources would flush the whole tier; keep them on disk only
+        if resource.size > self.memory_bytes // 8:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= previous.size
+            self._memory[key] = resource
+            self._memory_size += resource.size
+            while self._memory_size > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= evicted.size
+
+    # ---------- disk tier ----------
+
+    def _disk_get(self, key: str) -> Optional[CachedResource]:
+        if not self.directory:
+            return None
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+            if len(body) != meta.get("size"):
+                return None
+            # Touch for LRU eviction
+            os.utime(body_path)
+            return CachedResource.from_meta(meta, body)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _disk_put(self, key: str, resource: CachedResource) -> None:
+        if not self.directory:
+            return
+        body_path, meta_path = self._paths(key)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(body_path + suffix, "wb") as f:
+                f.write(resource.body)
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump(resource.to_meta(), f)
+            # Body first: readers check the size recorded in the metadata
+            os.replace(body_path + suffix, body_path)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            print(f"WARNING: Could not write resource cache entry: {e}")
+            return
+
+        self._writes_since_eviction += 1
+        if self._writes_since_eviction >= _DISK_EVICTION_INTERVAL:
+            self._writes_since_eviction = 0
+            self.evict_disk()
+
+    def evict_disk(self) -> int:
+        """
+        Removes least recently used disk entries until the store fits its limit.
+
+        Returns:
+            Number of entries removed
+        """
+        if not self.directory:
+            return 0
+        entries = []
+        total = 0
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".body"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.name[:-5]))
+                    total += stat.st_size
+        except OSError:
+            return 0
+
+        removed = 0
+        entries.sort()
+        for _, size, key in entries:
+            if total <= self.disk_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+    # ---------- public API ----------
+
+    def get(self, url: str):
+        """
+        Looks up a URL in both tiers.
+
+        Returns:
+            Tuple of (CachedResource or None, tier name: "memory", "disk" or None)
+        """
+        key = self._key(url)
+        resource = self._memory_get(key)
+        if resource is not None:
+            return resource, "memory"
+        resource = self._disk_get(key)
+        if resource is not None:
+            self._memory_put(key, resource)
+            return resource, "disk"
+        return None, None
+
+    def put(self, resource: CachedResource, url: Optional[str] = None) -> None:
+        """Stores a resource in both tiers under url (defaults to resource.url)."""
+        key = self._key(url or resource.url)
+        self._memory_put(key, resource)
+        self._disk_put(key, resource)
+
+    def clear(self) -> None:
+        """Empties both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.directory:
+            for entry in os.scandir(self.directory):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+_resource_cache: Optional[ResourceCache] = None
+_http_client: Optional[httpx.Client] = None
+
+
+def get_resource_cache() -> ResourceCache:
+    """Get or create the process-wide resource cache singleton."""
+    global _resource_cache
+    if _resource_cache is None:
+        _resource_cache = ResourceCache()
+    return _resource_cache
+
+
+def get_http_client() -> httpx.Client:
+    """Get or create the pooled HTTP client used for resource fetches."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            follow_redirects=True,
+            headers=RESOURCE_FETCH_HEADERS,
+        )
+    return _http_client
+
+
+class ResourceFetcher:
+    """
+    Per-document resource fetcher backed by the shared ResourceCache.
+
+    Enforces a timeout per resource and a total fetch budget per document,
+    and records statistics for the job (see stats()). Resources fetched ahead
+    of layout (see resource_prefetch) are kept per document, so they are
+    served even when their cache headers forbid storing them.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[ResourceCache] = None,
+        timeout: float = RESOURCE_FETCH_TIMEOUT,
+        budget: float = RESOURCE_FETCH_BUDGET,
+        client: Optional[httpx.Client] = None,
+        max_bytes: int = RESOURCE_MAX_BYTES
+    ):
+        self.cache = cache if cache is not None else get_resource_cache()
+        self.timeout = timeout
+        self.budget = budget
+        self.client = client
+        self.max_bytes = max_bytes
+        self._spent = 0.0
+        self._prefetched: Dict[str, CachedResource] = {}
+        self._stats = {
+            "requests": 0,
+            "prefetch_hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "revalidated": 0,
+            "network_fetches": 0,
+            "errors": 0,
+            "budget_exhausted": 0,
+            "bytes_fetched": 0,
+            "bytes_saved": 0,
+        }
+
+    def stats(self) -> dict:
+        """Returns per-document fetch statistics, including total fetch time in ms."""
+        return {**self._stats, "fetch_time_ms": int(self._spent * 1000)}
+
+    def remaining_budget(self) -> float:
+        """Seconds of fetching left for this document."""
+        return self.budget - self._spent
+
+    def charge(self, seconds: float) -> None:
+        """Counts time spent fetching outside fetch() (e.g. a concurrent prefetch) against the budget."""
+        self._spent += seconds
+
+    def add_prefetched(self, url: str, resource: CachedResource) -> None:
+        """Registers a resource fetched ahead of layout for this document."""
+        self._prefetched[url] = resource
+
+    def _lookup(self, url: str):
+        """
+        Resolves a URL without touching the network.
+
+        Returns:
+            Tuple of (resource to serve or None, cached entry to revalidate or None)
+        """
+        prefetched = self._prefetched.get(url)
+        if prefetched is not None:
+            self._stats["prefetch_hits"] += 1
+            return prefetched, None
+
+        cached, tier = self.cache.get(url)
+        if cached is not None and cached.is_fresh():
+            self._stats[f"{tier}_hits"] += 1
+            self._stats["bytes_saved"] += cached.size
+            return cached, None
+
+        if self.remaining_budget() <= 0:
+            self._stats["budget_exhausted"] += 1
+            if cached is not None:
+                # Stale content beats no content once the budget is gone
+                self._stats["bytes_saved"] += cached.size
+                return cached, None
+            raise ResourceFetchError(f"Fetch budget exhausted, skipping {url}")
+
+        return None, cached
+
+    @staticmethod
+    def _conditional_headers(cached: Optional[CachedResource]) -> Dict[str, str]:
+        headers = {}
+        if cached is not None and cached.can_revalidate():
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def _check_response(self, url: str, status_code: int, cached: Optional[CachedResource], headers) -> Optional[CachedResource]:
+        """Handles 304 revalidation and HTTP errors before the body is read."""
+        if status_code == 304 and cached is not None:
+            # Other threads may be serving the cached entry, so swap in a copy
+            lifetime = freshness_lifetime(headers)
+            revalidated = CachedResource.from_meta(
+                {**cached.to_meta(), "expires_at": time.time() + (lifetime or 0)},
+                cached.body
+            )
+            self.cache.put(revalidated, url)
+            self._stats["revalidated"] += 1
+            self._stats["bytes_saved"] += revalidated.size
+            return revalidated
+        if status_code >= 400:
+            raise ResourceFetchError(f"HTTP {status_code} fetching {url}")
+        return None
+
+    def _check_chunk(self, url: str, received: int, deadline: float) -> None:
+        if received > self.max_bytes:
+            raise ResourceFetchError(f"Resource exceeds {self.max_bytes} bytes: {url}")
+        if time.monotonic() > deadline:
+            raise ResourceFetchError(f"Timeout fetching {url}")
+
+    def _store_response(self, url: str, final_url: str, headers, body: bytes) -> CachedResource:
+        self._stats["network_fetches"] += 1
+        self._stats["bytes_fetched"] += len(body)
+
+        resource = CachedResource(
+            url=final_url,
+            body=body,
+            content_type=headers.get("content-type"),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+        )
+        lifetime = freshness_lifetime(headers)
+        if lifetime is not None:
+            resource.expires_at = time.time() + lifetime
+            self.cache.put(resource, url)
+        return resource
+
+    def fetch(self, url: str) -> CachedResource:
+        """
+        Returns the resource for url, from cache when fresh.
+
+        Raises:
+            ResourceFetchError: on HTTP errors, timeouts or when the
+                per-document fetch budget is exhausted
+        """
+        self._stats["requests"] += 1
+        resource, cached = self._lookup(url)
+        if resource is not None:
+            return resource
+
+        timeout = min(self.timeout, self.remaining_budget())
+        started = time.monotonic()
+        try:
+            return self._fetch_network(url, cached, timeout)
+        finally:
+            self._spent += time.monotonic() - started
+
+    def _fetch_network(self, url: str, cached: Optional[CachedResource], timeout: float) -> CachedResource:
+        client = self.client or get_http_client()
+        deadline = time.monotonic() + timeout
+        try:
+            with client.stream("GET", url, headers=self._conditional_headers(cached), timeout=timeout) as response:
+                revalidated = self._check_response(url, response.status_code, cached, response.headers)
+                if revalidated is not None:
+                    return revalidated
+
+                chunks = []
+                received = 0
+                for chunk in response.iter_bytes():
+                    received += len(chunk)
+                    self._check_chunk(url, received, deadline)
+                    chunks.append(chunk)
+                return self._store_response(url, str(response.url), response.headers, b"".join(chunks))
+        except httpx.HTTPError as e:
+            self._stats["errors"] += 1
+            raise ResourceFetchError(f"{type(e).__name__} fetching {url}: {e}") from e
+        except ResourceFetchError:
+            self._stats["errors"] += 1
+            raise
+
+    async def fetch_async(self, url: str, client: httpx.AsyncClient, timeout: float) -> CachedResource:
+        """
+        Async variant of fetch() used by the concurrent prefetch stage.
+
+        Time is not charged here; the caller charges the prefetch wall time.
+        Cache lookups and writes touch the disk tier, so they run in the
+        loop's default executor instead of blocking other fetches.
+        """
+        loop = asyncio.get_running_loop()
+        self._stats["requests"] += 1
+        resource, cached = await loop.run_in_executor(None, self._lookup, url)
+        if resource is not None:
+            return resource
+
+        deadline = time.monotonic() + timeout
+        try:
+            async with client.stream("GET", url, headers=self._conditional_headers(cached), timeout=timeout) as response:
+                revalidated = await loop.run_in_executor(
+                    None, self._check_response, url, response.status_code, cached, response.headers
+                )
+                if revalidated is not None:
+                    return revalidated
+
+                chunks = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    self._check_chunk(url, received, deadline)
+                    chunks.append(chunk)
+                return await loop.run_in_executor(
+                    None, self._store_response, url, str(response.url), response.headers, b"".join(chunks)
+                )
+        except httpx.HTTPError as e:
+            self._stats["errors"] += 1
+            raise ResourceFetchError(f"{type(e).__name__} fetching {url}: {e}") from e
+        except ResourceFetchError:
+            self._stats["errors"] += 1
+            raise
+
+
+if URLFetcher is not None:
+    class CachingURLFetcher(URLFetcher):
+        """
+        WeasyPrint URL fetcher that serves http(s) resources through a ResourceFetcher.
+
+        Other schemes (data:, file:) use WeasyPrint's default handling.
+        """
+
+        def __init__(self, resource_fetcher: ResourceFetcher, **kwargs):
+            super().__init__(timeout=resource_fetcher.timeout, **kwargs)
+            self.resource_fetcher = resource_fetcher
+
+        def fetch(self, url, headers=None):
+            if not url.lower().startswith(("http://", "https://")):
+                return super().fetch(url, headers)
+            resource = self.resource_fetcher.fetch(url)
+            response_headers = {}
+            if resource.content_type:
+                response_headers["Content-Type"] = resource.content_type
+            return URLFetcherResponse(resource.url, resource.body, response_headers)
+else:
+    CachingURLFetcher = None
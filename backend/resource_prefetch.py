@@ -0,0 +1,238 @@
+"""
+Concurrent prefetch of external resources before layout.
+
+WeasyPrint fetches resources one at a time while laying out the document, so a
+document with 40 remote images pays 40 sequential round-trips. This stage parses
+the HTML once, collects every <img src>, stylesheet <link href> and CSS url()
+/ @import, and fetches them concurrently (bounded by RESOURCE_PREFETCH_CONCURRENCY)
+through the document's ResourceFetcher. The results are registered on the fetcher,
+so WeasyPrint's url_fetcher serves them without touching the network.
+
+Stylesheets are scanned for nested url()s (fonts, background images), which are
+fetched in a second wave.
+
+Prefetches run on one long-lived event loop per worker process, with a
+single httpx.AsyncClient, so connections to asset hosts are pooled across
+documents.
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Iterable, List, Set
+from urllib.parse import urljoin
+
+import httpx
+
+from .config import RESOURCE_PREFETCH_CONCURRENCY
+from .resource_cache import ResourceFetcher, ResourceFetchError, RESOURCE_FETCH_HEADERS
+
+_CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)""", re.IGNORECASE)
+_CSS_IMPORT_RE = re.compile(r"""@import\s+(['"])(.*?)\1""", re.IGNORECASE)
+
+
+def _is_remote(url: str) -> bool:
+    return url.lower().startswith(("http://", "https://"))
+
+
+def collect_css_urls(css: str, base_url: str | None = None) -> List[str]:
+    """
+    Collects url() and @import targets from a stylesheet.
+
+    Args:
+        css: Stylesheet source
+        base_url: URL the stylesheet was loaded from (relative URLs are resolved against it)
+
+    Returns:
+        Remote URLs in document order, without duplicates
+    """
+    urls = []
+    for match in list(_CSS_IMPORT_RE.finditer(css)) + list(_CSS_URL_RE.finditer(css)):
+        url = match.group(2).strip()
+        if base_url:
+            url = urljoin(base_url, url)
+        if _is_remote(url) and url not in urls:
+            urls.append(url)
+    return urls
+
+
+class _ResourceCollector(HTMLParser):
+    """Collects remote resource URLs from an HTML document."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.urls: List[str] = []
+        self._in_style = False
+
+    def _add(self, url: str | None) -> None:
+        if url:
+            url = url.strip()
+            if _is_remote(url) and url not in self.urls:
+                self.urls.append(url)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "img":
+            self._add(attrs.get("src"))
+        elif tag == "link" and "stylesheet" in (attrs.get("rel") or "").lower().split():
+            self._add(attrs.get("href"))
+        elif tag == "style":
+            self._in_style = True
+
+        if attrs.get("style"):
+            for url in collect_css_urls(attrs["style"]):
+                self._add(url)
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            for url in collect_css_urls(data):
+                self._add(url)
+
+
+def collect_resource_urls(html: str) -> List[str]:
+    """
+    Collects remote resource URLs referenced by an HTML document.
+
+    Args:
+        html: Full HTML document (after sanitization and wrapping)
+
+    Returns:
+        Absolute http(s) URLs of images, stylesheets and CSS url() targets
+    """
+    collector = _ResourceCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.urls
+
+
+def _is_stylesheet(url: str, content_type: str | None) -> bool:
+    if content_type:
+        return "text/css" in content_type.lower()
+    return url.lower().split("?", 1)[0].endswith(".css")
+
+
+_prefetch_loop: asyncio.AbstractEventLoop | None = None
+_prefetch_loop_pid: int | None = None
+_prefetch_loop_lock = threading.Lock()
+_async_http_client: httpx.AsyncClient | None = None
+
+
+def get_prefetch_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get or create the event loop that runs prefetches in this process.
+
+    The loop runs forever in a daemon thread. It is recreated after a fork,
+    since the thread does not survive into the child (Celery prefork).
+    """
+    global _prefetch_loop, _prefetch_loop_pid, _async_http_client
+    if _prefetch_loop is None or _prefetch_loop_pid != os.getpid():
+        with _prefetch_loop_lock:
+            if _prefetch_loop is None or _prefetch_loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="resource-prefetch", daemon=True).start()
+                _async_http_client = None
+                _prefetch_loop = loop
+                _prefetch_loop_pid = os.getpid()
+    return _prefetch_loop
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Get or create the pooled async client used by prefetches.
+
+    Only called on the prefetch loop, which owns the client's connections.
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(follow_redirects=True, headers=RESOURCE_FETCH_HEADERS)
+    return _async_http_client
+
+
+async def _prefetch(
+    fetcher: ResourceFetcher,
+    urls: Iterable[str],
+    concurrency: int,
+    client: httpx.AsyncClient | None,
+    stats: dict
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    seen: Set[str] = set()
+    if client is None:
+        client = get_async_http_client()
+
+    async def fetch_one(url: str) -> List[str]:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                resource = await fetcher.fetch_async(url, client, fetcher.timeout)
+            except ResourceFetchError as e:
+                stats["errors"] += 1
+                print(f"WARNING: Prefetch failed: {e}")
+                return []
+            finally:
+                stats["sum_fetch_time_ms"] += int((time.monotonic() - started) * 1000)
+
+        fetcher.add_prefetched(url, resource)
+        stats["fetched"] += 1
+        if _is_stylesheet(url, resource.content_type):
+            return collect_css_urls(resource.body.decode("utf-8", errors="replace"), resource.url)
+        return []
+
+    wave = list(urls)
+    while wave:
+        wave = [url for url in wave if url not in seen]
+        seen.update(wave)
+        stats["urls"] += len(wave)
+        results = await asyncio.gather(*(fetch_one(url) for url in wave))
+        wave = [url for nested in results for url in nested]
+
+
+def prefetch_resources(
+    fetcher: ResourceFetcher,
+    urls: Iterable[str],
+    concurrency: int = RESOURCE_PREFETCH_CONCURRENCY,
+    client: httpx.AsyncClient | None = None
+) -> dict:
+    """
+    Fetches resources concurrently and registers them on the fetcher.
+
+    The prefetch wall time is charged against the fetcher's per-document budget,
+    and the whole stage is cut off when the remaining budget runs out. URLs that
+    were not prefetched are fetched by WeasyPrint as usual.
+
+    Args:
+        fetcher: Per-document ResourceFetcher used by the url_fetcher
+        urls: Remote URLs to fetch
+        concurrency: Maximum parallel fetches
+        client: Optional httpx.AsyncClient (the process-wide pooled client otherwise)
+
+    Returns:
+        Stats dict: urls, fetched, errors, wall_time_ms and sum_fetch_time_ms
+    """
+    stats = {"urls": 0, "fetched": 0, "errors": 0, "wall_time_ms": 0, "sum_fetch_time_ms": 0}
+    budget = fetcher.remaining_budget()
+    if budget <= 0:
+        return stats
+
+    async def bounded():
+        try:
+            await asyncio.wait_for(_prefetch(fetcher, urls, concurrency, client, stats), timeout=budget)
+        except asyncio.TimeoutError:
+            print("WARNING: Resource prefetch hit the fetch budget; remaining resources load during layout.")
+
+    started = time.monotonic()
+    try:
+        # Also safe from inside an event loop (sync mode): the prefetch loop is its own thread
+        asyncio.run_coroutine_threadsafe(bounded(), get_prefetch_loop()).result()
+    finally:
+        elapsed = time.monotonic() - started
+        fetcher.charge(elapsed)
+        stats["wall_time_ms"] = int(elapsed * 1000)
+    return stats
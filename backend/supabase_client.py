@@ -6,6 +6,8 @@ import os
 import hashlib
 from typing import Optional, Dict
 import time
+from datetime import datetime, timezone
+import httpx
 from supabase import create_client, Client
 
 
@@ -36,6 +38,79 @@ def get_supabase() -> Client:
     return _supabase
 
 
+# Pooled async HTTP client for PostgREST, used by the API's request handlers
+# (the supabase client is synchronous and would block the event loop)
+_async_http: Optional[httpx.AsyncClient] = None
+
+
+def get_async_http() -> httpx.AsyncClient:
+    """Get or create the pooled async PostgREST client."""
+    global _async_http
+
+    if _async_http is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_KEY")
+
+        if not url or not key:
+            raise ValueError(
+                "Missing SUPABASE_URL or SUPABASE_SERVICE_KEY environment variables"
+            )
+
+        _async_http = httpx.AsyncClient(
+            base_url=url.rstrip("/"),
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+
+    return _async_http
+
+
+async def close_async_http() -> None:
+    """Close the pooled async PostgREST client."""
+    global _async_http
+    if _async_http is not None:
+        await _async_http.aclose()
+        _async_http = None
+
+
+async def _rpc_async(function: str, params: dict):
+    """Call a Postgres function through PostgREST and return the decoded JSON."""
+    response = await get_async_http().post(f"/rest/v1/rpc/{function}", json=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def _conversion_row(
+    job_id: str,
+    user_id: Optional[str],
+    api_key_id: Optional[str],
+    action: str,
+    html_size: Optional[int],
+    status: str,
+    source: str,
+    ip_address: Optional[str]
+) -> dict:
+    """Build the conversions row inserted by track_conversion/track_conversion_async."""
+    data = {
+        "job_id": job_id,
+        "action": action,
+        "status": status,
+        "source": source,
+    }
+
+    if user_id:
+        data["user_id"] = user_id
+    if api_key_id:
+        data["api_key_id"] = api_key_id
+    if html_size:
+        data["html_size"] = html_size
+    if ip_address:
+        data["ip_address"] = ip_address
+
+    return data
+
+
 def track_conversion(
     job_id: str,
     user_id: Optional[str] = None,
@@ -54,22 +129,7 @@ def track_conversion(
     try:
         supabase = get_supabase()
 
-        data = {
-            "job_id": job_id,
-            "action": action,
-            "status": status,
-            "source": source,
-        }
-
-        if user_id:
-            data["user_id"] = user_id
-        if api_key_id:
-            data["api_key_id"] = api_key_id
-        if html_size:
-            data["html_size"] = html_size
-        if ip_address:
-            data["ip_address"] = ip_address
-
+        data = _conversion_row(job_id, user_id, api_key_id, action, html_size, status, source, ip_address)
         result = supabase.table("conversions").insert(data).execute()
 
         if result.data and len(result.data) > 0:
@@ -82,6 +142,41 @@ def track_conversion(
         return None
 
 
+async def track_conversion_async(
+    job_id: str,
+    user_id: Optional[str] = None,
+    api_key_id: Optional[str] = None,
+    action: str = "download",
+    html_size: Optional[int] = None,
+    status: str = "pending",
+    source: str = "web",
+    ip_address: Optional[str] = None
+) -> Optional[str]:
+    """
+    Track a PDF conversion in the database (async, pooled HTTP).
+
+    Returns the conversion ID if successful, None otherwise.
+    """
+    try:
+        data = _conversion_row(job_id, user_id, api_key_id, action, html_size, status, source, ip_address)
+        response = await get_async_http().post(
+            "/rest/v1/conversions",
+            json=data,
+            headers={"Prefer": "return=representation"}
+        )
+        response.raise_for_status()
+        rows = response.json()
+
+        if rows:
+            return rows[0]["id"]
+        return None
+
+    except Exception as e:
+        # Log error but don't fail the conversion
+        print(f"Error tracking conversion: {e}")
+        return None
+
+
 def update_conversion_status(
     job_id: str,
     status: str,
@@ -114,6 +209,98 @@ def update_conversion_status(
         return False
 
 
+def upsert_conversions(rows: list) -> bool:
+    """
+    Bulk insert-or-update conversions, keyed by job_id.
+
+    Replaying rows is harmless: status never moves backwards and the
+    earliest event keeps defining created_at (see upsert_conversions in
+    the migrations).
+
+    Args:
+        rows: Merged conversion rows, at most one per job_id
+
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        supabase = get_supabase()
+        supabase.rpc("upsert_conversions", {"p_rows": rows}).execute()
+        return True
+
+    except Exception as e:
+        print(f"Error writing conversions: {e}")
+        return False
+
+
+def insert_template(row: dict) -> Optional[dict]:
+    """
+    Insert a PDF template.
+
+    Returns the stored row, or None on error.
+    """
+    try:
+        supabase = get_supabase()
+        result = supabase.table("pdf_templates").insert(row).execute()
+        return result.data[0] if result.data else None
+
+    except Exception as e:
+        print(f"Error inserting template: {e}")
+        return None
+
+
+def fetch_template(template_id: str) -> Optional[dict]:
+    """
+    Fetch a PDF template by ID.
+
+    Returns the row (including source), or None if not found or on error.
+    """
+    try:
+        supabase = get_supabase()
+        result = supabase.table("pdf_templates").select(
+            "id, user_id, name, source, version, dynamic_urls, created_at"
+        ).eq("id", template_id).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    except Exception as e:
+        print(f"Error fetching template: {e}")
+        return None
+
+
+def fetch_user_templates(user_id: str) -> list:
+    """
+    List a user's PDF templates (without source), newest first.
+    """
+    try:
+        supabase = get_supabase()
+        result = supabase.table("pdf_templates").select(
+            "id, name, version, created_at"
+        ).eq("user_id", user_id).order("created_at", desc=True).execute()
+        return result.data or []
+
+    except Exception as e:
+        print(f"Error listing templates: {e}")
+        return []
+
+
+def remove_template(template_id: str, user_id: str) -> bool:
+    """
+    Delete a user's PDF template.
+
+    Returns True if a template was deleted.
+    """
+    try:
+        supabase = get_supabase()
+        result = supabase.table("pdf_templates").delete().eq(
+            "id", template_id
+        ).eq("user_id", user_id).execute()
+        return bool(result.data)
+
+    except Exception as e:
+        print(f"Error deleting template: {e}")
+        return False
+
+
 def validate_api_key(key_hash: str) -> Optional[dict]:
     """
     Validate an API key and return user info if valid.
@@ -137,11 +324,79 @@ def validate_api_key(key_hash: str) -> Optional[dict]:
         return None
 
 
-def check_user_quota(user_id: str) -> dict:
+def lookup_api_key(key_hash: str) -> Optional[dict]:
     """
-    Check the usage quota for a user.
+    Look up an API key without side effects (no usage count, no last_used_at write).
 
-    Returns dict with monthly_limit, used_this_month, remaining, can_convert.
+    Returns the key row (api_key_id, user_id, plan, monthly_limit, is_valid),
+    {"is_valid": False} if the key does not exist, or None on error.
+    """
+    try:
+        supabase = get_supabase()
+
+        result = supabase.rpc("lookup_api_key", {"p_key_hash": key_hash}).execute()
+
+        if result.data and len(result.data) > 0:
+            return result.data[0]
+        return {"is_valid": False}
+
+    except Exception as e:
+        print(f"Error looking up API key: {e}")
+        return None
+
+
+async def lookup_api_key_async(key_hash: str) -> Optional[dict]:
+    """Async variant of lookup_api_key (same return values)."""
+    try:
+        rows = await _rpc_async("lookup_api_key", {"p_key_hash": key_hash})
+        if rows:
+            return rows[0]
+        return {"is_valid": False}
+
+    except Exception as e:
+        print(f"Error looking up API key: {e}")
+        return None
+
+
+def touch_api_keys(last_used: Dict[str, float]) -> bool:
+    """
+    Batch-update last_used_at for API keys.
+
+    Args:
+        last_used: Mapping of api_key_id to last use (unix timestamp)
+
+    Returns True if successful, False otherwise.
+    """
+    try:
+        supabase = get_supabase()
+
+        usage = [
+            {"id": api_key_id, "used_at": datetime.fromtimestamp(used_at, timezone.utc).isoformat()}
+            for api_key_id, used_at in last_used.items()
+        ]
+        supabase.rpc("touch_api_keys", {"p_usage": usage}).execute()
+        return True
+
+    except Exception as e:
+        print(f"Error updating API key usage: {e}")
+        return False
+
+
+# Default free tier limits
+_DEFAULT_QUOTA = {
+    "monthly_limit": 100,
+    "used_this_month": 0,
+    "remaining": 100,
+    "can_convert": True
+}
+
+
+def fetch_usage_quota(user_id: str) -> Optional[dict]:
+    """
+    Fetch the usage quota for a user from the database.
+
+    Returns dict with monthly_limit, used_this_month, remaining, can_convert,
+    or None on error (unlike check_user_quota, which fails open).
     """
     try:
         supabase = get_supabase()
@@ -150,24 +405,45 @@ def check_user_quota(user_id: str) -> dict:
 
         if result.data and len(result.data) > 0:
             return result.data[0]
+        return dict(_DEFAULT_QUOTA)
+
+    except Exception as e:
+        print(f"Error checking user quota: {e}")
+        return None
 
-        # Default free tier limits
-        return {
-            "monthly_limit": 100,
-            "used_this_month": 0,
-            "remaining": 100,
-            "can_convert": True
-        }
+
+async def fetch_usage_quota_async(user_id: str) -> Optional[dict]:
+    """Async variant of fetch_usage_quota (same return values)."""
+    try:
+        rows = await _rpc_async("check_usage_quota", {"p_user_id": user_id})
+        if rows:
+            return rows[0]
+        return dict(_DEFAULT_QUOTA)
 
     except Exception as e:
         print(f"Error checking user quota: {e}")
+        return None
+
+
+async def check_user_quota_async(user_id: str) -> dict:
+    """Async variant of check_user_quota (fails open with the default limits)."""
+    quota = await fetch_usage_quota_async(user_id)
+    if quota is None:
+        return dict(_DEFAULT_QUOTA)
+    return quota
+
+
+def check_user_quota(user_id: str) -> dict:
+    """
+    Check the usage quota for a user.
+
+    Returns dict with monthly_limit, used_this_month, remaining, can_convert.
+    """
+    quota = fetch_usage_quota(user_id)
+    if quota is None:
         # Return default limits on error
-        return {
-            "monthly_limit": 100,
-            "used_this_month": 0,
-            "remaining": 100,
-            "can_convert": True
-        }
+        return dict(_DEFAULT_QUOTA)
+    return quota
 
 # Cache for rate limits (avoids excessive database queries)
 _plan_rate_limits_cache: Dict[str, Dict] = {}
@@ -0,0 +1,563 @@
+"""
+Offline TailwindCSS compiler for PDF generation.
+
+WeasyPrint does not execute JavaScript, so the Tailwind CDN script never
+applied utility classes to generated PDFs. This module replaces it with a
+server-side stage:
+
+1. Scan the document (plus header/footer HTML) for class tokens
+2. Look each token up in a precomputed utility index bundled with the backend
+3. Emit only the CSS rules for the classes actually used
+
+The index is built once per process from the Tailwind v3 default theme and is
+versioned by TAILWIND_INDEX_VERSION. class_set_hash() identifies the matched
+class set, so callers can memoize the compiled stylesheet per layout.
+
+Not in the index: gradients (bg-gradient-*, from-*, via-*, to-*), shadows
+and rings, filters, transforms, transitions and animations, arbitrary values
+(w-[13px]) and opacity modifiers (bg-black/50). Unknown classes are ignored.
+
+Supported variants:
+- print: always applied (documents are always printed)
+- sm:, md:, lg:, xl:, 2xl: applied when the page is at least as wide as the breakpoint
+- Interactive variants (hover:, focus:, dark:, ...) are ignored
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Bump when the index contents change so memoized output is not reused
+TAILWIND_INDEX_VERSION = "3.4-pdfleaf.1"
+
+# Responsive breakpoints (min-width in CSS pixels)
+BREAKPOINTS = {
+    "sm": 640,
+    "md": 768,
+    "lg": 1024,
+    "xl": 1280,
+    "2xl": 1536,
+}
+
+# Default viewport: A4 portrait at 96 DPI
+DEFAULT_VIEWPORT_WIDTH_PX = 794
+
+# Page widths in CSS pixels (96 DPI) for the supported page sizes
+_PAGE_WIDTHS_PX = {
+    "A3": (1123, 1587),
+    "A4": (794, 1123),
+    "A5": (559, 794),
+    "LETTER": (816, 1056),
+    "LEGAL": (816, 1344),
+    "B4": (945, 1334),
+    "B5": (665, 945),
+}
+
+_UNIT_TO_PX = {"mm": 96 / 25.4, "cm": 96 / 2.54, "in": 96.0, "px": 1.0, "pt": 96 / 72}
+
+_CLASS_ATTR_RE = re.compile(r"""\sclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+
+
+# ============================================
+# THEME (Tailwind v3 defaults)
+# ============================================
+
+_SHADES = ["50", "100", "200", "300", "400", "500", "600", "700", "800", "900", "950"]
+
+_PALETTE = {
+    "slate": "f8fafc f1f5f9 e2e8f0 cbd5e1 94a3b8 64748b 475569 334155 1e293b 0f172a 020617",
+    "gray": "f9fafb f3f4f6 e5e7eb d1d5db 9ca3af 6b7280 4b5563 374151 1f2937 111827 030712",
+    "zinc": "fafafa f4f4f5 e4e4e7 d4d4d8 a1a1aa 71717a 52525b 3f3f46 27272a 18181b 09090b",
+    "neutral": "fafafa f5f5f5 e5e5e5 d4d4d4 a3a3a3 737373 525252 404040 262626 171717 0a0a0a",
+    "stone": "fafaf9 f5f5f4 e7e5e4 d6d3d1 a8a29e 78716c 57534e 44403c 292524 1c1917 0c0a09",
+    "red": "fef2f2 fee2e2 fecaca fca5a5 f87171 ef4444 dc2626 b91c1c 991b1b 7f1d1d 450a0a",
+    "orange": "fff7ed ffedd5 fed7aa fdba74 fb923c f97316 ea580c c2410c 9a3412 7c2d12 431407",
+    "amber": "fffbeb fef3c7 fde68a fcd34d fbbf24 f59e0b d97706 b45309 92400e 78350f 451a03",
+    "yellow": "fefce8 fef9c3 fef08a fde047 facc15 eab308 ca8a04 a16207 854d0e 713f12 422006",
+    "lime": "f7fee7 ecfccb d9f99d bef264 a3e635 84cc16 65a30d 4d7c0f 3f6212 365314 1a2e05",
+    "green": "f0fdf4 dcfce7 bbf7d0 86efac 4ade80 22c55e 16a34a 15803d 166534 14532d 052e16",
+    "emerald": "ecfdf5 d1fae5 a7f3d0 6ee7b7 34d399 10b981 059669 047857 065f46 064e3b 022c22",
+    "teal": "f0fdfa ccfbf1 99f6e4 5eead4 2dd4bf 14b8a6 0d9488 0f766e 115e59 134e4a 042f2e",
+    "cyan": "ecfeff cffafe a5f3fc 67e8f9 22d3ee 06b6d4 0891b2 0e7490 155e75 164e63 083344",
+    "sky": "f0f9ff e0f2fe bae6fd 7dd3fc 38bdf8 0ea5e9 0284c7 0369a1 075985 0c4a6e 082f49",
+    "blue": "eff6ff dbeafe bfdbfe 93c5fd 60a5fa 3b82f6 2563eb 1d4ed8 1e40af 1e3a8a 172554",
+    "indigo": "eef2ff e0e7ff c7d2fe a5b4fc 818cf8 6366f1 4f46e5 4338ca 3730a3 312e81 1e1b4b",
+    "violet": "f5f3ff ede9fe ddd6fe c4b5fd a78bfa 8b5cf6 7c3aed 6d28d9 5b21b6 4c1d95 2e1065",
+    "purple": "faf5ff f3e8ff e9d5ff d8b4fe c084fc a855f7 9333ea 7e22ce 6b21a8 581c87 3b0764",
+    "fuchsia": "fdf4ff fae8ff f5d0fe f0abfc e879f9 d946ef c026d3 a21caf 86198f 701a75 4a044e",
+    "pink": "fdf2f8 fce7f3 fbcfe8 f9a8d4 f472b6 ec4899 db2777 be185d 9d174d 831843 500724",
+    "rose": "fff1f2 ffe4e6 fecdd3 fda4af fb7185 f43f5e e11d48 be123c 9f1239 881337 4c0519",
+}
+
+_SPACING = {
+    "0": "0px", "px": "1px", "0.5": "0.125rem", "1": "0.25rem", "1.5": "0.375rem",
+    "2": "0.5rem", "2.5": "0.625rem", "3": "0.75rem", "3.5": "0.875rem", "4": "1rem",
+    "5": "1.25rem", "6": "1.5rem", "7": "1.75rem", "8": "2rem", "9": "2.25rem",
+    "10": "2.5rem", "11": "2.75rem", "12": "3rem", "14": "3.5rem", "16": "4rem",
+    "20": "5rem", "24": "6rem", "28": "7rem", "32": "8rem", "36": "9rem",
+    "40": "10rem", "44": "11rem", "48": "12rem", "52": "13rem", "56": "14rem",
+    "60": "15rem", "64": "16rem", "72": "18rem", "80": "20rem", "96": "24rem",
+}
+
+_FRACTIONS = {
+    "1/2": "50%", "1/3": "33.333333%", "2/3": "66.666667%", "1/4": "25%", "2/4": "50%",
+    "3/4": "75%", "1/5": "20%", "2/5": "40%", "3/5": "60%", "4/5": "80%",
+    "1/6": "16.666667%", "2/6": "33.333333%", "3/6": "50%", "4/6": "66.666667%",
+    "5/6": "83.333333%", "1/12": "8.333333%", "2/12": "16.666667%", "3/12": "25%",
+    "4/12": "33.333333%", "5/12": "41.666667%", "6/12": "50%", "7/12": "58.333333%",
+    "8/12": "66.666667%", "9/12": "75%", "10/12": "83.333333%", "11/12": "91.666667%",
+}
+
+_FONT_SIZES = {
+    "xs": ("0.75rem", "1rem"), "sm": ("0.875rem", "1.25rem"), "base": ("1rem", "1.5rem"),
+    "lg": ("1.125rem", "1.75rem"), "xl": ("1.25rem", "1.75rem"), "2xl": ("1.5rem", "2rem"),
+    "3xl": ("1.875rem", "2.25rem"), "4xl": ("2.25rem", "2.5rem"), "5xl": ("3rem", "1"),
+    "6xl": ("3.75rem", "1"), "7xl": ("4.5rem", "1"), "8xl": ("6rem", "1"), "9xl": ("8rem", "1"),
+}
+
+_FONT_WEIGHTS = {
+    "thin": "100", "extralight": "200", "light": "300", "normal": "400", "medium": "500",
+    "semibold": "600", "bold": "700", "extrabold": "800", "black": "900",
+}
+
+_FONT_FAMILIES = {
+    "sans": 'ui-sans-serif, system-ui, sans-serif, "Apple Color Emoji", "Segoe UI Emoji"',
+    "serif": 'ui-serif, Georgia, Cambria, "Times New Roman", Times, serif',
+    "mono": 'ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Courier New", monospace',
+}
+
+_LEADING = {
+    "none": "1", "tight": "1.25", "snug": "1.375", "normal": "1.5", "relaxed": "1.625",
+    "loose": "2", "3": ".75rem", "4": "1rem", "5": "1.25rem", "6": "1.5rem",
+    "7": "1.75rem", "8": "2rem", "9": "2.25rem", "10": "2.5rem",
+}
+
+_TRACKING = {
+    "tighter": "-0.05em", "tight": "-0.025em", "normal": "0em",
+    "wide": "0.025em", "wider": "0.05em", "widest": "0.1em",
+}
+
+_RADIUS = {
+    "none": "0px", "sm": "0.125rem", "": "0.25rem", "md": "0.375rem", "lg": "0.5rem",
+    "xl": "0.75rem", "2xl": "1rem", "3xl": "1.5rem", "full": "9999px",
+}
+
+_MAX_WIDTHS = {
+    "none": "none", "xs": "20rem", "sm": "24rem", "md": "28rem", "lg": "32rem",
+    "xl": "36rem", "2xl": "42rem", "3xl": "48rem", "4xl": "56rem", "5xl": "64rem",
+    "6xl": "72rem", "7xl": "80rem", "full": "100%", "min": "min-content",
+    "max": "max-content", "fit": "fit-content", "prose": "65ch",
+}
+
+_DEFAULT_BORDER_COLOR = "#e5e7eb"
+
+_SIDES = {
+    "t": ("top",), "r": ("right",), "b": ("bottom",), "l": ("left",),
+    "x": ("left", "right"), "y": ("top", "bottom"),
+}
+
+_CHILD_SELECTOR = " > :not([hidden]) ~ :not([hidden])"
+
+
+def _color_map() -> Dict[str, str]:
+    """Flattens the palette into {'blue-500': '#3b82f6', ...} plus named colors."""
+    colors = {
+        "inherit": "inherit",
+        "current": "currentColor",
+        "transparent": "transparent",
+        "black": "#000",
+        "white": "#fff",
+    }
+    for name, values in _PALETTE.items():
+        for shade, value in zip(_SHADES, values.split()):
+            colors[f"{name}-{shade}"] = f"#{value}"
+    return colors
+
+
+def _build_utility_index() -> "OrderedDict[str, Tuple[str, str]]":
+    """
+    Builds the utility index: class name -> (selector suffix, declarations).
+
+    Insertion order is the output order, mirroring Tailwind's layer ordering
+    so later utilities (e.g. border colors) override earlier ones (border widths).
+    """
+    index: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    def add(name: str, declarations: str, suffix: str = "") -> None:
+        index[name] = (suffix, declarations)
+
+    # Layout
+    for name, value in {
+        "block": "block", "inline-block": "inline-block", "inline": "inline",
+        "flex": "flex", "inline-flex": "inline-flex", "grid": "grid",
+        "inline-grid": "inline-grid", "table": "table", "table-row": "table-row",
+        "table-cell": "table-cell", "flow-root": "flow-root", "contents": "contents",
+        "list-item": "list-item", "hidden": "none",
+    }.items():
+        add(name, f"display: {value}")
+    for name in ["static", "fixed", "absolute", "relative", "sticky"]:
+        add(name, f"position: {name}")
+    for value in ["0", "auto", "px", "1", "2", "4", "8"]:
+        spacing = "auto" if value == "auto" else _SPACING[value]
+        add(f"inset-{value}", f"top: {spacing}; right: {spacing}; bottom: {spacing}; left: {spacing}")
+        for side in ["top", "right", "bottom", "left"]:
+            add(f"{side}-{value}", f"{side}: {spacing}")
+    for value in ["0", "10", "20", "30", "40", "50", "auto"]:
+        add(f"z-{value}", f"z-index: {value}")
+    for name in ["left", "right", "none"]:
+        add(f"float-{name}", f"float: {name}")
+        add(f"clear-{name}", f"clear: {name}")
+    add("clear-both", "clear: both")
+    for value in ["auto", "hidden", "visible", "scroll", "clip"]:
+        add(f"overflow-{value}", f"overflow: {value}")
+    add("box-border", "box-sizing: border-box")
+    add("box-content", "box-sizing: content-box")
+    add("visible", "visibility: visible")
+    add("invisible", "visibility: hidden")
+
+    # Flexbox & grid
+    for name, value in {"row": "row", "row-reverse": "row-reverse", "col": "column", "col-reverse": "column-reverse"}.items():
+        add(f"flex-{name}", f"flex-direction: {value}")
+    for name in ["wrap", "wrap-reverse", "nowrap"]:
+        add(f"flex-{name}", f"flex-wrap: {name}")
+    for name, value in {"1": "1 1 0%", "auto": "1 1 auto", "initial": "0 1 auto", "none": "none"}.items():
+        add(f"flex-{name}", f"flex: {value}")
+    add("grow", "flex-grow: 1")
+    add("grow-0", "flex-grow: 0")
+    add("shrink", "flex-shrink: 1")
+    add("shrink-0", "flex-shrink: 0")
+    for name, value in {"start": "flex-start", "end": "flex-end", "center": "center", "baseline": "baseline", "stretch": "stretch"}.items():
+        add(f"items-{name}", f"align-items: {value}")
+        add(f"self-{name}", f"align-self: {value}")
+    add("self-auto", "align-self: auto")
+    for name, value in {
+        "start": "flex-start", "end": "flex-end", "center": "center",
+        "between": "space-between", "around": "space-around", "evenly": "space-evenly",
+    }.items():
+        add(f"justify-{name}", f"justify-content: {value}")
+        add(f"content-{name}", f"align-content: {value}")
+    for i in range(1, 13):
+        add(f"grid-cols-{i}", f"grid-template-columns: repeat({i}, minmax(0, 1fr))")
+        add(f"col-span-{i}", f"grid-column: span {i} / span {i}")
+    for i in range(1, 7):
+        add(f"grid-rows-{i}", f"grid-template-rows: repeat({i}, minmax(0, 1fr))")
+        add(f"row-span-{i}", f"grid-row: span {i} / span {i}")
+    add("col-span-full", "grid-column: 1 / -1")
+    for key, value in _SPACING.items():
+        add(f"gap-{key}", f"gap: {value}")
+        add(f"gap-x-{key}", f"column-gap: {value}")
+        add(f"gap-y-{key}", f"row-gap: {value}")
+
+    # Spacing
+    for key, value in _SPACING.items():
+        add(f"p-{key}", f"padding: {value}")
+        for side, props in _SIDES.items():
+            add(f"p{side}-{key}", "; ".join(f"padding-{p}: {value}" for p in props))
+    for key, value in list(_SPACING.items()) + [("auto", "auto")]:
+        add(f"m-{key}", f"margin: {value}")
+        for side, props in _SIDES.items():
+            add(f"m{side}-{key}", "; ".join(f"margin-{p}: {value}" for p in props))
+        if key not in ("0", "auto"):
+            add(f"-m-{key}", f"margin: -{value}")
+            for side, props in _SIDES.items():
+                add(f"-m{side}-{key}", "; ".join(f"margin-{p}: -{value}" for p in props))
+    for key, value in _SPACING.items():
+        add(f"space-x-{key}", f"margin-left: {value}", _CHILD_SELECTOR)
+        add(f"space-y-{key}", f"margin-top: {value}", _CHILD_SELECTOR)
+
+    # Sizing
+    sizes = {**_SPACING, **_FRACTIONS, "auto": "auto", "full": "100%", "min": "min-content", "max": "max-content", "fit": "fit-content"}
+    for key, value in sizes.items():
+        add(f"w-{key}", f"width: {value}")
+        add(f"h-{key}", f"height: {value}")
+    add("w-screen", "width: 100vw")
+    add("h-screen", "height: 100vh")
+    for key, value in {"0": "0px", "full": "100%", "min": "min-content", "max": "max-content", "fit": "fit-content"}.items():
+        add(f"min-w-{key}", f"min-width: {value}")
+        add(f"min-h-{key}", f"min-height: {value}")
+    add("min-h-screen", "min-height: 100vh")
+    for key, value in _MAX_WIDTHS.items():
+        add(f"max-w-{key}", f"max-width: {value}")
+    for key, value in {**_SPACING, "full": "100%", "none": "none", "screen": "100vh"}.items():
+        add(f"max-h-{key}", f"max-height: {value}")
+
+    # Typography
+    for key, value in _FONT_FAMILIES.items():
+        add(f"font-{key}", f"font-family: {value}")
+    for key, (size, line_height) in _FONT_SIZES.items():
+        add(f"text-{key}", f"font-size: {size}; line-height: {line_height}")
+    for key, value in _FONT_WEIGHTS.items():
+        add(f"font-{key}", f"font-weight: {value}")
+    add("italic", "font-style: italic")
+    add("not-italic", "font-style: normal")
+    for key, value in _TRACKING.items():
+        add(f"tracking-{key}", f"letter-spacing: {value}")
+    for key, value in _LEADING.items():
+        add(f"leading-{key}", f"line-height: {value}")
+    add("list-none", "list-style-type: none")
+    add("list-disc", "list-style-type: disc")
+    add("list-decimal", "list-style-type: decimal")
+    add("list-inside", "list-style-position: inside")
+    add("list-outside", "list-style-position: outside")
+    for name in ["left", "center", "right", "justify", "start", "end"]:
+        add(f"text-{name}", f"text-align: {name}")
+    add("underline", "text-decoration-line: underline")
+    add("overline", "text-decoration-line: overline")
+    add("line-through", "text-decoration-line: line-through")
+    add("no-underline", "text-decoration-line: none")
+    add("uppercase", "text-transform: uppercase")
+    add("lowercase", "text-transform: lowercase")
+    add("capitalize", "text-transform: capitalize")
+    add("normal-case", "text-transform: none")
+    add("truncate", "overflow: hidden; text-overflow: ellipsis; white-space: nowrap")
+    add("text-ellipsis", "text-overflow: ellipsis")
+    add("text-clip", "text-overflow: clip")
+    for name in ["baseline", "top", "middle", "bottom", "text-top", "text-bottom", "sub", "super"]:
+        add(f"align-{name}", f"vertical-align: {name}")
+    for name in ["normal", "nowrap", "pre", "pre-line", "pre-wrap", "break-spaces"]:
+        add(f"whitespace-{name}", f"white-space: {name}")
+    add("break-normal", "overflow-wrap: normal; word-break: normal")
+    add("break-words", "overflow-wrap: break-word")
+    add("break-all", "word-break: break-all")
+    for key in ["0", "1", "2", "3", "4", "5", "6", "7", "8", "10", "12", "16", "20", "24", "32", "40", "48", "56", "64"]:
+        add(f"indent-{key}", f"text-indent: {_SPACING[key]}")
+
+    # Tables
+    add("border-collapse", "border-collapse: collapse")
+    add("border-separate", "border-collapse: separate")
+    add("table-auto", "table-layout: auto")
+    add("table-fixed", "table-layout: fixed")
+    add("caption-top", "caption-side: top")
+    add("caption-bottom", "caption-side: bottom")
+
+    # Borders (widths carry the preflight style/color so they render standalone)
+    border_base = f"border-style: solid; border-color: {_DEFAULT_BORDER_COLOR}"
+    for key, width in {"": "1px", "0": "0px", "2": "2px", "4": "4px", "8": "8px"}.items():
+        suffix = f"-{key}" if key else ""
+        add(f"border{suffix}", f"border-width: {width}; {border_base}")
+        for side, props in _SIDES.items():
+            widths = "; ".join(f"border-{p}-width: {width}" for p in props)
+            add(f"border-{side}{suffix}", f"{widths}; {border_base}")
+        add(f"divide-y{suffix}", f"border-top-width: {width}; border-bottom-width: 0; {border_base}", _CHILD_SELECTOR)
+        add(f"divide-x{suffix}", f"border-left-width: {width}; border-right-width: 0; {border_base}", _CHILD_SELECTOR)
+    for name in ["solid", "dashed", "dotted", "double", "none"]:
+        add(f"border-{name}", f"border-style: {name}")
+    corners = {
+        "t": ("top-left", "top-right"), "r": ("top-right", "bottom-right"),
+        "b": ("bottom-right", "bottom-left"), "l": ("top-left", "bottom-left"),
+        "tl": ("top-left",), "tr": ("top-right",), "br": ("bottom-right",), "bl": ("bottom-left",),
+    }
+    for key, value in _RADIUS.items():
+        suffix = f"-{key}" if key else ""
+        add(f"rounded{suffix}", f"border-radius: {value}")
+        for corner, props in corners.items():
+            add(f"rounded-{corner}{suffix}", "; ".join(f"border-{p}-radius: {value}" for p in props))
+
+    # Colors
+    for key, value in _color_map().items():
+        add(f"text-{key}", f"color: {value}")
+        add(f"bg-{key}", f"background-color: {value}")
+        add(f"border-{key}", f"border-color: {value}")
+        for side, props in _SIDES.items():
+            add(f"border-{side}-{key}", "; ".join(f"border-{p}-color: {value}" for p in props))
+        add(f"divide-{key}", f"border-color: {value}", _CHILD_SELECTOR)
+        add(f"decoration-{key}", f"text-decoration-color: {value}")
+
+    # Effects & misc
+    for step in range(0, 101, 5):
+        add(f"opacity-{step}", f"opacity: {step / 100:g}")
+    add("bg-none", "background-image: none")
+    for name in ["auto", "avoid", "all", "avoid-page", "page", "left", "right", "column"]:
+        add(f"break-before-{name}", f"break-before: {name}")
+        add(f"break-after-{name}", f"break-after: {name}")
+    for name in ["auto", "avoid", "avoid-page", "avoid-column"]:
+        add(f"break-inside-{name}", f"break-inside: {name}")
+    for name in ["contain", "cover", "fill", "none", "scale-down"]:
+        add(f"object-{name}", f"object-fit: {name}")
+
+    return index
+
+
+_utility_index: Optional["OrderedDict[str, Tuple[str, str]]"] = None
+_utility_order: Dict[str, int] = {}
+_index_lock = threading.Lock()
+
+
+def get_utility_index() -> "OrderedDict[str, Tuple[str, str]]":
+    """Returns the utility index, building it on first use."""
+    global _utility_index, _utility_order
+
+    if _utility_index is None:
+        with _index_lock:
+            if _utility_index is None:
+                index = _build_utility_index()
+                _utility_order = {name: position for position, name in enumerate(index)}
+                _utility_index = index
+    return _utility_index
+
+
+# ============================================
+# SCANNING & COMPILATION
+# ============================================
+
+def scan_class_names(*html_fragments: Optional[str]) -> set:
+    """
+    Collects the class tokens used in one or more HTML fragments.
+
+    Args:
+        html_fragments: HTML strings to scan (None values are skipped)
+
+    Returns:
+        Set of class tokens as written in the markup (including variant prefixes)
+    """
+    classes = set()
+    for fragment in html_fragments:
+        if not fragment:
+            continue
+        for match in _CLASS_ATTR_RE.finditer(fragment):
+            value = match.group(1) or match.group(2) or match.group(3) or ""
+            classes.update(value.split())
+    return classes
+
+
+def page_width_px(page_size: str, orientation: str = "portrait") -> int:
+    """
+    Returns the page width in CSS pixels for a page size and orientation.
+
+    Used to decide which responsive variants apply. Unknown sizes fall back
+    to A4 portrait.
+    """
+    landscape = orientation == "landscape"
+    named = _PAGE_WIDTHS_PX.get(page_size.strip().upper())
+    if named:
+        return named[1] if landscape else named[0]
+
+    # Custom dimensions, e.g. "210mm 297mm"
+    lengths = []
+    for token in page_size.split():
+        match = re.match(r"^([\d.]+)(mm|cm|in|px|pt)$", token.strip())
+        if match:
+            lengths.append(float(match.group(1)) * _UNIT_TO_PX[match.group(2)])
+    if not lengths:
+        return DEFAULT_VIEWPORT_WIDTH_PX
+    width = lengths[0]
+    height = lengths[1] if len(lengths) > 1 else lengths[0]
+    return int(height if landscape else width)
+
+
+def _active_breakpoints(viewport_width: int) -> List[str]:
+    """Returns the breakpoint names that apply at the given viewport width."""
+    return [name for name, min_width in BREAKPOINTS.items() if viewport_width >= min_width]
+
+
+def _resolve_class(token: str, active_breakpoints: Iterable[str]) -> Optional[Tuple[int, str]]:
+    """
+    Resolves a class token to (variant rank, utility name).
+
+    Returns None when the token is not a known utility or its variant does
+    not apply to printed output.
+    """
+    *variants, utility = token.split(":")
+    rank = 0
+    breakpoint_names = list(BREAKPOINTS)
+    for variant in variants:
+        if variant == "print":
+            continue
+        if variant in BREAKPOINTS:
+            if variant not in active_breakpoints:
+                return None
+            rank = max(rank, breakpoint_names.index(variant) + 1)
+            continue
+        # Interactive (hover:, focus:, ...) and unknown variants never apply
+        return None
+
+    important = utility.startswith("!")
+    if important:
+        utility = utility[1:]
+    if utility not in get_utility_index():
+        return None
+    return rank, ("!" if important else "") + utility
+
+
+def _escape_class(name: str) -> str:
+    """
+    Escapes a class name for use in a CSS selector.
+
+    Follows CSS.escape(): a leading digit (or a digit after a leading
+    hyphen) is written as a code point, so 2xl:p-4 becomes \\32 xl\\:p-4.
+    """
+    escaped = re.sub(r"([^A-Za-z0-9_-])", r"\\\1", name)
+    if name[:1].isdigit():
+        return f"\\{ord(name[0]):x} {escaped[1:]}"
+    if name[:1] == "-" and name[1:2].isdigit():
+        return f"-\\{ord(name[1]):x} {escaped[2:]}"
+    return escaped
+
+
+def class_set_hash(class_names: Iterable[str], viewport_width: int = DEFAULT_VIEWPORT_WIDTH_PX) -> Optional[str]:
+    """
+    Returns a stable hash of the utilities matched by a class set.
+
+    Only tokens that resolve to known utilities contribute, so unrelated
+    custom class names do not fragment the memoization cache. Returns None
+    when no utility matches.
+    """
+    breakpoints = _active_breakpoints(viewport_width)
+    matched = sorted(
+        token for token in set(class_names)
+        if _resolve_class(token, breakpoints) is not None
+    )
+    if not matched:
+        return None
+    digest = hashlib.sha256()
+    digest.update(TAILWIND_INDEX_VERSION.encode())
+    digest.update(",".join(breakpoints).encode())
+    digest.update("\n".join(matched).encode())
+    return digest.hexdigest()
+
+
+def _render_css(class_names: Iterable[str], viewport_width: int) -> str:
+    """Emits CSS rules for the matched utilities in index order."""
+    index = get_utility_index()
+    breakpoints = _active_breakpoints(viewport_width)
+
+    rules = []
+    for token in set(class_names):
+        resolved = _resolve_class(token, breakpoints)
+        if resolved is None:
+            continue
+        rank, utility = resolved
+        important = utility.startswith("!")
+        name = utility[1:] if important else utility
+        suffix, declarations = index[name]
+        if important:
+            declarations = "; ".join(f"{d.strip()} !important" for d in declarations.split(";"))
+        rules.append((rank, _utility_order[name], token, f".{_escape_class(token)}{suffix} {{ {declarations} }}"))
+
+    # Base utilities first, then each breakpoint in ascending order
+    rules.sort(key=lambda rule: rule[:3])
+    return "\n".join(rule[3] for rule in rules)
+
+
+def compile_tailwind_css(
+    class_names: Iterable[str],
+    viewport_width: int = DEFAULT_VIEWPORT_WIDTH_PX
+) -> Tuple[Optional[str], str]:
+    """
+    Compiles the Tailwind utilities used by a class set into CSS.
+
+    Args:
+        class_names: Class tokens found in the document
+        viewport_width: Page width in CSS pixels (selects responsive variants)
+
+    Returns:
+        Tuple of (class-set hash, CSS text). The hash is None and the CSS is
+        empty when no Tailwind utility is used.
+    """
+    class_names = set(class_names)
+    key = class_set_hash(class_names, viewport_width)
+    if key is None:
+        return None, ""
+    return key, _render_css(class_names, viewport_width)
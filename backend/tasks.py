@@ -1,108 +1,495 @@
 import time
 import logging
 from typing import Optional
+from celery import chord, group
 from .celery_app import celery_app
-from .pdf_service import generate_pdf_from_html
-from .redis_client import store_pdf, set_job_status
-from .supabase_client import update_conversion_status
+from .config import CHUNKED_RENDER_MAX_CHUNKS, CHUNKED_RENDER_MIN_CHUNK_BYTES, RENDER_QUEUE_TTL, RENDER_WATCHDOG_SECONDS
+from .pdf_service import generate_pdf_from_html, plan_chunked_render, assemble_chunked_pdf
+from .redis_client import store_pdf, store_pdf_ref, set_job_status, get_job_status
+from .render_cache import start_render, watch_render, finish_render, render_blob_key
+from .pdf_storage import put_blob, retention_seconds
+from .download_urls import build_download_url
+from .quota_ledger import commit_quota, release_quota
+from .payload_store import (
+    load_payload,
+    delete_payload,
+    store_payload,
+    store_payloads,
+    store_bytes,
+    load_bytes,
+    large_bytes_supported,
+)
+from .conversion_log import record_conversion_status
 from .webhook_service import send_webhook_sync
+from .batches import record_batch_result
+from .templates import render_template
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(bind=True)
+def complete_job(
+    job_id: str,
+    storage: dict,
+    processing_time_ms: int,
+    user_id: Optional[str] = None,
+    parts: Optional[list] = None
+) -> None:
+    """
+    Marks a job as completed, updates tracking and notifies webhooks.
+
+    Args:
+        job_id: Unique identifier for the job
+        storage: Storage metadata of the PDF (tier, size, etag)
+        processing_time_ms: Time spent producing the PDF
+        user_id: Optional user ID for webhook notifications
+        parts: Storage metadata of each record's PDF, for split_on jobs
+            (storage then only carries the total size)
+    """
+    size = storage["size"]
+    status = {
+        "status": "completed",
+        "size": size,
+        "storage": storage,
+    }
+    if parts is not None:
+        status["parts"] = parts
+    set_job_status(job_id, status, ttl=retention_seconds(), user_id=user_id)
+    commit_quota(job_id)
+    in_batch = record_batch_result(job_id, "completed")
+
+    # Update conversion tracking (written to Supabase in batches)
+    try:
+        record_conversion_status(
+            job_id=job_id,
+            status="completed",
+            file_size_bytes=size,
+            processing_time_ms=processing_time_ms
+        )
+    except Exception:
+        pass  # Don't fail if tracking update fails
+
+    # Send webhook notification (non-blocking; batches send one batch.completed instead)
+    if user_id and not in_batch:
+        try:
+            data = {
+                "status": "completed",
+                "size": size,
+                "processing_time_ms": processing_time_ms
+            }
+            if parts is not None:
+                data["parts"] = [part_info(part, build_download_url(job_id, part)) for part in parts]
+            else:
+                download_url = build_download_url(job_id, storage)
+                if download_url:
+                    data["download_url"] = download_url
+            send_webhook_sync(
+                user_id=user_id,
+                job_id=job_id,
+                event_type="job.completed",
+                data=data
+            )
+        except Exception as webhook_error:
+            logger.warning(f"Webhook notification failed for job {job_id}: {webhook_error}")
+
+
+def fail_job(job_id: str, error: str, user_id: Optional[str] = None) -> None:
+    """
+    Marks a job as failed, updates tracking and notifies webhooks.
+
+    Args:
+        job_id: Unique identifier for the job
+        error: Error message shown to the user
+        user_id: Optional user ID for webhook notifications
+    """
+    set_job_status(job_id, {
+        "status": "failed",
+        "error": error
+    }, user_id=user_id)
+    release_quota(job_id)
+    in_batch = record_batch_result(job_id, "failed")
+
+    # Update conversion tracking (written to Supabase in batches)
+    try:
+        record_conversion_status(job_id=job_id, status="failed")
+    except Exception:
+        pass
+
+    # Send webhook notification for failure (non-blocking; batches send one batch.completed instead)
+    if user_id and not in_batch:
+        try:
+            send_webhook_sync(
+                user_id=user_id,
+                job_id=job_id,
+                event_type="job.failed",
+                data={
+                    "status": "failed",
+                    "error": error
+                }
+            )
+        except Exception as webhook_error:
+            logger.warning(f"Webhook notification failed for job {job_id}: {webhook_error}")
+
+
+def finish_rendered_job(
+    job_id: str,
+    pdf_bytes: bytes,
+    start_time: float,
+    user_id: Optional[str] = None,
+    render_key: Optional[str] = None
+) -> dict:
+    """
+    Stores a rendered PDF and completes its job, plus any identical jobs
+    that coalesced onto it through the render cache.
+
+    Args:
+        job_id: Unique identifier for the job
+        pdf_bytes: The rendered PDF
+        start_time: time.time() when processing started
+        user_id: Optional user ID for webhook notifications
+        render_key: Optional render cache key the PDF is stored under
+
+    Returns:
+        Storage metadata of the PDF
+    """
+    # Store PDF (once under the render key when cached, referenced by each job)
+    retention = retention_seconds()
+    followers = []
+    if render_key:
+        blob_key = render_blob_key(render_key)
+        storage = put_blob(blob_key, pdf_bytes, retention)
+        store_pdf_ref(job_id, blob_key, retention)
+        # A follower that took over the claim may still be listed as waiting on it
+        followers = [
+            follower for follower in finish_render(render_key, storage, leader=job_id) or []
+            if follower["job_id"] != job_id
+        ]
+        for follower in followers:
+            store_pdf_ref(follower["job_id"], blob_key, retention)
+    else:
+        storage = store_pdf(job_id, pdf_bytes, retention)
+
+    # Calculate processing time
+    processing_time_ms = int((time.time() - start_time) * 1000)
+
+    complete_job(job_id, storage, processing_time_ms, user_id)
+    for follower in followers:
+        logger.info(f"Job {follower['job_id']} completed by identical job {job_id}")
+        complete_job(follower["job_id"], storage, processing_time_ms, follower.get("user_id"))
+    return storage
+
+
+def finish_split_job(
+    job_id: str,
+    parts: list,
+    start_time: float,
+    user_id: Optional[str] = None
+) -> list:
+    """
+    Stores the per-record PDFs of a split_on job and completes the job.
+
+    Each part is stored as its own blob (pdf:{job_id}-{n}, n from 1).
+
+    Args:
+        job_id: Unique identifier for the job
+        parts: SplitPart list from generate_pdf_from_html
+        start_time: time.time() when processing started
+        user_id: Optional user ID for webhook notifications
+
+    Returns:
+        Storage metadata of each part
+    """
+    retention = retention_seconds()
+    stored = []
+    for number, part in enumerate(parts, start=1):
+        storage = put_blob(f"pdf:{job_id}-{number}", part.pdf_bytes, retention)
+        stored.append({
+            **storage,
+            "record": part.record,
+            "first_page": part.first_page,
+            "last_page": part.last_page,
+        })
+
+    processing_time_ms = int((time.time() - start_time) * 1000)
+    total_size = sum(part["size"] for part in stored)
+    complete_job(job_id, {"size": total_size}, processing_time_ms, user_id, parts=stored)
+    return stored
+
+
+def part_info(part: dict, download_url: Optional[str] = None) -> dict:
+    """Public fields of a split_on part (without its storage name and tier)."""
+    info = {
+        "record": part.get("record"),
+        "first_page": part["first_page"],
+        "last_page": part["last_page"],
+        "size": part["size"],
+    }
+    if download_url:
+        info["download_url"] = download_url
+    return info
+
+
+def fail_rendered_job(
+    job_id: str,
+    error: str,
+    user_id: Optional[str] = None,
+    render_key: Optional[str] = None
+) -> None:
+    """Fails a job whose render raised, plus any identical jobs waiting on it."""
+    fail_job(job_id, error, user_id)
+
+    # Identical jobs waiting on this render would fail the same way
+    if render_key:
+        for follower in finish_render(render_key, None, leader=job_id) or []:
+            if follower["job_id"] != job_id:
+                fail_job(follower["job_id"], error, follower.get("user_id"))
+
+
+@celery_app.task(bind=True, ignore_result=True)
 def generate_pdf_task(
     self,
     job_id: str,
-    html: str,
-    options: dict,
-    user_id: Optional[str] = None
+    html: Optional[str] = None,
+    options: Optional[dict] = None,
+    user_id: Optional[str] = None,
+    render_key: Optional[str] = None,
+    payload_ref: Optional[str] = None
 ):
     """
     Celery task to generate PDF asynchronously.
 
+    Results are not stored: status and PDF live in Redis under the job ID.
+
     Args:
         job_id: Unique identifier for the job
-        html: Sanitized HTML content
+        html: Sanitized HTML content (when not passed through payload_ref)
         options: PDF generation options (page_size, margins, etc.)
         user_id: Optional user ID for webhook notifications
+        render_key: Optional render cache key; the PDF is cached under it and
+            identical jobs that coalesced onto this one are completed too
+        payload_ref: Reference to {"html", "options"} in the payload store, or
+            to {"template", "data", "options"} for a template job
     """
     start_time = time.time()
 
     try:
         # Update status to processing
-        set_job_status(job_id, {"status": "processing"})
+        set_job_status(job_id, {"status": "processing"}, user_id=user_id)
 
-        # Generate PDF
-        pdf_bytes = generate_pdf_from_html(html=html, **options)
+        # Out of the queue: the claim on the render now only has to outlive the render
+        if render_key and not start_render(render_key, job_id):
+            logger.warning(f"Job {job_id} lost its render claim while queued; rendering anyway")
 
-        # Store PDF in Redis
-        store_pdf(job_id, pdf_bytes)
+        # Read the document from the payload store (claim-check)
+        extra_options = {}
+        if payload_ref:
+            payload = load_payload(payload_ref)
+            html, options = payload.get("html"), payload["options"]
+            if payload.get("template"):
+                # Template job: compiled template and its parsed styles are cached per worker
+                html, template_stylesheets = render_template(payload["template"], payload["data"])
+                extra_options["extra_stylesheets"] = template_stylesheets
 
-        # Calculate processing time
-        processing_time_ms = int((time.time() - start_time) * 1000)
+        # Chunked render: chunks rendered in parallel by render_pdf_chunk tasks
+        if options.get("chunked"):
+            if dispatch_chunked_render(job_id, html, options, start_time, user_id, render_key):
+                return {"status": "processing", "chunked": True}
+            options = {name: value for name, value in options.items() if name != "chunked"}
 
-        # Update status to completed
-        set_job_status(job_id, {
-            "status": "completed",
-            "size": len(pdf_bytes),
-        })
+        # Generate PDF (one PDF per record with split_on)
+        render_stats = {}
+        pdf_bytes = generate_pdf_from_html(html=html, render_stats=render_stats, **options, **extra_options)
 
-        # Update conversion tracking in Supabase (non-blocking)
-        try:
-            update_conversion_status(
-                job_id=job_id,
-                status="completed",
-                file_size_bytes=len(pdf_bytes),
-                processing_time_ms=processing_time_ms
+        resource_stats = render_stats.get("resources", {})
+        if resource_stats.get("requests"):
+            logger.info(
+                f"Job {job_id} resources: {resource_stats['requests']} requests, "
+                f"{resource_stats['fetch_time_ms']}ms fetching, "
+                f"{resource_stats['bytes_fetched']} bytes fetched, "
+                f"{resource_stats['bytes_saved']} bytes served from cache"
+            )
+
+        prefetch_stats = render_stats.get("prefetch")
+        if prefetch_stats:
+            logger.info(
+                f"Job {job_id} prefetch: {prefetch_stats['fetched']}/{prefetch_stats['urls']} resources in "
+                f"{prefetch_stats['wall_time_ms']}ms wall time "
+                f"({prefetch_stats['sum_fetch_time_ms']}ms summed fetch time)"
             )
-        except Exception:
-            pass  # Don't fail if tracking update fails
-
-        # Send webhook notification (non-blocking)
-        if user_id:
-            try:
-                send_webhook_sync(
-                    user_id=user_id,
-                    job_id=job_id,
-                    event_type="job.completed",
-                    data={
-                        "status": "completed",
-                        "size": len(pdf_bytes),
-                        "processing_time_ms": processing_time_ms
-                    }
-                )
-            except Exception as webhook_error:
-                logger.warning(f"Webhook notification failed for job {job_id}: {webhook_error}")
 
+        if options.get("split_on"):
+            stored = finish_split_job(job_id, pdf_bytes, start_time, user_id)
+            return {"status": "completed", "parts": len(stored)}
+
+        finish_rendered_job(job_id, pdf_bytes, start_time, user_id, render_key)
         return {"status": "completed", "size": len(pdf_bytes)}
 
     except Exception as e:
-        # Update status to failed
-        set_job_status(job_id, {
-            "status": "failed",
-            "error": str(e)
-        })
+        fail_rendered_job(job_id, str(e), user_id, render_key)
+        raise
 
-        # Update conversion tracking in Supabase (non-blocking)
-        try:
-            update_conversion_status(job_id=job_id, status="failed")
-        except Exception:
-            pass
-
-        # Send webhook notification for failure (non-blocking)
-        if user_id:
-            try:
-                send_webhook_sync(
-                    user_id=user_id,
-                    job_id=job_id,
-                    event_type="job.failed",
-                    data={
-                        "status": "failed",
-                        "error": str(e)
-                    }
-                )
-            except Exception as webhook_error:
-                logger.warning(f"Webhook notification failed for job {job_id}: {webhook_error}")
+    finally:
+        delete_payload(payload_ref)
 
-        raise
+
+def dispatch_chunked_render(
+    job_id: str,
+    html: str,
+    options: dict,
+    start_time: float,
+    user_id: Optional[str] = None,
+    render_key: Optional[str] = None
+) -> bool:
+    """
+    Starts a chunked render: a Celery chord of render_pdf_chunk tasks whose
+    callback, assemble_pdf_chunks, concatenates the chunks and completes the job.
+
+    Args:
+        job_id: Unique identifier for the job
+        html: Sanitized HTML of the document
+        options: PDF generation options (with chunked=True)
+        start_time: time.time() when processing started
+        user_id: Optional user ID for webhook notifications
+        render_key: Optional render cache key
+
+    Returns:
+        False if the document does not split into chunks, or the rendered
+        chunks could only be kept in Redis (render it in one piece)
+    """
+    if not large_bytes_supported():
+        logger.warning(
+            f"Job {job_id} rendering in one piece: chunked renders need PAYLOAD_STORE=disk or PDF cold storage"
+        )
+        return False
+
+    plan = plan_chunked_render(html, options, CHUNKED_RENDER_MAX_CHUNKS, CHUNKED_RENDER_MIN_CHUNK_BYTES)
+    if plan is None:
+        return False
+
+    chunk_refs = store_payloads([{"html": chunk, "options": plan.chunk_options} for chunk in plan.chunks])
+    assembly_ref = store_payload({"head_styles": plan.head_styles, "options": plan.assembly_options})
+    logger.info(f"Job {job_id} rendering in {len(chunk_refs)} chunks")
+
+    job = {"job_id": job_id, "assembly_ref": assembly_ref, "user_id": user_id, "render_key": render_key}
+    callback = assemble_pdf_chunks.s(start_time=start_time, **job).on_error(fail_chunked_render.s(**job))
+    chord(render_pdf_chunk.s(ref) for ref in chunk_refs)(callback)
+
+    # The chunk tasks queue up again, so the claim has to cover another queue wait
+    if render_key:
+        start_render(render_key, job_id, RENDER_QUEUE_TTL)
+    return True
+
+
+@celery_app.task(ignore_result=False)
+def render_pdf_chunk(payload_ref: str) -> str:
+    """
+    Renders one chunk of a chunked render.
+
+    Args:
+        payload_ref: Reference to {"html", "options"} in the payload store
+
+    Returns:
+        Reference to the chunk's PDF bytes (see store_bytes)
+    """
+    try:
+        payload = load_payload(payload_ref)
+        pdf_bytes = generate_pdf_from_html(html=payload["html"], **payload["options"])
+        return store_bytes(pdf_bytes)
+    finally:
+        delete_payload(payload_ref)
+
+
+@celery_app.task(ignore_result=True)
+def assemble_pdf_chunks(
+    chunk_refs: list,
+    job_id: str,
+    assembly_ref: str,
+    start_time: float,
+    user_id: Optional[str] = None,
+    render_key: Optional[str] = None
+) -> None:
+    """
+    Chord callback of a chunked render: concatenates the chunks, stamps the
+    header/footer and page numbers, and completes the job.
+
+    Failures are recorded on the job here and not raised, so the chord's
+    error callback does not fail the job a second time.
+    """
+    try:
+        assembly = load_payload(assembly_ref)
+        chunk_pdfs = [load_bytes(ref) for ref in chunk_refs]
+        pdf_bytes = assemble_chunked_pdf(chunk_pdfs, assembly["head_styles"], **assembly["options"])
+        finish_rendered_job(job_id, pdf_bytes, start_time, user_id, render_key)
+    except Exception as e:
+        logger.error(f"Job {job_id} chunk assembly failed: {e}")
+        fail_rendered_job(job_id, str(e), user_id, render_key)
+    finally:
+        delete_payload(assembly_ref)
+        for ref in chunk_refs:
+            delete_payload(ref)
+
+
+@celery_app.task(ignore_result=True)
+def fail_chunked_render(
+    request,
+    exc,
+    traceback,
+    job_id: str,
+    assembly_ref: str,
+    user_id: Optional[str] = None,
+    render_key: Optional[str] = None
+) -> None:
+    """Chord error callback: a chunk failed, so the job fails."""
+    fail_rendered_job(job_id, str(exc), user_id, render_key)
+    delete_payload(assembly_ref)
+
+
+@celery_app.task(ignore_result=True)
+def watch_render_follower(
+    job_id: str,
+    render_key: str,
+    payload_ref: str,
+    user_id: Optional[str] = None
+) -> None:
+    """
+    Watchdog of a job coalesced onto an identical in-flight render.
+
+    Runs every RENDER_WATCHDOG_SECONDS until the job is settled. If the
+    leader's claim disappears without a result (the leader was killed, or
+    its task never ran), the follower takes the render over with its own
+    payload; if the PDF was cached meanwhile, the job completes from it.
+
+    Args:
+        job_id: The follower job
+        render_key: Render cache key the job is waiting on
+        payload_ref: The follower's own {"html", "options"} payload
+        user_id: Optional user ID for webhook notifications
+    """
+    status = get_job_status(job_id)
+    if status is None or status.get("status") != "pending":
+        # Completed or failed by the leader (or expired)
+        delete_payload(payload_ref)
+        return
+
+    outcome, storage = watch_render(render_key, job_id)
+    if outcome == "waiting":
+        watch_render_follower.apply_async(
+            kwargs={"job_id": job_id, "render_key": render_key, "payload_ref": payload_ref, "user_id": user_id},
+            countdown=RENDER_WATCHDOG_SECONDS
+        )
+    elif outcome == "hit":
+        store_pdf_ref(job_id, render_blob_key(render_key), retention_seconds())
+        complete_job(job_id, storage, 0, user_id)
+        delete_payload(payload_ref)
+    else:
+        logger.warning(f"Job {job_id} took over render {render_key} from a leader that did not finish")
+        generate_pdf_task.delay(job_id=job_id, payload_ref=payload_ref, user_id=user_id, render_key=render_key)
+
+
+def enqueue_pdf_tasks(jobs: list) -> None:
+    """
+    Enqueues many generate_pdf_task calls at once, as a Celery group.
+
+    Args:
+        jobs: Keyword arguments of each generate_pdf_task call
+    """
+    group(generate_pdf_task.s(**job) for job in jobs).apply_async()
@@ -0,0 +1,306 @@
+"""
+PDF templates: one registered layout, rendered from a JSON data payload.
+
+Most traffic is the same layout with different data, yet every job sent the
+full HTML through sanitize_html and WeasyPrint parsed its styles from
+scratch. A template is registered once (POST /api/v1/templates) and jobs
+send only its id and their data:
+
+- Registration sanitizes the markup with the regular sanitizer. Jinja tags
+  are swapped for HTML comment placeholders first, so the sanitizer's parser
+  leaves them where they are, and restored afterwards.
+- Templates render in a sandboxed Jinja environment that autoescapes every
+  value and has no "safe" filter, so the output is as safe as sanitized HTML
+  without sanitizing each job. Data in href/src/cite attributes is checked
+  against the sanitizer's URL schemes.
+- Workers compile a template once per process (TEMPLATE_CACHE_SIZE entries,
+  keyed by id and version). Its static <style> blocks are parsed once into
+  WeasyPrint stylesheets and removed from the markup.
+- Template records are stored in Supabase and read through a Redis cache
+  (template:{id}, TEMPLATE_RECORD_TTL).
+"""
+
+import hashlib
+import html as html_lib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import redis
+
+from .config import TEMPLATE_CACHE_SIZE, TEMPLATE_RECORD_TTL
+from .redis_client import get_redis
+from .supabase_client import insert_template, fetch_template, fetch_user_templates, remove_template
+
+try:
+    from jinja2 import nodes, TemplateSyntaxError
+    from jinja2.sandbox import SandboxedEnvironment
+    JINJA2_AVAILABLE = True
+except ImportError:
+    JINJA2_AVAILABLE = False
+
+
+class TemplateError(Exception):
+    """Raised when a template cannot be registered or rendered."""
+
+
+_TAG_PATTERN = re.compile(r"\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}", re.DOTALL)
+_PLACEHOLDER_PATTERN = re.compile(r"<!--tpl-(\d+)-->|&lt;!--tpl-(\d+)--(?:&gt;|>)")
+_COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+_STYLE_BLOCK_PATTERN = re.compile(r"<style[^>]*>(.*?)</style>", re.DOTALL | re.IGNORECASE)
+_DYNAMIC_URL_PATTERN = re.compile(r"""\b(?:href|src|cite)=(["'])[^"']*?(?:\{\{|\{%)""")
+_URL_ATTRIBUTE_PATTERN = re.compile(r"""\b(href|src|cite)=(["'])(.*?)\2""", re.DOTALL)
+_SCHEME_PATTERN = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.\-]*):")
+
+# Same URL schemes the sanitizer (bleach) allows
+_ALLOWED_URL_SCHEMES = {"http", "https", "mailto"}
+
+# Tags that need a template loader (templates are self-contained)
+_LOADER_NODES = ("Extends", "Include", "Import", "FromImport")
+
+_environment = None
+
+
+def _get_environment():
+    global _environment
+    if not JINJA2_AVAILABLE:
+        raise TemplateError("Templates are unavailable: jinja2 is not installed")
+    if _environment is None:
+        environment = SandboxedEnvironment(autoescape=True)
+        environment.filters.pop("safe", None)
+        _environment = environment
+    return _environment
+
+
+def _compile(source: str):
+    """Compiles template source, rejecting anything that could bypass escaping."""
+    environment = _get_environment()
+    try:
+        tree = environment.parse(source)
+    except TemplateSyntaxError as e:
+        raise TemplateError(f"Template syntax error on line {e.lineno}: {e.message}")
+    if next(tree.find_all(nodes.EvalContextModifier), None) is not None:
+        raise TemplateError("Templates cannot turn autoescaping off")
+    if next(tree.find_all(tuple(getattr(nodes, name) for name in _LOADER_NODES)), None) is not None:
+        raise TemplateError("Templates cannot extend, include or import other templates")
+    try:
+        return environment.from_string(tree)
+    except TemplateSyntaxError as e:
+        raise TemplateError(f"Template error on line {e.lineno}: {e.message}")
+
+
+def prepare_template_source(source: str, sanitize: Callable[[str], str]) -> tuple:
+    """
+    Sanitizes a template's markup while keeping its Jinja tags.
+
+    Args:
+        source: Template source (HTML with Jinja tags)
+        sanitize: HTML sanitizer that keeps HTML comments
+
+    Returns:
+        (sanitized source, dynamic_urls): dynamic_urls is True if tags are
+        used inside href/src/cite attributes
+
+    Raises:
+        TemplateError: if the template is invalid or a tag would not survive
+            sanitization (tags must be in text or in allowed attribute values)
+    """
+    tags = []
+
+    def stash(match):
+        if match.group(0).startswith("{#"):
+            return ""
+        tags.append(match.group(0))
+        return f"<!--tpl-{len(tags) - 1}-->"
+
+    masked = _TAG_PATTERN.sub(stash, _COMMENT_PATTERN.sub("", source))
+    cleaned = sanitize(masked)
+
+    restored = set()
+
+    def restore(match):
+        index = int(match.group(1) or match.group(2))
+        restored.add(index)
+        return tags[index] if index < len(tags) else ""
+
+    cleaned = _PLACEHOLDER_PATTERN.sub(restore, cleaned)
+    if restored != set(range(len(tags))):
+        raise TemplateError(
+            "Template tags must be placed in text content or in allowed attribute values"
+        )
+    cleaned = _COMMENT_PATTERN.sub("", cleaned)
+
+    _compile(cleaned)
+    return cleaned, bool(_DYNAMIC_URL_PATTERN.search(cleaned))
+
+
+def _strip_unsafe_urls(html: str) -> str:
+    """Empties href/src/cite values whose scheme the sanitizer would not allow."""
+    def check(match):
+        value = html_lib.unescape(match.group(3)).strip()
+        scheme = _SCHEME_PATTERN.match(value)
+        if scheme and scheme.group(1).lower() not in _ALLOWED_URL_SCHEMES:
+            return f"{match.group(1)}={match.group(2)}{match.group(2)}"
+        return match.group(0)
+
+    return _URL_ATTRIBUTE_PATTERN.sub(check, html)
+
+
+def _extract_static_styles(source: str) -> tuple:
+    """Splits <style> blocks without template tags out of the markup."""
+    styles = []
+
+    def take(match):
+        css = match.group(1)
+        if "{{" in css or "{%" in css:
+            return match.group(0)
+        styles.append(css)
+        return ""
+
+    return _STYLE_BLOCK_PATTERN.sub(take, source), styles
+
+
+def _record_key(template_id: str) -> str:
+    return f"template:{template_id}"
+
+
+def _cache_record(record: dict) -> None:
+    try:
+        get_redis().setex(_record_key(record["id"]), TEMPLATE_RECORD_TTL, json.dumps(record))
+    except redis.RedisError as e:
+        print(f"WARNING: Could not cache template {record['id']} ({e}).")
+
+
+def create_template(user_id: str, name: str, source: str, sanitize: Callable[[str], str]) -> dict:
+    """
+    Registers a template.
+
+    Args:
+        user_id: Owner of the template
+        name: Display name
+        source: Template source (HTML with Jinja tags)
+        sanitize: HTML sanitizer that keeps HTML comments
+
+    Returns:
+        The stored template record
+
+    Raises:
+        TemplateError: if the template is invalid
+        RuntimeError: if it could not be stored
+    """
+    clean_source, dynamic_urls = prepare_template_source(source, sanitize)
+    record = insert_template({
+        "user_id": user_id,
+        "name": name,
+        "source": clean_source,
+        "version": hashlib.sha256(clean_source.encode("utf-8")).hexdigest()[:16],
+        "dynamic_urls": dynamic_urls,
+    })
+    if record is None:
+        raise RuntimeError("Failed to store template")
+    _cache_record(record)
+    return record
+
+
+def get_template(template_id: str) -> Optional[dict]:
+    """Retrieve a template record (Redis cache first, then the database)."""
+    try:
+        cached = get_redis().get(_record_key(template_id))
+        if cached is not None:
+            return json.loads(cached)
+    except redis.RedisError as e:
+        print(f"WARNING: Template cache unavailable ({e}). Reading template from the database.")
+
+    record = fetch_template(template_id)
+    if record is not None:
+        _cache_record(record)
+    return record
+
+
+def list_templates(user_id: str) -> list:
+    """List a user's templates (without source), newest first."""
+    return fetch_user_templates(user_id)
+
+
+def delete_template(template_id: str, user_id: str) -> bool:
+    """Deletes a user's template. Returns True if it existed."""
+    if not remove_template(template_id, user_id):
+        return False
+    try:
+        get_redis().delete(_record_key(template_id))
+    except redis.RedisError as e:
+        print(f"WARNING: Could not evict template {template_id} from the cache ({e}).")
+    return True
+
+
+def template_payload(record: dict, data: Optional[dict]) -> dict:
+    """Job payload fields for rendering a template (see render_template)."""
+    return {"template": {"id": record["id"], "version": record["version"]}, "data": data or {}}
+
+
+def template_render_source(record: dict, data: Optional[dict]) -> str:
+    """Stands in for the HTML when computing the render cache key of a template job."""
+    return json.dumps(template_payload(record, data), sort_keys=True, ensure_ascii=False)
+
+
+class _CompiledTemplate:
+    __slots__ = ("template", "stylesheets", "dynamic_urls")
+
+    def __init__(self, template, stylesheets: list, dynamic_urls: bool):
+        self.template = template
+        self.stylesheets = stylesheets
+        self.dynamic_urls = dynamic_urls
+
+
+_compiled: OrderedDict = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def _get_compiled(template_id: str, version: str) -> _CompiledTemplate:
+    key = (template_id, version)
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+
+    record = get_template(template_id)
+    if record is None or record["version"] != version:
+        raise TemplateError(f"Template {template_id} no longer exists")
+
+    from .pdf_service import CSS
+
+    markup, styles = _extract_static_styles(record["source"])
+    stylesheets = [CSS(string=css) for css in styles] if CSS is not None else []
+    compiled = _CompiledTemplate(_compile(markup), stylesheets, bool(record.get("dynamic_urls")))
+
+    with _compiled_lock:
+        _compiled[key] = compiled
+        _compiled.move_to_end(key)
+        while len(_compiled) > TEMPLATE_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def render_template(template: dict, data: dict) -> tuple:
+    """
+    Renders a template job's HTML with this worker's compiled template.
+
+    Args:
+        template: {"id", "version"} from the job payload
+        data: The job's JSON data
+
+    Returns:
+        (html, stylesheets): stylesheets are the template's pre-parsed
+        static styles, to pass to generate_pdf_from_html
+
+    Raises:
+        TemplateError: if the template no longer exists
+    """
+    compiled = _get_compiled(template["id"], template["version"])
+    html = compiled.template.render(data)
+    if compiled.dynamic_urls:
+        html = _strip_unsafe_urls(html)
+    return html, compiled.stylesheets
@@ -131,6 +131,122 @@ class TestJobDownloadEndpoint:
         assert response.status_code == 404
 
 
+class TestStreamingDownload:
+    """Tests for Range, ETag and conditional GET on the download endpoint."""
+
+    PDF = b"%PDF-1.7 0123456789"
+
+    @pytest.fixture
+    def stored_job(self):
+        from unittest.mock import patch, MagicMock
+
+        blob = MagicMock(size=len(self.PDF))
+        blob.iter_range.side_effect = lambda start, end, *args: iter([self.PDF[start:end + 1]])
+        status = {"status": "completed", "size": len(self.PDF), "storage": {"etag": "abc123"}}
+        with patch('backend.main.get_job_status_async', return_value=status), \
+             patch('backend.main.open_pdf', return_value=blob):
+            yield blob
+
+    def test_full_download_has_etag_and_length(self, client, stored_job):
+        response = client.get("/api/v1/jobs/job-1/download")
+        assert response.status_code == 200
+        assert response.content == self.PDF
+        assert response.headers["etag"] == '"abc123"'
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["content-length"] == str(len(self.PDF))
+
+    def test_range_returns_partial_content(self, client, stored_job):
+        response = client.get("/api/v1/jobs/job-1/download", headers={"Range": "bytes=9-"})
+        assert response.status_code == 206
+        assert response.content == self.PDF[9:]
+        assert response.headers["content-range"] == f"bytes 9-{len(self.PDF) - 1}/{len(self.PDF)}"
+
+    def test_suffix_range(self, client, stored_job):
+        response = client.get("/api/v1/jobs/job-1/download", headers={"Range": "bytes=-4"})
+        assert response.status_code == 206
+        assert response.content == b"6789"
+
+    def test_unsatisfiable_range(self, client, stored_job):
+        response = client.get("/api/v1/jobs/job-1/download", headers={"Range": "bytes=500-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(self.PDF)}"
+
+    def test_if_none_match_returns_304(self, client, stored_job):
+        response = client.get("/api/v1/jobs/job-1/download", headers={"If-None-Match": '"abc123"'})
+        assert response.status_code == 304
+        stored_job.iter_range.assert_not_called()
+
+    def test_stale_if_range_sends_full_pdf(self, client, stored_job):
+        response = client.get(
+            "/api/v1/jobs/job-1/download",
+            headers={"Range": "bytes=9-", "If-Range": '"other"'}
+        )
+        assert response.status_code == 200
+        assert response.content == self.PDF
+
+
+class TestSyncMode:
+    """Tests for mode=sync (inline rendering of small documents)."""
+
+    PDF = b"%PDF-1.7 inline"
+
+    def _post(self, client, valid_html, **extra):
+        return client.post(
+            "/api/v1/convert",
+            json={"html_content": valid_html, "action": "download", "mode": "sync", **extra}
+        )
+
+    def test_small_document_returns_pdf(self, client, valid_html):
+        from concurrent.futures import Future
+        from unittest.mock import patch, MagicMock
+
+        future = Future()
+        future.set_result(self.PDF)
+        mock_task = MagicMock()
+        with patch('backend.main.submit_inline_render', return_value=future), \
+             patch('backend.main.generate_pdf_task', mock_task), \
+             patch('backend.inline_render.finish_rendered_job') as mock_finish:
+            response = self._post(client, valid_html)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.headers["content-disposition"].startswith("attachment")
+        assert response.content == self.PDF
+        job_id = response.headers["x-job-id"]
+        mock_finish.assert_called_once()
+        assert mock_finish.call_args.args[:2] == (job_id, self.PDF)
+        mock_task.delay.assert_not_called()
+
+    def test_ineligible_document_is_queued(self, client, valid_html):
+        from unittest.mock import patch, MagicMock
+
+        mock_task = MagicMock()
+        with patch('backend.main.submit_inline_render', return_value=None), \
+             patch('backend.main.generate_pdf_task', mock_task):
+            response = self._post(client, valid_html)
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+        mock_task.delay.assert_called_once()
+
+    def test_render_over_budget_returns_pending_job(self, client, valid_html):
+        from concurrent.futures import Future
+        from unittest.mock import patch
+
+        future = Future()
+        with patch('backend.main.submit_inline_render', return_value=future), \
+             patch('backend.main.INLINE_RENDER_TIMEOUT_MS', 10):
+            response = self._post(client, valid_html)
+        future.cancel()
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+
+    def test_invalid_mode_returns_422(self, client, valid_html):
+        response = self._post(client, valid_html, mode="later")
+        assert response.status_code == 422
+
+
 class TestFullAsyncFlow:
     """Tests for the complete async conversion flow."""
 
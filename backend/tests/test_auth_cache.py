@@ -0,0 +1,188 @@
+"""
+Tests for cached API key authentication.
+"""
+import json
+import httpx
+import pytest
+from unittest.mock import patch, MagicMock
+
+from backend import auth_cache, supabase_client
+from backend.auth_cache import validate_api_key, validate_api_key_async, invalidate_api_key, flush_last_used
+
+VALID_ROW = {
+    "api_key_id": "key-1",
+    "user_id": "user-1",
+    "plan": "pro",
+    "monthly_limit": 1000,
+    "is_valid": True,
+}
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis calls used by auth_cache."""
+
+    def __init__(self):
+        self.data = {}
+        self.hashes = {}
+        self.published = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.hashes.pop(key, None)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        return []
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    def hgetall(self, key):
+        return self.hashes.get(key, {})
+
+    def rename(self, src, dst):
+        import redis
+        if src not in self.hashes:
+            raise redis.ResponseError("no such key")
+        self.hashes[dst] = self.hashes.pop(src)
+
+
+class AsyncFakeRedis:
+    """redis.asyncio-shaped view of a FakeRedis (commands awaited, pipelines queued)."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get(self, key):
+        return self.redis.get(key)
+
+    async def hset(self, key, field, value):
+        self.redis.hset(key, field, value)
+
+    def pipeline(self):
+        return self
+
+    def setex(self, key, ttl, value):
+        self.redis.setex(key, ttl, value)
+
+    async def execute(self):
+        return []
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    auth_cache._local_cache.clear()
+    auth_cache._last_recorded.clear()
+    with patch("backend.auth_cache.get_redis", return_value=redis), \
+         patch("backend.auth_cache.get_async_redis", return_value=AsyncFakeRedis(redis)):
+        yield redis
+
+
+class TestValidateApiKey:
+    """Tests for the cache layers."""
+
+    def test_repeat_calls_hit_cache(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key", return_value=VALID_ROW) as mock_lookup:
+            assert validate_api_key("hash-1")["user_id"] == "user-1"
+            assert validate_api_key("hash-1")["user_id"] == "user-1"
+        assert mock_lookup.call_count == 1
+
+    def test_redis_entry_shared_across_processes(self, fake_redis):
+        fake_redis.data["auth:key:hash-1"] = json.dumps(VALID_ROW).encode()
+        with patch("backend.auth_cache.lookup_api_key") as mock_lookup:
+            assert validate_api_key("hash-1")["api_key_id"] == "key-1"
+        mock_lookup.assert_not_called()
+
+    def test_unknown_key_is_cached_as_invalid(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key", return_value={"is_valid": False}) as mock_lookup:
+            assert validate_api_key("bad") is None
+            assert validate_api_key("bad") is None
+        assert mock_lookup.call_count == 1
+
+    def test_database_error_is_not_cached(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key", side_effect=[None, VALID_ROW]):
+            assert validate_api_key("hash-1") is None
+            assert validate_api_key("hash-1") is not None
+
+    def test_records_last_used_once_per_interval(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key", return_value=VALID_ROW):
+            validate_api_key("hash-1")
+            validate_api_key("hash-1")
+        assert fake_redis.hashes["auth:last_used"].keys() == {b"key-1"}
+
+
+class TestValidateApiKeyAsync:
+    """Tests for the event-loop variant used by the API."""
+
+    async def test_shares_cache_with_sync_lookups(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key_async", return_value=VALID_ROW) as mock_lookup:
+            assert (await validate_api_key_async("hash-1"))["user_id"] == "user-1"
+        assert mock_lookup.await_count == 1
+        auth_cache._local_cache.clear()
+        with patch("backend.auth_cache.lookup_api_key") as mock_sync_lookup:
+            assert validate_api_key("hash-1")["user_id"] == "user-1"
+        mock_sync_lookup.assert_not_called()
+        assert fake_redis.hashes["auth:last_used"].keys() == {b"key-1"}
+
+    async def test_database_error_is_not_cached(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key_async", return_value=None):
+            assert await validate_api_key_async("hash-1") is None
+        assert "auth:key:hash-1" not in fake_redis.data
+
+    async def test_lookup_over_postgrest(self, monkeypatch):
+        def handler(request):
+            assert request.url.path == "/rest/v1/rpc/lookup_api_key"
+            assert json.loads(request.content) == {"p_key_hash": "hash-1"}
+            return httpx.Response(200, json=[VALID_ROW])
+
+        client = httpx.AsyncClient(base_url="https://db.example", transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(supabase_client, "_async_http", client)
+        assert await supabase_client.lookup_api_key_async("hash-1") == VALID_ROW
+        await supabase_client.close_async_http()
+
+
+class TestRevocation:
+    """Tests for revocation fan-out."""
+
+    def test_invalidate_by_id_drops_and_publishes(self, fake_redis):
+        with patch("backend.auth_cache.lookup_api_key", return_value=VALID_ROW) as mock_lookup:
+            validate_api_key("hash-1")
+            invalidate_api_key(api_key_id="key-1")
+            validate_api_key("hash-1")
+        assert fake_redis.published == [(auth_cache.REVOCATION_CHANNEL, "hash-1")]
+        assert mock_lookup.call_count == 2
+
+    def test_revocation_message_drops_local_entry(self, fake_redis):
+        auth_cache._local_set("hash-1", VALID_ROW)
+        auth_cache._handle_revocation({"data": b"hash-1"})
+        assert auth_cache._local_get("hash-1") is None
+
+
+class TestLastUsedFlush:
+    """Tests for batched last_used_at updates."""
+
+    def test_flush_sends_one_batch(self, fake_redis):
+        fake_redis.hset("auth:last_used", "key-1", 1700000000)
+        fake_redis.hset("auth:last_used", "key-2", 1700000100)
+        with patch("backend.auth_cache.touch_api_keys", return_value=True) as mock_touch:
+            assert flush_last_used() == 2
+        assert mock_touch.call_args.args[0] == {"key-1": 1700000000.0, "key-2": 1700000100.0}
+        assert fake_redis.hashes == {}
+
+    def test_flush_with_nothing_recorded(self, fake_redis):
+        with patch("backend.auth_cache.touch_api_keys") as mock_touch:
+            assert flush_last_used() == 0
+        mock_touch.assert_not_called()
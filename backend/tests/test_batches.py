@@ -0,0 +1,148 @@
+"""
+Tests for batch conversions.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+from backend.batches import record_batch_result
+
+
+@pytest.fixture
+def batch_mocks():
+    """Patches the batch pipeline's Redis, quota and queue calls."""
+    quota = {"can_convert": True, "used_this_month": 10, "monthly_limit": 100, "remaining": 90}
+    with patch("backend.main.reserve_quota_batch_async", return_value=quota) as reserve, \
+         patch("backend.main.create_batch_async") as create, \
+         patch("backend.main.set_job_statuses_async") as set_statuses, \
+         patch("backend.main.record_conversions_async") as record, \
+         patch("backend.main.store_payloads", side_effect=lambda payloads: [f"ref-{i}" for i in range(len(payloads))]) as store, \
+         patch("backend.main.enqueue_pdf_tasks") as enqueue, \
+         patch("backend.main.sanitize_html", side_effect=lambda html: html) as sanitize:
+        yield {
+            "reserve": reserve,
+            "create": create,
+            "set_statuses": set_statuses,
+            "record": record,
+            "store": store,
+            "enqueue": enqueue,
+            "sanitize": sanitize,
+        }
+
+
+def _documents(count):
+    return [{"html_content": f"<p>Invoice number {i}</p>", "reference": f"NF-{i}"} for i in range(count)]
+
+
+class TestCreateBatch:
+    """Tests for POST /api/v1/batches."""
+
+    def test_one_call_per_stage_for_the_whole_batch(self, client, batch_mocks):
+        response = client.post("/api/v1/batches", json={"documents": _documents(3)})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total"] == 3
+        assert [job["reference"] for job in body["jobs"]] == ["NF-0", "NF-1", "NF-2"]
+        assert body["quota"] == {"used": 13, "limit": 100, "remaining": 87}
+
+        job_ids = [job["job_id"] for job in body["jobs"]]
+        for stage in ("reserve", "create", "set_statuses", "record", "store", "enqueue"):
+            assert batch_mocks[stage].call_count == 1, stage
+        assert batch_mocks["reserve"].call_args.args[1] == job_ids
+        assert batch_mocks["set_statuses"].call_args.args[0] == job_ids
+        assert len(batch_mocks["record"].call_args.args[0]) == 3
+        enqueued = batch_mocks["enqueue"].call_args.args[0]
+        assert [job["job_id"] for job in enqueued] == job_ids
+        assert [job["payload_ref"] for job in enqueued] == ["ref-0", "ref-1", "ref-2"]
+
+    def test_document_options_override_defaults(self, client, batch_mocks):
+        documents = _documents(2)
+        documents[1]["options"] = {"orientation": "landscape"}
+        client.post("/api/v1/batches", json={
+            "documents": documents,
+            "defaults": {"orientation": "portrait", "footer_html": "<div>Footer</div>"},
+        })
+        payloads = batch_mocks["store"].call_args.args[0]
+        assert [p["options"]["orientation"] for p in payloads] == ["portrait", "landscape"]
+        # The shared footer is sanitized once, not once per document
+        sanitized = [call.args[0] for call in batch_mocks["sanitize"].call_args_list]
+        assert sanitized.count("<div>Footer</div>") == 1
+
+    def test_invalid_document_option_is_reported_with_its_index(self, client, batch_mocks):
+        documents = _documents(2)
+        documents[1]["options"] = {"orientation": "diagonal"}
+        response = client.post("/api/v1/batches", json={"documents": documents})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"][:3] == ["body", "documents", 1]
+        batch_mocks["reserve"].assert_not_called()
+
+    def test_quota_must_cover_the_whole_batch(self, client, batch_mocks):
+        batch_mocks["reserve"].return_value = {
+            "can_convert": False, "used_this_month": 99, "monthly_limit": 100, "remaining": 1
+        }
+        response = client.post("/api/v1/batches", json={"documents": _documents(2)})
+        assert response.status_code == 429
+        assert response.json()["detail"]["error"] == "quota_exceeded"
+        batch_mocks["enqueue"].assert_not_called()
+
+    def test_rejects_oversized_batch(self, client, batch_mocks):
+        with patch("backend.main.BATCH_MAX_BYTES", 30):
+            response = client.post("/api/v1/batches", json={"documents": _documents(3)})
+        assert response.status_code == 413
+
+    def test_requires_api_key(self, client_no_auth):
+        assert client_no_auth.post("/api/v1/batches", json={"documents": _documents(1)}).status_code == 401
+
+
+class TestGetBatch:
+    """Tests for GET /api/v1/batches/{batch_id}."""
+
+    def test_returns_aggregate_status(self, client):
+        batch = {"batch_id": "b1", "status": "processing", "total": 2, "completed": 1, "failed": 0, "pending": 1}
+        with patch("backend.main.get_batch_async", return_value=batch):
+            response = client.get("/api/v1/batches/b1")
+        assert response.json()["pending"] == 1
+
+    def test_missing_batch(self, client):
+        with patch("backend.main.get_batch_async", return_value=None):
+            assert client.get("/api/v1/batches/missing").status_code == 404
+
+
+class TestRecordBatchResult:
+    """Tests for counting finished jobs in their batch."""
+
+    def _record(self, script_result):
+        redis_client = MagicMock()
+        redis_client.eval.return_value = script_result
+        with patch("backend.batches.get_redis", return_value=redis_client), \
+             patch("backend.batches.send_webhook_sync") as mock_webhook:
+            in_batch = record_batch_result("job-1", "completed")
+        return in_batch, mock_webhook
+
+    def test_job_outside_a_batch(self):
+        in_batch, mock_webhook = self._record(0)
+        assert in_batch is False
+        mock_webhook.assert_not_called()
+
+    def test_batch_still_running(self):
+        in_batch, mock_webhook = self._record(1)
+        assert in_batch is True
+        mock_webhook.assert_not_called()
+
+    def test_last_job_sends_one_batch_webhook(self):
+        in_batch, mock_webhook = self._record([b"b1", b"user-1", b"3", b"2", b"1"])
+        assert in_batch is True
+        mock_webhook.assert_called_once()
+        kwargs = mock_webhook.call_args.kwargs
+        assert (kwargs["user_id"], kwargs["event_type"]) == ("user-1", "batch.completed")
+        assert kwargs["data"] == {"batch_id": "b1", "status": "completed", "total": 3, "completed": 2, "failed": 1}
+
+    def test_batch_job_skips_its_own_webhook(self):
+        from backend.tasks import complete_job
+
+        with patch("backend.tasks.set_job_status"), \
+             patch("backend.tasks.commit_quota"), \
+             patch("backend.tasks.record_conversion_status"), \
+             patch("backend.tasks.record_batch_result", return_value=True), \
+             patch("backend.tasks.send_webhook_sync") as mock_webhook:
+            complete_job("job-1", {"size": 10}, 5, "user-1")
+        mock_webhook.assert_not_called()
@@ -0,0 +1,167 @@
+"""
+Tests for chunked rendering of very large documents.
+"""
+import io
+import pytest
+from unittest.mock import patch, MagicMock
+
+from backend.pdf_service import _split_at_page_breaks, plan_chunked_render, assemble_chunked_pdf
+
+PAGE = '<p>Row</p><div class="page-break"></div>'
+
+
+def _document(pages):
+    return f"<html><head><style>p {{ color: red; }}</style></head><body>{PAGE * pages}</body></html>"
+
+
+def _pdf(pages):
+    pikepdf = pytest.importorskip("pikepdf")
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+class TestSplitAtPageBreaks:
+    """Tests for cutting the body at top-level page breaks."""
+
+    def test_splits_after_page_break_and_before_page_break_before(self):
+        body = '<h1>A</h1><div class="page-break"></div><p>B</p><section class="page-break-before">C</section>'
+        assert _split_at_page_breaks(body) == [
+            '<h1>A</h1><div class="page-break"></div>',
+            '<p>B</p>',
+            '<section class="page-break-before">C</section>',
+        ]
+
+    def test_nested_page_breaks_are_not_boundaries(self):
+        body = '<div><p>A</p><div class="page-break"></div><p>B</p></div>'
+        assert _split_at_page_breaks(body) == [body]
+
+    def test_void_page_break(self):
+        assert _split_at_page_breaks('<p>A</p><hr class="page-break"><p>B</p>') == [
+            '<p>A</p><hr class="page-break">', '<p>B</p>'
+        ]
+
+    def test_style_contents_are_not_markup(self):
+        body = '<style>div > p { color: red; }</style><p>A</p><div class="page-break"></div><p>B</p>'
+        assert len(_split_at_page_breaks(body)) == 2
+
+    def test_unbalanced_markup_is_not_split(self):
+        body = '<div><p>A</p><div class="page-break"></div>'
+        assert _split_at_page_breaks(body) == [body]
+
+
+class TestPlanChunkedRender:
+    """Tests for grouping pages into chunks."""
+
+    def test_chunks_are_complete_documents(self):
+        plan = plan_chunked_render(_document(12), {}, max_chunks=4, min_chunk_bytes=10)
+        assert len(plan.chunks) == 4
+        assert all(chunk.startswith("<html><head><style>") and chunk.endswith("</body></html>") for chunk in plan.chunks)
+        assert sum(chunk.count("<p>Row</p>") for chunk in plan.chunks) == 12
+        assert plan.head_styles == "<style>p { color: red; }</style>"
+
+    def test_small_documents_are_not_chunked(self):
+        assert plan_chunked_render(_document(12), {}, max_chunks=4, min_chunk_bytes=10 ** 6) is None
+        assert plan_chunked_render("<p>No page breaks</p>", {}, max_chunks=4, min_chunk_bytes=1) is None
+
+    def test_header_footer_and_page_numbers_move_to_assembly(self):
+        options = {
+            "header_html": "<div>Report</div>",
+            "header_height": "3cm",
+            "include_page_numbers": True,
+            "margin_bottom": "1.5cm",
+            "chunked": True,
+        }
+        plan = plan_chunked_render(_document(4), options, max_chunks=2, min_chunk_bytes=10)
+        assert plan.chunk_options["header_html"] is None
+        assert plan.chunk_options["footer_html"] is None
+        assert plan.chunk_options["include_page_numbers"] is False
+        assert plan.chunk_options["margin_top"] == "3cm"
+        assert "chunked" not in plan.chunk_options
+        # Standalone numbering is stamped as a footer across the whole document
+        assert "{{page}}" in plan.assembly_options["footer_html"]
+        assert plan.assembly_options["footer_height"] == "1.5cm"
+
+
+class TestAssembly:
+    """Tests for concatenating chunks."""
+
+    def test_concatenates_in_order(self):
+        pikepdf = pytest.importorskip("pikepdf")
+        pdf_bytes = assemble_chunked_pdf([_pdf(2), _pdf(3)], "")
+        assert len(pikepdf.open(io.BytesIO(pdf_bytes)).pages) == 5
+
+    def test_assembly_completes_the_job(self):
+        from backend.tasks import assemble_pdf_chunks
+
+        with patch("backend.tasks.load_payload", return_value={"head_styles": "", "options": {}}), \
+             patch("backend.tasks.load_bytes", side_effect=lambda ref: ref.encode()), \
+             patch("backend.tasks.assemble_chunked_pdf", return_value=b"%PDF") as mock_assemble, \
+             patch("backend.tasks.finish_rendered_job") as mock_finish, \
+             patch("backend.tasks.delete_payload") as mock_delete:
+            assemble_pdf_chunks.run(["c1", "c2"], job_id="job-1", assembly_ref="a1", start_time=0, user_id="u1")
+        assert mock_assemble.call_args.args[0] == [b"c1", b"c2"]
+        mock_finish.assert_called_once_with("job-1", b"%PDF", 0, "u1", None)
+        assert sorted(call.args[0] for call in mock_delete.call_args_list) == ["a1", "c1", "c2"]
+
+    def test_assembly_failure_fails_the_job_once(self):
+        from backend.tasks import assemble_pdf_chunks
+
+        with patch("backend.tasks.load_payload", side_effect=RuntimeError("expired")), \
+             patch("backend.tasks.delete_payload"), \
+             patch("backend.tasks.fail_rendered_job") as mock_fail:
+            assemble_pdf_chunks.run([], job_id="job-1", assembly_ref="a1", start_time=0)
+        mock_fail.assert_called_once_with("job-1", "expired", None, None)
+
+
+class TestDispatch:
+    """Tests for starting a chunked render from generate_pdf_task."""
+
+    def test_chunks_are_rendered_by_a_chord(self):
+        from backend.tasks import generate_pdf_task
+
+        with patch("backend.tasks.set_job_status"), \
+             patch("backend.tasks.store_payloads", side_effect=lambda payloads: [f"c{i}" for i in range(len(payloads))]), \
+             patch("backend.tasks.store_payload", return_value="a1"), \
+             patch("backend.tasks.CHUNKED_RENDER_MIN_CHUNK_BYTES", 10), \
+             patch("backend.tasks.CHUNKED_RENDER_MAX_CHUNKS", 3), \
+             patch("backend.tasks.chord") as mock_chord, \
+             patch("backend.tasks.generate_pdf_from_html") as mock_generate:
+            result = generate_pdf_task.run(job_id="job-1", html=_document(9), options={"chunked": True})
+        assert result == {"status": "processing", "chunked": True}
+        mock_generate.assert_not_called()
+        header = list(mock_chord.call_args.args[0])
+        assert [signature.args[0] for signature in header] == ["c0", "c1", "c2"]
+        callback = mock_chord.return_value.call_args.args[0]
+        assert callback.kwargs["assembly_ref"] == "a1"
+
+    def test_unsplittable_document_renders_in_one_piece(self):
+        from backend.tasks import generate_pdf_task
+
+        with patch("backend.tasks.set_job_status"), \
+             patch("backend.tasks.chord") as mock_chord, \
+             patch("backend.tasks.generate_pdf_from_html", return_value=b"%PDF") as mock_generate, \
+             patch("backend.tasks.finish_rendered_job"):
+            generate_pdf_task.run(job_id="job-1", html="<p>Short</p>", options={"chunked": True})
+        mock_chord.assert_not_called()
+        assert "chunked" not in mock_generate.call_args.kwargs
+
+    def test_redis_only_renders_in_one_piece(self):
+        from backend.tasks import generate_pdf_task
+
+        with patch("backend.tasks.set_job_status"), \
+             patch("backend.tasks.large_bytes_supported", return_value=False), \
+             patch("backend.tasks.CHUNKED_RENDER_MIN_CHUNK_BYTES", 10), \
+             patch("backend.tasks.chord") as mock_chord, \
+             patch("backend.tasks.generate_pdf_from_html", return_value=b"%PDF") as mock_generate, \
+             patch("backend.tasks.finish_rendered_job"):
+            generate_pdf_task.run(job_id="job-1", html=_document(9), options={"chunked": True})
+        mock_chord.assert_not_called()
+        mock_generate.assert_called_once()
+
+    def test_rejected_with_templates(self, client):
+        response = client.post("/api/v1/convert", json={"template_id": "tpl-1", "chunked": True})
+        assert response.status_code == 422
@@ -0,0 +1,183 @@
+"""
+Tests for write-behind conversion tracking.
+"""
+import json
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import redis
+
+from backend import conversion_log
+from backend.conversion_log import (
+    merge_events,
+    flush_conversion_events,
+    record_conversion_async,
+    record_conversion_status,
+)
+
+
+class StreamRedis:
+    """In-memory model of one stream with a single consumer group."""
+
+    def __init__(self):
+        self.entries = {}  # id -> fields
+        self.pending = {}  # id -> consumer
+        self.delivered = set()
+        self.next_id = 0
+        self.dead = []  # fields appended to the dead-letter stream
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        if name == conversion_log.DEAD_LETTER_KEY:
+            self.dead.append(fields)
+            return
+        self.next_id += 1
+        entry_id = f"{self.next_id}-0".encode()
+        self.entries[entry_id] = {k.encode(): v.encode() for k, v in fields.items()}
+        return entry_id
+
+    def xautoclaim(self, name, group, consumer, min_idle_time, count=None):
+        # Everything pending counts as idle, as if the claim timeout had passed
+        claimed = [(entry_id, self.entries.get(entry_id)) for entry_id in list(self.pending)[:count]]
+        for entry_id, _ in claimed:
+            self.pending[entry_id] = consumer
+        return [b"0-0", claimed, []]
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        new = [entry_id for entry_id in self.entries if entry_id not in self.delivered][:count]
+        if not new:
+            return []
+        for entry_id in new:
+            self.delivered.add(entry_id)
+            self.pending[entry_id] = consumer
+        return [[b"conversions:events", [(entry_id, self.entries[entry_id]) for entry_id in new]]]
+
+    def pipeline(self):
+        return self
+
+    def xack(self, name, group, *ids):
+        for entry_id in ids:
+            self.pending.pop(entry_id, None)
+
+    def xdel(self, name, *ids):
+        for entry_id in ids:
+            self.entries.pop(entry_id, None)
+
+    def execute(self):
+        return []
+
+
+@pytest.fixture
+def stream_redis():
+    client = StreamRedis()
+    with patch("backend.conversion_log.get_redis", return_value=client):
+        yield client
+
+
+def _add(client, **event):
+    client.xadd(conversion_log.STREAM_KEY, {"event": json.dumps(event)})
+
+
+class TestMergeEvents:
+    """Tests for folding events into one row per job."""
+
+    def test_merges_submission_and_completion(self):
+        rows = merge_events([
+            {"job_id": "j1", "status": "pending", "at": "2026-10-01T00:00:00", "user_id": "u1", "source": "api"},
+            {"job_id": "j1", "status": "completed", "at": "2026-10-01T00:00:05", "file_size_bytes": 10},
+        ])
+        assert rows == [{
+            "job_id": "j1",
+            "created_at": "2026-10-01T00:00:00",
+            "status": "completed",
+            "user_id": "u1",
+            "source": "api",
+            "file_size_bytes": 10,
+        }]
+
+    def test_status_never_moves_backwards(self):
+        rows = merge_events([
+            {"job_id": "j1", "status": "completed", "at": "2026-10-01T00:00:05"},
+            {"job_id": "j1", "status": "pending", "at": "2026-10-01T00:00:00", "user_id": "u1"},
+        ])
+        assert rows[0]["status"] == "completed"
+        assert rows[0]["created_at"] == "2026-10-01T00:00:00"
+
+
+class TestFlush:
+    """Tests for the stream writer."""
+
+    def test_writes_one_batch_and_acknowledges(self, stream_redis):
+        for i in range(3):
+            _add(stream_redis, job_id=f"j{i}", status="pending", at="2026-10-01T00:00:00")
+        with patch("backend.conversion_log.upsert_conversions", return_value=True) as mock_upsert:
+            assert flush_conversion_events("writer-1") == 3
+        assert mock_upsert.call_count == 1
+        assert len(mock_upsert.call_args.args[0]) == 3
+        assert stream_redis.entries == {} and stream_redis.pending == {}
+
+    def test_failed_write_is_retried(self, stream_redis):
+        _add(stream_redis, job_id="j1", status="pending", at="2026-10-01T00:00:00")
+        # The batch and the empty probe both fail: the database is down
+        with patch("backend.conversion_log.upsert_conversions", side_effect=[False, False, True]) as mock_upsert:
+            assert flush_conversion_events("writer-1") is None
+            assert len(stream_redis.pending) == 1
+            assert flush_conversion_events("writer-2") == 1
+        assert mock_upsert.call_args_list[1].args[0] == []
+        assert mock_upsert.call_args_list[0] == mock_upsert.call_args_list[2]
+        assert stream_redis.pending == {} and stream_redis.dead == []
+
+    def test_rejected_row_is_dead_lettered(self, stream_redis):
+        for i in range(5):
+            _add(stream_redis, job_id=f"j{i}", status="pending", at="2026-10-01T00:00:00")
+        _add(stream_redis, job_id="bad", status="pending", at="2026-10-01T00:00:00", user_id="no-profile")
+        written = []
+
+        def upsert(rows):
+            if any(row["job_id"] == "bad" for row in rows):
+                return False
+            written.extend(row["job_id"] for row in rows)
+            return True
+
+        with patch("backend.conversion_log.upsert_conversions", side_effect=upsert):
+            assert flush_conversion_events("writer-1") == 5
+        assert sorted(written) == [f"j{i}" for i in range(5)]
+        assert [json.loads(fields["event"])["job_id"] for fields in stream_redis.dead] == ["bad"]
+        assert stream_redis.entries == {} and stream_redis.pending == {}
+
+    def test_batch_is_capped(self, stream_redis, monkeypatch):
+        monkeypatch.setattr(conversion_log, "CONVERSION_FLUSH_BATCH", 2)
+        for i in range(3):
+            _add(stream_redis, job_id=f"j{i}", status="pending", at="2026-10-01T00:00:00")
+        with patch("backend.conversion_log.upsert_conversions", return_value=True):
+            assert flush_conversion_events("writer-1") == 2
+            assert flush_conversion_events("writer-1") == 1
+
+
+class TestRecord:
+    """Tests for appending events."""
+
+    def test_appends_status_event(self, stream_redis):
+        record_conversion_status("j1", "completed", file_size_bytes=10)
+        event = json.loads(next(iter(stream_redis.entries.values()))[b"event"])
+        assert event["status"] == "completed" and event["file_size_bytes"] == 10
+        assert "page_count" not in event
+
+    async def test_invalid_ids_are_dropped(self, stream_redis):
+        async_client = MagicMock()
+        async_client.xadd = AsyncMock()
+        async_client.xadd.side_effect = lambda **kwargs: stream_redis.xadd(**kwargs)
+        user_id = "6f1c2a9e-2b7d-4c52-9d1e-0a4b8e3f5c21"
+        with patch("backend.conversion_log.get_async_redis", return_value=async_client):
+            await record_conversion_async("j1", user_id="web-user", ip_address="testclient")
+            await record_conversion_async("j2", user_id=user_id, ip_address="10.0.0.1")
+        first, second = [json.loads(fields[b"event"]) for fields in stream_redis.entries.values()]
+        assert "user_id" not in first and "ip_address" not in first
+        assert second["user_id"] == user_id and second["ip_address"] == "10.0.0.1"
+
+    def test_falls_back_to_database_without_redis(self):
+        failing = MagicMock()
+        failing.xadd.side_effect = redis.ConnectionError("down")
+        with patch("backend.conversion_log.get_redis", return_value=failing), \
+             patch("backend.conversion_log.update_conversion_status") as mock_update:
+            record_conversion_status("j1", "failed")
+        mock_update.assert_called_once_with("j1", "failed", None, None, None)
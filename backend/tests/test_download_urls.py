@@ -0,0 +1,98 @@
+"""
+Tests for signed direct-download URLs.
+"""
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from urllib.parse import urlsplit, parse_qsl
+
+from backend.download_urls import build_download_url, sign, verify
+from backend.pdf_storage import FilesystemColdStore, S3ColdStore
+
+
+@pytest.fixture
+def secret():
+    with patch("backend.download_urls.DOWNLOAD_URL_SECRET", "test-secret"):
+        yield
+
+
+@pytest.fixture
+def file_tier(tmp_path):
+    store = FilesystemColdStore(str(tmp_path))
+    with patch("backend.download_urls.get_cold_store", return_value=store):
+        yield store
+
+
+def _split(url):
+    parts = urlsplit(url)
+    return parts.path, dict(parse_qsl(parts.query))
+
+
+class TestSigning:
+    """Tests for URL signatures."""
+
+    def test_no_secret_means_no_url(self):
+        with patch("backend.download_urls.DOWNLOAD_URL_SECRET", None):
+            assert build_download_url("job-1", {"name": "pdf:job-1"}) is None
+
+    def test_file_tier_url_is_served_by_nginx(self, secret, file_tier):
+        path, query = _split(build_download_url("job-1", {"name": "render:abc"}))
+        assert path == "/files/render/abc.pdf"
+        assert verify("render/abc.pdf", query["expires"], query["disposition"], query["sig"])
+
+    def test_redis_only_url_is_served_by_api(self, secret):
+        with patch("backend.download_urls.get_cold_store", return_value=None):
+            path, _ = _split(build_download_url("job-1", None))
+        assert path == "/api/v1/files/pdf/job-1.pdf"
+
+    def test_s3_tier_uses_presigned_url(self, secret):
+        client = MagicMock()
+        client.generate_presigned_url.return_value = "https://s3.example/pdf/job-1.pdf?X-Amz-Signature=x"
+        store = S3ColdStore(bucket="pdfs", client=client)
+        with patch("backend.download_urls.get_cold_store", return_value=store):
+            url = build_download_url("job-1", {"name": "pdf:job-1"}, disposition="inline")
+        assert url.startswith("https://s3.example/")
+        params = client.generate_presigned_url.call_args.kwargs["Params"]
+        assert params["Key"] == "pdf/job-1.pdf"
+        assert params["ResponseContentDisposition"].startswith("inline")
+
+    def test_tampered_path_is_rejected(self, secret):
+        expires = int(time.time()) + 60
+        signature = sign("pdf/job-1.pdf", expires, "attachment")
+        assert not verify("pdf/job-2.pdf", str(expires), "attachment", signature)
+
+    def test_expired_url_is_rejected(self, secret):
+        expires = int(time.time()) - 1
+        assert not verify("pdf/job-1.pdf", str(expires), "attachment", sign("pdf/job-1.pdf", expires, "attachment"))
+
+
+class TestSignedDownloadEndpoints:
+    """Tests for the API side of signed downloads."""
+
+    def test_job_status_includes_download_url(self, client, secret, file_tier):
+        status = {"status": "completed", "size": 4, "storage": {"name": "pdf:job-1"}}
+        with patch("backend.main.get_job_status_async", return_value=status):
+            data = client.get("/api/v1/jobs/job-1").json()
+        assert data["download_url"].startswith("/files/pdf/job-1.pdf?")
+
+    def test_nginx_verify_accepts_valid_signature(self, client, secret, file_tier):
+        url = build_download_url("job-1", {"name": "pdf:job-1"}, disposition="inline")
+        response = client.get("/api/v1/files/verify", headers={"X-Original-URI": url})
+        assert response.status_code == 200
+        assert response.headers["x-pdf-disposition"].startswith("inline")
+
+    def test_nginx_verify_rejects_bad_signature(self, client, secret, file_tier):
+        url = build_download_url("job-1", {"name": "pdf:job-1"}).replace("sig=", "sig=0")
+        response = client.get("/api/v1/files/verify", headers={"X-Original-URI": url})
+        assert response.status_code == 403
+
+    def test_api_serves_signed_url_without_file_tier(self, client, secret):
+        blob = MagicMock(size=8)
+        blob.iter_range.side_effect = lambda start, end, *args: iter([b"%PDF-1.7"[start:end + 1]])
+        with patch("backend.download_urls.get_cold_store", return_value=None):
+            url = build_download_url("job-1", {"name": "pdf:job-1"})
+        with patch("backend.main.open_blob", return_value=blob) as mock_open:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert response.content == b"%PDF-1.7"
+        mock_open.assert_called_once_with("pdf:job-1")
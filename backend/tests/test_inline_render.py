@@ -0,0 +1,94 @@
+"""
+Tests for inline rendering (mode=sync).
+"""
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import pytest
+
+from backend import inline_render
+from backend.inline_render import is_inline_eligible, submit_inline_render, start_inline_job
+
+
+class FakePool:
+    """Executor stand-in that hands out futures without running anything."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(inline_render, "INLINE_RENDER_WORKERS", 1)
+    monkeypatch.setattr(inline_render, "INLINE_RENDER_MAX_QUEUE", 1)
+    monkeypatch.setattr(inline_render, "_in_flight", 0)
+    with patch("backend.inline_render.get_render_pool", return_value=pool):
+        yield pool
+
+
+class TestEligibility:
+    """Tests for the size/complexity thresholds."""
+
+    def test_small_document_is_eligible(self):
+        assert is_inline_eligible("<h1>Invoice</h1><p>Total: 10</p>", {})
+
+    def test_large_document_is_not(self, monkeypatch):
+        monkeypatch.setattr(inline_render, "INLINE_RENDER_MAX_BYTES", 100)
+        assert not is_inline_eligible("<p>" + "x" * 200 + "</p>", {})
+
+    def test_header_and_footer_count(self, monkeypatch):
+        monkeypatch.setattr(inline_render, "INLINE_RENDER_MAX_ELEMENTS", 4)
+        assert is_inline_eligible("<p>a</p>", {})
+        assert not is_inline_eligible("<p>a</p>", {"header_html": "<b>h</b>", "footer_html": "<i>f</i>"})
+
+    def test_many_external_resources_are_not(self, monkeypatch):
+        monkeypatch.setattr(inline_render, "INLINE_RENDER_MAX_RESOURCES", 1)
+        html = '<img src="https://cdn.example/a.png"><img src="https://cdn.example/b.png">'
+        assert not is_inline_eligible(html, {})
+
+
+class TestSubmit:
+    """Tests for the pool's queue depth."""
+
+    def test_falls_back_when_pool_is_full(self, fake_pool):
+        first = submit_inline_render("<p>1</p>", {})
+        assert submit_inline_render("<p>2</p>", {}) is not None
+        assert submit_inline_render("<p>3</p>", {}) is None
+        first.set_result(b"%PDF")
+        assert submit_inline_render("<p>4</p>", {}) is not None
+
+    def test_disabled_pool(self):
+        with patch("backend.inline_render.get_render_pool", return_value=None):
+            assert submit_inline_render("<p>1</p>", {}) is None
+
+
+class TestStartInlineJob:
+    """Tests for completing jobs from inline renders."""
+
+    async def test_completes_job(self):
+        future = Future()
+        with patch("backend.inline_render.finish_rendered_job") as mock_finish:
+            render = start_inline_job(future, "job-1", "user-1", "rk")
+            future.set_result(b"%PDF")
+            assert await render == b"%PDF"
+            for completion in list(inline_render._completions):
+                await completion
+        assert mock_finish.call_args.args[0:2] == ("job-1", b"%PDF")
+        assert mock_finish.call_args.args[3:] == ("user-1", "rk")
+
+    async def test_failed_render_fails_job(self):
+        future = Future()
+        with patch("backend.inline_render.fail_rendered_job") as mock_fail:
+            render = start_inline_job(future, "job-1")
+            future.set_exception(RuntimeError("boom"))
+            with pytest.raises(RuntimeError):
+                await render
+            for completion in list(inline_render._completions):
+                await completion
+        mock_fail.assert_called_once_with("job-1", "boom", None, None)
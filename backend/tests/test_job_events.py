@@ -0,0 +1,221 @@
+"""
+Tests for job status push (pub/sub, long-poll and SSE).
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+
+import redis
+
+from backend import job_events
+from backend.job_events import watch_job
+
+
+class FakePubSub:
+    """Delivers scripted messages once a channel is subscribed."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = set()
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        await asyncio.sleep(0.01)
+        if self.messages and self.channels:
+            return self.messages.pop(0)
+        return None
+
+    async def aclose(self):
+        self.closed = True
+
+
+def _message(job_id, status):
+    return {"type": "message", "channel": f"job-events:{job_id}".encode(), "data": json.dumps(status).encode()}
+
+
+@pytest.fixture
+def job_store():
+    """Current job statuses, read through get_job_status_async."""
+    store = {}
+
+    async def get_status(job_id):
+        return store.get(job_id)
+
+    job_events._hub = None
+    with patch("backend.job_events.get_job_status_async", side_effect=get_status):
+        yield store
+    job_events._hub = None
+
+
+def _pubsub(messages):
+    pubsub = FakePubSub(messages)
+    client = MagicMock()
+    client.pubsub.return_value = pubsub
+    return pubsub, patch("backend.job_events.get_async_redis", return_value=client)
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+class TestPublish:
+    """Tests for publishing transitions with the status write."""
+
+    def test_set_job_status_publishes(self):
+        from backend.redis_client import set_job_status
+
+        client = MagicMock()
+        with patch("backend.redis_client.get_redis", return_value=client):
+            set_job_status("job-1", {"status": "processing", "updated_at": 1})
+        _, numkeys, key, data, _, channel = client.eval.call_args.args
+        assert (numkeys, key, channel) == (1, "job:job-1", "job-events:job-1")
+        assert data == '{"status": "processing"}'  # updated_at comes from the Redis clock
+
+
+class TestWatchJob:
+    """Tests for following a job's transitions."""
+
+    async def test_yields_changes_until_terminal(self, job_store):
+        job_store["job-1"] = {"status": "pending"}
+        pubsub, patched = _pubsub([
+            _message("job-1", {"status": "processing"}),
+            _message("job-1", {"status": "processing"}),
+            _message("job-1", {"status": "completed", "size": 10}),
+        ])
+        with patched:
+            statuses = await _collect(watch_job("job-1", timeout=5))
+        assert [s["status"] for s in statuses] == ["pending", "processing", "completed"]
+        assert pubsub.closed  # connection released once nobody waits
+
+    async def test_terminal_job_returns_immediately(self, job_store):
+        job_store["job-1"] = {"status": "failed", "error": "boom"}
+        _, patched = _pubsub([])
+        with patched:
+            assert await _collect(watch_job("job-1", timeout=5)) == [{"status": "failed", "error": "boom"}]
+
+    async def test_missing_job_yields_nothing(self, job_store):
+        _, patched = _pubsub([])
+        with patched:
+            assert await _collect(watch_job("missing", timeout=5)) == []
+
+    async def test_ticks_while_idle(self, job_store):
+        job_store["job-1"] = {"status": "processing"}
+        _, patched = _pubsub([])
+        with patched:
+            statuses = await _collect(watch_job("job-1", timeout=0.25, tick=0.1))
+        assert statuses[0] == {"status": "processing"}
+        assert statuses[1:] and all(status is None for status in statuses[1:])
+
+    async def test_falls_back_to_polling_without_pubsub(self, job_store):
+        job_store["job-1"] = {"status": "processing"}
+        client = MagicMock()
+        client.pubsub.return_value.subscribe.side_effect = redis.ConnectionError("down")
+
+        async def complete_later():
+            await asyncio.sleep(0.1)
+            job_store["job-1"] = {"status": "completed"}
+
+        with patch("backend.job_events.get_async_redis", return_value=client), \
+             patch("backend.job_events._POLL_INTERVAL", 0.05):
+            task = asyncio.ensure_future(complete_later())
+            statuses = await _collect(watch_job("job-1", timeout=5))
+            await task
+        assert [s["status"] for s in statuses] == ["processing", "completed"]
+
+
+class TestJobEndpoints:
+    """Tests for long-poll and SSE on the job endpoints."""
+
+    def test_long_poll_returns_on_change(self, client, job_store):
+        job_store["job-1"] = {"status": "processing"}
+        _, patched = _pubsub([_message("job-1", {"status": "completed", "size": 10})])
+        with patched:
+            response = client.get("/api/v1/jobs/job-1?wait=10")
+        assert response.status_code == 200
+        assert response.json() == {"job_id": "job-1", "status": "completed", "size": 10}
+
+    def test_long_poll_times_out_with_current_status(self, client, job_store):
+        job_store["job-1"] = {"status": "processing"}
+        _, patched = _pubsub([])
+        with patched, patch("backend.main.JOB_WAIT_MAX_SECONDS", 0.1):
+            response = client.get("/api/v1/jobs/job-1?wait=30")
+        assert response.json()["status"] == "processing"
+
+    def test_long_poll_missing_job(self, client, job_store):
+        _, patched = _pubsub([])
+        with patched:
+            assert client.get("/api/v1/jobs/missing?wait=5").status_code == 404
+
+    def test_sse_streams_until_terminal(self, client, job_store):
+        job_store["job-1"] = {"status": "pending"}
+        _, patched = _pubsub([
+            _message("job-1", {"status": "processing"}),
+            _message("job-1", {"status": "completed", "size": 10}),
+        ])
+        with patched:
+            response = client.get("/api/v1/jobs/job-1/events")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line[len("data: "):])
+            for line in response.text.splitlines() if line.startswith("data: ")
+        ]
+        assert [event["status"] for event in events] == ["pending", "processing", "completed"]
+        assert events[-1]["job_id"] == "job-1"
+
+    def test_sse_missing_job(self, client, job_store):
+        _, patched = _pubsub([])
+        with patched:
+            assert client.get("/api/v1/jobs/missing/events").status_code == 404
+
+
+class TestBulkStatus:
+    """Tests for POST /api/v1/jobs/status."""
+
+    async def test_reads_statuses_and_cursor_in_one_transaction(self):
+        from backend.redis_client import get_job_statuses_async
+
+        pipe = MagicMock()
+        pipe.execute = MagicMock(return_value=asyncio.sleep(0, result=[
+            (1700000000, 250000),
+            [b'{"status": "pending", "updated_at": 1}', None],
+        ]))
+        client = MagicMock()
+        client.pipeline.return_value = pipe
+        with patch("backend.redis_client.get_async_redis", return_value=client):
+            statuses, cursor = await get_job_statuses_async(["a", "b"])
+        client.pipeline.assert_called_once_with(transaction=True)
+        pipe.mget.assert_called_once_with(["job:a", "job:b"])
+        assert statuses == [{"status": "pending", "updated_at": 1}, None]
+        assert cursor == 1700000000250
+
+    def test_returns_found_and_missing_jobs(self, client):
+        statuses = [{"status": "completed", "size": 10, "updated_at": 5}, None]
+        with patch("backend.main.get_job_statuses_async", return_value=(statuses, 100)) as mock_get:
+            response = client.post("/api/v1/jobs/status", json={"job_ids": ["a", "b", "a"]})
+        assert response.status_code == 200
+        mock_get.assert_called_once_with(["a", "b"])
+        body = response.json()
+        assert [job["job_id"] for job in body["jobs"]] == ["a"]
+        assert body["missing"] == ["b"]
+        assert body["cursor"] == 100
+
+    def test_since_filters_unchanged_jobs(self, client):
+        statuses = [{"status": "processing", "updated_at": 40}, {"status": "completed", "updated_at": 50}]
+        with patch("backend.main.get_job_statuses_async", return_value=(statuses, 60)):
+            response = client.post("/api/v1/jobs/status", json={"job_ids": ["a", "b"], "since": 50})
+        assert [job["job_id"] for job in response.json()["jobs"]] == ["b"]
+
+    def test_rejects_empty_and_oversized_batches(self, client):
+        from backend.config import JOB_STATUS_BATCH_MAX
+
+        assert client.post("/api/v1/jobs/status", json={"job_ids": []}).status_code == 422
+        too_many = [f"job-{i}" for i in range(JOB_STATUS_BATCH_MAX + 1)]
+        assert client.post("/api/v1/jobs/status", json={"job_ids": too_many}).status_code == 422
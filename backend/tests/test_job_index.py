@@ -0,0 +1,156 @@
+"""
+Tests for the per-user job index and GET /api/v1/jobs.
+"""
+import json
+import pytest
+from unittest.mock import patch
+
+from backend.redis_client import _status_args, list_user_jobs_async, user_jobs_key
+
+
+class FakePipeline:
+    """Queues calls against the fake client and runs them on execute()."""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.calls.append((method, args, kwargs))
+
+    async def execute(self):
+        return [await method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+
+class IndexRedis:
+    """In-memory model of the sorted sets and job keys used by the index."""
+
+    def __init__(self):
+        self.zsets = {}  # key -> {member: score}
+        self.jobs = {}   # job_id -> status
+
+    def add(self, user_id, job_id, created, status):
+        self.zsets.setdefault(user_jobs_key(user_id), {})[job_id] = created
+        self.zsets.setdefault(user_jobs_key(user_id, status["status"]), {})[job_id] = created
+        self.jobs[job_id] = status
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _sorted(self, key):
+        # Redis orders by score, then by member (both reversed for ZREVRANGE*)
+        entries = sorted(self.zsets.get(key, {}).items(), key=lambda entry: (entry[1], entry[0]), reverse=True)
+        return [(member.encode(), float(score)) for member, score in entries]
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        return self._sorted(key)[start:end + 1]
+
+    async def zrevrangebyscore(self, key, max, min, start=None, num=None, withscores=False):
+        exclusive = isinstance(max, str) and max.startswith("(")
+        top = float(max[1:]) if exclusive else float(max)
+        bottom = float("-inf") if min == "-inf" else float(min)
+        entries = [
+            (member, score) for member, score in self._sorted(key)
+            if (score < top if exclusive else score <= top) and score >= bottom
+        ]
+        return entries[start:start + num] if num is not None else entries
+
+    async def mget(self, keys):
+        return [
+            json.dumps(self.jobs[key[len("job:"):]]).encode() if key[len("job:"):] in self.jobs else None
+            for key in keys
+        ]
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+
+@pytest.fixture
+def index_redis():
+    client = IndexRedis()
+    with patch("backend.redis_client.get_async_redis", return_value=client):
+        yield client
+
+
+class TestIndexWrite:
+    """Tests for indexing jobs with the status write."""
+
+    def test_without_user_only_the_job_key(self):
+        _, numkeys, key, *_ = _status_args("job-1", {"status": "pending"}, 60)
+        assert (numkeys, key) == (1, "job:job-1")
+
+    def test_with_user_indexes_under_new_status(self):
+        _, numkeys, key, index_key, data, ttl, channel, job_id, window, status, *statuses = _status_args(
+            "job-1", {"status": "completed"}, 60, "user-1"
+        )
+        assert (numkeys, key, index_key) == (2, "job:job-1", "user-jobs:user-1")
+        assert (job_id, status) == ("job-1", "completed")
+        assert statuses == ["pending", "processing", "completed", "failed"]
+
+
+class TestListUserJobs:
+    """Tests for paging through the index."""
+
+    async def test_pages_newest_first(self, index_redis):
+        for i in range(5):
+            index_redis.add("u1", f"job-{i}", 1000 + i, {"status": "completed"})
+
+        jobs, cursor = await list_user_jobs_async("u1", limit=2)
+        assert [job_id for job_id, _ in jobs] == ["job-4", "job-3"]
+        jobs, cursor = await list_user_jobs_async("u1", limit=2, cursor=cursor)
+        assert [job_id for job_id, _ in jobs] == ["job-2", "job-1"]
+        jobs, cursor = await list_user_jobs_async("u1", limit=2, cursor=cursor)
+        assert [job_id for job_id, _ in jobs] == ["job-0"]
+        assert cursor is None
+
+    async def test_same_millisecond_jobs_span_pages(self, index_redis):
+        for job_id in ("a", "b", "c"):
+            index_redis.add("u1", job_id, 1000, {"status": "pending"})
+
+        jobs, cursor = await list_user_jobs_async("u1", limit=2)
+        rest, _ = await list_user_jobs_async("u1", limit=2, cursor=cursor)
+        assert [job_id for job_id, _ in jobs + rest] == ["c", "b", "a"]
+
+    async def test_filters_by_status(self, index_redis):
+        index_redis.add("u1", "done", 1000, {"status": "completed"})
+        index_redis.add("u1", "broken", 1001, {"status": "failed"})
+
+        jobs, _ = await list_user_jobs_async("u1", status="failed")
+        assert jobs == [("broken", {"status": "failed"})]
+
+    async def test_expired_jobs_are_dropped_from_index(self, index_redis):
+        index_redis.add("u1", "gone", 1000, {"status": "completed"})
+        del index_redis.jobs["gone"]
+
+        jobs, _ = await list_user_jobs_async("u1")
+        assert jobs == []
+        assert index_redis.zsets[user_jobs_key("u1")] == {}
+
+    async def test_rejects_malformed_cursor(self, index_redis):
+        with pytest.raises(ValueError):
+            await list_user_jobs_async("u1", cursor="not-a-cursor")
+
+
+class TestListJobsEndpoint:
+    """Tests for GET /api/v1/jobs."""
+
+    def test_lists_the_key_owners_jobs(self, client):
+        jobs = [("job-1", {"status": "completed", "size": 10, "updated_at": 5})]
+        with patch("backend.main.list_user_jobs_async", return_value=(jobs, "5:job-1")) as mock_list:
+            response = client.get("/api/v1/jobs?status=completed&limit=10")
+        assert response.status_code == 200
+        mock_list.assert_called_once_with("test-user-123", "completed", 10, None)
+        assert response.json()["jobs"][0]["job_id"] == "job-1"
+        assert response.json()["next_cursor"] == "5:job-1"
+
+    def test_rejects_unknown_status(self, client):
+        assert client.get("/api/v1/jobs?status=archived").status_code == 400
+
+    def test_rejects_malformed_cursor(self, client):
+        with patch("backend.main.list_user_jobs_async", side_effect=ValueError("bad")):
+            assert client.get("/api/v1/jobs?cursor=zzz").status_code == 400
+
+    def test_requires_api_key(self, client_no_auth):
+        assert client_no_auth.get("/api/v1/jobs").status_code == 401
@@ -0,0 +1,125 @@
+"""
+Tests for the claim-check payload store.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from backend.payload_store import (
+    DiskPayloadStore,
+    RedisPayloadStore,
+    PayloadNotFoundError,
+    PAYLOAD_CHUNK_SIZE,
+    store_payload,
+    load_payload,
+    delete_payload,
+    store_bytes,
+    load_bytes,
+    large_bytes_supported,
+)
+from backend.pdf_storage import FilesystemColdStore
+
+
+class TestPayloadRoundTrip:
+    """Tests for storing and loading payloads (disk store from conftest)."""
+
+    def test_round_trip(self):
+        payload = {"html": "<p>Olá</p>", "options": {"page_size": "A4"}}
+        ref = store_payload(payload)
+        assert load_payload(ref) == payload
+
+    def test_large_payload_is_compressed_and_streamed(self, tmp_path):
+        store = DiskPayloadStore(str(tmp_path))
+        html = "<tr><td>row</td></tr>" * 200_000  # ~4MB
+        with patch("backend.payload_store._store", store):
+            ref = store_payload({"html": html, "options": {}})
+            stored = (tmp_path / f"{ref}.json.z").stat().st_size
+            assert stored < len(html) // 20
+            assert load_payload(ref)["html"] == html
+
+    def test_deleted_payload_is_not_found(self):
+        ref = store_payload({"html": "<p>x</p>", "options": {}})
+        delete_payload(ref)
+        with pytest.raises(PayloadNotFoundError):
+            load_payload(ref)
+
+    def test_purge_removes_expired(self, tmp_path):
+        store = DiskPayloadStore(str(tmp_path), ttl=-1)
+        store.put("old", b"data")
+        assert store.purge_expired() == 1
+
+
+class TestRedisPayloadStore:
+    """Tests for the Redis backend."""
+
+    def test_reads_back_in_chunks(self):
+        data = b"x" * (PAYLOAD_CHUNK_SIZE * 2 + 10)
+        mock_redis = MagicMock()
+        mock_redis.exists.return_value = 1
+        mock_redis.getrange.side_effect = lambda key, start, end: data[start:end + 1]
+
+        with patch("backend.payload_store.get_redis", return_value=mock_redis):
+            chunks = list(RedisPayloadStore().iter_chunks("ref"))
+
+        assert b"".join(chunks) == data
+        assert max(len(chunk) for chunk in chunks) == PAYLOAD_CHUNK_SIZE
+
+    def test_missing_key_raises(self):
+        mock_redis = MagicMock()
+        mock_redis.exists.return_value = 0
+        with patch("backend.payload_store.get_redis", return_value=mock_redis):
+            with pytest.raises(PayloadNotFoundError):
+                list(RedisPayloadStore().iter_chunks("ref"))
+
+
+class TestRawBytes:
+    """Tests for rendered chunks stored with store_bytes."""
+
+    def test_large_bytes_skip_redis(self, tmp_path):
+        mock_redis = MagicMock()
+        cold_store = FilesystemColdStore(str(tmp_path))
+        with patch("backend.payload_store._store", RedisPayloadStore()), \
+             patch("backend.payload_store.get_redis", return_value=mock_redis), \
+             patch("backend.payload_store.get_cold_store", return_value=cold_store), \
+             patch("backend.payload_store.PAYLOAD_REDIS_MAX_BYTES", 4):
+            small = store_bytes(b"%PDF")
+            large = store_bytes(b"%PDF-1.7")
+            assert mock_redis.setex.call_count == 1
+            assert load_bytes(large) == b"%PDF-1.7"
+            delete_payload(large)
+            with pytest.raises(PayloadNotFoundError):
+                load_bytes(large)
+        assert not small.startswith("cold:")
+        assert not list(tmp_path.rglob("*.pdf"))
+
+    def test_redis_only_does_not_support_large_bytes(self):
+        with patch("backend.payload_store._store", RedisPayloadStore()), \
+             patch("backend.payload_store.get_cold_store", return_value=None):
+            assert not large_bytes_supported()
+        assert large_bytes_supported()  # disk store from conftest
+
+
+class TestTaskPayloadReference:
+    """Tests for tasks receiving a reference instead of the document."""
+
+    def test_convert_enqueues_reference_only(self, client, valid_html):
+        with patch("backend.main.generate_pdf_task") as mock_task:
+            client.post("/api/v1/convert", json={"html_content": valid_html})
+
+        kwargs = mock_task.delay.call_args.kwargs
+        assert "html" not in kwargs
+        assert "options" not in kwargs
+        assert load_payload(kwargs["payload_ref"])["options"]["page_size"] == "A4"
+
+    def test_task_loads_and_deletes_payload(self):
+        from backend.tasks import generate_pdf_task
+
+        ref = store_payload({"html": "<p>x</p>", "options": {"page_size": "A4"}})
+        with patch("backend.tasks.generate_pdf_from_html", return_value=b"%PDF") as mock_render, \
+             patch("backend.tasks.store_pdf"), \
+             patch("backend.tasks.complete_job"), \
+             patch("backend.tasks.set_job_status"):
+            generate_pdf_task.run(job_id="job-1", payload_ref=ref)
+
+        assert mock_render.call_args.kwargs["html"] == "<p>x</p>"
+        assert mock_render.call_args.kwargs["page_size"] == "A4"
+        with pytest.raises(PayloadNotFoundError):
+            load_payload(ref)
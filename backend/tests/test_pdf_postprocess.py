@@ -0,0 +1,74 @@
+"""
+Tests for header/footer overlay stamping.
+"""
+import io
+import pytest
+
+pikepdf = pytest.importorskip("pikepdf")
+
+from backend.pdf_postprocess import MarginOverlay, PageNumberSlot, stamp_overlays
+
+
+def _blank_pdf(pages, size):
+    """Build a PDF with blank pages of the given size in points."""
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page(page_size=size)
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+def _page_content(page):
+    contents = page.obj.Contents
+    streams = contents if isinstance(contents, pikepdf.Array) else [contents]
+    return b"".join(stream.read_bytes() for stream in streams)
+
+
+class TestMarginOverlay:
+    """Tests for overlay placement."""
+
+    def test_header_is_anchored_to_top(self):
+        overlay = MarginOverlay(b"", "top", 56.7, 0, 481.9, 56.7)
+        assert overlay.rect(841.89) == pytest.approx((56.7, 785.19, 538.6, 841.89))
+
+    def test_footer_is_anchored_to_bottom(self):
+        overlay = MarginOverlay(b"", "bottom", 56.7, 0, 481.9, 56.7)
+        assert overlay.rect(841.89) == pytest.approx((56.7, 0, 538.6, 56.7))
+
+
+class TestStampOverlays:
+    """Tests for stamping overlays with pikepdf."""
+
+    def test_overlay_is_shared_by_all_pages(self):
+        body = _blank_pdf(3, (595, 842))
+        header = _blank_pdf(1, (480, 56))
+        result = pikepdf.open(io.BytesIO(stamp_overlays(body, [MarginOverlay(header, "top", 57, 0, 480, 56)])))
+
+        xobjects = {
+            xobject.objgen
+            for page in result.pages
+            for xobject in page.Resources.XObject.values()
+        }
+        assert len(result.pages) == 3
+        assert len(xobjects) == 1
+
+    def test_excluded_pages_are_not_stamped(self):
+        body = _blank_pdf(3, (595, 842))
+        footer = _blank_pdf(1, (480, 56))
+        overlay = MarginOverlay(footer, "bottom", 57, 0, 480, 56, exclude_pages={2})
+        result = pikepdf.open(io.BytesIO(stamp_overlays(body, [overlay])))
+
+        assert "/XObject" in result.pages[0].Resources
+        assert "/XObject" not in result.pages[1].Resources
+        assert "/XObject" in result.pages[2].Resources
+
+    def test_page_numbers_are_drawn_per_page(self):
+        body = _blank_pdf(2, (595, 842))
+        footer = _blank_pdf(1, (480, 56))
+        slot = PageNumberSlot(x=100, y=20, font_size=9)
+        overlay = MarginOverlay(footer, "bottom", 57, 0, 480, 56, page_number_slots=[slot])
+        result = pikepdf.open(io.BytesIO(stamp_overlays(body, [overlay])))
+
+        assert b"157.00 20.00 Td (1) Tj" in _page_content(result.pages[0])
+        assert b"157.00 20.00 Td (2) Tj" in _page_content(result.pages[1])
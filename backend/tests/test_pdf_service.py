@@ -384,3 +384,306 @@ class TestGeneratePdfHeaderFooterCombinations:
             footer_height="0.5in"
         )
         assert result[:4] == b"%PDF"
+
+
+class TestPageStylesheetCache:
+    """Tests for the process-local @page stylesheet cache."""
+
+    PAGE_OPTIONS = {
+        "page_size": "A4",
+        "orientation": "portrait",
+        "margin_top": "2cm",
+        "margin_bottom": "2cm",
+        "margin_left": "2cm",
+        "margin_right": "2cm",
+        "include_page_numbers": False,
+        "header_html": None,
+        "footer_html": None,
+        "header_height": "2cm",
+        "footer_height": "2cm",
+    }
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        from backend.pdf_service import clear_page_css_cache
+        clear_page_css_cache()
+        yield
+        clear_page_css_cache()
+
+    def test_same_options_parsed_once(self):
+        """Identical layouts should reuse the parsed stylesheet."""
+        from unittest.mock import patch, MagicMock
+        from backend.pdf_service import _get_page_stylesheet, get_page_css_cache_stats
+
+        with patch("backend.pdf_service.CSS", MagicMock()) as mock_css:
+            first = _get_page_stylesheet(**self.PAGE_OPTIONS)
+            second = _get_page_stylesheet(**self.PAGE_OPTIONS)
+
+        assert first is second
+        assert mock_css.call_count == 1
+        stats = get_page_css_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_header_content_does_not_affect_key(self):
+        """Only the presence of a header matters for the @page rules."""
+        from unittest.mock import patch, MagicMock
+        from backend.pdf_service import _get_page_stylesheet
+
+        with patch("backend.pdf_service.CSS", MagicMock()) as mock_css:
+            _get_page_stylesheet(**{**self.PAGE_OPTIONS, "header_html": "<div>A</div>"})
+            _get_page_stylesheet(**{**self.PAGE_OPTIONS, "header_html": "<div>B</div>"})
+
+        assert mock_css.call_count == 1
+
+    def test_different_layouts_are_cached_separately(self):
+        """Different page options should produce distinct cache entries."""
+        from unittest.mock import patch, MagicMock
+        from backend.pdf_service import _get_page_stylesheet, get_page_css_cache_stats
+
+        with patch("backend.pdf_service.CSS", MagicMock()) as mock_css:
+            _get_page_stylesheet(**self.PAGE_OPTIONS)
+            _get_page_stylesheet(**{**self.PAGE_OPTIONS, "orientation": "landscape"})
+
+        assert mock_css.call_count == 2
+        assert get_page_css_cache_stats()["size"] == 2
+
+    def test_orientation_case_shares_entry_and_css(self):
+        """Key and CSS are built from the same normalized orientation, whichever call comes first."""
+        from unittest.mock import patch, MagicMock
+        from backend.pdf_service import _get_page_stylesheet
+
+        with patch("backend.pdf_service.CSS", MagicMock()) as mock_css:
+            _get_page_stylesheet(**{**self.PAGE_OPTIONS, "orientation": " Landscape"})
+            _get_page_stylesheet(**{**self.PAGE_OPTIONS, "orientation": "landscape"})
+
+        assert mock_css.call_count == 1
+        assert "A4 landscape" in mock_css.call_args.kwargs["string"]
+
+    def test_cache_is_bounded(self):
+        """Least recently used stylesheets should be evicted past the limit."""
+        from unittest.mock import patch, MagicMock
+        import backend.pdf_service
+        from backend.pdf_service import _get_page_stylesheet, get_page_css_cache_stats
+
+        with patch("backend.pdf_service.CSS", MagicMock()), \
+             patch.object(backend.pdf_service._page_css_cache, "max_size", 2):
+            for margin in ["1cm", "2cm", "3cm"]:
+                _get_page_stylesheet(**{**self.PAGE_OPTIONS, "margin_top": margin})
+            assert get_page_css_cache_stats()["size"] == 2
+
+
+class TestSingleLayoutExclusions:
+    """Tests for page exclusions applied during a single layout pass."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        from backend.pdf_service import clear_page_css_cache
+        clear_page_css_cache()
+        yield
+        clear_page_css_cache()
+
+    def test_header_and_footer_exclusions_are_independent(self):
+        """Header exclusions should only blank the header margin box, and vice versa."""
+        from backend.pdf_service import _build_exclusion_css
+
+        css = _build_exclusion_css(frozenset({1}), frozenset({2}))
+        header_rule = css[css.index("@page :nth(1)"):css.index("@page :nth(2)")]
+        footer_rule = css[css.index("@page :nth(2)"):]
+        assert "@top-center" in header_rule and "@bottom-center" not in header_rule
+        assert "@bottom-center" in footer_rule and "@top-center" not in footer_rule
+
+    def test_parse_page_numbers(self):
+        """Page lists should tolerate spaces."""
+        from backend.pdf_service import _parse_page_numbers
+        assert _parse_page_numbers("1, 3,5") == {1, 3, 5}
+        assert _parse_page_numbers(None) == set()
+
+    def test_exclusions_render_once(self):
+        """Exclusions should not trigger a second layout of the document."""
+        from unittest.mock import patch, MagicMock
+
+        mock_html = MagicMock()
+        mock_html.return_value.write_pdf.return_value = b"%PDF-1.7"
+        with patch("backend.pdf_service.HTML", mock_html), \
+             patch("backend.pdf_service.CSS", MagicMock()) as mock_css, \
+             patch("backend.pdf_service.CachingURLFetcher", MagicMock()):
+            generate_pdf_from_html(
+                "<p>Body</p>",
+                header_html="<div>Header</div>",
+                footer_html="<div>Footer</div>",
+                exclude_header_pages="1, 3",
+                exclude_footer_pages="2"
+            )
+
+        assert mock_html.call_count == 1
+        stylesheets = mock_html.return_value.write_pdf.call_args.kwargs["stylesheets"]
+        exclusion_css = mock_css.call_args_list[-1].kwargs["string"]
+        assert len(stylesheets) == 2
+        assert "@page :nth(3)" in exclusion_css
+
+    def test_exclusions_ignored_without_header_footer(self):
+        """No exclusion stylesheet should be added when there is nothing to exclude."""
+        from unittest.mock import patch, MagicMock
+
+        mock_html = MagicMock()
+        mock_html.return_value.write_pdf.return_value = b"%PDF-1.7"
+        with patch("backend.pdf_service.HTML", mock_html), \
+             patch("backend.pdf_service.CSS", MagicMock()), \
+             patch("backend.pdf_service.CachingURLFetcher", MagicMock()):
+            generate_pdf_from_html("<p>Body</p>", exclude_header_pages="1")
+
+        stylesheets = mock_html.return_value.write_pdf.call_args.kwargs["stylesheets"]
+        assert len(stylesheets) == 1
+
+
+class TestHeaderFooterOverlayMode:
+    """Tests for rendering header/footer once and stamping it onto the body."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        from backend.pdf_service import clear_page_css_cache
+        clear_page_css_cache()
+        yield
+        clear_page_css_cache()
+
+    @pytest.mark.parametrize("value,expected", [
+        ("2cm", 56.69),
+        ("20mm", 56.69),
+        ("0.5in", 36.0),
+        ("12pt", 12.0),
+        ("0", 0.0),
+    ])
+    def test_length_to_pt(self, value, expected):
+        """CSS absolute lengths should convert to points."""
+        from backend.pdf_service import _length_to_pt
+        assert _length_to_pt(value) == pytest.approx(expected, abs=0.01)
+
+    def test_relative_length_is_rejected(self):
+        """Relative units cannot be resolved before layout."""
+        from backend.pdf_service import _length_to_pt
+        with pytest.raises(ValueError):
+            _length_to_pt("2em")
+
+    def test_page_width(self):
+        """Named and custom page sizes should resolve to widths in points."""
+        from backend.pdf_service import _page_width_pt
+        assert _page_width_pt("A4", "portrait") == pytest.approx(595.28)
+        assert _page_width_pt("A4", "landscape") == pytest.approx(841.89)
+        assert _page_width_pt("210mm 297mm", "portrait") == pytest.approx(595.28, abs=0.01)
+
+    def test_overlay_mode_lays_out_body_without_running_elements(self):
+        """The body should be laid out once, without header/footer, then stamped."""
+        from unittest.mock import patch, MagicMock
+
+        mock_html = MagicMock()
+        mock_html.return_value.render.return_value.pages = [MagicMock()] * 3
+        mock_html.return_value.render.return_value.write_pdf.return_value = b"%PDF-1.7"
+        with patch("backend.pdf_service.HTML", mock_html), \
+             patch("backend.pdf_service.CSS", MagicMock()), \
+             patch("backend.pdf_service.CachingURLFetcher", MagicMock()), \
+             patch("backend.pdf_postprocess.stamp_overlays", return_value=b"%PDF-stamped") as mock_stamp:
+            result = generate_pdf_from_html(
+                "<p>Body</p>",
+                header_html="<div>Header</div>",
+                footer_html="<div>Footer</div>",
+                exclude_footer_pages="1",
+                header_footer_mode="overlay"
+            )
+
+        assert result == b"%PDF-stamped"
+        body_html = mock_html.call_args_list[0].kwargs["string"]
+        assert "pdf-running-header" not in body_html
+        assert "pdf-running-footer" not in body_html
+        # Body, header and footer are each laid out once
+        assert mock_html.call_count == 3
+
+        header, footer = mock_stamp.call_args.args[1]
+        assert header.anchor == "top"
+        assert header.exclude_pages == frozenset()
+        assert footer.anchor == "bottom"
+        assert footer.exclude_pages == {1}
+
+    def test_overlay_mode_falls_back_for_relative_margins(self):
+        """Margins that cannot be converted to points should use running elements."""
+        from unittest.mock import patch, MagicMock
+
+        mock_html = MagicMock()
+        mock_html.return_value.write_pdf.return_value = b"%PDF-1.7"
+        with patch("backend.pdf_service.HTML", mock_html), \
+             patch("backend.pdf_service.CSS", MagicMock()), \
+             patch("backend.pdf_service.CachingURLFetcher", MagicMock()):
+            generate_pdf_from_html(
+                "<p>Body</p>",
+                margin_left="5%",
+                header_html="<div>Header</div>",
+                header_footer_mode="overlay"
+            )
+
+        assert "pdf-running-header" in mock_html.call_args.kwargs["string"]
+
+
+class TestWeasyPrintInternals:
+    """Guards for the WeasyPrint internals read by pdf_service (Page._page_box)."""
+
+    def test_installed_version_matches_pin(self):
+        """The box tree walk is only tested against the pinned WeasyPrint release line."""
+        import os
+        import re
+        from importlib.metadata import version
+        specifiers = pytest.importorskip("packaging.specifiers")
+
+        requirements = os.path.join(os.path.dirname(__file__), "..", "requirements.txt")
+        with open(requirements) as f:
+            pin = re.search(r"^weasyprint([^\s#]+)", f.read(), re.MULTILINE).group(1)
+        assert version("weasyprint") in specifiers.SpecifierSet(pin)
+
+    def test_missing_internals_are_reported(self):
+        """A WeasyPrint without Page._page_box should fail with a clear error."""
+        from types import SimpleNamespace
+        from backend.pdf_service import _page_boxes, _find_page_number_slots
+
+        with pytest.raises(RuntimeError, match="requirements.txt"):
+            _page_boxes(SimpleNamespace())
+        assert _find_page_number_slots(SimpleNamespace(pages=[SimpleNamespace()]), 50) == []
+
+    def test_overlay_falls_back_without_box_tree(self):
+        """Without Page._page_box, {{page}} placeholders render as running elements."""
+        from types import SimpleNamespace
+        from unittest.mock import patch, MagicMock
+        from backend import pdf_service
+
+        pytest.importorskip("pikepdf")  # otherwise overlay mode is unavailable anyway
+        mock_html = MagicMock()
+        mock_html.return_value.render.return_value.pages = [SimpleNamespace()]  # no _page_box
+        mock_html.return_value.write_pdf.return_value = b"%PDF"
+        with patch("backend.pdf_service.HTML", mock_html), \
+             patch("backend.pdf_service.CSS", MagicMock()), \
+             patch("backend.pdf_service.CachingURLFetcher", MagicMock()), \
+             patch("backend.pdf_service._box_tree_probe", None), \
+             patch("backend.pdf_service._stamp_margin_overlays") as mock_stamp:
+            pdf_bytes = pdf_service.generate_pdf_from_html(
+                "<p>Body</p>", footer_html="<p>Page {{page}}</p>",
+                include_page_numbers=True, header_footer_mode="overlay"
+            )
+            assert pdf_service._box_tree_available() is False
+        assert pdf_bytes == b"%PDF"
+        mock_stamp.assert_not_called()
+        assert "pdf-running-footer" in mock_html.call_args.kwargs["string"]
+
+    def test_page_number_slot_geometry(self):
+        """Slots should be found at the placeholder baseline with its font size."""
+        from backend import pdf_service
+
+        if pdf_service.HTML is None:
+            pytest.skip("WeasyPrint native libraries are not installed")
+        _, slots = pdf_service._render_margin_overlay(
+            '<p style="font-size: 12pt; color: #ff0000; margin: 0;">Page {{page}}</p>',
+            "", 400, 50, 12, True, [], None
+        )
+        assert len(slots) == 1
+        slot = slots[0]
+        assert 0 < slot.x < 400
+        assert 0 < slot.y < 50
+        assert slot.font_size == pytest.approx(12)
@@ -0,0 +1,141 @@
+"""
+Tests for tiered PDF storage.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from backend.pdf_storage import FilesystemColdStore, S3ColdStore, put_blob, get_blob
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the Redis calls used by pdf_storage."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        self.ttls[key] = ttl
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def strlen(self, key):
+        return len(self.data.get(key, b""))
+
+    def getrange(self, key, start, end):
+        return self.data.get(key, b"")[start:end + 1]
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch("backend.pdf_storage.get_redis", return_value=redis), \
+         patch("backend.redis_client.get_redis", return_value=redis):
+        yield redis
+
+
+@pytest.fixture
+def cold_store(tmp_path):
+    store = FilesystemColdStore(str(tmp_path))
+    with patch("backend.pdf_storage._cold_store", store), \
+         patch("backend.pdf_storage._cold_store_initialized", True):
+        yield store
+
+
+class TestTiering:
+    """Tests for hot/cold placement."""
+
+    def test_small_pdf_is_kept_hot_and_cold(self, fake_redis, cold_store):
+        meta = put_blob("pdf:job-1", b"%PDF small")
+        assert meta["tier"] == "hot"
+        assert meta["size"] == 10
+        assert fake_redis.get("pdf:job-1") == b"%PDF small"
+        assert cold_store.get("pdf:job-1") == b"%PDF small"
+
+    def test_large_pdf_skips_redis(self, fake_redis, cold_store):
+        with patch("backend.pdf_storage.PDF_HOT_MAX_BYTES", 4):
+            meta = put_blob("pdf:job-1", b"%PDF large")
+        assert meta["tier"] == "cold"
+        assert fake_redis.get("pdf:job-1") is None
+        assert get_blob("pdf:job-1") == b"%PDF large"
+
+    def test_evicted_hot_copy_falls_back_to_cold(self, fake_redis, cold_store):
+        from backend.redis_client import get_pdf
+
+        put_blob("pdf:job-1", b"%PDF")
+        fake_redis.data.clear()
+        assert get_pdf("job-1") == b"%PDF"
+
+    def test_redis_only_without_cold_tier(self, fake_redis):
+        with patch("backend.pdf_storage._cold_store", None), \
+             patch("backend.pdf_storage._cold_store_initialized", True):
+            meta = put_blob("pdf:job-1", b"%PDF", ttl=7200)
+        assert meta["tier"] == "hot"
+        assert fake_redis.ttls["pdf:job-1"] == 7200
+
+    def test_etag_is_content_hash(self, fake_redis, cold_store):
+        assert put_blob("pdf:a", b"%PDF same")["etag"] == put_blob("pdf:b", b"%PDF same")["etag"]
+
+
+class TestColdStores:
+    """Tests for cold tier backends."""
+
+    def test_filesystem_layout(self, tmp_path):
+        store = FilesystemColdStore(str(tmp_path))
+        store.put("render:abc", b"%PDF")
+        assert (tmp_path / "render" / "abc.pdf").read_bytes() == b"%PDF"
+
+    def test_filesystem_missing_returns_none(self, tmp_path):
+        assert FilesystemColdStore(str(tmp_path)).get("pdf:missing") is None
+
+    def test_filesystem_purge(self, tmp_path):
+        store = FilesystemColdStore(str(tmp_path), ttl=-1)
+        store.put("pdf:old", b"%PDF")
+        assert store.purge_expired() == 1
+
+    def test_s3_put_and_get(self):
+        client = MagicMock()
+        client.get_object.return_value = {"Body": MagicMock(read=MagicMock(return_value=b"%PDF"))}
+        store = S3ColdStore(bucket="pdfs", client=client)
+
+        store.put("pdf:job-1", b"%PDF")
+        assert client.put_object.call_args.kwargs["Key"] == "pdf/job-1.pdf"
+        assert store.get("pdf:job-1") == b"%PDF"
+
+
+class TestStreaming:
+    """Tests for opening blobs and reading byte ranges."""
+
+    def test_file_blob_range_in_chunks(self, fake_redis, cold_store):
+        from backend.pdf_storage import open_blob
+
+        with patch("backend.pdf_storage.PDF_HOT_MAX_BYTES", 0):
+            put_blob("pdf:job-1", b"0123456789")
+        blob = open_blob("pdf:job-1")
+        assert blob.size == 10
+        assert list(blob.iter_range(2, 8, chunk_size=3)) == [b"234", b"567", b"8"]
+
+    def test_open_blob_missing(self, fake_redis, cold_store):
+        from backend.pdf_storage import open_blob
+
+        assert open_blob("pdf:missing") is None
+
+    def test_redis_blob_falls_back_to_cold_mid_download(self, cold_store):
+        from backend.pdf_storage import RedisBlob
+
+        cold_store.put("pdf:job-1", b"0123456789")
+        mock_redis = MagicMock()
+        mock_redis.getrange.side_effect = [b"0123", b""]
+        with patch("backend.pdf_storage.get_redis", return_value=mock_redis):
+            chunks = list(RedisBlob("pdf:job-1", 10).iter_range(0, 9, chunk_size=4))
+        assert b"".join(chunks) == b"0123456789"
+
+    def test_open_pdf_follows_reference(self, fake_redis, cold_store):
+        from backend.redis_client import open_pdf
+
+        with patch("backend.pdf_storage.PDF_HOT_MAX_BYTES", 0):
+            put_blob("render:abc", b"%PDF cached")
+        fake_redis.getrange = lambda key, start, end: b"@ref:render:abc" if key == "pdf:job-1" else b""
+        fake_redis.strlen = lambda key: 0
+        assert b"".join(open_pdf("job-1").iter_range(0, 10)) == b"%PDF cached"
@@ -0,0 +1,248 @@
+"""
+Tests for the Redis quota ledger.
+
+The Lua scripts are exercised against an in-memory model of the ledger so the
+reserve/commit/release semantics can be checked without a Redis server.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+import redis
+
+from backend import quota_ledger
+from backend.quota_ledger import (
+    reserve_quota,
+    reserve_quota_async,
+    commit_quota,
+    release_quota,
+    reconcile_ledgers,
+)
+
+
+class LedgerRedis:
+    """Evaluates the ledger scripts in Python with the same semantics as the Lua."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+        self.strings = {}
+        self.expires = {}
+        self.now = 0  # clock used to expire quota:res keys
+
+    def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], [str(a) for a in args[numkeys:]]
+        if script == quota_ledger._RESERVE_SCRIPT:
+            ledger, reservations, res_key = keys
+            if "used" not in self.hashes.get(ledger, {}):
+                return [b"uninitialized"]
+            now = int(argv[1])
+            zset = self.zsets.setdefault(reservations, {})
+            for member in [m for m, score in zset.items() if score <= now]:
+                del zset[member]
+            used = int(self.hashes[ledger]["used"])
+            limit = int(self.hashes[ledger]["limit"])
+            reserved = len(zset)
+            if used + reserved >= limit:
+                return [b"exceeded", used, reserved, limit]
+            zset[argv[0]] = now + int(argv[2])
+            self.strings[res_key] = ledger
+            self.expires[res_key] = now + int(argv[4])
+            return [b"ok", used, reserved, limit]
+        if script == quota_ledger._RECONCILE_SCRIPT:
+            ledger = self.hashes.setdefault(keys[0], {})
+            ledger["used"] = max(int(ledger.get("used", 0)), int(argv[0]))
+            ledger["limit"] = int(argv[1])
+            return ledger["used"]
+        if self.expires.get(keys[0], float("inf")) <= self.now:
+            self.strings.pop(keys[0], None)
+        ledger = self.strings.pop(keys[0], None)
+        if ledger is None:
+            return 0
+        self.zsets.get(f"{ledger}:reservations", {}).pop(argv[0], None)
+        if argv[1] == "1":
+            self.hashes[ledger]["used"] = int(self.hashes[ledger]["used"]) + 1
+        return 1
+
+    def pipeline(self):
+        return self
+
+    def hsetnx(self, key, field, value):
+        self.hashes.setdefault(key, {}).setdefault(field, value)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        return []
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def scan_iter(self, match=None, count=None):
+        return [key.encode() for key in self.hashes]
+
+
+class AsyncLedgerRedis:
+    """redis.asyncio-shaped view of a LedgerRedis (commands awaited, pipelines queued)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def eval(self, *args):
+        return self.client.eval(*args)
+
+    def pipeline(self):
+        return self
+
+    def hsetnx(self, *args):
+        self.client.hsetnx(*args)
+
+    def expire(self, *args):
+        pass
+
+    async def execute(self):
+        return []
+
+
+@pytest.fixture
+def ledger_redis():
+    client = LedgerRedis()
+    with patch("backend.quota_ledger.get_redis", return_value=client), \
+         patch("backend.quota_ledger.get_async_redis", return_value=AsyncLedgerRedis(client)), \
+         patch("backend.quota_ledger._month", return_value="202610"):
+        yield client
+
+
+def _db_quota(used, limit):
+    return {"used_this_month": used, "monthly_limit": limit, "remaining": limit - used, "can_convert": used < limit}
+
+
+class TestReserve:
+    """Tests for reservations."""
+
+    def test_seeds_ledger_from_database_once(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(3, 10)) as mock_fetch:
+            first = reserve_quota("user-1", "job-1")
+            second = reserve_quota("user-1", "job-2")
+        assert mock_fetch.call_count == 1
+        assert first["can_convert"] and first["used_this_month"] == 3
+        assert second["used_this_month"] == 4  # job-1 is in flight
+        assert second["remaining"] == 6
+
+    def test_concurrent_reservations_never_overshoot(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(8, 10)):
+            results = [reserve_quota("user-1", f"job-{i}")["can_convert"] for i in range(5)]
+        assert results == [True, True, False, False, False]
+
+    def test_release_returns_unit(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(9, 10)):
+            assert reserve_quota("user-1", "job-1")["can_convert"]
+            assert not reserve_quota("user-1", "job-2")["can_convert"]
+            release_quota("job-1")
+            assert reserve_quota("user-1", "job-3")["can_convert"]
+
+    def test_commit_counts_as_used_once(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(0, 10)):
+            reserve_quota("user-1", "job-1")
+        commit_quota("job-1")
+        commit_quota("job-1")
+        assert ledger_redis.hashes["quota:ledger:user-1:202610"]["used"] == 1
+
+    def test_late_completion_is_still_counted(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(0, 10)), \
+             patch("backend.quota_ledger.time.time", return_value=1000):
+            reserve_quota("user-1", "job-1")
+        late = 1000 + quota_ledger.QUOTA_RESERVATION_TTL + 1
+        assert late < 1000 + quota_ledger.QUOTA_SETTLE_TTL
+        with patch("backend.quota_ledger.time.time", return_value=late):
+            reserve_quota("user-1", "job-2")  # prunes job-1's expired reservation
+        ledger_redis.now = late
+        commit_quota("job-1")
+        assert ledger_redis.hashes["quota:ledger:user-1:202610"]["used"] == 1
+
+    def test_falls_back_to_database_without_redis(self):
+        failing = MagicMock()
+        failing.eval.side_effect = redis.ConnectionError("down")
+        with patch("backend.quota_ledger.get_redis", return_value=failing), \
+             patch("backend.quota_ledger.check_user_quota", return_value=_db_quota(1, 10)) as mock_check:
+            assert reserve_quota("user-1", "job-1")["used_this_month"] == 1
+        mock_check.assert_called_once_with("user-1")
+
+
+class TestReserveAsync:
+    """Tests for the event-loop variant used by the API."""
+
+    async def test_shares_ledger_with_sync_reservations(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota_async", return_value=_db_quota(8, 10)) as mock_fetch:
+            assert (await reserve_quota_async("user-1", "job-1"))["can_convert"]
+        assert mock_fetch.await_count == 1
+        assert reserve_quota("user-1", "job-2")["can_convert"]
+        assert not (await reserve_quota_async("user-1", "job-3"))["can_convert"]
+
+    async def test_falls_back_to_database_without_redis(self):
+        failing = MagicMock()
+        failing.eval.side_effect = redis.ConnectionError("down")
+        with patch("backend.quota_ledger.get_async_redis", return_value=failing), \
+             patch("backend.quota_ledger.check_user_quota_async", return_value=_db_quota(1, 10)) as mock_check:
+            assert (await reserve_quota_async("user-1", "job-1"))["used_this_month"] == 1
+        mock_check.assert_awaited_once_with("user-1")
+
+
+class TestReconcile:
+    """Tests for reconciliation against the conversions table."""
+
+    def test_raises_used_and_sets_limit(self, ledger_redis):
+        ledger_redis.hashes["quota:ledger:user-1:202610"] = {"used": 3, "limit": 10}
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(5, 50)):
+            assert reconcile_ledgers() == 1
+        assert ledger_redis.hashes["quota:ledger:user-1:202610"] == {"used": 5, "limit": 50}
+
+    def test_commit_during_reconcile_is_kept(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(4, 10)):
+            reserve_quota("user-1", "job-1")
+
+        def read_database(user_id):
+            commit_quota("job-1")  # lands between the database read and the ledger write
+            return _db_quota(4, 10)  # conversion not flushed to the table yet
+
+        with patch("backend.quota_ledger.fetch_usage_quota", side_effect=read_database):
+            reconcile_ledgers()
+        assert ledger_redis.hashes["quota:ledger:user-1:202610"]["used"] == 5
+
+    def test_runs_once_per_interval(self, ledger_redis):
+        with patch("backend.quota_ledger.fetch_usage_quota", return_value=_db_quota(0, 10)):
+            reconcile_ledgers()
+            assert reconcile_ledgers() == 0
+
+
+class TestSubmitRelease:
+    """Tests for returning reservations when a submit fails after reserving."""
+
+    def test_convert_releases_when_enqueue_fails(self, client):
+        mock_task = MagicMock()
+        mock_task.delay.side_effect = redis.ConnectionError("broker down")
+        with patch("backend.main.generate_pdf_task", mock_task), \
+             patch("backend.main.release_quota") as mock_release:
+            with pytest.raises(redis.ConnectionError):
+                client.post("/api/v1/convert", json={"html_content": "<p>Some content here</p>"})
+        mock_release.assert_called_once()
+
+    def test_batch_releases_every_job_when_store_fails(self, client):
+        quota = {"can_convert": True, "used_this_month": 0, "monthly_limit": 100, "remaining": 100}
+        with patch("backend.main.reserve_quota_batch_async", return_value=quota), \
+             patch("backend.main.create_batch_async"), \
+             patch("backend.main.set_job_statuses_async"), \
+             patch("backend.main.record_conversions_async"), \
+             patch("backend.main.store_payloads", side_effect=redis.ConnectionError("down")), \
+             patch("backend.main.release_quotas") as mock_release:
+            with pytest.raises(redis.ConnectionError):
+                client.post("/api/v1/batches", json={
+                    "documents": [{"html_content": "<p>One</p>"}, {"html_content": "<p>Two</p>"}],
+                })
+        assert len(mock_release.call_args.args[0]) == 2
@@ -128,3 +128,95 @@ class TestRateLimitHeaders:
         assert headers["X-RateLimit-Limit"] == "10"
         assert headers["X-RateLimit-Remaining"] == "5"
         assert headers["X-RateLimit-Reset"] == "30"
+
+
+class TestAPIKeyRateLimiter:
+    """Tests for the GCRA limiter's result handling (script mocked)."""
+
+    LIMITS = {"per_minute": 10, "per_hour": 100}
+
+    def _limiter(self, script_results, **kwargs):
+        from unittest.mock import MagicMock
+        from backend.rate_limiter import APIKeyRateLimiter
+
+        mock_redis = MagicMock()
+        script = MagicMock(side_effect=script_results)
+        mock_redis.register_script.return_value = script
+        return APIKeyRateLimiter(mock_redis, **kwargs), script
+
+    def test_single_round_trip_checks_both_windows(self):
+        from unittest.mock import patch
+
+        limiter, script = self._limiter([[1, 9, 6000, 99, 36000]])
+        with patch("backend.rate_limiter.get_plan_rate_limits", return_value=self.LIMITS):
+            result = limiter.check_rate_limit("key-1", "free")
+
+        assert script.call_count == 1
+        assert script.call_args.kwargs["keys"] == ["ratelimit:key-1:minute", "ratelimit:key-1:hour"]
+        assert script.call_args.kwargs["args"] == [10, 100, 1]
+        assert result["allowed"] is True
+        assert result["windows"]["hour"] == {"limit": 100, "remaining": 99, "reset": 36}
+
+    def test_hour_window_is_enforced(self):
+        from unittest.mock import patch
+
+        limiter, _ = self._limiter([[0, 5, 0, 0, 120000]])
+        with patch("backend.rate_limiter.get_plan_rate_limits", return_value=self.LIMITS):
+            result = limiter.check_rate_limit("key-1", "free")
+
+        assert result["allowed"] is False
+        assert result["limit"] == 100
+        assert result["remaining"] == 0
+        assert result["reset"] == 120
+
+    def test_local_batch_absorbs_burst(self):
+        from unittest.mock import patch
+
+        limiter, script = self._limiter([[5, 5, 30000, 95, 180000]], local_batch=5)
+        with patch("backend.rate_limiter.get_plan_rate_limits", return_value=self.LIMITS):
+            results = [limiter.check_rate_limit("key-1", "free") for _ in range(5)]
+
+        assert script.call_count == 1
+        assert all(r["allowed"] for r in results)
+
+    def test_redis_failure_allows_request(self):
+        import redis
+        from unittest.mock import patch
+
+        limiter, _ = self._limiter(redis.ConnectionError("down"))
+        with patch("backend.rate_limiter.get_plan_rate_limits", return_value=self.LIMITS):
+            assert limiter.check_rate_limit("key-1", "free")["allowed"] is True
+
+    def test_headers_include_hour_window(self):
+        from backend.rate_limiter import get_rate_limit_headers
+
+        headers = get_rate_limit_headers({
+            "limit": 10, "remaining": 9, "reset": 6,
+            "windows": {"hour": {"limit": 100, "remaining": 99, "reset": 36}},
+        })
+        assert headers["X-RateLimit-Remaining-Hour"] == "99"
+
+
+class TestIPRateLimiterStorage:
+    """Tests for the shared (Redis) storage of the per-IP slowapi limiter."""
+
+    def test_limiter_uses_redis_storage(self):
+        from backend.main import limiter
+
+        assert type(limiter._storage).__name__ == "RedisStorage"
+
+    def test_falls_back_to_memory_when_redis_is_down(self):
+        import redis
+        from unittest.mock import patch
+        from fastapi.testclient import TestClient
+        from backend.main import app, limiter
+
+        with patch.object(limiter, "enabled", True), \
+             patch.object(limiter._storage, "check", return_value=False), \
+             patch.object(limiter._limiter, "hit", side_effect=redis.ConnectionError("down")), \
+             patch("backend.main.invalidate_api_key"):
+            client = TestClient(app)
+            codes = [client.post("/api/v1/api-keys/key-1/invalidate").status_code for _ in range(31)]
+
+        assert codes[:30] == [200] * 30
+        assert codes[30] == 429
@@ -0,0 +1,288 @@
+"""
+Tests for the content-addressed render cache and job coalescing.
+"""
+import pytest
+import redis
+from unittest.mock import patch, MagicMock
+from backend.render_cache import (
+    compute_render_key,
+    claim_render,
+    start_render,
+    watch_render,
+    finish_render,
+    render_blob_key,
+)
+from backend.config import RENDER_LOCK_TTL, RENDER_QUEUE_TTL
+
+
+OPTIONS = {
+    "page_size": "A4",
+    "orientation": "portrait",
+    "header_html": None,
+    "exclude_header_pages": "1, 3",
+}
+
+
+class TestComputeRenderKey:
+    """Tests for render key normalization."""
+
+    def test_same_input_same_key(self):
+        assert compute_render_key("<p>x</p>", OPTIONS) == compute_render_key("<p>x</p>", dict(OPTIONS))
+
+    def test_equivalent_options_share_key(self):
+        """Case, whitespace and page list order should not fragment the cache."""
+        variant = {**OPTIONS, "orientation": " Portrait", "exclude_header_pages": "3,1"}
+        assert compute_render_key("<p>x</p>", OPTIONS) == compute_render_key("<p>x</p>", variant)
+
+    def test_html_changes_key(self):
+        assert compute_render_key("<p>x</p>", OPTIONS) != compute_render_key("<p>y</p>", OPTIONS)
+
+    def test_header_changes_key(self):
+        variant = {**OPTIONS, "header_html": "<div>Header</div>"}
+        assert compute_render_key("<p>x</p>", OPTIONS) != compute_render_key("<p>x</p>", variant)
+
+    def test_keys_are_scoped_per_user(self):
+        """A cache hit must not reveal that another tenant rendered the same content."""
+        assert compute_render_key("<p>x</p>", OPTIONS, "user-1") != compute_render_key("<p>x</p>", OPTIONS, "user-2")
+
+
+class TestClaimRender:
+    """Tests for claim outcomes."""
+
+    def test_hit_returns_cached_storage(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.return_value = [b"hit", b'{"size": 2048, "tier": "cold"}']
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            assert claim_render("abc", "job-1") == ("hit", {"size": 2048, "tier": "cold"})
+
+    def test_follower(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.return_value = [b"follower"]
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            assert claim_render("abc", "job-2", "user-1") == ("follower", None)
+        follower = mock_redis.eval.call_args.args[6]
+        assert '"job_id": "job-2"' in follower
+
+    def test_claim_covers_the_queue_wait(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.return_value = [b"leader"]
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            claim_render("abc", "job-1")
+        assert mock_redis.eval.call_args.args[7] == RENDER_QUEUE_TTL
+
+    def test_start_refreshes_claim(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.return_value = 1
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            assert start_render("abc", "job-1") is True
+        assert mock_redis.eval.call_args.args[5:7] == ("job-1", RENDER_LOCK_TTL)
+
+    def test_start_reports_lost_claim(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.return_value = 0
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            assert start_render("abc", "job-1") is False
+
+    def test_watch_outcomes(self):
+        mock_redis = MagicMock()
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            mock_redis.eval.return_value = [b"waiting"]
+            assert watch_render("abc", "job-2") == ("waiting", None)
+            mock_redis.eval.return_value = [b"hit", b'{"size": 4}']
+            assert watch_render("abc", "job-2") == ("hit", {"size": 4})
+            mock_redis.eval.side_effect = redis.ConnectionError("down")
+            assert watch_render("abc", "job-2") == ("waiting", None)
+
+    def test_redis_error_renders_without_dedup(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.side_effect = redis.ConnectionError("down")
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            assert claim_render("abc", "job-1") == ("leader", None)
+
+    def test_finish_returns_followers(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.return_value = [b'{"job_id": "job-2", "user_id": "user-1"}']
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            followers = finish_render("abc", {"size": 4, "tier": "hot"}, leader="job-1")
+        assert mock_redis.eval.call_args.args[5] == '{"size": 4, "tier": "hot"}'
+        assert mock_redis.eval.call_args.args[7] == "job-1"
+        assert followers == [{"job_id": "job-2", "user_id": "user-1"}]
+
+    def test_finish_redis_error_returns_none(self):
+        mock_redis = MagicMock()
+        mock_redis.eval.side_effect = redis.ConnectionError("down")
+        with patch("backend.render_cache.get_redis", return_value=mock_redis):
+            assert finish_render("abc", {"size": 4}) is None
+
+
+class TestPdfReferences:
+    """Tests for pdf:{job_id} references to shared blobs."""
+
+    def test_get_pdf_follows_reference(self):
+        from backend.redis_client import get_pdf
+
+        store = {
+            "pdf:job-1": b"@ref:" + render_blob_key("abc").encode(),
+            render_blob_key("abc"): b"%PDF-1.7 cached",
+        }
+        mock_redis = MagicMock()
+        mock_redis.get.side_effect = store.get
+        with patch("backend.redis_client.get_redis", return_value=mock_redis), \
+             patch("backend.pdf_storage.get_redis", return_value=mock_redis):
+            assert get_pdf("job-1") == b"%PDF-1.7 cached"
+
+    def test_get_pdf_returns_plain_bytes(self):
+        from backend.redis_client import get_pdf
+
+        mock_redis = MagicMock()
+        mock_redis.get.return_value = b"%PDF-1.7"
+        with patch("backend.redis_client.get_redis", return_value=mock_redis):
+            assert get_pdf("job-1") == b"%PDF-1.7"
+
+
+class TestTaskCoalescing:
+    """Tests for completing coalesced jobs from the leader's task."""
+
+    def test_followers_are_completed_by_leader(self):
+        from backend.tasks import generate_pdf_task
+
+        followers = [{"job_id": "job-2", "user_id": None}]
+        storage = {"size": 8, "tier": "hot", "etag": "e"}
+        with patch("backend.tasks.generate_pdf_from_html", return_value=b"%PDF-1.7"), \
+             patch("backend.tasks.finish_render", return_value=followers) as mock_finish, \
+             patch("backend.tasks.put_blob", return_value=storage) as mock_put, \
+             patch("backend.tasks.retention_seconds", return_value=7200), \
+             patch("backend.tasks.store_pdf") as mock_store, \
+             patch("backend.tasks.store_pdf_ref") as mock_ref, \
+             patch("backend.tasks.complete_job") as mock_complete, \
+             patch("backend.tasks.set_job_status"):
+            generate_pdf_task.run(job_id="job-1", html="<p>x</p>", options={}, render_key="abc")
+
+        mock_store.assert_not_called()
+        assert mock_put.call_args.args[0] == render_blob_key("abc")
+        assert mock_finish.call_args.args == ("abc", storage)
+        assert {c.args[0] for c in mock_ref.call_args_list} == {"job-1", "job-2"}
+        assert [c.args[:2] for c in mock_complete.call_args_list] == [("job-1", storage), ("job-2", storage)]
+
+    def test_followers_fail_with_leader(self):
+        from backend.tasks import generate_pdf_task
+
+        with patch("backend.tasks.generate_pdf_from_html", side_effect=RuntimeError("boom")), \
+             patch("backend.tasks.finish_render", return_value=[{"job_id": "job-2", "user_id": None}]), \
+             patch("backend.tasks.fail_job") as mock_fail, \
+             patch("backend.tasks.set_job_status"):
+            with pytest.raises(RuntimeError):
+                generate_pdf_task.run(job_id="job-1", html="<p>x</p>", options={}, render_key="abc")
+
+        assert [c.args[0] for c in mock_fail.call_args_list] == ["job-1", "job-2"]
+
+    def test_leader_is_not_its_own_follower(self):
+        """A follower that took over the claim is still in the list it joined."""
+        from backend.tasks import finish_rendered_job
+
+        followers = [{"job_id": "job-2", "user_id": None}, {"job_id": "job-3", "user_id": None}]
+        with patch("backend.tasks.finish_render", return_value=followers), \
+             patch("backend.tasks.put_blob", return_value={"size": 8}), \
+             patch("backend.tasks.retention_seconds", return_value=7200), \
+             patch("backend.tasks.store_pdf_ref"), \
+             patch("backend.tasks.complete_job") as mock_complete:
+            finish_rendered_job("job-2", b"%PDF", 0, None, "abc")
+
+        assert [c.args[0] for c in mock_complete.call_args_list] == ["job-2", "job-3"]
+
+    def test_started_render_refreshes_claim(self):
+        from backend.tasks import generate_pdf_task
+
+        with patch("backend.tasks.generate_pdf_from_html", return_value=b"%PDF-1.7"), \
+             patch("backend.tasks.finish_rendered_job"), \
+             patch("backend.tasks.start_render", return_value=True) as mock_start, \
+             patch("backend.tasks.set_job_status"):
+            generate_pdf_task.run(job_id="job-1", html="<p>x</p>", options={}, render_key="abc")
+
+        mock_start.assert_called_once_with("abc", "job-1")
+
+
+class TestFollowerWatchdog:
+    """Tests for followers whose leader never finishes."""
+
+    KWARGS = {"job_id": "job-2", "render_key": "abc", "payload_ref": "ref-2", "user_id": "user-1"}
+
+    def _run(self, status, outcome):
+        from backend.tasks import watch_render_follower
+
+        mocks = {}
+        with patch("backend.tasks.get_job_status", return_value=status), \
+             patch("backend.tasks.watch_render", return_value=outcome) as mocks["watch"], \
+             patch("backend.tasks.watch_render_follower.apply_async") as mocks["reschedule"], \
+             patch("backend.tasks.generate_pdf_task") as mocks["task"], \
+             patch("backend.tasks.store_pdf_ref") as mocks["ref"], \
+             patch("backend.tasks.retention_seconds", return_value=7200), \
+             patch("backend.tasks.complete_job") as mocks["complete"], \
+             patch("backend.tasks.delete_payload") as mocks["delete"]:
+            watch_render_follower.run(**self.KWARGS)
+        return mocks
+
+    def test_settled_job_stops_watching(self):
+        mocks = self._run({"status": "completed"}, None)
+        mocks["watch"].assert_not_called()
+        mocks["delete"].assert_called_once_with("ref-2")
+
+    def test_waiting_reschedules(self):
+        mocks = self._run({"status": "pending"}, ("waiting", None))
+        assert mocks["reschedule"].call_args.kwargs["kwargs"] == self.KWARGS
+        mocks["task"].delay.assert_not_called()
+        mocks["delete"].assert_not_called()
+
+    def test_cached_result_completes_job(self):
+        mocks = self._run({"status": "pending"}, ("hit", {"size": 4}))
+        assert mocks["complete"].call_args.args[:2] == ("job-2", {"size": 4})
+        mocks["delete"].assert_called_once_with("ref-2")
+
+    def test_dead_leader_is_taken_over(self):
+        mocks = self._run({"status": "pending"}, ("leader", None))
+        mocks["task"].delay.assert_called_once_with(
+            job_id="job-2", payload_ref="ref-2", user_id="user-1", render_key="abc"
+        )
+        mocks["reschedule"].assert_not_called()
+
+
+class TestConvertEndpointRenderCache:
+    """Tests for render cache outcomes at submit time."""
+
+    def test_cache_hit_completes_job_immediately(self, client, valid_html):
+        storage = {"size": 2048, "tier": "cold", "etag": "e"}
+        with patch("backend.main.claim_render", return_value=("hit", storage)), \
+             patch("backend.main.retention_seconds", return_value=7200), \
+             patch("backend.main.store_pdf_ref") as mock_ref, \
+             patch("backend.main.complete_job") as mock_complete, \
+             patch("backend.main.generate_pdf_task") as mock_task:
+            response = client.post("/api/v1/convert", json={"html_content": valid_html})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "completed"
+        mock_task.delay.assert_not_called()
+        mock_ref.assert_called_once()
+        assert mock_complete.call_args.args[:2] == (data["job_id"], storage)
+
+    def test_in_flight_render_is_not_queued_again(self, client, valid_html):
+        from backend.payload_store import load_payload
+
+        with patch("backend.main.claim_render", return_value=("follower", None)), \
+             patch("backend.main.watch_render_follower") as mock_watch, \
+             patch("backend.main.generate_pdf_task") as mock_task:
+            response = client.post("/api/v1/convert", json={"html_content": valid_html})
+
+        assert response.json()["status"] == "pending"
+        mock_task.delay.assert_not_called()
+        # The follower keeps its own payload and is watched in case the leader dies
+        watch = mock_watch.apply_async.call_args.kwargs
+        assert watch["kwargs"]["job_id"] == response.json()["job_id"]
+        assert "html" in load_payload(watch["kwargs"]["payload_ref"])
+
+    def test_render_key_is_scoped_to_user(self, client, valid_html):
+        with patch("backend.main.compute_render_key", return_value="abc") as mock_key, \
+             patch("backend.main.generate_pdf_task"):
+            client.post("/api/v1/convert", json={"html_content": valid_html})
+
+        assert mock_key.call_args.args[2] == "test-user-123"
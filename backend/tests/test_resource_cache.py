@@ -0,0 +1,177 @@
+"""
+Tests for the shared resource cache and per-document resource fetcher.
+"""
+import time
+import pytest
+import httpx
+from backend.resource_cache import (
+    CachedResource,
+    ResourceCache,
+    ResourceFetcher,
+    ResourceFetchError,
+    freshness_lifetime,
+)
+
+
+def _client(handler):
+    """Build an httpx client backed by a request handler."""
+    return httpx.Client(transport=httpx.MockTransport(handler), follow_redirects=True)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResourceCache(directory=str(tmp_path), memory_bytes=1024 * 1024, disk_bytes=1024 * 1024)
+
+
+class TestFreshnessLifetime:
+    """Tests for HTTP cache header interpretation."""
+
+    def test_max_age(self):
+        assert freshness_lifetime(httpx.Headers({"cache-control": "public, max-age=600"})) == 600
+
+    def test_s_maxage_takes_precedence(self):
+        headers = httpx.Headers({"cache-control": "max-age=60, s-maxage=120"})
+        assert freshness_lifetime(headers) == 120
+
+    def test_age_is_subtracted(self):
+        headers = httpx.Headers({"cache-control": "max-age=600", "age": "100"})
+        assert freshness_lifetime(headers) == 500
+
+    def test_no_store_is_not_cached(self):
+        assert freshness_lifetime(httpx.Headers({"cache-control": "no-store"})) is None
+
+    def test_no_cache_requires_revalidation(self):
+        assert freshness_lifetime(httpx.Headers({"cache-control": "no-cache"})) == 0
+
+    def test_expires_header(self):
+        headers = httpx.Headers({
+            "date": "Sat, 10 Jan 2026 12:00:00 GMT",
+            "expires": "Sat, 10 Jan 2026 13:00:00 GMT",
+        })
+        assert freshness_lifetime(headers) == 3600
+
+    def test_invalid_expires_means_expired(self):
+        assert freshness_lifetime(httpx.Headers({"expires": "0"})) == 0
+
+
+class TestResourceCache:
+    """Tests for the two-tier cache."""
+
+    def test_memory_hit(self, cache):
+        cache.put(CachedResource("https://cdn.test/logo.png", b"png", expires_at=time.time() + 60))
+        resource, tier = cache.get("https://cdn.test/logo.png")
+        assert resource.body == b"png"
+        assert tier == "memory"
+
+    def test_disk_is_shared_between_instances(self, tmp_path):
+        """A second process (new instance) should find entries on disk."""
+        first = ResourceCache(directory=str(tmp_path))
+        first.put(CachedResource("https://cdn.test/font.woff2", b"font", "font/woff2", time.time() + 60))
+
+        second = ResourceCache(directory=str(tmp_path))
+        resource, tier = second.get("https://cdn.test/font.woff2")
+        assert tier == "disk"
+        assert resource.body == b"font"
+        assert resource.content_type == "font/woff2"
+
+    def test_memory_tier_is_bounded(self, tmp_path):
+        cache = ResourceCache(directory=None, memory_bytes=800)
+        for i in range(10):
+            cache.put(CachedResource(f"https://cdn.test/{i}", b"x" * 100, expires_at=time.time() + 60))
+        assert cache._memory_size <= 800
+        assert cache.get("https://cdn.test/0") == (None, None)
+        assert cache.get("https://cdn.test/9")[1] == "memory"
+
+    def test_disk_eviction_removes_least_recent(self, tmp_path):
+        cache = ResourceCache(directory=str(tmp_path), memory_bytes=0, disk_bytes=250)
+        for i in range(3):
+            cache.put(CachedResource(f"https://cdn.test/{i}", b"x" * 100, expires_at=time.time() + 60))
+            time.sleep(0.01)
+        assert cache.evict_disk() == 1
+        assert cache.get("https://cdn.test/0") == (None, None)
+        assert cache.get("https://cdn.test/2")[1] == "disk"
+
+
+class TestResourceFetcher:
+    """Tests for the per-document fetcher."""
+
+    def test_second_fetch_is_served_from_cache(self, cache):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url)
+            return httpx.Response(200, content=b"image", headers={
+                "content-type": "image/png", "cache-control": "max-age=3600"
+            })
+
+        fetcher = ResourceFetcher(cache=cache, client=_client(handler))
+        fetcher.fetch("https://cdn.test/logo.png")
+        resource = fetcher.fetch("https://cdn.test/logo.png")
+
+        assert resource.body == b"image"
+        assert len(calls) == 1
+        stats = fetcher.stats()
+        assert stats["network_fetches"] == 1
+        assert stats["memory_hits"] == 1
+        assert stats["bytes_fetched"] == 5
+        assert stats["bytes_saved"] == 5
+
+    def test_no_store_is_fetched_every_time(self, cache):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url)
+            return httpx.Response(200, content=b"x", headers={"cache-control": "no-store"})
+
+        fetcher = ResourceFetcher(cache=cache, client=_client(handler))
+        fetcher.fetch("https://cdn.test/a")
+        fetcher.fetch("https://cdn.test/a")
+        assert len(calls) == 2
+
+    def test_stale_entry_is_revalidated(self, cache):
+        stale = CachedResource("https://cdn.test/a", b"cached", etag='"v1"', expires_at=0)
+        cache.put(stale)
+
+        def handler(request):
+            assert request.headers["if-none-match"] == '"v1"'
+            return httpx.Response(304, headers={"cache-control": "max-age=60"})
+
+        fetcher = ResourceFetcher(cache=cache, client=_client(handler))
+        resource = fetcher.fetch("https://cdn.test/a")
+
+        assert resource.body == b"cached"
+        assert resource.is_fresh()
+        assert fetcher.stats()["revalidated"] == 1
+        # The shared entry is replaced, never mutated under concurrent readers
+        assert stale.expires_at == 0
+        assert cache.get("https://cdn.test/a")[0] is resource
+
+    def test_http_error_raises(self, cache):
+        fetcher = ResourceFetcher(cache=cache, client=_client(lambda request: httpx.Response(404)))
+        with pytest.raises(ResourceFetchError):
+            fetcher.fetch("https://cdn.test/missing.png")
+        assert fetcher.stats()["errors"] == 1
+
+    def test_oversized_resource_raises(self, cache):
+        handler = lambda request: httpx.Response(200, content=b"x" * 100)
+        fetcher = ResourceFetcher(cache=cache, client=_client(handler), max_bytes=10)
+        with pytest.raises(ResourceFetchError):
+            fetcher.fetch("https://cdn.test/huge.png")
+
+    def test_budget_exhausted_skips_network(self, cache):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url)
+            return httpx.Response(200, content=b"x")
+
+        fetcher = ResourceFetcher(cache=cache, client=_client(handler), budget=0)
+        with pytest.raises(ResourceFetchError):
+            fetcher.fetch("https://slow.test/a.png")
+        assert calls == []
+        assert fetcher.stats()["budget_exhausted"] == 1
+
+    def test_budget_exhausted_serves_stale(self, cache):
+        cache.put(CachedResource("https://cdn.test/a", b"stale", expires_at=0))
+        fetcher = ResourceFetcher(cache=cache, client=_client(lambda r: httpx.Response(500)), budget=0)
+        assert fetcher.fetch("https://cdn.test/a").body == b"stale"
@@ -0,0 +1,157 @@
+"""
+Tests for the concurrent resource prefetch stage.
+"""
+import asyncio
+import pytest
+import httpx
+from backend.resource_cache import ResourceCache, ResourceFetcher
+from backend.resource_prefetch import (
+    collect_css_urls,
+    collect_resource_urls,
+    prefetch_resources,
+)
+
+
+def _async_client(handler):
+    """Build an async httpx client backed by a request handler."""
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+
+
+def _sync_client(handler):
+    return httpx.Client(transport=httpx.MockTransport(handler), follow_redirects=True)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResourceCache(directory=str(tmp_path))
+
+
+class TestCollectResourceUrls:
+    """Tests for URL collection from HTML."""
+
+    def test_collects_images_stylesheets_and_css_urls(self):
+        html = """<html><head>
+            <link rel="stylesheet" href="https://cdn.test/site.css">
+            <link rel="icon" href="https://cdn.test/favicon.ico">
+            <style>@import "https://cdn.test/fonts.css"; body { background: url('https://cdn.test/bg.png') }</style>
+        </head><body>
+            <img src="https://cdn.test/logo.png">
+            <div style="background-image: url(https://cdn.test/hero.jpg)"></div>
+        </body></html>"""
+        assert collect_resource_urls(html) == [
+            "https://cdn.test/site.css",
+            "https://cdn.test/fonts.css",
+            "https://cdn.test/bg.png",
+            "https://cdn.test/logo.png",
+            "https://cdn.test/hero.jpg",
+        ]
+
+    def test_skips_data_uris_relative_urls_and_duplicates(self):
+        html = """<img src="data:image/png;base64,AAA"><img src="logo.png">
+            <img src="https://cdn.test/a.png"><img src="https://cdn.test/a.png">"""
+        assert collect_resource_urls(html) == ["https://cdn.test/a.png"]
+
+    def test_css_urls_resolve_against_stylesheet(self):
+        css = "@font-face { src: url('../fonts/inter.woff2') }"
+        assert collect_css_urls(css, "https://cdn.test/css/site.css") == ["https://cdn.test/fonts/inter.woff2"]
+
+
+class TestPrefetchResources:
+    """Tests for concurrent fetching."""
+
+    def test_prefetched_resources_skip_the_network_during_layout(self, cache):
+        def handler(request):
+            return httpx.Response(200, content=b"img", headers={"cache-control": "no-store"})
+
+        sync_calls = []
+
+        def sync_handler(request):
+            sync_calls.append(request.url)
+            return httpx.Response(200, content=b"img")
+
+        fetcher = ResourceFetcher(cache=cache, client=_sync_client(sync_handler))
+        stats = prefetch_resources(fetcher, ["https://cdn.test/a.png"], client=_async_client(handler))
+
+        # no-store is still served for this document, from the prefetch
+        assert fetcher.fetch("https://cdn.test/a.png").body == b"img"
+        assert sync_calls == []
+        assert stats["fetched"] == 1
+        assert fetcher.stats()["prefetch_hits"] == 1
+
+    def test_fetches_run_concurrently(self, cache):
+        in_flight = []
+        peak = []
+
+        async def handler(request):
+            in_flight.append(request.url)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(request.url)
+            return httpx.Response(200, content=b"x")
+
+        fetcher = ResourceFetcher(cache=cache)
+        urls = [f"https://cdn.test/{i}.png" for i in range(8)]
+        stats = prefetch_resources(fetcher, urls, concurrency=4, client=_async_client(handler))
+
+        assert max(peak) == 4
+        assert stats["fetched"] == 8
+        assert stats["wall_time_ms"] < stats["sum_fetch_time_ms"]
+
+    def test_stylesheet_urls_are_fetched_in_second_wave(self, cache):
+        def handler(request):
+            if request.url.path == "/css/site.css":
+                return httpx.Response(200, text="body { background: url(bg.png) }",
+                                      headers={"content-type": "text/css"})
+            return httpx.Response(200, content=b"png", headers={"content-type": "image/png"})
+
+        fetcher = ResourceFetcher(cache=cache)
+        stats = prefetch_resources(fetcher, ["https://cdn.test/css/site.css"], client=_async_client(handler))
+
+        assert stats["urls"] == 2
+        assert "https://cdn.test/css/bg.png" in fetcher._prefetched
+
+    def test_errors_are_counted_not_raised(self, cache):
+        fetcher = ResourceFetcher(cache=cache)
+        client = _async_client(lambda request: httpx.Response(404))
+        stats = prefetch_resources(fetcher, ["https://cdn.test/missing.png"], client=client)
+        assert stats["errors"] == 1
+        assert stats["fetched"] == 0
+
+    def test_wall_time_is_charged_to_budget(self, cache):
+        async def handler(request):
+            await asyncio.sleep(0.5)
+            return httpx.Response(200, content=b"x")
+
+        fetcher = ResourceFetcher(cache=cache, budget=0.1)
+        stats = prefetch_resources(fetcher, ["https://slow.test/a.png"], client=_async_client(handler))
+
+        assert stats["fetched"] == 0
+        assert fetcher.remaining_budget() <= 0
+
+    def test_runs_inside_event_loop(self, cache):
+        """The render may be called from an async handler (sync mode)."""
+        fetcher = ResourceFetcher(cache=cache)
+        client = _async_client(lambda request: httpx.Response(200, content=b"x"))
+
+        async def render():
+            return prefetch_resources(fetcher, ["https://cdn.test/a.png"], client=client)
+
+        assert asyncio.run(render())["fetched"] == 1
+
+    def test_client_is_pooled_across_documents(self, cache, monkeypatch):
+        """Documents without an explicit client share the process-wide client."""
+        import backend.resource_prefetch as resource_prefetch
+
+        created = []
+        real_client = httpx.AsyncClient
+
+        def make_client(**kwargs):
+            created.append(kwargs)
+            return real_client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=b"x")), **kwargs)
+
+        monkeypatch.setattr(resource_prefetch, "_async_http_client", None)
+        monkeypatch.setattr(resource_prefetch.httpx, "AsyncClient", make_client)
+        for _ in range(2):
+            stats = prefetch_resources(ResourceFetcher(cache=cache), ["https://cdn.test/a.png"])
+            assert stats["fetched"] == 1
+        assert len(created) == 1
@@ -0,0 +1,204 @@
+"""
+Tests for split_on: one render cut into one PDF per record.
+"""
+import io
+import zipfile
+import pytest
+from unittest.mock import patch, MagicMock
+
+from xml.etree import ElementTree
+
+from backend.pdf_service import SplitPart, _mark_records, _split_document
+from backend.pdf_storage import iter_zip
+
+
+class FakePage:
+    def __init__(self, *anchors):
+        self.anchors = {anchor: (0, 0, 0, 0) for anchor in anchors}
+
+
+class FakeDocument:
+    """Rendered document whose copies write their page numbers as the PDF."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def copy(self, pages):
+        numbers = [self.pages.index(page) + 1 for page in pages]
+        copy = MagicMock()
+        copy.write_pdf.return_value = ",".join(map(str, numbers)).encode()
+        return copy
+
+
+class FakeBlob:
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+
+    def iter_range(self, start, end):
+        yield self.data[start:end + 1]
+
+
+class TestMarkRecords:
+    """Tests for giving each record an anchor before layout."""
+
+    def test_ids_are_kept_or_added(self):
+        root = ElementTree.fromstring(
+            '<body><div class="cover"/><div class="statement" id="acc-1"/>'
+            '<div class="statement big"/><div class="statements"/></body>'
+        )
+        markers = _mark_records(root, "statement")
+        assert markers == [("acc-1", "acc-1"), ("split-on-record-2", None)]
+        assert root[2].get("id") == "split-on-record-2"
+        assert root[3].get("id") is None
+
+    def test_duplicate_record_ids_are_rejected(self):
+        root = ElementTree.fromstring('<body><p id="acc"/><div class="statement" id="acc"/></body>')
+        with pytest.raises(ValueError, match="unique"):
+            _mark_records(root, "statement")
+
+
+class TestSplitDocument:
+    """Tests for mapping pages to records."""
+
+    def test_one_pdf_per_record(self):
+        document = FakeDocument([
+            FakePage("cover"),
+            FakePage("acc-1"),
+            FakePage("acc-1"),  # first record continues on this page
+            FakePage("split-on-record-2"),
+        ])
+        markers = [("acc-1", "acc-1"), ("split-on-record-2", None)]
+        parts = _split_document(document, "statement", markers)
+        # Pages before the first record belong to it
+        assert [(p.record, p.first_page, p.last_page, p.pdf_bytes) for p in parts] == [
+            ("acc-1", 1, 3, b"1,2,3"),
+            (None, 4, 4, b"4"),
+        ]
+
+    def test_records_sharing_a_page_are_rejected(self):
+        document = FakeDocument([FakePage("a", "b")])
+        with pytest.raises(ValueError, match="new page"):
+            _split_document(document, "statement", [("a", "a"), ("b", "b")])
+
+    def test_unrendered_records_are_skipped(self):
+        document = FakeDocument([FakePage("a")])
+        parts = _split_document(document, "statement", [("a", "a"), ("hidden", "hidden")])
+        assert [p.record for p in parts] == ["a"]
+
+    def test_document_without_records(self):
+        with pytest.raises(ValueError, match="statement"):
+            _split_document(FakeDocument([FakePage("other")]), "statement", [])
+
+    def test_part_limit(self):
+        document = FakeDocument([FakePage(f"r{i}") for i in range(3)])
+        with patch("backend.pdf_service.SPLIT_MAX_PARTS", 2):
+            with pytest.raises(ValueError, match="limited to 2"):
+                _split_document(document, "statement", [(f"r{i}", None) for i in range(3)])
+
+    def test_rendered_document(self):
+        """Runs the anchor lookup against a real WeasyPrint layout."""
+        from backend import pdf_service
+
+        if pdf_service.HTML is None:
+            pytest.skip("WeasyPrint native libraries are not installed")
+        source = pdf_service.HTML(string=(
+            '<div class="statement" id="acc-1">One</div>'
+            '<div class="statement" style="break-before: page">Two</div>'
+        ))
+        markers = _mark_records(source.etree_element, "statement")
+        parts = _split_document(source.render(), "statement", markers)
+        assert [(p.record, p.first_page, p.last_page) for p in parts] == [("acc-1", 1, 1), (None, 2, 2)]
+
+
+class TestZipStream:
+    """Tests for streaming parts as a ZIP."""
+
+    def test_round_trip(self):
+        data = b"".join(iter_zip([("0001.pdf", FakeBlob(b"%PDF-1")), ("0002.pdf", FakeBlob(b"%PDF-2"))]))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.namelist() == ["0001.pdf", "0002.pdf"]
+        assert archive.read("0002.pdf") == b"%PDF-2"
+
+
+class TestSplitJob:
+    """Tests for storing and serving the parts of a split job."""
+
+    def test_parts_are_stored_separately(self):
+        from backend.tasks import finish_split_job
+
+        parts = [SplitPart(b"pdf-1", "acc-1", 1, 2), SplitPart(b"pdf-22", None, 3, 3)]
+        with patch("backend.tasks.put_blob", side_effect=lambda name, data, ttl: {"name": name, "size": len(data)}), \
+             patch("backend.tasks.complete_job") as mock_complete:
+            stored = finish_split_job("job-1", parts, 0, "user-1")
+        assert [part["name"] for part in stored] == ["pdf:job-1-1", "pdf:job-1-2"]
+        storage = mock_complete.call_args.args[1]
+        assert storage == {"size": 11}
+        assert mock_complete.call_args.kwargs["parts"][0]["record"] == "acc-1"
+
+    def _status(self):
+        return {
+            "status": "completed",
+            "size": 11,
+            "storage": {"size": 11},
+            "parts": [
+                {"name": "pdf:job-1-1", "size": 5, "etag": "e1", "record": "acc/1", "first_page": 1, "last_page": 2},
+                {"name": "pdf:job-1-2", "size": 6, "etag": "e2", "record": None, "first_page": 3, "last_page": 3},
+            ],
+        }
+
+    def test_download_one_part(self, client):
+        with patch("backend.main.get_job_status_async", return_value=self._status()), \
+             patch("backend.main.open_blob", return_value=FakeBlob(b"pdf-22")) as mock_open:
+            response = client.get("/api/v1/jobs/job-1/download?part=2")
+        assert response.status_code == 200
+        assert response.content == b"pdf-22"
+        assert response.headers["etag"] == '"e2"'
+        mock_open.assert_called_once_with("pdf:job-1-2")
+
+    def test_download_all_parts_as_zip(self, client):
+        blobs = {"pdf:job-1-1": FakeBlob(b"pdf-1"), "pdf:job-1-2": FakeBlob(b"pdf-22")}
+        with patch("backend.main.get_job_status_async", return_value=self._status()), \
+             patch("backend.main.open_blob", side_effect=blobs.get):
+            response = client.get("/api/v1/jobs/job-1/download")
+        assert response.headers["content-type"] == "application/zip"
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.namelist() == ["0001_acc_1.pdf", "0002.pdf"]
+
+    def test_missing_part(self, client):
+        with patch("backend.main.get_job_status_async", return_value=self._status()):
+            assert client.get("/api/v1/jobs/job-1/download?part=3").status_code == 404
+
+    def test_status_lists_parts(self, client):
+        with patch("backend.main.get_job_status_async", return_value=self._status()):
+            body = client.get("/api/v1/jobs/job-1").json()
+        assert [part["first_page"] for part in body["parts"]] == [1, 3]
+        assert "name" not in body["parts"][0]
+        assert "download_url" not in body
+
+
+class TestSplitRequest:
+    """Tests for the split_on option."""
+
+    def test_split_job_skips_render_cache(self, client):
+        mock_task = MagicMock()
+        with patch("backend.main.generate_pdf_task", mock_task), \
+             patch("backend.main.claim_render") as mock_claim:
+            response = client.post("/api/v1/convert", json={
+                "html_content": '<div class="statement">Record one</div>', "split_on": ".statement"
+            })
+        assert response.status_code == 200
+        mock_claim.assert_not_called()
+        mock_task.delay.assert_called_once()
+
+    def test_rejects_page_numbers(self, client):
+        response = client.post("/api/v1/convert", json={
+            "html_content": "<p>Some content here</p>", "split_on": "statement", "include_page_numbers": True
+        })
+        assert response.status_code == 422
+
+    def test_rejects_invalid_class(self, client):
+        response = client.post("/api/v1/convert", json={
+            "html_content": "<p>Some content here</p>", "split_on": "div > p"
+        })
+        assert response.status_code == 422
@@ -0,0 +1,169 @@
+"""
+Tests for the offline TailwindCSS compiler.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from backend.tailwind_compiler import (
+    scan_class_names,
+    compile_tailwind_css,
+    class_set_hash,
+    page_width_px,
+)
+
+
+class TestScanClassNames:
+    """Tests for class token scanning."""
+
+    def test_scans_double_and_single_quotes(self):
+        """Class attributes with either quote style should be scanned."""
+        html = """<div class="p-4 text-blue-500"><span class='font-bold'>x</span></div>"""
+        assert scan_class_names(html) == {"p-4", "text-blue-500", "font-bold"}
+
+    def test_scans_header_and_footer(self):
+        """Classes from every fragment should be collected."""
+        classes = scan_class_names(
+            '<p class="mt-2">body</p>',
+            '<div class="text-center">header</div>',
+            None
+        )
+        assert classes == {"mt-2", "text-center"}
+
+    def test_ignores_data_attributes(self):
+        """Attributes that merely end in 'class' should not be scanned."""
+        assert scan_class_names('<div data-class="p-4">x</div>') == set()
+
+
+class TestCompileTailwindCss:
+    """Tests for CSS generation."""
+
+    def test_emits_only_used_utilities(self):
+        """Only utilities present in the class set should be emitted."""
+        _, css = compile_tailwind_css({"p-4", "text-blue-500"})
+        assert ".p-4 { padding: 1rem }" in css
+        assert ".text-blue-500 { color: #3b82f6 }" in css
+        assert "bg-" not in css
+
+    def test_unknown_classes_are_ignored(self):
+        """Custom classes should not produce CSS or a hash."""
+        class_hash, css = compile_tailwind_css({"invoice-total", "my-custom"})
+        assert class_hash is None
+        assert css == ""
+
+    def test_escapes_special_characters(self):
+        """Fractions and decimals should be escaped in selectors."""
+        _, css = compile_tailwind_css({"w-1/2", "p-0.5"})
+        assert ".w-1\\/2 { width: 50% }" in css
+        assert ".p-0\\.5 { padding: 0.125rem }" in css
+
+    def test_escapes_leading_digit(self):
+        """2xl: selectors should escape the leading digit as a code point."""
+        _, css = compile_tailwind_css({"2xl:p-4", "-mt-2"}, viewport_width=1600)
+        assert ".\\32 xl\\:p-4 { padding: 1rem }" in css
+        assert ".-mt-2 { margin-top: -0.5rem }" in css
+
+    def test_2xl_selector_matches_element(self):
+        """The escaped 2xl: selector should parse and match the class."""
+        cssselect2 = pytest.importorskip("cssselect2")
+        import tinycss2
+        from xml.etree import ElementTree
+
+        _, css = compile_tailwind_css({"2xl:p-4"}, viewport_width=1600)
+        rule = tinycss2.parse_stylesheet(css, skip_whitespace=True)[0]
+        selectors = cssselect2.compile_selector_list(rule.prelude)
+        root = cssselect2.ElementWrapper.from_xml_root(ElementTree.fromstring('<div class="2xl:p-4"/>'))
+        assert selectors[0].test(root)
+
+    def test_border_width_includes_style(self):
+        """Border width utilities should render without Tailwind preflight."""
+        _, css = compile_tailwind_css({"border"})
+        assert "border-style: solid" in css
+
+    def test_border_color_overrides_default(self):
+        """Border colors should be emitted after border widths."""
+        _, css = compile_tailwind_css({"border-red-500", "border"})
+        assert css.index(".border {") < css.index(".border-red-500 {")
+
+    def test_print_variant_applies(self):
+        """The print: variant should always apply."""
+        _, css = compile_tailwind_css({"print:hidden"})
+        assert ".print\\:hidden { display: none }" in css
+
+    def test_interactive_variants_are_ignored(self):
+        """hover:, focus: and dark: never apply to a PDF."""
+        class_hash, _ = compile_tailwind_css({"hover:bg-red-500", "dark:text-white"})
+        assert class_hash is None
+
+    def test_breakpoints_follow_page_width(self):
+        """Responsive variants should apply only when the page is wide enough."""
+        _, portrait = compile_tailwind_css({"md:flex", "lg:block"}, viewport_width=794)
+        _, landscape = compile_tailwind_css({"md:flex", "lg:block"}, viewport_width=1123)
+        assert "md\\:flex" in portrait
+        assert "lg\\:block" not in portrait
+        assert "lg\\:block" in landscape
+
+    def test_responsive_rules_come_after_base(self):
+        """Breakpoint utilities should override base utilities."""
+        _, css = compile_tailwind_css({"md:block", "hidden"})
+        assert css.index(".hidden") < css.index(".md\\:block")
+
+    def test_important_modifier(self):
+        """The ! prefix should mark declarations as important."""
+        _, css = compile_tailwind_css({"!font-bold"})
+        assert "font-weight: 700 !important" in css
+
+    def test_space_utilities_use_child_selector(self):
+        """space-y-* should target siblings, not the element itself."""
+        _, css = compile_tailwind_css({"space-y-2"})
+        assert ".space-y-2 > :not([hidden]) ~ :not([hidden])" in css
+
+
+class TestTailwindStylesheetCache:
+    """Tests for the parsed Tailwind stylesheet cache in pdf_service."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        from backend.pdf_service import clear_tailwind_css_cache
+        clear_tailwind_css_cache()
+        yield
+        clear_tailwind_css_cache()
+
+    def test_same_class_set_compiles_once(self):
+        """Identical class sets should be compiled and parsed once."""
+        from backend.pdf_service import _get_tailwind_stylesheet, get_tailwind_css_cache_stats
+
+        with patch("backend.pdf_service.CSS", MagicMock()) as mock_css, \
+             patch("backend.pdf_service.compile_tailwind_css", wraps=compile_tailwind_css) as mock_compile:
+            first = _get_tailwind_stylesheet('<p class="p-4 text-blue-500">x</p>', None, None, "A4", "portrait")
+            second = _get_tailwind_stylesheet('<p class="text-blue-500 my-custom p-4">x</p>', None, None, "A4", "portrait")
+
+        assert first is second
+        assert mock_compile.call_count == 1
+        assert mock_css.call_count == 1
+        stats = get_tailwind_css_cache_stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_no_utilities_no_stylesheet(self):
+        """Documents without Tailwind classes should not create a stylesheet."""
+        from backend.pdf_service import _get_tailwind_stylesheet
+
+        assert _get_tailwind_stylesheet('<p class="invoice-row">x</p>', None, None, "A4", "portrait") is None
+
+    def test_hash_ignores_unknown_classes(self):
+        """Custom classes should not fragment the cache."""
+        assert class_set_hash({"p-4"}) == class_set_hash({"p-4", "invoice-row"})
+
+
+class TestPageWidth:
+    """Tests for page width resolution."""
+
+    @pytest.mark.parametrize("page_size,orientation,expected", [
+        ("A4", "portrait", 794),
+        ("A4", "landscape", 1123),
+        ("letter", "portrait", 816),
+        ("210mm 297mm", "portrait", 793),
+        ("unknown", "portrait", 794),
+    ])
+    def test_page_width(self, page_size, orientation, expected):
+        """Page sizes should resolve to widths in CSS pixels."""
+        assert page_width_px(page_size, orientation) == expected
@@ -0,0 +1,150 @@
+"""
+Tests for PDF templates.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+from backend.payload_store import load_payload
+from backend.templates import TemplateError, _extract_static_styles, _strip_unsafe_urls
+
+TEMPLATE = {
+    "id": "tpl-1",
+    "user_id": "test-user-123",
+    "name": "Invoice",
+    "source": "<h1>Invoice {{ number }}</h1>",
+    "version": "abc123",
+    "dynamic_urls": False,
+}
+
+
+class TestTemplateSource:
+    """Tests for sanitizing a template's markup at registration."""
+
+    @pytest.fixture(autouse=True)
+    def _jinja2(self):
+        pytest.importorskip("jinja2")
+
+    def _prepare(self, source):
+        from backend.main import sanitize_template_html
+        from backend.templates import prepare_template_source
+        return prepare_template_source(source, sanitize_template_html)
+
+    def test_keeps_tags_and_strips_unsafe_markup(self):
+        clean, dynamic_urls = self._prepare(
+            "<h1>{{ title }}</h1><script>alert(1)</script>"
+            "{% for item in items %}<p>{{ item.name }}</p>{% endfor %}"
+        )
+        assert "<script>" not in clean
+        assert "{{ title }}" in clean
+        assert "{% for item in items %}" in clean
+        assert dynamic_urls is False
+
+    def test_flags_tags_in_urls(self):
+        _, dynamic_urls = self._prepare('<a href="{{ link }}">Link</a>')
+        assert dynamic_urls is True
+
+    def test_rejects_tags_in_stripped_attributes(self):
+        with pytest.raises(TemplateError):
+            self._prepare('<p onclick="{{ handler }}">Text</p>')
+
+    def test_rejects_autoescape_override(self):
+        with pytest.raises(TemplateError):
+            self._prepare("{% autoescape false %}{{ value }}{% endautoescape %}")
+
+    def test_rejects_include(self):
+        with pytest.raises(TemplateError):
+            self._prepare('{% include "other.html" %}')
+
+    def test_rendered_values_are_escaped(self):
+        from backend.templates import _compile
+
+        clean, _ = self._prepare("<p>{{ name }}</p>")
+        assert _compile(clean).render(name="<b>x</b>") == "<p>&lt;b&gt;x&lt;/b&gt;</p>"
+        with pytest.raises(TemplateError):
+            _compile("{{ name|safe }}")
+
+
+class TestRenderHelpers:
+    """Tests for the render-time helpers."""
+
+    def test_strips_unsafe_url_schemes(self):
+        html = '<a href="javascript:alert(1)">x</a><a href="https://example.com">y</a>'
+        assert _strip_unsafe_urls(html) == '<a href="">x</a><a href="https://example.com">y</a>'
+
+    def test_static_styles_are_extracted(self):
+        markup, styles = _extract_static_styles(
+            "<style>h1 { color: red; }</style><style>p { color: {{ color }}; }</style><h1>x</h1>"
+        )
+        assert styles == ["h1 { color: red; }"]
+        assert "{{ color }}" in markup
+
+
+class TestConvertWithTemplate:
+    """Tests for POST /api/v1/convert with template_id."""
+
+    def test_payload_carries_template_and_data(self, client):
+        mock_task = MagicMock()
+        with patch("backend.main.generate_pdf_task", mock_task), \
+             patch("backend.main.get_template", return_value=TEMPLATE), \
+             patch("backend.main.sanitize_html") as mock_sanitize:
+            response = client.post("/api/v1/convert", json={"template_id": "tpl-1", "data": {"number": 7}})
+        assert response.status_code == 200
+        mock_sanitize.assert_not_called()
+        payload = load_payload(mock_task.delay.call_args.kwargs["payload_ref"])
+        assert payload["template"] == {"id": "tpl-1", "version": "abc123"}
+        assert payload["data"] == {"number": 7}
+        assert "html" not in payload
+
+    def test_other_users_template_is_not_found(self, client):
+        with patch("backend.main.get_template", return_value={**TEMPLATE, "user_id": "someone-else"}):
+            response = client.post("/api/v1/convert", json={"template_id": "tpl-1"})
+        assert response.status_code == 404
+
+    def test_requires_html_or_template(self, client):
+        assert client.post("/api/v1/convert", json={"action": "preview"}).status_code == 422
+        response = client.post("/api/v1/convert", json={
+            "html_content": "<p>Some content here</p>", "template_id": "tpl-1"
+        })
+        assert response.status_code == 422
+
+    def test_batch_loads_each_template_once(self, client):
+        quota = {"can_convert": True, "used_this_month": 0, "monthly_limit": 100, "remaining": 100}
+        with patch("backend.main.get_template", return_value=TEMPLATE) as mock_get, \
+             patch("backend.main.reserve_quota_batch_async", return_value=quota), \
+             patch("backend.main.create_batch_async"), \
+             patch("backend.main.set_job_statuses_async"), \
+             patch("backend.main.record_conversions_async"), \
+             patch("backend.main.store_payloads", return_value=["ref-0", "ref-1"]) as mock_store, \
+             patch("backend.main.enqueue_pdf_tasks"):
+            response = client.post("/api/v1/batches", json={
+                "defaults": {"template_id": "tpl-1"},
+                "documents": [{"data": {"number": 1}}, {"data": {"number": 2}}],
+            })
+        assert response.status_code == 200
+        mock_get.assert_called_once_with("tpl-1")
+        payloads = mock_store.call_args.args[0]
+        assert [p["data"]["number"] for p in payloads] == [1, 2]
+
+
+class TestTemplateEndpoints:
+    """Tests for /api/v1/templates."""
+
+    def test_create_returns_record(self, client):
+        with patch("backend.main.create_template", return_value={**TEMPLATE, "created_at": "2026-01-13"}) as mock_create:
+            response = client.post("/api/v1/templates", json={"name": "Invoice", "html_content": "<h1>{{ number }}</h1>"})
+        assert response.status_code == 200
+        assert response.json()["version"] == "abc123"
+        assert mock_create.call_args.args[:3] == ("test-user-123", "Invoice", "<h1>{{ number }}</h1>")
+
+    def test_invalid_template(self, client):
+        with patch("backend.main.create_template", side_effect=TemplateError("bad tag")):
+            response = client.post("/api/v1/templates", json={"name": "Bad", "html_content": "<h1>{{ x </h1>"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "bad tag"
+
+    def test_delete_missing_template(self, client):
+        with patch("backend.main.delete_template", return_value=False):
+            assert client.delete("/api/v1/templates/nope").status_code == 404
+
+    def test_requires_api_key(self, client_no_auth):
+        assert client_no_auth.get("/api/v1/templates").status_code == 401
@@ -301,3 +301,24 @@ class TestPDFRequestHeaderFooterValidation:
             exclude_footer_pages="   "
         )
         assert request.exclude_footer_pages is None
+
+    def test_header_footer_mode_defaults_to_running(self):
+        """Header/footer should use running elements unless overlay is requested."""
+        request = PDFRequest(html_content="<p>Test content with enough characters.</p>")
+        assert request.header_footer_mode == "running"
+
+    def test_valid_header_footer_mode_overlay(self):
+        """Overlay mode should be accepted case-insensitively."""
+        request = PDFRequest(
+            html_content="<p>Test content with enough characters.</p>",
+            header_footer_mode="Overlay"
+        )
+        assert request.header_footer_mode == "overlay"
+
+    def test_invalid_header_footer_mode(self):
+        """Unknown header/footer modes should be rejected."""
+        with pytest.raises(ValidationError):
+            PDFRequest(
+                html_content="<p>Test content with enough characters.</p>",
+                header_footer_mode="stamp"
+            )
@@ -78,6 +78,7 @@ class TestWebhookEndpoints:
     def client_with_webhook_mocks(self):
         """Client with mocked Supabase for webhook operations."""
         from backend.pdf_service import generate_pdf_from_html
+        from backend.payload_store import load_payload
         from unittest.mock import patch, MagicMock
 
         # Mock storage
@@ -86,7 +87,7 @@ class TestWebhookEndpoints:
         _webhook_storage = {}
         _webhook_id_counter = [0]
 
-        def _mock_set_job_status(job_id, status, ttl=None):
+        def _mock_set_job_status(job_id, status, ttl=None, user_id=None):
             _job_storage[job_id] = status
 
         def _mock_get_job_status(job_id):
@@ -95,11 +96,18 @@ class TestWebhookEndpoints:
         def _mock_store_pdf(job_id, pdf_bytes, ttl=None):
             _pdf_storage[job_id] = pdf_bytes
 
-        def _mock_get_pdf(job_id):
-            return _pdf_storage.get(job_id)
+        def _mock_open_pdf(job_id):
+            pdf_bytes = _pdf_storage.get(job_id)
+            if pdf_bytes is None:
+                return None
+            blob = MagicMock(size=len(pdf_bytes))
+            blob.iter_range.side_effect = lambda start, end, *args: iter([pdf_bytes[start:end + 1]])
+            return blob
 
-        def sync_task_delay(job_id, html, options, user_id=None):
+        def sync_task_delay(job_id, payload_ref, user_id=None, render_key=None):
             try:
+                payload = load_payload(payload_ref)
+                html, options = payload["html"], payload["options"]
                 _mock_set_job_status(job_id, {"status": "processing"})
                 pdf_bytes = generate_pdf_from_html(html=html, **options)
                 _mock_store_pdf(job_id, pdf_bytes)
@@ -169,7 +177,7 @@ class TestWebhookEndpoints:
                 "is_valid": True
             }
 
-        def _mock_check_user_quota_ok(user_id):
+        def _mock_reserve_quota_ok(user_id, job_id):
             return {
                 "can_convert": True,
                 "used_this_month": 10,
@@ -177,14 +185,14 @@ class TestWebhookEndpoints:
                 "remaining": 90
             }
 
-        with patch('backend.main.set_job_status', side_effect=_mock_set_job_status), \
-             patch('backend.main.get_job_status', side_effect=_mock_get_job_status), \
-             patch('backend.main.get_pdf', side_effect=_mock_get_pdf), \
+        with patch('backend.main.set_job_status_async', side_effect=_mock_set_job_status), \
+             patch('backend.main.get_job_status_async', side_effect=_mock_get_job_status), \
+             patch('backend.main.open_pdf', side_effect=_mock_open_pdf), \
              patch('backend.main.generate_pdf_task', mock_task), \
              patch('backend.main.get_api_key_from_request', return_value=TEST_API_KEY), \
-             patch('backend.main.validate_api_key', side_effect=_mock_validate_api_key_success), \
-             patch('backend.main.check_user_quota', side_effect=_mock_check_user_quota_ok), \
-             patch('backend.main.track_conversion', return_value=None), \
+             patch('backend.main.validate_api_key_async', side_effect=_mock_validate_api_key_success), \
+             patch('backend.main.reserve_quota_async', side_effect=_mock_reserve_quota_ok), \
+             patch('backend.main.record_conversion_async', return_value=None), \
              patch('backend.main.get_rate_limiter', return_value=mock_rate_limiter), \
              patch('backend.main.supabase', mock_supabase), \
              patch('backend.main.limiter.enabled', False):
@@ -95,6 +95,10 @@ export default function ApiKeyManager() {
 
       if (error) throw error
 
+      // Drop the key from the API's auth cache so revocation applies immediately
+      const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000'
+      fetch(`${apiUrl}/api/v1/api-keys/${keyId}/invalidate`, { method: 'POST' }).catch(() => {})
+
       toast.success(t('dashboard.keyRevoked'))
       fetchApiKeys()
     } catch (error) {
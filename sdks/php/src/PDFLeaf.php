@@ -203,7 +203,7 @@ class PDFLeaf
      *
      * @param string $jobId The job ID
      *
-     * @return array{status: string, size?: int, error?: string}
+     * @return array{status: string, size?: int, error?: string, download_url?: string}
      */
     public function getStatus(string $jobId): array
     {
@@ -229,7 +229,7 @@ class PDFLeaf
      * @param float $pollInterval Polling interval in seconds (default: 0.5)
      * @param float $maxWait Maximum wait time in seconds (default: 60)
      *
-     * @return array{status: string, size?: int, error?: string}
+     * @return array{status: string, size?: int, error?: string, download_url?: string}
      * @throws PDFLeafException If timeout is reached
      */
     public function waitForCompletion(
@@ -23,6 +23,7 @@ class PDFOptions
      * @param string|null $footerHeight Footer height with CSS units
      * @param string|null $excludeHeaderPages Comma-separated page numbers to exclude header
      * @param string|null $excludeFooterPages Comma-separated page numbers to exclude footer
+     * @param string|null $headerFooterMode 'running' or 'overlay' (render header/footer once)
      */
     public function __construct(
         public ?string $pageSize = null,
@@ -38,6 +39,7 @@ class PDFOptions
         public ?string $footerHeight = null,
         public ?string $excludeHeaderPages = null,
         public ?string $excludeFooterPages = null,
+        public ?string $headerFooterMode = null,
     ) {
     }
 
@@ -89,6 +91,9 @@ class PDFOptions
         if ($this->excludeFooterPages !== null) {
             $result['exclude_footer_pages'] = $this->excludeFooterPages;
         }
+        if ($this->headerFooterMode !== null) {
+            $result['header_footer_mode'] = $this->headerFooterMode;
+        }
 
         return $result;
     }
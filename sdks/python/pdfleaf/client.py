@@ -26,6 +26,19 @@ DEFAULT_BASE_URL = "https://htmltopdf.buscarid.com"
 DEFAULT_TIMEOUT = 30.0
 SDK_VERSION = "1.0.0"
 
+# Seconds the server holds a status request open waiting for a change
+LONG_POLL_SECONDS = 25
+
+
+def _long_poll_wait(remaining: float) -> int:
+    """Seconds to long-poll for, within the caller's remaining time (at least 1)."""
+    return max(1, int(min(remaining, LONG_POLL_SECONDS)))
+
+
+def _answered_without_waiting(status: str, last_status: Optional[str], requested_at: float, wait: int) -> bool:
+    """True if an unchanged status came back early: the server ignores ?wait= and must be polled."""
+    return status == last_status and time.time() - requested_at < wait / 2
+
 
 class PDFLeaf:
     """
@@ -214,23 +227,30 @@ class PDFLeaf:
             rate_limit=RateLimitInfo(**data["rate_limit"]) if data.get("rate_limit") else None,
         )
 
-    def get_status(self, job_id: str) -> JobStatus:
+    def get_status(self, job_id: str, wait: int = 0) -> JobStatus:
         """
         Get job status (synchronous).
 
         Args:
             job_id: The job ID
+            wait: Seconds to wait for the next status change (long-poll)
 
         Returns:
             Current job status
         """
-        response = self._get_sync_client().get(f"/api/v1/jobs/{job_id}")
+        response = self._get_sync_client().get(
+            f"/api/v1/jobs/{job_id}",
+            params={"wait": wait} if wait > 0 else None,
+            timeout=self.timeout + wait,
+        )
         data = self._handle_response(response)
 
         return JobStatus(
             status=data["status"],
             size=data.get("size"),
             error=data.get("error"),
+            download_url=data.get("download_url"),
+            parts=data.get("parts"),
         )
 
     def download(self, job_id: str) -> bytes:
@@ -259,9 +279,13 @@ class PDFLeaf:
         """
         Wait for job completion (synchronous).
 
+        Long-polls the job status, so the server answers as soon as the
+        status changes.
+
         Args:
             job_id: The job ID
-            poll_interval: Polling interval in seconds (default: 0.5)
+            poll_interval: Polling interval in seconds for servers without
+                long-poll support (default: 0.5)
             max_wait: Maximum wait time in seconds (default: 60)
 
         Returns:
@@ -271,14 +295,19 @@ class PDFLeaf:
             PDFLeafError: If timeout is reached
         """
         start_time = time.time()
+        last_status = None
 
         while time.time() - start_time < max_wait:
-            status = self.get_status(job_id)
+            wait = _long_poll_wait(max_wait - (time.time() - start_time))
+            requested_at = time.time()
+            status = self.get_status(job_id, wait=wait)
 
             if status.status in ("completed", "failed"):
                 return status
 
-            time.sleep(poll_interval)
+            if _answered_without_waiting(status.status, last_status, requested_at, wait):
+                time.sleep(poll_interval)
+            last_status = status.status
 
         raise PDFLeafError("Timeout waiting for job completion", 408)
 
@@ -343,23 +372,30 @@ class PDFLeaf:
             rate_limit=RateLimitInfo(**data["rate_limit"]) if data.get("rate_limit") else None,
         )
 
-    async def get_status_async(self, job_id: str) -> JobStatus:
+    async def get_status_async(self, job_id: str, wait: int = 0) -> JobStatus:
         """
         Get job status (asynchronous).
 
         Args:
             job_id: The job ID
+            wait: Seconds to wait for the next status change (long-poll)
 
         Returns:
             Current job status
         """
-        response = await self._get_async_client().get(f"/api/v1/jobs/{job_id}")
+        response = await self._get_async_client().get(
+            f"/api/v1/jobs/{job_id}",
+            params={"wait": wait} if wait > 0 else None,
+            timeout=self.timeout + wait,
+        )
         data = self._handle_response(response)
 
         return JobStatus(
             status=data["status"],
             size=data.get("size"),
             error=data.get("error"),
+            download_url=data.get("download_url"),
+            parts=data.get("parts"),
         )
 
     async def download_async(self, job_id: str) -> bytes:
@@ -388,9 +424,13 @@ class PDFLeaf:
         """
         Wait for job completion (asynchronous).
 
+        Long-polls the job status, so the server answers as soon as the
+        status changes.
+
         Args:
             job_id: The job ID
-            poll_interval: Polling interval in seconds (default: 0.5)
+            poll_interval: Polling interval in seconds for servers without
+                long-poll support (default: 0.5)
             max_wait: Maximum wait time in seconds (default: 60)
 
         Returns:
@@ -399,14 +439,19 @@ class PDFLeaf:
         import asyncio
 
         start_time = time.time()
+        last_status = None
 
         while time.time() - start_time < max_wait:
-            status = await self.get_status_async(job_id)
+            wait = _long_poll_wait(max_wait - (time.time() - start_time))
+            requested_at = time.time()
+            status = await self.get_status_async(job_id, wait=wait)
 
             if status.status in ("completed", "failed"):
                 return status
 
-            await asyncio.sleep(poll_interval)
+            if _answered_without_waiting(status.status, last_status, requested_at, wait):
+                await asyncio.sleep(poll_interval)
+            last_status = status.status
 
         raise PDFLeafError("Timeout waiting for job completion", 408)
 
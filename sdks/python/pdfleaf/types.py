@@ -9,7 +9,7 @@ from typing import List, Literal, Optional
 PageSize = Literal["A4", "Letter", "A3", "A5", "Legal", "B4", "B5"]
 Orientation = Literal["portrait", "landscape"]
 JobStatusType = Literal["pending", "processing", "completed", "failed"]
-WebhookEvent = Literal["job.completed", "job.failed"]
+WebhookEvent = Literal["job.completed", "job.failed", "batch.completed"]
 
 
 @dataclass
@@ -31,6 +31,12 @@ class PDFOptions:
         footer_height: Footer height with CSS units (default: '2cm')
         exclude_header_pages: Comma-separated page numbers to exclude header
         exclude_footer_pages: Comma-separated page numbers to exclude footer
+        header_footer_mode: 'running' or 'overlay' (render header/footer once,
+            faster for long documents; default: 'running')
+        split_on: CSS class marking the first element of each record; the
+            document is rendered once and split into one PDF per record
+        chunked: Render very large documents in parallel chunks, split at
+            top-level .page-break/.page-break-before elements
     """
 
     page_size: Optional[PageSize] = None
@@ -46,6 +52,9 @@ class PDFOptions:
     footer_height: Optional[str] = None
     exclude_header_pages: Optional[str] = None
     exclude_footer_pages: Optional[str] = None
+    header_footer_mode: Optional[str] = None
+    split_on: Optional[str] = None
+    chunked: Optional[bool] = None
 
     def to_dict(self) -> dict:
         """Convert to API request dictionary."""
@@ -76,6 +85,12 @@ class PDFOptions:
             result["exclude_header_pages"] = self.exclude_header_pages
         if self.exclude_footer_pages is not None:
             result["exclude_footer_pages"] = self.exclude_footer_pages
+        if self.header_footer_mode is not None:
+            result["header_footer_mode"] = self.header_footer_mode
+        if self.split_on is not None:
+            result["split_on"] = self.split_on
+        if self.chunked is not None:
+            result["chunked"] = self.chunked
         return result
 
 
@@ -88,11 +103,17 @@ class JobStatus:
         status: Current job status
         size: PDF file size in bytes (when completed)
         error: Error message (when failed)
+        download_url: Short-lived signed URL to fetch the PDF directly
+            (when completed and enabled on the server)
+        parts: One entry per record for split_on jobs (record, first_page,
+            last_page, size and download_url)
     """
 
     status: JobStatusType
     size: Optional[int] = None
     error: Optional[str] = None
+    download_url: Optional[str] = None
+    parts: Optional[List[dict]] = None
 
 
 @dataclass
@@ -30,6 +30,7 @@ import type {
   JobStatus,
   WebhookConfig,
   WebhookResponse,
+  WebhookEvent,
 } from './types';
 
 // Re-export types
@@ -289,6 +290,9 @@ export class PDFLeaf {
       if (options.footerHeight) body.footer_height = options.footerHeight;
       if (options.excludeHeaderPages) body.exclude_header_pages = options.excludeHeaderPages;
       if (options.excludeFooterPages) body.exclude_footer_pages = options.excludeFooterPages;
+      if (options.headerFooterMode) body.header_footer_mode = options.headerFooterMode;
+      if (options.splitOn) body.split_on = options.splitOn;
+      if (options.chunked) body.chunked = options.chunked;
     }
 
     const response = await this.request<{
@@ -410,7 +414,7 @@ export class PDFLeaf {
       id: response.id,
       url: response.url,
       secret: response.secret,
-      events: response.events as ('job.completed' | 'job.failed')[],
+      events: response.events as WebhookEvent[],
       isActive: response.is_active,
       createdAt: response.created_at,
     };
@@ -441,7 +445,7 @@ export class PDFLeaf {
       id: wh.id,
       url: wh.url,
       secret: wh.secret,
-      events: wh.events as ('job.completed' | 'job.failed')[],
+      events: wh.events as WebhookEvent[],
       isActive: wh.is_active,
       createdAt: wh.created_at,
     }));
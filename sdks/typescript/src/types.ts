@@ -80,6 +80,49 @@ export interface PDFOptions {
    * Comma-separated page numbers to exclude footer (e.g., '1')
    */
   excludeFooterPages?: string;
+
+  /**
+   * 'running' (default) or 'overlay' (render header/footer once, faster for long documents)
+   */
+  headerFooterMode?: 'running' | 'overlay';
+
+  /**
+   * CSS class marking the first element of each record: the document is rendered once
+   * and split into one PDF per record (each record must start on a new page)
+   */
+  splitOn?: string;
+
+  /**
+   * Render very large documents in parallel chunks, split at top-level
+   * .page-break/.page-break-before elements
+   */
+  chunked?: boolean;
+}
+
+/**
+ * One record's PDF of a job converted with splitOn
+ */
+export interface JobPart {
+  /**
+   * id attribute of the record's marker element, if any
+   */
+  record?: string | null;
+
+  /**
+   * First and last page of the record in the full document (1-based)
+   */
+  first_page: number;
+  last_page: number;
+
+  /**
+   * PDF file size in bytes
+   */
+  size: number;
+
+  /**
+   * Short-lived signed URL to fetch this PDF directly (when enabled on the server)
+   */
+  download_url?: string;
 }
 
 /**
@@ -100,6 +143,16 @@ export interface JobStatus {
    * Error message (when failed)
    */
   error?: string;
+
+  /**
+   * Short-lived signed URL to fetch the PDF directly (when completed and enabled on the server)
+   */
+  download_url?: string;
+
+  /**
+   * One PDF per record (jobs converted with splitOn, when completed)
+   */
+  parts?: JobPart[];
 }
 
 /**
@@ -158,7 +211,7 @@ export interface PDFLeafConfig {
 /**
  * Webhook event types
  */
-export type WebhookEvent = 'job.completed' | 'job.failed';
+export type WebhookEvent = 'job.completed' | 'job.failed' | 'batch.completed';
 
 /**
  * Webhook configuration
@@ -0,0 +1,40 @@
+-- Side-effect-free API key lookup and batched last_used_at updates.
+-- validate_api_key counted this month's conversions and wrote last_used_at on
+-- every request; the API now caches lookups (auth_cache.py) and flushes usage
+-- timestamps periodically.
+
+CREATE OR REPLACE FUNCTION public.lookup_api_key(p_key_hash TEXT)
+RETURNS TABLE(
+    api_key_id UUID,
+    user_id UUID,
+    plan TEXT,
+    monthly_limit INTEGER,
+    is_valid BOOLEAN
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        ak.id AS api_key_id,
+        ak.user_id,
+        p.plan,
+        p.monthly_limit,
+        (ak.is_active = TRUE AND (ak.expires_at IS NULL OR ak.expires_at > NOW())) AS is_valid
+    FROM public.api_keys ak
+    JOIN public.profiles p ON p.id = ak.user_id
+    WHERE ak.key_hash = p_key_hash;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+-- p_usage: [{"id": "<api_key_id>", "used_at": "<timestamptz>"}, ...]
+CREATE OR REPLACE FUNCTION public.touch_api_keys(p_usage JSONB)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE public.api_keys ak
+    SET last_used_at = GREATEST(COALESCE(ak.last_used_at, u.used_at), u.used_at)
+    FROM jsonb_to_recordset(p_usage) AS u(id UUID, used_at TIMESTAMPTZ)
+    WHERE ak.id = u.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION public.lookup_api_key IS 'API key lookup for the auth cache (no writes, no usage count)';
+COMMENT ON FUNCTION public.touch_api_keys IS 'Batched last_used_at update flushed by the API';
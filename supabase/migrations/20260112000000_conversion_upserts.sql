@@ -0,0 +1,64 @@
+-- Write-behind conversion tracking.
+-- The API and workers append conversion events to a Redis Stream; a writer
+-- merges them per job and upserts them in batches (conversion_log.py).
+-- Delivery is at-least-once, so conversions.job_id becomes unique and
+-- replayed rows must not move a conversion backwards.
+
+-- Keep the earliest row of any duplicated job before adding the constraint
+DELETE FROM public.conversions a
+USING public.conversions b
+WHERE a.job_id = b.job_id
+  AND (a.created_at, a.id) > (b.created_at, b.id);
+
+DROP INDEX IF EXISTS public.idx_conversions_job;
+CREATE UNIQUE INDEX idx_conversions_job ON public.conversions(job_id);
+
+CREATE OR REPLACE FUNCTION public.conversion_status_rank(p_status TEXT)
+RETURNS INTEGER AS $$
+    SELECT CASE p_status
+        WHEN 'pending' THEN 0
+        WHEN 'processing' THEN 1
+        ELSE 2
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- p_rows: [{"job_id": "...", "status": "...", "created_at": "<timestamptz>", ...}, ...]
+-- The earliest event defines created_at and the submission fields (a status
+-- update may arrive before its submission when a batch is retried).
+CREATE OR REPLACE FUNCTION public.upsert_conversions(p_rows JSONB)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO public.conversions AS c (
+        job_id, user_id, api_key_id, status, action, html_size, page_count,
+        file_size_bytes, processing_time_ms, source, ip_address, created_at
+    )
+    SELECT
+        r.job_id, r.user_id, r.api_key_id, COALESCE(r.status, 'pending'),
+        COALESCE(r.action, 'download'), r.html_size, r.page_count,
+        r.file_size_bytes, r.processing_time_ms, COALESCE(r.source, 'web'),
+        r.ip_address, COALESCE(r.created_at, NOW())
+    FROM jsonb_to_recordset(p_rows) AS r(
+        job_id TEXT, user_id UUID, api_key_id UUID, status TEXT, action TEXT,
+        html_size INTEGER, page_count INTEGER, file_size_bytes INTEGER,
+        processing_time_ms INTEGER, source TEXT, ip_address INET,
+        created_at TIMESTAMPTZ
+    )
+    ON CONFLICT (job_id) DO UPDATE SET
+        user_id = COALESCE(c.user_id, EXCLUDED.user_id),
+        api_key_id = COALESCE(c.api_key_id, EXCLUDED.api_key_id),
+        status = CASE
+            WHEN public.conversion_status_rank(EXCLUDED.status) >= public.conversion_status_rank(c.status)
+            THEN EXCLUDED.status ELSE c.status
+        END,
+        action = CASE WHEN EXCLUDED.created_at < c.created_at THEN EXCLUDED.action ELSE c.action END,
+        source = CASE WHEN EXCLUDED.created_at < c.created_at THEN EXCLUDED.source ELSE c.source END,
+        html_size = COALESCE(c.html_size, EXCLUDED.html_size),
+        ip_address = COALESCE(c.ip_address, EXCLUDED.ip_address),
+        page_count = COALESCE(EXCLUDED.page_count, c.page_count),
+        file_size_bytes = COALESCE(EXCLUDED.file_size_bytes, c.file_size_bytes),
+        processing_time_ms = COALESCE(EXCLUDED.processing_time_ms, c.processing_time_ms),
+        created_at = LEAST(c.created_at, EXCLUDED.created_at);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION public.upsert_conversions IS 'Idempotent bulk conversion upsert flushed from the conversions:events stream';
@@ -0,0 +1,30 @@
+-- PDF templates for template + data rendering.
+-- The API stores the sanitized template source; workers compile it once per
+-- process (keyed by id and version) and render jobs from a JSON data payload.
+
+CREATE TABLE IF NOT EXISTS public.pdf_templates (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES public.profiles(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    version TEXT NOT NULL,
+    dynamic_urls BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_pdf_templates_user ON public.pdf_templates(user_id, created_at DESC);
+
+ALTER TABLE public.pdf_templates ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own templates"
+    ON public.pdf_templates FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can delete own templates"
+    ON public.pdf_templates FOR DELETE
+    USING (auth.uid() = user_id);
+
+-- Templates are created through the API, which sanitizes them first
+CREATE POLICY "Service role can manage templates"
+    ON public.pdf_templates FOR ALL
+    USING (auth.role() = 'service_role');